@@ -27,18 +27,16 @@ class Command(BaseCommand):
         mstore = modulestore('direct')
         cstore = contentstore()
 
-        org, course_num, _ = dest_course_id.split("/")
-        mstore.ignore_write_events_on_courses.append('{0}/{1}'.format(org, course_num))
-
         print("Cloning course {0} to {1}".format(source_course_id, dest_course_id))
 
         source_location = CourseDescriptor.id_to_location(source_course_id)
         dest_location = CourseDescriptor.id_to_location(dest_course_id)
 
-        if clone_course(mstore, cstore, source_location, dest_location):
-            # be sure to recompute metadata inheritance after all those updates
-            mstore.refresh_cached_metadata_inheritance_tree(dest_location)
+        # metadata inheritance is recomputed once, after all those updates
+        with mstore.bulk_write_operations(dest_location):
+            cloned = clone_course(mstore, cstore, source_location, dest_location)
 
+        if cloned:
             print("copying User permissions...")
             # purposely avoids auth.add_user b/c it doesn't have a caller to authorize
             CourseInstructorRole(dest_location).add_users(
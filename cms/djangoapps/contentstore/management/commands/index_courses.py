@@ -0,0 +1,20 @@
+"""
+Script for building the summaries of courses which the Studio course listing shows
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from contentstore.models import CourseSummary
+from xmodule.modulestore.django import modulestore
+
+
+class Command(BaseCommand):
+    """Build the course summaries of all of the courses in mongo, removing those of deleted courses"""
+    help = 'Build the course summaries of all of the courses in mongo, removing those of deleted courses'
+
+    def handle(self, *args, **options):
+        "Execute the command"
+        if len(args) != 0:
+            raise CommandError("index_courses takes no arguments")
+
+        num_indexed, num_removed = CourseSummary.index_courses(modulestore('direct'))
+        print("Indexed {0} courses, removed {1} deleted ones".format(num_indexed, num_removed))
@@ -0,0 +1,257 @@
+"""
+Records of the course import and export jobs run by Studio in celery, and the
+summaries of courses used to list them.
+"""
+from datetime import timedelta
+
+from celery.result import AsyncResult
+from celery.states import FAILURE, REVOKED
+from django.contrib.auth.models import User
+from django.db import models, transaction
+from django.db.models import Q
+from django.dispatch import receiver
+from django.utils import timezone
+
+from student.roles import GlobalStaff, CourseStaffRole, CourseInstructorRole
+from xmodule.error_module import ErrorDescriptor
+from xmodule.modulestore import Location
+from xmodule.modulestore.django import loc_mapper, modulestore_update_signal
+from xmodule.modulestore.exceptions import ItemNotFoundError
+
+
+class ImportExportJob(models.Model):
+    """
+    The status of a course import or export, kept up to date by the celery task
+    running it, so that Studio can report its progress and the result.
+
+    `course_location` is the url of the location of the course, and `filename` is
+    the name of the uploaded file for imports, and of the tar.gz file made for exports.
+    `artifact_path` is where the file is on disk: imports unpack it in a directory of
+    their own, which they delete when they're done, and exports keep it to be
+    downloaded until the next export of the course succeeds.
+    """
+    IMPORT = 'import'
+    EXPORT = 'export'
+    JOB_TYPES = ((IMPORT, 'import'), (EXPORT, 'export'))
+
+    QUEUED = 'queued'
+    IN_PROGRESS = 'in_progress'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    STATES = (
+        (QUEUED, 'queued'),
+        (IN_PROGRESS, 'in progress'),
+        (SUCCEEDED, 'succeeded'),
+        (FAILED, 'failed'),
+    )
+
+    # phases of imports, in order
+    UNPACKING = 'unpacking'
+    VERIFYING = 'verifying'
+    IMPORTING = 'importing'
+    # phases of exports, in order
+    EXPORTING = 'exporting'
+    COMPRESSING = 'compressing'
+
+    # how long a job can go without recording any progress before it's taken to have been
+    # abandoned, e.g. because the celery worker running it died
+    TIMEOUT = timedelta(hours=1)
+    # how many items a job processes between writes of its progress
+    PROGRESS_INTERVAL = 100
+
+    job_type = models.CharField(max_length=8, choices=JOB_TYPES)
+    course_location = models.CharField(max_length=255, db_index=True)
+    filename = models.CharField(max_length=255)
+    user = models.ForeignKey(User)
+    task_id = models.CharField(max_length=255, blank=True)
+    state = models.CharField(max_length=16, choices=STATES, default=QUEUED)
+    phase = models.CharField(max_length=16, blank=True)
+    # number of files unpacked or modules imported, or of files exported
+    items_processed = models.IntegerField(default=0)
+    # bytes unpacked, or written to the tar.gz file of an export
+    bytes_processed = models.BigIntegerField(default=0)
+    artifact_path = models.CharField(max_length=1024, blank=True)
+    error = models.TextField(blank=True)
+    # url of the location of the item which couldn't be exported, if that's why an export failed
+    error_location = models.CharField(max_length=255, blank=True)
+    created = models.DateTimeField(auto_now_add=True, db_index=True)
+    updated = models.DateTimeField(auto_now=True)
+
+    def __unicode__(self):
+        return u"{0} of {1} [{2}]".format(self.job_type, self.course_location, self.state)
+
+    @classmethod
+    def latest(cls, job_type, course_location, **kwargs):
+        """
+        Return the most recent job of job_type for the course, filtered by kwargs,
+        or None if there isn't one.
+        """
+        jobs = cls.objects.filter(job_type=job_type, course_location=course_location, **kwargs).order_by('-id')
+        return jobs[0] if jobs else None
+
+    @transaction.autocommit
+    def save_now(self):
+        """
+        Writes the job immediately, committing any pending transaction, so that the celery
+        task running it can find it.
+
+        When called from a view wrapped by TransactionMiddleware, and thus in a
+        "commit-on-success" transaction, this autocommit commits the pending transaction.
+        Any future database operations take place in a separate transaction.
+        """
+        self.save()
+
+    @property
+    def is_finished(self):
+        """Whether the job has succeeded or failed"""
+        return self.state in (self.SUCCEEDED, self.FAILED)
+
+    @property
+    def is_abandoned(self):
+        """
+        Whether the job isn't finished, but the celery task running it failed or was revoked
+        without recording that, or hasn't recorded any progress for TIMEOUT
+        """
+        if self.is_finished:
+            return False
+        if AsyncResult(self.task_id).state in (FAILURE, REVOKED):
+            return True
+        return self.updated < timezone.now() - self.TIMEOUT
+
+    def start_phase(self, phase):
+        """Record that the job has started phase"""
+        self.state = self.IN_PROGRESS
+        self.phase = phase
+        self.save()
+
+    def add_items_processed(self, count=1):
+        """
+        Record that count more items have been processed, writing the job's progress
+        every PROGRESS_INTERVAL items
+        """
+        previous = self.items_processed
+        self.items_processed += count
+        if previous // self.PROGRESS_INTERVAL != self.items_processed // self.PROGRESS_INTERVAL:
+            self.save()
+
+    def succeed(self):
+        """Record that the job has succeeded"""
+        self.state = self.SUCCEEDED
+        self.save()
+
+    def fail(self, error, error_location=''):
+        """Record that the job failed in its current phase"""
+        self.state = self.FAILED
+        self.error = error
+        self.error_location = error_location
+        self.save()
+
+
+class CourseSummary(models.Model):
+    """
+    What the Studio course listing shows of a course, so that listing the courses a
+    user can see doesn't load every course from the modulestore. Kept up to date by
+    `update_course_summary` whenever a course is written or deleted.
+
+    The `*_key` fields are lower cased versions of the course_id, package_id and
+    number, which are the names by which role groups give access to the course (see
+    `student.roles.CourseRole`). Group names are lower cased too.
+    """
+    course_id = models.CharField(max_length=255, unique=True)
+    org = models.CharField(max_length=255)
+    number = models.CharField(max_length=255)
+    run = models.CharField(max_length=255)
+    display_name = models.CharField(max_length=255, blank=True)
+    display_org = models.CharField(max_length=255, blank=True)
+    display_number = models.CharField(max_length=255, blank=True)
+    # the locator of the draft version of the course
+    package_id = models.CharField(max_length=255)
+    block_id = models.CharField(max_length=255)
+    course_id_key = models.CharField(max_length=255, db_index=True)
+    package_id_key = models.CharField(max_length=255, db_index=True)
+    number_key = models.CharField(max_length=255, db_index=True)
+
+    def __unicode__(self):
+        return self.course_id
+
+    @classmethod
+    def update_for_course(cls, store, location):
+        """
+        Bring the summary of the course at location up to date with the course in store,
+        removing it if the course no longer exists
+        """
+        location = Location(location).replace(revision=None)
+        course_id = location.course_id
+        try:
+            course = store.get_item(location)
+        except ItemNotFoundError:
+            course = None
+        # pylint: disable=fixme
+        # TODO remove the templates condition when templates purged from db
+        if (course is None or isinstance(course, ErrorDescriptor) or
+                location.course == 'templates' or not (location.org and location.course and location.name)):
+            cls.objects.filter(course_id=course_id).delete()
+            return
+
+        # published = false b/c studio manipulates draft versions not b/c the course isn't pub'd
+        locator = loc_mapper().translate_location(course_id, location, published=False, add_entry_if_missing=True)
+        summary, _ = cls.objects.get_or_create(course_id=course_id, defaults={
+            'org': location.org, 'number': location.course, 'run': location.name,
+        })
+        summary.display_name = course.display_name or ''
+        summary.display_org = course.display_org_with_default
+        summary.display_number = course.display_number_with_default
+        summary.package_id = locator.package_id
+        summary.block_id = locator.block_id
+        summary.course_id_key = course_id.lower()
+        summary.package_id_key = locator.package_id.lower()
+        summary.number_key = location.course.lower()
+        summary.save()
+
+    @classmethod
+    def index_courses(cls, store):
+        """
+        Build the summaries of all of the courses in store, removing those of deleted courses.
+        Returns the numbers of courses indexed and of summaries removed.
+        """
+        course_ids = set()
+        for course in store.get_courses():
+            cls.update_for_course(store, course.location)
+            course_ids.add(course.location.course_id)
+
+        stale = cls.objects.exclude(course_id__in=course_ids)
+        num_removed = stale.count()
+        stale.delete()
+        return len(course_ids), num_removed
+
+    @classmethod
+    def for_user(cls, user):
+        """
+        Returns a queryset of the summaries of the courses which user has staff access
+        to in Studio, found from the names of the user's role groups.
+        """
+        if GlobalStaff().has_user(user):
+            return cls.objects.all()
+        if not (user.is_authenticated() and user.is_active):
+            return cls.objects.none()
+
+        keys = set()
+        for group_name in user.groups.values_list('name', flat=True):
+            role, _, key = group_name.lower().partition('_')
+            # instructors of a course are also its staff
+            if role in (CourseStaffRole.ROLE, CourseInstructorRole.ROLE) and key:
+                keys.add(key)
+        if not keys:
+            return cls.objects.none()
+        return cls.objects.filter(
+            Q(course_id_key__in=keys) | Q(package_id_key__in=keys) | Q(number_key__in=keys)
+        )
+
+
+@receiver(modulestore_update_signal)
+def update_course_summary(sender, modulestore=None, location=None, **kwargs):  # pylint: disable=W0613
+    """
+    Receiver for `modulestore_update_signal` that keeps the summaries of courses up to date
+    """
+    if location is not None and Location(location).category == 'course':
+        CourseSummary.update_for_course(modulestore, location)
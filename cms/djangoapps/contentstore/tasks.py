@@ -0,0 +1,177 @@
+"""
+Celery tasks which import and export courses for Studio, so that large courses
+don't tie up web workers. Their progress is recorded in `ImportExportJob`s.
+"""
+import os
+import shutil
+import tarfile
+from tempfile import mkdtemp
+from path import path
+
+from celery import task
+from celery.utils.log import get_task_logger
+from django.conf import settings
+from django.core.exceptions import SuspiciousOperation
+from django.utils.translation import ugettext as _
+
+from contentstore.models import ImportExportJob
+from extract_tar import safetar_extractall
+from student import auth
+from student.roles import CourseInstructorRole, CourseStaffRole
+from xmodule.contentstore.django import contentstore
+from xmodule.exceptions import SerializationError
+from xmodule.modulestore import Location
+from xmodule.modulestore.django import modulestore
+from xmodule.modulestore.xml_exporter import export_to_xml
+from xmodule.modulestore.xml_importer import import_from_xml
+
+log = get_task_logger(__name__)
+
+
+def _get_dir_for_fname(directory, filename):
+    """
+    Returns the dirpath for the first file found in the directory
+    with the given name.  If there is no file in the directory with
+    the specified name, return None.
+    """
+    for dirpath, _dirnames, filenames in os.walk(directory):
+        if filename in filenames:
+            return path(dirpath)
+    return None
+
+
+@task  # pylint: disable=E1102
+def import_course(job_id):
+    """
+    Unpacks the tar.gz file uploaded for the import job job_id, which is in a course directory
+    inside a directory of the job's own under GITHUB_REPO_ROOT, and imports the course in it into
+    the course of the job. The job's directory is removed afterwards. GITHUB_REPO_ROOT must be
+    shared by Studio and its celery workers; the job fails if the file isn't found.
+    """
+    job = ImportExportJob.objects.get(id=job_id)
+    course_dir = path(job.artifact_path).dirname()
+    job_dir = course_dir.dirname()
+
+    if not os.path.exists(job.artifact_path):
+        # the file was uploaded to a Studio server which doesn't share GITHUB_REPO_ROOT with this worker
+        log.error('The file uploaded for import job %d is missing: GITHUB_REPO_ROOT (%s) must be shared '
+                  'by Studio and its celery workers', job.id, settings.GITHUB_REPO_ROOT)
+        job.fail(_('The uploaded file could not be found on the server running the import.'))
+        return
+
+    try:
+        job.start_phase(ImportExportJob.UNPACKING)
+        tar_file = tarfile.open(job.artifact_path)
+        try:
+            safetar_extractall(tar_file, (course_dir + '/').encode('utf-8'))
+            members = tar_file.getmembers()
+        except SuspiciousOperation as exc:
+            job.fail(u'{0} {1}'.format(_('Unsafe tar file. Aborting import.'), exc.args[0]))
+            return
+        finally:
+            tar_file.close()
+        job.items_processed = len(members)
+        job.bytes_processed = sum(member.size for member in members)
+
+        job.start_phase(ImportExportJob.VERIFYING)
+        dirpath = _get_dir_for_fname(course_dir, "course.xml")
+        if not dirpath:
+            job.fail(_('Could not find the course.xml file in the package.'))
+            return
+
+        log.debug('found course.xml at {0}'.format(dirpath))
+
+        if dirpath != course_dir:
+            for fname in os.listdir(dirpath):
+                shutil.move(dirpath / fname, course_dir)
+
+        job.items_processed = 0
+        job.start_phase(ImportExportJob.IMPORTING)
+        _xml_module_store, course_items = import_from_xml(
+            modulestore('direct'),
+            course_dir.dirname(),
+            [course_dir.basename()],
+            load_error_modules=False,
+            static_content_store=contentstore(),
+            target_location_namespace=Location(job.course_location),
+            draft_store=modulestore(),
+            module_imported=lambda module: job.add_items_processed()
+        )
+
+        new_location = course_items[0].location
+        log.debug('new course at {0}'.format(new_location))
+
+        auth.add_users(job.user, CourseInstructorRole(new_location), job.user)
+        auth.add_users(job.user, CourseStaffRole(new_location), job.user)
+        log.debug('created all course groups at {0}'.format(new_location))
+
+        job.succeed()
+
+    except Exception as exception:   # pylint: disable=W0703
+        log.exception('There was an error importing course {0}'.format(job.course_location))
+        job.fail(unicode(exception))
+
+    finally:
+        shutil.rmtree(job_dir)
+
+
+@task  # pylint: disable=E1102
+def export_course(job_id):
+    """
+    Exports the course of the export job job_id to xml, and writes it out as a tar.gz
+    file under COURSE_EXPORT_ROOT, from which it can be downloaded, so COURSE_EXPORT_ROOT
+    must be shared by Studio and its celery workers. Once the export has succeeded, the
+    files of earlier exports of the course are removed.
+    """
+    job = ImportExportJob.objects.get(id=job_id)
+    course_location = Location(job.course_location)
+    name = course_location.name
+    root_dir = path(mkdtemp())
+
+    try:
+        job.start_phase(ImportExportJob.EXPORTING)
+        try:
+            export_to_xml(modulestore('direct'), contentstore(), course_location, root_dir, name, modulestore())
+        except SerializationError as exc:
+            log.exception('There was an error exporting course {0}'.format(course_location))
+            job.fail(unicode(exc), Location(exc.location).url())
+            return
+
+        job.start_phase(ImportExportJob.COMPRESSING)
+        export_dir = path(settings.COURSE_EXPORT_ROOT)
+        if not export_dir.isdir():
+            export_dir.makedirs_p()
+        job.artifact_path = export_dir / u'{0}-{1}.tar.gz'.format(name, job.id)
+
+        def count_file(tarinfo):
+            """Counts the files written to the tar file"""
+            job.add_items_processed()
+            return tarinfo
+
+        # write the tar file as a stream, rather than seeking back to finish off each file
+        tar_file = tarfile.open(name=job.artifact_path, mode='w|gz')
+        try:
+            tar_file.add(root_dir / name, arcname=name, filter=count_file)
+        finally:
+            tar_file.close()
+        job.bytes_processed = os.path.getsize(job.artifact_path)
+        job.succeed()
+
+        earlier_exports = ImportExportJob.objects.filter(
+            job_type=ImportExportJob.EXPORT, course_location=job.course_location, id__lt=job.id
+        ).exclude(artifact_path='')
+        for earlier_export in earlier_exports:
+            if os.path.exists(earlier_export.artifact_path):
+                os.remove(earlier_export.artifact_path)
+            earlier_export.artifact_path = ''
+            earlier_export.save()
+
+    except Exception as exception:   # pylint: disable=W0703
+        log.exception('There was an error exporting course {0}'.format(course_location))
+        if job.artifact_path and os.path.exists(job.artifact_path):
+            os.remove(job.artifact_path)
+        job.artifact_path = ''
+        job.fail(unicode(exception))
+
+    finally:
+        shutil.rmtree(root_dir)
@@ -1724,6 +1724,7 @@ class ContentStoreTest(ModuleStoreTestCase):
     def test_update_modulestore_signal_did_fire(self):
         module_store = modulestore('direct')
         CourseFactory.create(org='edX', course='999', display_name='Robot Super Course')
+        update_signal = module_store.modulestore_update_signal
 
         try:
             module_store.modulestore_update_signal = Signal(providing_args=['modulestore', 'course_id', 'location'])
@@ -1741,7 +1742,7 @@ class ContentStoreTest(ModuleStoreTestCase):
             module_store.create_and_save_xmodule(new_component_location)
 
         finally:
-            module_store.modulestore_update_signal = None
+            module_store.modulestore_update_signal = update_signal
 
         self.assertTrue(self.got_signal)
 
@@ -13,12 +13,12 @@ from django_future.csrf import ensure_csrf_cookie
 from django.conf import settings
 from django.views.decorators.http import require_http_methods
 from django.core.exceptions import PermissionDenied
+from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
 from django.core.urlresolvers import reverse
 from django.http import HttpResponseBadRequest, HttpResponseNotFound
 from util.json_request import JsonResponse
 from edxmako.shortcuts import render_to_response
 
-from xmodule.error_module import ErrorDescriptor
 from xmodule.modulestore.django import modulestore, loc_mapper
 from xmodule.contentstore.content import StaticContent
 
@@ -26,6 +26,7 @@ from xmodule.modulestore.exceptions import (
     ItemNotFoundError, InvalidLocationError)
 from xmodule.modulestore import Location
 
+from contentstore.models import CourseSummary
 from contentstore.course_info_model import get_course_updates, update_course_updates, delete_course_update
 from contentstore.utils import (
     get_lms_link_for_item, add_extra_panel_tab, remove_extra_panel_tab,
@@ -61,6 +62,9 @@ __all__ = ['course_info_handler', 'course_handler', 'course_info_update_handler'
            'advanced_settings_handler',
            'textbooks_list_handler', 'textbooks_detail_handler']
 
+# number of courses shown on each page of the course listing
+COURSE_LISTING_PAGE_SIZE = 50
+
 
 def _get_locator_and_course(package_id, branch, version_guid, block_id, user, depth=0):
     """
@@ -160,44 +164,42 @@ def _xmodule_json(xmodule, course_id):
 @ensure_csrf_cookie
 def course_listing(request):
     """
-    List all courses available to the logged in user
+    List the courses available to the logged in user, a page at a time.
+
+    The courses come from their `CourseSummary`s, found by the user's role groups,
+    rather than from loading every course in the modulestore and checking access to it.
     """
-    courses = modulestore('direct').get_courses()
+    summaries = CourseSummary.for_user(request.user).extra(
+        select={'display_name_key': 'lower(display_name)'}
+    ).order_by('display_name_key', 'course_id')
 
-    # filter out courses that we don't have access too
-    def course_filter(course):
-        """
-        Get courses to which this user has access
-        """
-        return (has_course_access(request.user, course.location)
-                # pylint: disable=fixme
-                # TODO remove this condition when templates purged from db
-                and course.location.course != 'templates'
-                and course.location.org != ''
-                and course.location.course != ''
-                and course.location.name != '')
-    courses = filter(course_filter, courses)
-
-    def format_course_for_view(course):
+    paginator = Paginator(summaries, COURSE_LISTING_PAGE_SIZE)
+    try:
+        page = paginator.page(request.GET.get('page', 1))
+    except PageNotAnInteger:
+        page = paginator.page(1)
+    except EmptyPage:
+        page = paginator.page(paginator.num_pages)
+
+    def format_course_for_view(summary):
         """
         return tuple of the data which the view requires for each course
         """
-        # published = false b/c studio manipulates draft versions not b/c the course isn't pub'd
-        course_loc = loc_mapper().translate_location(
-            course.location.course_id, course.location, published=False, add_entry_if_missing=True
-        )
+        # the draft version b/c studio manipulates draft versions not b/c the course isn't pub'd
+        course_loc = BlockUsageLocator(package_id=summary.package_id, branch='draft', block_id=summary.block_id)
         return (
-            course.display_name,
+            summary.display_name,
             # note, couldn't get django reverse to work; so, wrote workaround
             course_loc.url_reverse('course/', ''),
-            get_lms_link_for_item(course.location),
-            course.display_org_with_default,
-            course.display_number_with_default,
-            course.location.name
+            get_lms_link_for_item(Location('i4x', summary.org, summary.number, 'course', summary.run)),
+            summary.display_org,
+            summary.display_number,
+            summary.run
         )
 
     return render_to_response('index.html', {
-        'courses': [format_course_for_view(c) for c in courses if not isinstance(c, ErrorDescriptor)],
+        'courses': [format_course_for_view(summary) for summary in page.object_list],
+        'page': page,
         'user': request.user,
         'request_course_creator_url': reverse('contentstore.views.request_course_creator'),
         'course_creator_status': _get_course_creator_status(request.user),
@@ -222,6 +224,7 @@ def course_index(request, package_id, branch, version_guid, block):
         'context_course': course,
         'lms_link': lms_link,
         'sections': sections,
+        'locators': _outline_locators(course, sections),
         'course_graders': json.dumps(
             CourseGradingModel.fetch(locator).graders
         ),
@@ -233,6 +236,22 @@ def course_index(request, package_id, branch, version_guid, block):
     })
 
 
+def _outline_locators(course, sections):
+    """
+    Returns a dict of the draft locators of the course and of its sections, subsections and units
+    keyed by their locations, translated all at once for the course outline
+    """
+    locations = [course.location]
+    for section in sections:
+        locations.append(section.location)
+        for subsection in section.get_children():
+            locations.append(subsection.location)
+            locations.extend(unit.location for unit in subsection.get_children())
+    # published = false b/c studio manipulates draft versions not b/c the course isn't pub'd
+    locators = loc_mapper().translate_locations(course.location.course_id, locations, False, True)
+    return dict(zip(locations, locators))
+
+
 @expect_json
 def create_new_course(request):
     """
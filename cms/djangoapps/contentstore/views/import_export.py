@@ -4,10 +4,10 @@ courses
 """
 import logging
 import os
-import tarfile
-import shutil
 import re
+import shutil
 from tempfile import mkdtemp
+from uuid import uuid4
 from path import path
 
 from django.conf import settings
@@ -15,30 +15,25 @@ from django.http import HttpResponse
 from django.contrib.auth.decorators import login_required
 from django_future.csrf import ensure_csrf_cookie
 from django.core.servers.basehttp import FileWrapper
-from django.core.files.temp import NamedTemporaryFile
-from django.core.exceptions import SuspiciousOperation, PermissionDenied
-from django.http import HttpResponseNotFound
+from django.core.exceptions import PermissionDenied
+from django.http import HttpResponseNotFound, Http404
 from django.views.decorators.http import require_http_methods, require_GET
 from django.utils.translation import ugettext as _
 
 from edxmako.shortcuts import render_to_response
 
-from xmodule.modulestore.xml_importer import import_from_xml
-from xmodule.contentstore.django import contentstore
-from xmodule.modulestore.xml_exporter import export_to_xml
+from xmodule.modulestore import Location
 from xmodule.modulestore.django import modulestore, loc_mapper
-from xmodule.exceptions import SerializationError
 
 from xmodule.modulestore.locator import BlockUsageLocator
 from .access import has_course_access
 
+from contentstore.models import ImportExportJob
+from contentstore.tasks import import_course, export_course
 from util.json_request import JsonResponse
-from extract_tar import safetar_extractall
-from student.roles import CourseInstructorRole, CourseStaffRole
-from student import auth
 
 
-__all__ = ['import_handler', 'import_status_handler', 'export_handler']
+__all__ = ['import_handler', 'import_status_handler', 'export_handler', 'export_status_handler']
 
 
 log = logging.getLogger(__name__)
@@ -47,6 +42,9 @@ log = logging.getLogger(__name__)
 # Regex to capture Content-Range header ranges.
 CONTENT_RE = re.compile(r"(?P<start>\d{1,11})-(?P<stop>\d{1,11})/(?P<end>\d{1,11})")
 
+# The phases of an import, which the import page numbers from 1 (after the upload)
+IMPORT_STAGES = [ImportExportJob.UNPACKING, ImportExportJob.VERIFYING, ImportExportJob.IMPORTING]
+
 
 @login_required
 @ensure_csrf_cookie
@@ -59,7 +57,9 @@ def import_handler(request, tag=None, package_id=None, branch=None, version_guid
         html: return html page for import page
         json: not supported
     POST or PUT
-        json: import a course via the .tar.gz file specified in request.FILES
+        json: import a course via the .tar.gz file specified in request.FILES. Once the last
+            chunk of the file has been uploaded, the import runs in celery, and its status
+            is returned (see import_status_handler).
     """
     location = BlockUsageLocator(package_id=package_id, branch=branch, version_guid=version_guid, block_id=block)
     if not has_course_access(request.user, location):
@@ -146,110 +146,32 @@ def import_handler(request, tag=None, package_id=None, branch=None, version_guid
                 })
 
             else:   # This was the last chunk.
-
-                # Use sessions to keep info about import progress
-                session_status = request.session.setdefault("import_status", {})
-                key = location.package_id + filename
-                session_status[key] = 1
-                request.session.modified = True
-
-                # Do everything from now on in a try-finally block to make sure
-                # everything is properly cleaned up.
+                # Import the course in celery. The upload is moved to a directory of the job's own,
+                # so that concurrent imports of the course don't unpack over or remove each other's
+                # files, and the task removes that directory when it's done.
+                task_id = str(uuid4())
+                job_course_dir = path(mkdtemp(prefix=u'import-{0}-'.format(task_id), dir=data_root)) / course_subdir
+                job_course_dir.mkdir()
+                shutil.move(temp_filepath, job_course_dir / filename)
                 try:
-
-                    tar_file = tarfile.open(temp_filepath)
-                    try:
-                        safetar_extractall(tar_file, (course_dir + '/').encode('utf-8'))
-                    except SuspiciousOperation as exc:
-                        return JsonResponse(
-                            {
-                                'ErrMsg': 'Unsafe tar file. Aborting import.',
-                                'SuspiciousFileOperationMsg': exc.args[0],
-                                'Stage': 1
-                            },
-                            status=400
-                        )
-                    finally:
-                        tar_file.close()
-
-                    session_status[key] = 2
-                    request.session.modified = True
-
-                    # find the 'course.xml' file
-                    def get_all_files(directory):
-                        """
-                        For each file in the directory, yield a 2-tuple of (file-name,
-                        directory-path)
-                        """
-                        for dirpath, _dirnames, filenames in os.walk(directory):
-                            for filename in filenames:
-                                yield (filename, dirpath)
-
-                    def get_dir_for_fname(directory, filename):
-                        """
-                        Returns the dirpath for the first file found in the directory
-                        with the given name.  If there is no file in the directory with
-                        the specified name, return None.
-                        """
-                        for fname, dirpath in get_all_files(directory):
-                            if fname == filename:
-                                return dirpath
-                        return None
-
-                    fname = "course.xml"
-
-                    dirpath = get_dir_for_fname(course_dir, fname)
-
-                    if not dirpath:
-                        return JsonResponse(
-                            {
-
-                                'ErrMsg': _('Could not find the course.xml file in the package.'),
-                                'Stage': 2
-                            },
-                            status=415
-                        )
-
-                    logging.debug('found course.xml at {0}'.format(dirpath))
-
-                    if dirpath != course_dir:
-                        for fname in os.listdir(dirpath):
-                            shutil.move(dirpath / fname, course_dir)
-
-                    _module_store, course_items = import_from_xml(
-                        modulestore('direct'),
-                        settings.GITHUB_REPO_ROOT,
-                        [course_subdir],
-                        load_error_modules=False,
-                        static_content_store=contentstore(),
-                        target_location_namespace=old_location,
-                        draft_store=modulestore()
-                    )
-
-                    new_location = course_items[0].location
-                    logging.debug('new course at {0}'.format(new_location))
-
-                    session_status[key] = 3
-                    request.session.modified = True
-
-                    auth.add_users(request.user, CourseInstructorRole(new_location), request.user)
-                    auth.add_users(request.user, CourseStaffRole(new_location), request.user)
-                    logging.debug('created all course groups at {0}'.format(new_location))
-
-                # Send errors to client with stage at which error occurred.
-                except Exception as exception:   # pylint: disable=W0703
-                    return JsonResponse(
-                        {
-                            'ErrMsg': str(exception),
-                            'Stage': session_status[key]
-                        },
-                        status=400
-                    )
-
-                finally:
-                    shutil.rmtree(course_dir)
-
-                return JsonResponse({'Status': 'OK'})
+                    course_dir.rmdir()
+                except OSError:
+                    # another upload of the course is in progress
+                    pass
+
+                job = ImportExportJob(
+                    job_type=ImportExportJob.IMPORT,
+                    course_location=old_location.url(),
+                    filename=filename,
+                    user=request.user,
+                    task_id=task_id,
+                    artifact_path=job_course_dir / filename,
+                )
+                # commit the job before the task looks for it
+                job.save_now()
+                import_course.apply_async((job.id,), task_id=task_id)
+                job = ImportExportJob.objects.get(id=job.id)
+                return JsonResponse(_import_status(job))
     elif request.method == 'GET':  # assume html
         course_module = modulestore().get_item(old_location)
         return render_to_response('import.html', {
@@ -261,49 +183,147 @@ def import_handler(request, tag=None, package_id=None, branch=None, version_guid
         return HttpResponseNotFound()
 
 
+def _import_status(job):
+    """
+    Returns the status of the import job for the import page (see import_status_handler)
+    """
+    if job is None:
+        return {"ImportStatus": 0}
+
+    if job.phase in IMPORT_STAGES:
+        stage = IMPORT_STAGES.index(job.phase) + 1
+    else:
+        stage = 1
+    if job.state == ImportExportJob.SUCCEEDED:
+        status = len(IMPORT_STAGES) + 1
+    elif job.state == ImportExportJob.FAILED:
+        status = -stage
+    else:
+        status = stage
+    return {
+        "ImportStatus": status,
+        "Message": job.error,
+        "ItemsProcessed": job.items_processed,
+        "BytesProcessed": job.bytes_processed,
+    }
+
+
 @require_GET
 @ensure_csrf_cookie
 @login_required
 def import_status_handler(request, tag=None, package_id=None, branch=None, version_guid=None, block=None, filename=None):
     """
-    Returns an integer corresponding to the status of a file import. These are:
+    Returns an integer corresponding to the status of the latest import of the file. These are:
 
-        0 : No status info found (import done or upload still in progress)
+        0 : No status info found (upload still in progress)
         1 : Extracting file
         2 : Validating.
         3 : Importing to mongo
+        4 : Import succeeded
 
+    If the import failed, the status is minus the stage at which it failed, and the
+    error is returned as the Message. The number of files unpacked (then of modules
+    imported) and the number of bytes unpacked are returned as ItemsProcessed and
+    BytesProcessed.
     """
     location = BlockUsageLocator(package_id=package_id, branch=branch, version_guid=version_guid, block_id=block)
     if not has_course_access(request.user, location):
         raise PermissionDenied()
 
-    try:
-        session_status = request.session["import_status"]
-        status = session_status[location.package_id + filename]
-    except KeyError:
-        status = 0
+    old_location = loc_mapper().translate_locator_to_location(location)
+    job = ImportExportJob.latest(ImportExportJob.IMPORT, old_location.url(), filename=filename)
+    if job is not None and job.is_abandoned:
+        log.warning('Import job %d of %s was abandoned', job.id, job.course_location)
+        job.fail(_('The import was interrupted. Please try again.'))
+    return JsonResponse(_import_status(job))
+
+
+def _latest_export(old_location):
+    """
+    Returns the latest export job of the course at old_location, or None if there isn't one.
+    If the job was abandoned (see ImportExportJob.is_abandoned), it's recorded as having
+    failed, so that the course can be exported again.
+    """
+    job = ImportExportJob.latest(ImportExportJob.EXPORT, old_location.url())
+    if job is not None and job.is_abandoned:
+        log.warning('Export job %d of %s was abandoned', job.id, job.course_location)
+        job.fail(_('The export was interrupted. Please try again.'))
+    return job
+
 
-    return JsonResponse({"ImportStatus": status})
+def _export_status(location, job):
+    """
+    Returns the status of the export job for the export page (see export_status_handler)
+    """
+    if job is None:
+        return {"ExportStatus": None}
+
+    status = {
+        "ExportStatus": job.state,
+        "Phase": job.phase,
+        "Message": job.error,
+        "ItemsProcessed": job.items_processed,
+        "BytesProcessed": job.bytes_processed,
+    }
+    if job.state == ImportExportJob.SUCCEEDED:
+        status["ExportOutput"] = location.url_reverse('export') + '?_accept=application/x-tgz'
+    return status
+
+
+def _export_error_context(course_module, job):
+    """
+    Returns the context which the export page uses to describe why the export job failed
+    """
+    unit = None
+    failed_item = None
+    parent = None
+    if job.error_location:
+        try:
+            failed_item = modulestore().get_instance(course_module.location.course_id, Location(job.error_location))
+            parent_locs = modulestore().get_parent_locations(failed_item.location, course_module.location.course_id)
+
+            if len(parent_locs) > 0:
+                parent = modulestore().get_item(parent_locs[0])
+                if parent.location.category == 'vertical':
+                    unit = parent
+        except:
+            # if we have a nested exception, then we'll show the more generic error message
+            pass
+
+    if parent is not None:
+        unit_locator = loc_mapper().translate_location(course_module.location.course_id, parent.location, False, True)
+        edit_unit_url = unit_locator.url_reverse("unit")
+    else:
+        edit_unit_url = ""
+
+    return {
+        'in_err': True,
+        'raw_err_msg': job.error,
+        'failed_module': failed_item,
+        'unit': unit,
+        'edit_unit_url': edit_unit_url,
+    }
 
 
 @ensure_csrf_cookie
 @login_required
-@require_http_methods(("GET",))
+@require_http_methods(("GET", "POST"))
 def export_handler(request, tag=None, package_id=None, branch=None, version_guid=None, block=None):
     """
     The restful handler for exporting a course.
 
     GET
-        html: return html page for import page
-        application/x-tgz: return tar.gz file containing exported course
+        html: return html page for export page, which describes the failure of the latest
+            export if it failed
+        application/x-tgz: return tar.gz file containing the latest successful export of the
+            course, or 404 if there isn't one
         json: not supported
+    POST
+        json: start exporting the course in celery (unless it's already being exported), and
+            return the status of the export (see export_status_handler)
 
     Note that there are 2 ways to request the tar.gz file. The request header can specify
     application/x-tgz via HTTP_ACCEPT, or a query parameter can be used (?_accept=application/x-tgz).
-
-    If the tar.gz file has been requested but the export operation fails, an HTML page will be returned
-    which describes the error.
     """
     location = BlockUsageLocator(package_id=package_id, branch=branch, version_guid=version_guid, block_id=block)
     if not has_course_access(request.user, location):
@@ -312,79 +332,84 @@ def export_handler(request, tag=None, package_id=None, branch=None, version_guid
     old_location = loc_mapper().translate_locator_to_location(location)
     course_module = modulestore().get_item(old_location)
 
+    if request.method == 'POST':
+        job = _latest_export(old_location)
+        if job is None or job.is_finished:
+            task_id = str(uuid4())
+            job = ImportExportJob(
+                job_type=ImportExportJob.EXPORT,
+                course_location=old_location.url(),
+                filename=old_location.name + '.tar.gz',
+                user=request.user,
+                task_id=task_id,
+            )
+            # commit the job before the task looks for it
+            job.save_now()
+            export_course.apply_async((job.id,), task_id=task_id)
+            job = ImportExportJob.objects.get(id=job.id)
+        return JsonResponse(_export_status(location, job))
+
     # an _accept URL parameter will be preferred over HTTP_ACCEPT in the header.
     requested_format = request.REQUEST.get('_accept', request.META.get('HTTP_ACCEPT', 'text/html'))
 
     export_url = location.url_reverse('export') + '?_accept=application/x-tgz'
     if 'application/x-tgz' in requested_format:
-        name = old_location.name
-        export_file = NamedTemporaryFile(prefix=name + '.', suffix=".tar.gz")
-        root_dir = path(mkdtemp())
-
-        try:
-            export_to_xml(modulestore('direct'), contentstore(), old_location, root_dir, name, modulestore())
-
-        except SerializationError, e:
-            logging.exception('There was an error exporting course {0}. {1}'.format(course_module.location, unicode(e)))
-            unit = None
-            failed_item = None
-            parent = None
-            try:
-                failed_item = modulestore().get_instance(course_module.location.course_id, e.location)
-                parent_locs = modulestore().get_parent_locations(failed_item.location, course_module.location.course_id)
-
-                if len(parent_locs) > 0:
-                    parent = modulestore().get_item(parent_locs[0])
-                    if parent.location.category == 'vertical':
-                        unit = parent
-            except:
-                # if we have a nested exception, then we'll show the more generic error message
-                pass
-
-            unit_locator = loc_mapper().translate_location(old_location.course_id, parent.location, False, True)
-
-            return render_to_response('export.html', {
-                'context_course': course_module,
-                'in_err': True,
-                'raw_err_msg': str(e),
-                'failed_module': failed_item,
-                'unit': unit,
-                'edit_unit_url': unit_locator.url_reverse("unit") if parent else "",
-                'course_home_url': location.url_reverse("course"),
-                'export_url': export_url
-
-            })
-        except Exception, e:
-            logging.exception('There was an error exporting course {0}. {1}'.format(course_module.location, unicode(e)))
-            return render_to_response('export.html', {
-                'context_course': course_module,
-                'in_err': True,
-                'unit': None,
-                'raw_err_msg': str(e),
-                'course_home_url': location.url_reverse("course"),
-                'export_url': export_url
-            })
-
-        logging.debug('tar file being generated at {0}'.format(export_file.name))
-        tar_file = tarfile.open(name=export_file.name, mode='w:gz')
-        tar_file.add(root_dir / name, arcname=name)
-        tar_file.close()
-
-        # remove temp dir
-        shutil.rmtree(root_dir / name)
-
-        wrapper = FileWrapper(export_file)
+        job = ImportExportJob.latest(
+            ImportExportJob.EXPORT, old_location.url(), state=ImportExportJob.SUCCEEDED
+        )
+        if job is None or not job.artifact_path:
+            raise Http404
+        if not os.path.exists(job.artifact_path):
+            log.error('The file of export job %d is missing: COURSE_EXPORT_ROOT (%s) must be shared '
+                      'by Studio and its celery workers', job.id, settings.COURSE_EXPORT_ROOT)
+            raise Http404
+
+        # stream the file from disk
+        wrapper = FileWrapper(open(job.artifact_path, 'rb'))
         response = HttpResponse(wrapper, content_type='application/x-tgz')
-        response['Content-Disposition'] = 'attachment; filename=%s' % os.path.basename(export_file.name)
-        response['Content-Length'] = os.path.getsize(export_file.name)
+        response['Content-Disposition'] = 'attachment; filename=%s' % job.filename
+        response['Content-Length'] = os.path.getsize(job.artifact_path)
         return response
 
     elif 'text/html' in requested_format:
-        return render_to_response('export.html', {
+        job = _latest_export(old_location)
+        context = {
             'context_course': course_module,
-            'export_url': export_url
-        })
+            'export_url': export_url,
+            'export_handler_url': location.url_reverse('export'),
+            'export_status_url': location.url_reverse('export_status'),
+            'course_home_url': location.url_reverse("course"),
+            'export_in_progress': job is not None and not job.is_finished,
+            'export_available': job is not None and job.state == ImportExportJob.SUCCEEDED,
+        }
+        if job is not None and job.state == ImportExportJob.FAILED:
+            context.update(_export_error_context(course_module, job))
+        return render_to_response('export.html', context)
 
     else:
         # Only HTML or x-tgz request formats are supported (no JSON).
         return HttpResponse(status=406)
+
+
+@require_GET
+@ensure_csrf_cookie
+@login_required
+def export_status_handler(request, tag=None, package_id=None, branch=None, version_guid=None, block=None):
+    """
+    Returns the status of the latest export of the course:
+
+        ExportStatus: None if the course hasn't been exported, otherwise the state of the
+            export: queued, in_progress, succeeded or failed
+        Phase: exporting or compressing
+        Message: the error, if the export failed
+        ItemsProcessed: the number of files written to the tar.gz file
+        BytesProcessed: the size of the tar.gz file
+        ExportOutput: the url from which to download the tar.gz file, if the export succeeded
+    """
+    location = BlockUsageLocator(package_id=package_id, branch=branch, version_guid=version_guid, block_id=block)
+    if not has_course_access(request.user, location):
+        raise PermissionDenied()
+
+    old_location = loc_mapper().translate_locator_to_location(location)
+    job = _latest_export(old_location)
+    return JsonResponse(_export_status(location, job))
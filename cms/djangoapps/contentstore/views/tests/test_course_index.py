@@ -3,9 +3,12 @@ Unit tests for getting the list of courses and the course outline.
 """
 import json
 import lxml
+from mock import patch
 
+from contentstore.models import CourseSummary
 from contentstore.tests.utils import CourseTestCase
-from xmodule.modulestore.django import loc_mapper
+from student.roles import CourseInstructorRole
+from xmodule.modulestore.django import loc_mapper, modulestore
 from xmodule.modulestore.tests.factories import CourseFactory, ItemFactory
 from xmodule.modulestore import parsers
 
@@ -115,6 +118,69 @@ class TestCourseIndex(CourseTestCase):
         # Finally, validate the entire response for consistency
         self.assert_correct_json_response(json_response)
 
+    def test_course_summaries(self):
+        """
+        Test that course summaries are kept up to date as courses are written and deleted
+        """
+        summary = CourseSummary.objects.get(course_id=self.odd_course.location.course_id)
+        self.assertEqual(summary.display_name, 'dotted.course.name-2')
+        self.assertEqual(summary.number_key, 'test-2.3_course')
+
+        self.odd_course.display_name = 'Renamed'
+        modulestore('direct').update_item(self.odd_course, self.user.id)
+        summary = CourseSummary.objects.get(course_id=self.odd_course.location.course_id)
+        self.assertEqual(summary.display_name, 'Renamed')
+
+        modulestore('direct').delete_item(self.odd_course.location)
+        self.assertFalse(CourseSummary.objects.filter(course_id=self.odd_course.location.course_id).exists())
+
+    def test_index_courses(self):
+        """
+        Test that the summaries of existing courses are built, and those of deleted courses removed
+        """
+        CourseSummary.objects.all().delete()
+        CourseSummary.objects.create(course_id='deleted/course/run', org='deleted', number='course', run='run')
+        self.assertEqual(CourseSummary.index_courses(modulestore('direct')), (2, 1))
+        self.assertEqual(
+            set(CourseSummary.objects.values_list('course_id', flat=True)),
+            set([self.course.location.course_id, self.odd_course.location.course_id])
+        )
+
+    def test_listing_filtered_by_role_groups(self):
+        """
+        Test that users only see the courses they have a role in, without loading courses from the modulestore
+        """
+        course_staff_client, course_staff = self.createNonStaffAuthedUserClient()
+        self.assertFalse(CourseSummary.for_user(course_staff).exists())
+
+        CourseInstructorRole(self.odd_course.location).add_users(course_staff)
+        self.assertEqual(
+            [summary.course_id for summary in CourseSummary.for_user(course_staff)],
+            [self.odd_course.location.course_id]
+        )
+        with patch('xmodule.modulestore.mongo.base.MongoModuleStore.get_courses') as mock_get_courses:
+            response = course_staff_client.get('/course', {}, HTTP_ACCEPT='text/html')
+        self.assertFalse(mock_get_courses.called)
+        course_link_eles = lxml.html.fromstring(response.content).find_class('course-link')
+        self.assertEqual(len(course_link_eles), 1)
+
+    def test_listing_pages(self):
+        """
+        Test that the course listing is split into pages
+        """
+        with patch('contentstore.views.course.COURSE_LISTING_PAGE_SIZE', 1):
+            first_page = lxml.html.fromstring(self.client.get('/course', {}, HTTP_ACCEPT='text/html').content)
+            last_page = lxml.html.fromstring(
+                self.client.get('/course', {'page': '99'}, HTTP_ACCEPT='text/html').content
+            )
+        self.assertEqual(len(first_page.find_class('course-link')), 1)
+        self.assertEqual(len(first_page.find_class('next-page-link')), 1)
+        self.assertEqual(len(last_page.find_class('course-link')), 1)
+        self.assertEqual(len(last_page.find_class('next-page-link')), 0)
+        self.assertNotEqual(
+            first_page.find_class('course-link')[0].get('href'), last_page.find_class('course-link')[0].get('href')
+        )
+
     def assert_correct_json_response(self, json_response):
         """
         Asserts that the JSON response is syntactically consistent
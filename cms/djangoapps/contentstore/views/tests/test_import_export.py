@@ -9,12 +9,17 @@ import copy
 from path import path
 import json
 import logging
+from datetime import timedelta
 from uuid import uuid4
+from mock import patch
 from pymongo import MongoClient
 
+from contentstore.models import ImportExportJob
+from contentstore.tasks import import_course
 from contentstore.tests.utils import CourseTestCase
 from django.test.utils import override_settings
 from django.conf import settings
+from django.utils import timezone
 from xmodule.modulestore.django import loc_mapper
 
 from xmodule.contentstore.django import _CONTENTSTORE
@@ -72,6 +77,18 @@ class ImportTestCase(CourseTestCase):
         MongoClient().drop_database(TEST_DATA_CONTENTSTORE['DOC_STORE_CONFIG']['db'])
         _CONTENTSTORE.clear()
 
+    def _import_status(self, tarpath):
+        """
+        Returns the status of the import of the tar file at tarpath
+        """
+        resp_status = self.client.get(
+            self.new_location.url_reverse(
+                'import_status',
+                os.path.split(tarpath)[1]
+            )
+        )
+        return json.loads(resp_status.content)
+
     def test_no_coursexml(self):
         """
         Check that the response for a tar.gz import without a course.xml is
@@ -84,28 +101,118 @@ class ImportTestCase(CourseTestCase):
                     "name": self.bad_tar,
                     "course-data": [btar]
                 })
-        self.assertEquals(resp.status_code, 415)
-        # Check that `import_status` returns the appropriate stage (i.e., the
+        # the import runs in celery, so the upload itself succeeds
+        self.assertEquals(resp.status_code, 200)
+        # Check that `import_status` returns the appropriate stage (i.e., minus the
         # stage at which import failed).
-        resp_status = self.client.get(
-            self.new_location.url_reverse(
-                'import_status',
-                os.path.split(self.bad_tar)[1]
-            )
-        )
-
-        self.assertEquals(json.loads(resp_status.content)["ImportStatus"], 2)
+        status = self._import_status(self.bad_tar)
+        self.assertEquals(status["ImportStatus"], -2)
+        self.assertEquals(status["Message"], 'Could not find the course.xml file in the package.')
 
     def test_with_coursexml(self):
         """
         Check that the response for a tar.gz import with a course.xml is
         correct.
         """
+        self.assertEquals(self._import_status(self.good_tar)["ImportStatus"], 0)
         with open(self.good_tar) as gtar:
             args = {"name": self.good_tar, "course-data": [gtar]}
             resp = self.client.post(self.url, args)
 
         self.assertEquals(resp.status_code, 200)
+        self.assertEquals(json.loads(resp.content)["ImportStatus"], 4)
+        status = self._import_status(self.good_tar)
+        self.assertEquals(status["ImportStatus"], 4)
+        self.assertGreater(status["ItemsProcessed"], 0)
+        self.assertGreater(status["BytesProcessed"], 0)
+
+    def test_import_progress_recorded(self):
+        """
+        Check that the number of modules imported is recorded as the import goes.
+        """
+        recorded = []
+        original_save = ImportExportJob.save
+
+        def record_progress(job, *args, **kwargs):
+            """Records the progress of the import phase whenever the job is written"""
+            if job.phase == ImportExportJob.IMPORTING:
+                recorded.append(job.items_processed)
+            return original_save(job, *args, **kwargs)
+
+        with patch.object(ImportExportJob, 'PROGRESS_INTERVAL', 1):
+            with patch.object(ImportExportJob, 'save', record_progress):
+                with open(self.good_tar) as gtar:
+                    self.client.post(self.url, {"name": self.good_tar, "course-data": [gtar]})
+        # once at the start of the phase, then after each module, then at the end
+        self.assertEquals(recorded[0], 0)
+        self.assertEquals(recorded[1], 1)
+        self.assertEquals(recorded[-1], self._import_status(self.good_tar)["ItemsProcessed"])
+
+    def test_import_in_job_dir(self):
+        """
+        Check that each import unpacks in a directory of its own, which is removed afterwards,
+        so that concurrent imports of a course don't clobber each other.
+        """
+        with open(self.good_tar) as gtar:
+            self.client.post(self.url, {"name": self.good_tar, "course-data": [gtar]})
+
+        job = ImportExportJob.objects.get(job_type=ImportExportJob.IMPORT)
+        self.assertEquals(job.state, ImportExportJob.SUCCEEDED)
+        job_dir = path(job.artifact_path).dirname().dirname()
+        self.assertTrue(job_dir.basename().startswith('import-{0}-'.format(job.task_id)))
+        self.assertFalse(job_dir.exists())
+        location = self.course.location
+        course_subdir = "{0}-{1}-{2}".format(location.org, location.course, location.name)
+        self.assertFalse((path(settings.GITHUB_REPO_ROOT) / course_subdir).exists())
+
+    def test_import_upload_missing(self):
+        """
+        Check that an import fails clearly when its upload isn't on the disk of the worker running it.
+        """
+        job = ImportExportJob.objects.create(
+            job_type=ImportExportJob.IMPORT,
+            course_location=self.course.location.url(),
+            filename='good.tar.gz',
+            user=self.user,
+            task_id=str(uuid4()),
+            artifact_path=self.content_dir / 'missing' / 'course' / 'good.tar.gz',
+        )
+        import_course(job.id)
+        job = ImportExportJob.objects.get(id=job.id)
+        self.assertEquals(job.state, ImportExportJob.FAILED)
+        self.assertEquals(job.error, 'The uploaded file could not be found on the server running the import.')
+
+    def test_import_error_not_ascii(self):
+        """
+        Check that an import error whose message isn't ASCII is recorded on the job.
+        """
+        with patch('contentstore.tasks.import_from_xml', side_effect=Exception(u'Caf\xe9 not found')):
+            with open(self.good_tar) as gtar:
+                self.client.post(self.url, {"name": self.good_tar, "course-data": [gtar]})
+        status = self._import_status(self.good_tar)
+        self.assertEquals(status["ImportStatus"], -3)
+        self.assertEquals(status["Message"], u'Caf\xe9 not found')
+
+    def test_abandoned_import_failed(self):
+        """
+        Check that an import whose task stopped recording progress is reported as failed.
+        """
+        job = ImportExportJob.objects.create(
+            job_type=ImportExportJob.IMPORT,
+            course_location=self.course.location.url(),
+            filename='good.tar.gz',
+            user=self.user,
+            task_id=str(uuid4()),
+            state=ImportExportJob.IN_PROGRESS,
+            phase=ImportExportJob.IMPORTING,
+        )
+        ImportExportJob.objects.filter(id=job.id).update(
+            updated=timezone.now() - ImportExportJob.TIMEOUT - timedelta(minutes=1)
+        )
+        status = self._import_status(self.good_tar)
+        self.assertEquals(status["ImportStatus"], -3)
+        self.assertEquals(status["Message"], 'The import was interrupted. Please try again.')
+        self.assertEquals(ImportExportJob.objects.get(id=job.id).state, ImportExportJob.FAILED)
 
     ## Unsafe tar methods #####################################################
     # Each of these methods creates a tarfile with a single type of unsafe
@@ -181,24 +288,19 @@ class ImportTestCase(CourseTestCase):
             with open(tarpath) as tar:
                 args = {"name": tarpath, "course-data": [tar]}
                 resp = self.client.post(self.url, args)
-            self.assertEquals(resp.status_code, 400)
-            self.assertTrue("SuspiciousFileOperation" in resp.content)
+            self.assertEquals(resp.status_code, 200)
+            # the import fails while unpacking the file
+            status = self._import_status(tarpath)
+            self.assertEquals(status["ImportStatus"], -1)
+            self.assertTrue(status["Message"].startswith("Unsafe tar file"))
 
         try_tar(self._fifo_tar())
         try_tar(self._symlink_tar())
         try_tar(self._outside_tar())
         try_tar(self._outside_tar2())
-        # Check that `import_status` returns the appropriate stage (i.e.,
-        # either 3, indicating all previous steps are completed, or 0,
-        # indicating no upload in progress)
-        resp_status = self.client.get(
-            self.new_location.url_reverse(
-                'import_status',
-                os.path.split(self.good_tar)[1]
-            )
-        )
-        import_status = json.loads(resp_status.content)["ImportStatus"]
-        self.assertIn(import_status, (0, 3))
+        # Check that `import_status` returns 0, indicating no upload in progress,
+        # for a file which hasn't been uploaded
+        self.assertEquals(self._import_status(self.good_tar)["ImportStatus"], 0)
 
 
 @override_settings(CONTENTSTORE=TEST_DATA_CONTENTSTORE)
@@ -213,6 +315,7 @@ class ExportTestCase(CourseTestCase):
         super(ExportTestCase, self).setUp()
         location = loc_mapper().translate_location(self.course.location.course_id, self.course.location, False, True)
         self.url = location.url_reverse('export/', '')
+        self.status_url = location.url_reverse('export_status/', '')
 
     def test_export_html(self):
         """
@@ -229,10 +332,19 @@ class ExportTestCase(CourseTestCase):
         resp = self.client.get(self.url, HTTP_ACCEPT='application/json')
         self.assertEquals(resp.status_code, 406)
 
+    def _export(self):
+        """
+        Start an export of the course, which runs straight away in the tests, and return its status
+        """
+        resp = self.client.post(self.url, HTTP_ACCEPT='application/json')
+        self.assertEquals(resp.status_code, 200)
+        return json.loads(resp.content)
+
     def test_export_targz(self):
         """
         Get tar.gz file, using HTTP_ACCEPT.
         """
+        self._export()
         resp = self.client.get(self.url, HTTP_ACCEPT='application/x-tgz')
         self._verify_export_succeeded(resp)
 
@@ -240,9 +352,57 @@ class ExportTestCase(CourseTestCase):
         """
         Get tar.gz file, using URL parameter.
         """
+        self._export()
         resp = self.client.get(self.url + '?_accept=application/x-tgz')
         self._verify_export_succeeded(resp)
 
+    def test_export_targz_not_exported(self):
+        """
+        There's no tar.gz file until the course has been exported.
+        """
+        resp = self.client.get(self.url, HTTP_ACCEPT='application/x-tgz')
+        self.assertEquals(resp.status_code, 404)
+
+    def test_export_status(self):
+        """
+        Get the status of the export.
+        """
+        self.assertIsNone(json.loads(self.client.get(self.status_url).content)["ExportStatus"])
+        status = self._export()
+        self.assertEquals(status["ExportStatus"], "succeeded")
+        self.assertEquals(json.loads(self.client.get(self.status_url).content), status)
+        self.assertGreater(status["ItemsProcessed"], 0)
+        self.assertGreater(status["BytesProcessed"], 0)
+        self._verify_export_succeeded(self.client.get(status["ExportOutput"]))
+
+    def test_export_replaces_earlier_exports(self):
+        """
+        Only the tar.gz file of the latest export is kept.
+        """
+        self._export()
+        first_export = ImportExportJob.objects.get(job_type=ImportExportJob.EXPORT)
+        self._export()
+        self.assertFalse(os.path.exists(first_export.artifact_path))
+        self._verify_export_succeeded(self.client.get(self.url, HTTP_ACCEPT='application/x-tgz'))
+
+    def test_abandoned_export_restarted(self):
+        """
+        An export whose task stopped recording progress doesn't stop the course being exported again.
+        """
+        job = ImportExportJob.objects.create(
+            job_type=ImportExportJob.EXPORT,
+            course_location=self.course.location.url(),
+            filename='abandoned.tar.gz',
+            user=self.user,
+            task_id=str(uuid4()),
+            state=ImportExportJob.IN_PROGRESS,
+        )
+        ImportExportJob.objects.filter(id=job.id).update(
+            updated=timezone.now() - ImportExportJob.TIMEOUT - timedelta(minutes=1)
+        )
+        self.assertEquals(self._export()["ExportStatus"], "succeeded")
+        self.assertEquals(ImportExportJob.objects.get(id=job.id).state, ImportExportJob.FAILED)
+
     def _verify_export_succeeded(self, resp):
         """ Export success helper method. """
         self.assertEquals(resp.status_code, 200)
@@ -268,8 +428,13 @@ class ExportTestCase(CourseTestCase):
 
     def _verify_export_failure(self, expectedText):
         """ Export failure helper method. """
+        status = self._export()
+        self.assertEquals(status["ExportStatus"], "failed")
+        self.assertIn('Unable to create xml for module', status["Message"])
         resp = self.client.get(self.url, HTTP_ACCEPT='application/x-tgz')
+        self.assertEquals(resp.status_code, 404)
+        # the export page describes the failure
+        resp = self.client.get_html(self.url)
         self.assertEquals(resp.status_code, 200)
-        self.assertIsNone(resp.get('Content-Disposition'))
         self.assertContains(resp, 'Unable to create xml for module')
         self.assertContains(resp, expectedText)
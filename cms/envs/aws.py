@@ -99,6 +99,7 @@ if STATIC_URL_BASE:
 # GITHUB_REPO_ROOT is the base directory
 # for course data
 GITHUB_REPO_ROOT = ENV_TOKENS.get('GITHUB_REPO_ROOT', GITHUB_REPO_ROOT)
+COURSE_EXPORT_ROOT = ENV_TOKENS.get('COURSE_EXPORT_ROOT', COURSE_EXPORT_ROOT)
 
 # STATIC_ROOT specifies the directory where static files are
 # collected
@@ -84,7 +84,12 @@ COMMON_ROOT = REPO_ROOT / "common"
 LMS_ROOT = REPO_ROOT / "lms"
 ENV_ROOT = REPO_ROOT.dirname()  # virtualenv dir /edx-platform is in
 
+# Course imports are uploaded to a directory under GITHUB_REPO_ROOT, from which they're
+# imported in celery, so it must be on a disk shared by Studio and its celery workers
 GITHUB_REPO_ROOT = ENV_ROOT / "data"
+# Directory in which celery writes the tar.gz files of course exports, for Studio to serve
+# them for download, so it must be shared too
+COURSE_EXPORT_ROOT = ENV_ROOT / "course_exports"
 
 sys.path.append(REPO_ROOT)
 sys.path.append(PROJECT_ROOT / 'djangoapps')
@@ -41,7 +41,8 @@ define(
 
         /**
          * Check for import status updates every `timeout` milliseconds, and update
-         * the page accordingly.
+         * the page accordingly, until the import succeeds (stage 4) or fails (a
+         * negative stage, the stage at which it failed).
          * @param {string} url Url to call for status updates.
          * @param {int} timeout Number of milliseconds to wait in between ajax calls
          *     for new updates.
@@ -51,13 +52,19 @@ define(
             var currentStage = stage || 0;
             if (CourseImport.stopGetStatus) { return ;}
             updateStage(currentStage);
-            if (currentStage == 3 ) { return ;}
             var time = timeout || 1000;
             $.getJSON(url,
                 function (data) {
-                    setTimeout(function () {
-                        getStatus(url, time, data.ImportStatus);
-                    }, time);
+                    if (data.ImportStatus == 4) {
+                        CourseImport.displayFinishedImport();
+                    } else if (data.ImportStatus < 0) {
+                        CourseImport.stopGetStatus = true;
+                        CourseImport.stageError(-data.ImportStatus, data.Message);
+                    } else {
+                        setTimeout(function () {
+                            getStatus(url, time, data.ImportStatus);
+                        }, time);
+                    }
                 }
             );
         };
@@ -1,5 +1,10 @@
+import re
+from calendar import timegm
+
+from django.conf import settings
 from django.http import (HttpResponse, HttpResponseNotModified,
     HttpResponseForbidden)
+from django.utils.http import http_date, parse_http_date_safe
 from student.models import CourseEnrollment
 
 from xmodule.contentstore.django import contentstore
@@ -8,6 +13,42 @@ from xmodule.modulestore import InvalidLocationError
 from cache_toolbox.core import get_cached_content, set_cached_content
 from xmodule.exceptions import NotFoundError
 
+# a single byte range, e.g. "bytes=0-499", "bytes=500-" or "bytes=-500"
+SINGLE_BYTE_RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+# how long browsers may use unlocked assets without revalidating them
+DEFAULT_STATIC_CONTENT_MAX_AGE = 60 * 60
+
+
+def parse_byte_range(range_header, length):
+    """
+    Return the (first_byte, last_byte) requested by the HTTP Range header
+    `range_header` for content of `length` bytes, None if the header should
+    be ignored (it's malformed or asks for several ranges), or raise
+    ValueError if the range can't be satisfied.
+    """
+    match = SINGLE_BYTE_RANGE_RE.match(range_header.strip())
+    if match is None:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+
+    if not first:
+        # a suffix range: the last `last` bytes
+        suffix_length = int(last)
+        if suffix_length == 0:
+            raise ValueError(range_header)
+        return max(length - suffix_length, 0), length - 1
+
+    first_byte = int(first)
+    last_byte = int(last) if last else length - 1
+    if last_byte < first_byte:
+        return None
+    if first_byte >= length:
+        raise ValueError(range_header)
+    return first_byte, min(last_byte, length - 1)
+
 
 class StaticContentServer(object):
     def process_request(self, request):
@@ -44,7 +85,8 @@ class StaticContentServer(object):
                 pass
 
             # Check that user has access to content
-            if getattr(content, "locked", False):
+            locked = getattr(content, "locked", False)
+            if locked:
                 if not hasattr(request, "user") or not request.user.is_authenticated():
                     return HttpResponseForbidden('Unauthorized')
                 course_partial_id = "/".join([loc.org, loc.course])
@@ -52,18 +94,89 @@ class StaticContentServer(object):
                         request.user, course_partial_id):
                     return HttpResponseForbidden('Unauthorized')
 
-            # convert over the DB persistent last modified timestamp to a HTTP compatible
-            # timestamp, so we can simply compare the strings
-            last_modified_at_str = content.last_modified_at.strftime("%a, %d-%b-%Y %H:%M:%S GMT")
+            # convert over the DB persistent last modified timestamp to a HTTP compatible timestamp
+            last_modified_at = timegm(content.last_modified_at.utctimetuple())
+            last_modified_at_str = http_date(last_modified_at)
+            # getattr b/c caching may mean some pickled instances don't have attr
+            content_digest = getattr(content, 'content_digest', None)
+            etag = '"{0}"'.format(content_digest) if content_digest else None
 
-            # see if the client has cached this content, if so then compare the
-            # timestamps, if they are the same then just return a 304 (Not Modified)
-            if 'HTTP_IF_MODIFIED_SINCE' in request.META:
-                if_modified_since = request.META['HTTP_IF_MODIFIED_SINCE']
-                if if_modified_since == last_modified_at_str:
-                    return HttpResponseNotModified()
+            # see if the client has cached this content, if so then just return a 304 (Not Modified)
+            if self._is_not_modified(request, etag, last_modified_at):
+                response = HttpResponseNotModified()
+                self._set_caching_headers(response, etag, last_modified_at_str, locked)
+                return response
 
-            response = HttpResponse(content.stream_data(), content_type=content.content_type)
-            response['Last-Modified'] = last_modified_at_str
+            length = content.length
+            byte_range = None
+            if 'HTTP_RANGE' in request.META and length is not None and \
+                    self._if_range_matches(request, etag, last_modified_at):
+                try:
+                    byte_range = parse_byte_range(request.META['HTTP_RANGE'], length)
+                except ValueError:
+                    response = HttpResponse(status=416)
+                    response['Content-Range'] = 'bytes */{0}'.format(length)
+                    return response
+
+            if byte_range is not None:
+                first_byte, last_byte = byte_range
+                response = HttpResponse(
+                    content.stream_data_in_range(first_byte, last_byte), content_type=content.content_type
+                )
+                response.status_code = 206
+                response['Content-Range'] = 'bytes {0}-{1}/{2}'.format(first_byte, last_byte, length)
+                response['Content-Length'] = str(last_byte - first_byte + 1)
+            else:
+                response = HttpResponse(content.stream_data(), content_type=content.content_type)
+                if length is not None:
+                    response['Content-Length'] = str(length)
 
+            response['Accept-Ranges'] = 'bytes'
+            self._set_caching_headers(response, etag, last_modified_at_str, locked)
             return response
+
+    @staticmethod
+    def _is_not_modified(request, etag, last_modified_at):
+        """
+        Return True if the client's cached copy of the content is current
+        """
+        if 'HTTP_IF_NONE_MATCH' in request.META:
+            # If-None-Match takes precedence over If-Modified-Since
+            if etag is None:
+                return False
+            if_none_match = request.META['HTTP_IF_NONE_MATCH']
+            return if_none_match.strip() == '*' or etag in [tag.strip() for tag in if_none_match.split(',')]
+
+        if 'HTTP_IF_MODIFIED_SINCE' in request.META:
+            if_modified_since = parse_http_date_safe(request.META['HTTP_IF_MODIFIED_SINCE'])
+            return if_modified_since is not None and if_modified_since >= last_modified_at
+
+        return False
+
+    @staticmethod
+    def _if_range_matches(request, etag, last_modified_at):
+        """
+        Return True unless the request has an If-Range header for a different
+        version of the content, in which case the range must be ignored
+        """
+        if 'HTTP_IF_RANGE' not in request.META:
+            return True
+        if_range = request.META['HTTP_IF_RANGE'].strip()
+        if if_range.startswith('"'):
+            return etag is not None and if_range == etag
+        return parse_http_date_safe(if_range) == last_modified_at
+
+    @staticmethod
+    def _set_caching_headers(response, etag, last_modified_at_str, locked):
+        """
+        Set the headers that let clients cache and revalidate the content
+        """
+        response['Last-Modified'] = last_modified_at_str
+        if etag is not None:
+            response['ETag'] = etag
+        if locked:
+            # only users with access may see the content, so shared caches mustn't store it
+            response['Cache-Control'] = 'private, no-cache'
+        else:
+            max_age = getattr(settings, 'STATIC_CONTENT_MAX_AGE', DEFAULT_STATIC_CONTENT_MAX_AGE)
+            response['Cache-Control'] = 'public, max-age={0}'.format(max_age)
@@ -134,3 +134,67 @@ class ContentStoreToyCourseTest(ModuleStoreTestCase):
         resp = self.client.get(self.url_locked)
         self.assertEqual(resp.status_code, 200) #pylint: disable=E1103
 
+    def test_range_request(self):
+        """
+        Test that a byte range of an asset is served as partial content.
+        """
+        length = self.contentstore.find(self.loc_unlocked).length
+        data = self.client.get(self.url_unlocked).content
+
+        resp = self.client.get(self.url_unlocked, HTTP_RANGE='bytes=10-19')
+        self.assertEqual(resp.status_code, 206)  # pylint: disable=E1103
+        self.assertEqual(resp.content, data[10:20])  # pylint: disable=E1103
+        self.assertEqual(resp['Content-Range'], 'bytes 10-19/{0}'.format(length))
+        self.assertEqual(resp['Content-Length'], '10')
+
+        resp = self.client.get(self.url_unlocked, HTTP_RANGE='bytes=-5')
+        self.assertEqual(resp.status_code, 206)  # pylint: disable=E1103
+        self.assertEqual(resp.content, data[-5:])  # pylint: disable=E1103
+
+    def test_unsatisfiable_range_request(self):
+        """
+        Test that a byte range past the end of an asset is rejected.
+        """
+        length = self.contentstore.find(self.loc_unlocked).length
+        resp = self.client.get(self.url_unlocked, HTTP_RANGE='bytes={0}-'.format(length))
+        self.assertEqual(resp.status_code, 416)  # pylint: disable=E1103
+        self.assertEqual(resp['Content-Range'], 'bytes */{0}'.format(length))
+
+    def test_if_range_mismatch(self):
+        """
+        Test that the full asset is served if it changed since the client got the range's ETag.
+        """
+        resp = self.client.get(self.url_unlocked, HTTP_RANGE='bytes=10-19', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(resp.status_code, 200)  # pylint: disable=E1103
+
+    def test_etag(self):
+        """
+        Test that assets have an ETag, and are not resent to clients with a current copy.
+        """
+        resp = self.client.get(self.url_unlocked)
+        etag = resp['ETag']
+        self.assertEqual(etag, '"{0}"'.format(self.contentstore.find(self.loc_unlocked).content_digest))
+
+        resp = self.client.get(self.url_unlocked, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 304)  # pylint: disable=E1103
+        resp = self.client.get(self.url_unlocked, HTTP_IF_NONE_MATCH='"stale"')
+        self.assertEqual(resp.status_code, 200)  # pylint: disable=E1103
+
+    def test_if_modified_since(self):
+        """
+        Test that assets are not resent to clients with a copy from after the last modification.
+        """
+        resp = self.client.get(self.url_unlocked)
+        resp = self.client.get(self.url_unlocked, HTTP_IF_MODIFIED_SINCE=resp['Last-Modified'])
+        self.assertEqual(resp.status_code, 304)  # pylint: disable=E1103
+
+    def test_cache_control(self):
+        """
+        Test that locked assets may only be cached privately.
+        """
+        resp = self.client.get(self.url_unlocked)
+        self.assertTrue(resp['Cache-Control'].startswith('public'))
+
+        self.client.login(username=self.staff_usr, password=self.staff_pwd)
+        resp = self.client.get(self.url_locked)
+        self.assertEqual(resp['Cache-Control'], 'private, no-cache')
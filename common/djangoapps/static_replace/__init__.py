@@ -1,5 +1,7 @@
 import logging
 import re
+import threading
+from collections import OrderedDict
 
 from staticfiles.storage import staticfiles_storage
 from staticfiles import finders
@@ -11,6 +13,9 @@ from xmodule.contentstore.content import StaticContent
 
 log = logging.getLogger(__name__)
 
+MAX_COMPILED_PATTERNS = 1000
+_COMPILED_PATTERNS = {}
+
 
 def _url_replace_regex(prefix):
     """
@@ -28,6 +33,88 @@ def _url_replace_regex(prefix):
         """.format(prefix=prefix)
 
 
+def _url_replace_pattern(regex):
+    """
+    Return the compiled pattern for the url replacement `regex`. Patterns are
+    kept for the life of the process, as there are only a few per course.
+    """
+    pattern = _COMPILED_PATTERNS.get(regex)
+    if pattern is None:
+        if len(_COMPILED_PATTERNS) >= MAX_COMPILED_PATTERNS:
+            _COMPILED_PATTERNS.clear()
+        pattern = _COMPILED_PATTERNS[regex] = re.compile(regex)
+    return pattern
+
+
+class _LookupCache(object):
+    """
+    A bounded, thread-safe LRU of lookup results, which is emptied whenever
+    the object the lookups are made against (e.g. the staticfiles storage
+    or the modulestore) changes.
+    """
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._source = None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, source, key, compute):
+        """
+        Return the result of `compute()` for `key` looked up against `source`
+        """
+        with self._lock:
+            if source is not self._source:
+                self._source = source
+                self._entries.clear()
+            elif key in self._entries:
+                value = self._entries.pop(key)
+                self._entries[key] = value
+                return value
+
+        value = compute()
+        with self._lock:
+            if source is self._source:
+                self._entries[key] = value
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return value
+
+
+_STATICFILES_LOOKUPS = _LookupCache(10000)
+_MODULESTORE_TYPES = _LookupCache(1000)
+
+
+def _staticfiles_exists(path):
+    """
+    Return staticfiles_storage.exists(path), remembering the answer (except in
+    debug mode, where the static files may change under us)
+    """
+    if settings.DEBUG:
+        return staticfiles_storage.exists(path)
+    return _STATICFILES_LOOKUPS.get(
+        staticfiles_storage, ('exists', path), lambda: staticfiles_storage.exists(path)
+    )
+
+
+def _staticfiles_url(path):
+    """
+    Return staticfiles_storage.url(path), remembering the answer (except in debug mode)
+    """
+    if settings.DEBUG:
+        return staticfiles_storage.url(path)
+    return _STATICFILES_LOOKUPS.get(
+        staticfiles_storage, ('url', path), lambda: staticfiles_storage.url(path)
+    )
+
+
+def _modulestore_type(course_id):
+    """
+    Return the type of the modulestore which holds course_id, remembering the answer
+    """
+    store = modulestore()
+    return _MODULESTORE_TYPES.get(store, course_id, lambda: store.get_modulestore_type(course_id))
+
+
 def try_staticfiles_lookup(path):
     """
     Try to lookup a path in staticfiles_storage.  If it fails, return
@@ -69,7 +156,7 @@ def replace_jump_to_id_urls(text, course_id, jump_to_id_base_url):
         rest = match.group('rest')
         return "".join([quote, jump_to_id_base_url + rest, quote])
 
-    return re.sub(_url_replace_regex('/jump_to_id/'), replace_jump_to_id_url, text)
+    return _url_replace_pattern(_url_replace_regex('/jump_to_id/')).sub(replace_jump_to_id_url, text)
 
 
 def replace_course_urls(text, course_id):
@@ -87,7 +174,69 @@ def replace_course_urls(text, course_id):
         rest = match.group('rest')
         return "".join([quote, '/courses/' + course_id + '/', rest, quote])
 
-    return re.sub(_url_replace_regex('/course/'), replace_course_url, text)
+    return _url_replace_pattern(_url_replace_regex('/course/')).sub(replace_course_url, text)
+
+
+def _static_url_prefix_regex(data_directory, static_asset_path):
+    """
+    Return the regex for the prefix of the static urls that should be rewritten
+    """
+    return u'(?:{static_url}|/static/)(?!{data_dir})'.format(
+        static_url=settings.STATIC_URL,
+        data_dir=static_asset_path or data_directory
+    )
+
+
+def _replace_static_url(match, data_directory, course_id, static_asset_path):
+    """
+    Return the replacement for the static url matched by `match`. See `replace_static_urls`
+    """
+    original = match.group(0)
+    prefix = match.group('prefix')
+    quote = match.group('quote')
+    rest = match.group('rest')
+
+    # Don't mess with things that end in '?raw'
+    if rest.endswith('?raw'):
+        return original
+
+    # In debug mode, if we can find the url as is,
+    if settings.DEBUG and finders.find(rest, True):
+        return original
+    # if we're running with a MongoBacked store course_namespace is not None, then use studio style urls
+    elif (not static_asset_path) and course_id and _modulestore_type(course_id) != XML_MODULESTORE_TYPE:
+        # first look in the static file pipeline and see if we are trying to reference
+        # a piece of static content which is in the edx-platform repo (e.g. JS associated with an xmodule)
+
+        exists_in_staticfiles_storage = False
+        try:
+            exists_in_staticfiles_storage = _staticfiles_exists(rest)
+        except Exception as err:
+            log.warning("staticfiles_storage couldn't find path {0}: {1}".format(
+                rest, str(err)))
+
+        if exists_in_staticfiles_storage:
+            url = _staticfiles_url(rest)
+        else:
+            # if not, then assume it's courseware specific content and then look in the
+            # Mongo-backed database
+            url = StaticContent.convert_legacy_static_url_with_course_id(rest, course_id)
+    # Otherwise, look the file up in staticfiles_storage, and append the data directory if needed
+    else:
+        course_path = "/".join((static_asset_path or data_directory, rest))
+
+        try:
+            if _staticfiles_exists(rest):
+                url = _staticfiles_url(rest)
+            else:
+                url = _staticfiles_url(course_path)
+        # And if that fails, assume that it's course content, and add manually data directory
+        except Exception as err:
+            log.warning("staticfiles_storage couldn't find path {0}: {1}".format(
+                rest, str(err)))
+            url = "".join([prefix, course_path])
+
+    return "".join([quote, url, quote])
 
 
 def replace_static_urls(text, data_directory, course_id=None, static_asset_path=''):
@@ -104,58 +253,36 @@ def replace_static_urls(text, data_directory, course_id=None, static_asset_path=
     """
 
     def replace_static_url(match):
-        original = match.group(0)
-        prefix = match.group('prefix')
+        return _replace_static_url(match, data_directory, course_id, static_asset_path)
+
+    return _url_replace_pattern(
+        _url_replace_regex(_static_url_prefix_regex(data_directory, static_asset_path))
+    ).sub(replace_static_url, text)
+
+
+def replace_urls(text, data_directory, course_id, jump_to_id_base_url, static_asset_path=''):
+    """
+    Apply the replacements of `replace_static_urls`, `replace_course_urls` and
+    `replace_jump_to_id_urls` in a single pass over text.
+
+    See those functions for the meaning of the arguments.
+    """
+    regex = ur"""
+        (?x)                      # flags=re.VERBOSE
+        (?P<quote>\\?['"])        # the opening quotes
+        (?P<prefix>(?P<static>{static})|(?P<course>/course/)|(?P<jump_to_id>/jump_to_id/))
+        (?P<rest>.*?)             # everything else in the url
+        (?P=quote)                # the first matching closing quote
+        """.format(static=_static_url_prefix_regex(data_directory, static_asset_path))
+
+    def replace_url(match):
         quote = match.group('quote')
         rest = match.group('rest')
-
-        # Don't mess with things that end in '?raw'
-        if rest.endswith('?raw'):
-            return original
-
-        # In debug mode, if we can find the url as is,
-        if settings.DEBUG and finders.find(rest, True):
-            return original
-        # if we're running with a MongoBacked store course_namespace is not None, then use studio style urls
-        elif (not static_asset_path) and course_id and modulestore().get_modulestore_type(course_id) != XML_MODULESTORE_TYPE:
-            # first look in the static file pipeline and see if we are trying to reference
-            # a piece of static content which is in the edx-platform repo (e.g. JS associated with an xmodule)
-
-            exists_in_staticfiles_storage = False
-            try:
-                exists_in_staticfiles_storage = staticfiles_storage.exists(rest)
-            except Exception as err:
-                log.warning("staticfiles_storage couldn't find path {0}: {1}".format(
-                    rest, str(err)))
-
-            if exists_in_staticfiles_storage:
-                url = staticfiles_storage.url(rest)
-            else:
-                # if not, then assume it's courseware specific content and then look in the
-                # Mongo-backed database
-                url = StaticContent.convert_legacy_static_url_with_course_id(rest, course_id)
-        # Otherwise, look the file up in staticfiles_storage, and append the data directory if needed
+        if match.group('static') is not None:
+            return _replace_static_url(match, data_directory, course_id, static_asset_path)
+        elif match.group('course') is not None:
+            return "".join([quote, '/courses/' + course_id + '/', rest, quote])
         else:
-            course_path = "/".join((static_asset_path or data_directory, rest))
-
-            try:
-                if staticfiles_storage.exists(rest):
-                    url = staticfiles_storage.url(rest)
-                else:
-                    url = staticfiles_storage.url(course_path)
-            # And if that fails, assume that it's course content, and add manually data directory
-            except Exception as err:
-                log.warning("staticfiles_storage couldn't find path {0}: {1}".format(
-                    rest, str(err)))
-                url = "".join([prefix, course_path])
-
-        return "".join([quote, url, quote])
-
-    return re.sub(
-        _url_replace_regex(u'(?:{static_url}|/static/)(?!{data_dir})'.format(
-            static_url=settings.STATIC_URL,
-            data_dir=static_asset_path or data_directory
-        )),
-        replace_static_url,
-        text
-    )
+            return "".join([quote, jump_to_id_base_url + rest, quote])
+
+    return _url_replace_pattern(regex).sub(replace_url, text)
@@ -1,8 +1,10 @@
 import re
 
+from django.conf import settings
 from nose.tools import assert_equals, assert_true, assert_false  # pylint: disable=E0611
-from static_replace import (replace_static_urls, replace_course_urls,
-                            _url_replace_regex)
+from path import path
+from static_replace import (replace_static_urls, replace_course_urls, replace_jump_to_id_urls,
+                            replace_urls, _url_replace_regex)
 from mock import patch, Mock
 from xmodule.modulestore import Location
 from xmodule.modulestore.mongo import MongoModuleStore
@@ -122,3 +124,80 @@ def test_regex():
     for s in no:
         print 'Should not match: {0!r}'.format(s)
         assert_false(re.match(regex, s))
+
+
+JUMP_TO_ID_BASE_URL = '/courses/org/course/run/jump_to_id/'
+MIXED_SOURCE = (
+    '<a href="/static/handout.pdf">handout</a> <img src="/static/images/fig.png"/> '
+    '<a href=\'/course/courseware\'>courseware</a> <a href="/jump_to_id/vertical_1">next</a> '
+    '<a href="/static/handout.pdf?raw">raw</a> <script src="/static/data_dir/js.js"></script>'
+)
+
+
+def replace_sequentially(text, data_directory, course_id):
+    """
+    Apply the replacements one after the other, the way replace_urls used to be done
+    """
+    text = replace_static_urls(text, data_directory, course_id)
+    text = replace_course_urls(text, course_id)
+    return replace_jump_to_id_urls(text, course_id, JUMP_TO_ID_BASE_URL)
+
+
+@patch('static_replace.staticfiles_storage')
+@patch('static_replace.modulestore')
+def test_replace_urls(mock_modulestore, mock_storage):
+    """
+    Make sure the single pass replace_urls does the same as the individual replacements
+    """
+    mock_modulestore.return_value = Mock(MongoModuleStore)
+    mock_storage.exists.side_effect = lambda path: path.startswith('images/')
+    mock_storage.url.side_effect = lambda path: '/static/hashed/' + path
+
+    for course_id in (COURSE_ID, None):
+        assert_equals(
+            replace_sequentially(MIXED_SOURCE, DATA_DIRECTORY, course_id),
+            replace_urls(MIXED_SOURCE, DATA_DIRECTORY, course_id, JUMP_TO_ID_BASE_URL)
+        )
+
+
+@patch('static_replace.staticfiles_storage')
+@patch('static_replace.modulestore')
+def test_lookups_are_cached(mock_modulestore, mock_storage):
+    """
+    Make sure the staticfiles and modulestore lookups are only made once per url and course
+    """
+    mock_modulestore.return_value = Mock(MongoModuleStore)
+    mock_storage.exists.return_value = True
+    mock_storage.url.return_value = '/static/hashed/file.png'
+
+    for __ in range(3):
+        assert_equals('"/static/hashed/file.png"', replace_static_urls(STATIC_SOURCE, DATA_DIRECTORY, COURSE_ID))
+    mock_storage.exists.assert_called_once_with('file.png')
+    mock_storage.url.assert_called_once_with('file.png')
+    mock_modulestore.return_value.get_modulestore_type.assert_called_once_with(COURSE_ID)
+
+
+@patch('static_replace.staticfiles_storage')
+@patch('static_replace.modulestore')
+def test_replace_urls_course_html(mock_modulestore, mock_storage):
+    """
+    Rewrite the urls in the html of the test courses in a single pass, and
+    check that patterns and static file lookups are reused.
+    """
+    mock_modulestore.return_value = Mock(MongoModuleStore)
+    mock_storage.exists.return_value = False
+
+    html_files = sorted(path(settings.COMMON_TEST_DATA_ROOT).walkfiles('*.html'))
+    html = u''.join(html_file.text(errors='ignore') for html_file in html_files) + MIXED_SOURCE * 50
+    expected = replace_sequentially(html, DATA_DIRECTORY, COURSE_ID)
+    # each url was only looked up once
+    looked_up = [call_args[0][0] for call_args in mock_storage.exists.call_args_list]
+    assert_equals(len(looked_up), len(set(looked_up)))
+
+    mock_storage.exists.reset_mock()
+    with patch.dict('static_replace._COMPILED_PATTERNS', clear=True):
+        with patch('static_replace.re.compile', wraps=re.compile) as mock_compile:
+            for __ in range(3):
+                assert_equals(replace_urls(html, DATA_DIRECTORY, COURSE_ID, JUMP_TO_ID_BASE_URL), expected)
+    assert_equals(mock_compile.call_count, 1)
+    assert_false(mock_storage.exists.called)
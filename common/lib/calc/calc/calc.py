@@ -7,6 +7,9 @@ Uses pyparsing to parse. Main function as of now is evaluator().
 import math
 import operator
 import numbers
+import threading
+from collections import OrderedDict
+
 import numpy
 import scipy.constants
 import functions
@@ -73,6 +76,21 @@ SUFFIXES = {
 }
 
 
+# How many parsed expressions to keep around. FormulaResponse evaluates the
+# same few expressions (answers, tolerances) over and over.
+PARSE_CACHE_SIZE = 1024
+
+# Functions which, given a NumPy array, return the array of their results for
+# each element. Only expressions which use nothing but these (and ufuncs like
+# numpy.sin) are evaluated for many samples at once.
+VECTORIZED_FUNCTIONS = frozenset([
+    functions.sec, functions.csc, functions.cot,
+    functions.arcsec, functions.arccsc,
+    functions.sech, functions.csch, functions.coth,
+    functions.arcsech, functions.arccsch, functions.arccoth,
+])
+
+
 class UndefinedVariable(Exception):
     """
     Indicate when a student inputs a variable which was not expected.
@@ -228,34 +246,358 @@ def evaluator(variables, functions, math_expr, case_sensitive=False):
     if math_expr.strip() == "":
         return float('nan')
 
-    # Parse the tree.
-    math_interpreter = ParseAugmenter(math_expr, case_sensitive)
-    math_interpreter.parse_algebra()
+    # Parse the tree (or find it in the cache).
+    parsed_expr = parse_expression(math_expr)
 
     # Get our variables together.
     all_variables, all_functions = add_defaults(variables, functions, case_sensitive)
 
     # ...and check them
-    math_interpreter.check_variables(all_variables, all_functions)
+    parsed_expr.check_variables(all_variables, all_functions, case_sensitive)
+
+    return parsed_expr.compile(case_sensitive)(all_variables, all_functions)
+
+
+def evaluate_samples(samples, functions, math_expr, case_sensitive=False):
+    """
+    Evaluate an expression for each dictionary of variables in `samples`.
+
+    Return the list of results, the same as calling `evaluator` once per
+    sample. When every sample has the same (float or complex) variables, and
+    the expression only uses vectorized functions, evaluate it for all the
+    samples at once, with NumPy arrays as the values of the variables.
+    Anything out of the ordinary (a division by zero, an overflow, a result
+    which isn't finite...) falls back to evaluating the samples one by one,
+    so that errors are raised exactly as `evaluator` would raise them.
+    """
+    if math_expr.strip() == "" or len(samples) < 2:
+        return [evaluator(sample, functions, math_expr, case_sensitive) for sample in samples]
+
+    parsed_expr = parse_expression(math_expr)
+    names = set(samples[0])
+    vectorizable = all(
+        set(sample) == names and all(isinstance(value, (float, complex)) for value in sample.itervalues())
+        for sample in samples
+    )
+
+    if vectorizable:
+        sample_arrays = dict(
+            (name, numpy.array([sample[name] for sample in samples]))
+            for name in names
+        )
+        all_variables, all_functions = add_defaults(sample_arrays, functions, case_sensitive)
+        parsed_expr.check_variables(all_variables, all_functions, case_sensitive)
+
+        if parsed_expr.is_vectorizable(all_functions, case_sensitive):
+            try:
+                # Python floats raise errors where NumPy would only warn
+                with numpy.errstate(divide='raise', over='raise', invalid='raise'):
+                    result = parsed_expr.compile(case_sensitive)(all_variables, all_functions)
+            except Exception:  # pylint: disable=broad-except
+                result = None
+
+            if result is not None and numpy.all(numpy.isfinite(result)):
+                if numpy.ndim(result) == 0:
+                    # The expression doesn't depend on the samples
+                    return [result] * len(samples)
+                return list(result)
+
+    return [evaluator(sample, functions, math_expr, case_sensitive) for sample in samples]
 
-    # Create a recursion to evaluate the tree.
+
+def _casify(case_sensitive):
+    """
+    Return the function to normalize the names of variables and functions
+    """
     if case_sensitive:
-        casify = lambda x: x
+        return lambda x: x
     else:
-        casify = lambda x: x.lower()  # Lowercase for case insens.
+        return lambda x: x.lower()  # Lowercase for case insens.
+
+
+def check_names(variables_used, functions_used, valid_variables, valid_functions, case_sensitive):
+    """
+    Confirm that all the variables and functions used are valid/defined.
+
+    Otherwise, raise an UndefinedVariable containing all bad variables.
+    """
+    casify = _casify(case_sensitive)
+
+    # Test if casify(X) is valid, but return the actual bad input (i.e. X)
+    bad_vars = set(var for var in variables_used
+                   if casify(var) not in valid_variables)
+    bad_vars.update(func for func in functions_used
+                    if casify(func) not in valid_functions)
 
-    evaluate_actions = {
-        'number': eval_number,
-        'variable': lambda x: all_variables[casify(x[0])],
-        'function': lambda x: all_functions[casify(x[0])](x[1]),
-        'atom': eval_atom,
-        'power': eval_power,
-        'parallel': eval_parallel,
-        'product': eval_product,
-        'sum': eval_sum
-    }
+    if bad_vars:
+        raise UndefinedVariable(' '.join(sorted(bad_vars)))
 
-    return math_interpreter.reduce_tree(evaluate_actions)
+
+def _build_grammar():
+    """
+    Build the pyparsing grammar for algebraic expressions.
+
+    Parse an expression into a tree with proper groupings to reflect
+    parenthesis and order of operations. Leave all operators in the tree and
+    do not parse any strings of numbers into their float versions.
+
+    Adding the groups and result names makes the `repr()` of the result
+    really gross. For debugging, use something like
+      print tree.asXML()
+    """
+    # 0.33 or 7 or .34 or 16.
+    number_part = Word(nums)
+    inner_number = (number_part + Optional("." + Optional(number_part))) | ("." + number_part)
+    # pyparsing allows spaces between tokens--`Combine` prevents that.
+    inner_number = Combine(inner_number)
+
+    # SI suffixes and percent.
+    number_suffix = MatchFirst(Literal(k) for k in SUFFIXES.keys())
+
+    # 0.33k or 17
+    plus_minus = Literal('+') | Literal('-')
+    number = Group(
+        Optional(plus_minus) +
+        inner_number +
+        Optional(CaselessLiteral("E") + Optional(plus_minus) + number_part) +
+        Optional(number_suffix)
+    )
+    number = number("number")
+
+    # Predefine recursive variables.
+    expr = Forward()
+
+    # Handle variables passed in. They must start with letters/underscores
+    # and may contain numbers afterward.
+    inner_varname = Word(alphas + "_", alphanums + "_")
+    varname = Group(inner_varname)("variable")
+
+    # Same thing for functions.
+    function = Group(inner_varname + Suppress("(") + expr + Suppress(")"))("function")
+
+    atom = number | function | varname | "(" + expr + ")"
+    atom = Group(atom)("atom")
+
+    # Do the following in the correct order to preserve order of operation.
+    pow_term = atom + ZeroOrMore("^" + atom)
+    pow_term = Group(pow_term)("power")
+
+    par_term = pow_term + ZeroOrMore('||' + pow_term)  # 5k || 4k
+    par_term = Group(par_term)("parallel")
+
+    prod_term = par_term + ZeroOrMore((Literal('*') | Literal('/')) + par_term)  # 7 * 5 / 4
+    prod_term = Group(prod_term)("product")
+
+    sum_term = Optional(plus_minus) + prod_term + ZeroOrMore(plus_minus + prod_term)  # -5 + 4 - 3
+    sum_term = Group(sum_term)("sum")
+
+    # Finish the recursion.
+    expr << sum_term  # pylint: disable=W0104
+    return expr + stringEnd
+
+
+# The grammar doesn't depend on the expression, so it is only built once.
+ALGEBRA_GRAMMAR = _build_grammar()
+
+
+class ParsedExpression(object):
+    """
+    The parse tree of a math expression, along with the names it uses.
+
+    Instances are shared through the parse cache, so they must not be
+    modified once built.
+    """
+    def __init__(self, math_expr):
+        """
+        Parse `math_expr`. Raise a `ParseException` if it isn't valid.
+        """
+        self.math_expr = math_expr
+        self.tree = ALGEBRA_GRAMMAR.parseString(math_expr)[0]
+
+        variables_used = set()
+        functions_used = set()
+
+        def find_names(node):
+            """
+            Add the variables and functions used under `node` to the sets.
+            """
+            if not isinstance(node, ParseResults):
+                return
+            node_name = node.getName()
+            if node_name == 'variable':
+                variables_used.add(node[0])
+            elif node_name == 'function':
+                functions_used.add(node[0])
+            for child in node:
+                find_names(child)
+
+        find_names(self.tree)
+        self.variables_used = frozenset(variables_used)
+        self.functions_used = frozenset(functions_used)
+        self._compiled = {}
+
+    def check_variables(self, valid_variables, valid_functions, case_sensitive):
+        """
+        Confirm that all the variables used in the tree are valid/defined.
+
+        Otherwise, raise an UndefinedVariable containing all bad variables.
+        """
+        check_names(
+            self.variables_used, self.functions_used, valid_variables, valid_functions, case_sensitive
+        )
+
+    def is_vectorizable(self, valid_functions, case_sensitive):
+        """
+        Return whether all the functions used accept arrays of values
+        """
+        casify = _casify(case_sensitive)
+        for func in self.functions_used:
+            implementation = valid_functions[casify(func)]
+            if not isinstance(implementation, numpy.ufunc) and implementation not in VECTORIZED_FUNCTIONS:
+                return False
+        return True
+
+    def compile(self, case_sensitive):
+        """
+        Return a function of `(variables, functions)` which evaluates the tree.
+
+        The structure of the tree is only walked once, here: the returned
+        function is a nest of closures doing just the arithmetic. The
+        variables and functions must already have been checked, and (if not
+        `case_sensitive`) have lowercase names, as returned by `add_defaults`.
+        """
+        compiled = self._compiled.get(case_sensitive)
+        if compiled is None:
+            compiled = self._compiled[case_sensitive] = _compile_node(self.tree, _casify(case_sensitive))
+        return compiled
+
+
+def _compile_node(node, casify):
+    """
+    Return a function of `(variables, functions)` which evaluates `node`.
+
+    This does what the `eval_*` actions do when reducing the tree, but
+    works out the operators and constants up front, and works on arrays.
+    """
+    node_name = node.getName()
+
+    if node_name == 'number':
+        value = eval_number(node)
+        return lambda variables, functions: value
+
+    if node_name == 'variable':
+        name = casify(node[0])
+        return lambda variables, functions: variables[name]
+
+    if node_name == 'function':
+        name = casify(node[0])
+        argument = _compile_node(node[1], casify)
+        return lambda variables, functions: functions[name](argument(variables, functions))
+
+    children = [_compile_node(k, casify) for k in node if isinstance(k, ParseResults)]
+
+    if node_name == 'atom':
+        # Ignore parenthesis.
+        return children[0]
+
+    if len(children) == 1 and node_name != 'sum':
+        return children[0]
+
+    if node_name == 'power':
+        # Exponentiate right to left: 2^3^2 = 2^(3^2)
+        children.reverse()
+
+        def power(variables, functions):
+            """Evaluate a power node"""
+            result = children[0](variables, functions)
+            for child in children[1:]:
+                result = child(variables, functions) ** result
+            return result
+        return power
+
+    if node_name == 'parallel':
+        def parallel(variables, functions):
+            """Evaluate a parallel node"""
+            values = [child(variables, functions) for child in children]
+            # With arrays, this makes the result NaN if any sample has a zero;
+            # `evaluate_samples` then evaluates the samples one by one.
+            if any(numpy.any(value == 0) for value in values):
+                return float('nan')
+            return 1. / sum(1. / value for value in values)
+        return parallel
+
+    if node_name in ('product', 'sum'):
+        operators = {
+            '*': operator.mul, '/': operator.truediv,
+            '+': operator.add, '-': operator.sub,
+        }
+        if node_name == 'product':
+            initial, current_op = 1.0, operator.mul
+        else:
+            initial, current_op = 0.0, operator.add
+
+        terms = []
+        for token in node:
+            if isinstance(token, ParseResults):
+                terms.append((current_op, _compile_node(token, casify)))
+            else:
+                current_op = operators[token]
+
+        def combine(variables, functions):
+            """Evaluate a sum or product node"""
+            result = initial
+            for term_op, term in terms:
+                result = term_op(result, term(variables, functions))
+            return result
+        return combine
+
+    raise Exception(u"Unknown branch name '{}'".format(node_name))  # pragma: no cover
+
+
+class _ParseCache(object):
+    """
+    A bounded, thread-safe LRU of ParsedExpressions keyed by expression string.
+    """
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, math_expr):
+        """
+        Return the ParsedExpression for `math_expr`, parsing it if needed
+        """
+        with self._lock:
+            parsed_expr = self._entries.pop(math_expr, None)
+            if parsed_expr is not None:
+                self._entries[math_expr] = parsed_expr
+                return parsed_expr
+
+        parsed_expr = ParsedExpression(math_expr)
+        with self._lock:
+            self._entries[math_expr] = parsed_expr
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return parsed_expr
+
+    def clear(self):
+        """
+        Drop all of the parsed expressions
+        """
+        with self._lock:
+            self._entries.clear()
+
+
+_PARSE_CACHE = _ParseCache(PARSE_CACHE_SIZE)
+
+
+def parse_expression(math_expr):
+    """
+    Return the (cached) ParsedExpression for `math_expr`.
+
+    Raise a `ParseException` if it isn't a valid expression.
+    """
+    return _PARSE_CACHE.get(math_expr)
 
 
 class ParseAugmenter(object):
@@ -278,23 +620,6 @@ class ParseAugmenter(object):
         self.variables_used = set()
         self.functions_used = set()
 
-        def vpa(tokens):
-            """
-            When a variable is recognized, store it in `variables_used`.
-            """
-            varname = tokens[0][0]
-            self.variables_used.add(varname)
-
-        def fpa(tokens):
-            """
-            When a function is recognized, store it in `functions_used`.
-            """
-            varname = tokens[0][0]
-            self.functions_used.add(varname)
-
-        self.variable_parse_action = vpa
-        self.function_parse_action = fpa
-
     def parse_algebra(self):
         """
         Parse an algebraic expression into a tree.
@@ -302,62 +627,15 @@ class ParseAugmenter(object):
         Store a `pyparsing.ParseResult` in `self.tree` with proper groupings to
         reflect parenthesis and order of operations. Leave all operators in the
         tree and do not parse any strings of numbers into their float versions.
+        See `_build_grammar`.
 
-        Adding the groups and result names makes the `repr()` of the result
-        really gross. For debugging, use something like
-          print OBJ.tree.asXML()
+        The tree is shared with other parses of the same expression, so it
+        must not be modified.
         """
-        # 0.33 or 7 or .34 or 16.
-        number_part = Word(nums)
-        inner_number = (number_part + Optional("." + Optional(number_part))) | ("." + number_part)
-        # pyparsing allows spaces between tokens--`Combine` prevents that.
-        inner_number = Combine(inner_number)
-
-        # SI suffixes and percent.
-        number_suffix = MatchFirst(Literal(k) for k in SUFFIXES.keys())
-
-        # 0.33k or 17
-        plus_minus = Literal('+') | Literal('-')
-        number = Group(
-            Optional(plus_minus) +
-            inner_number +
-            Optional(CaselessLiteral("E") + Optional(plus_minus) + number_part) +
-            Optional(number_suffix)
-        )
-        number = number("number")
-
-        # Predefine recursive variables.
-        expr = Forward()
-
-        # Handle variables passed in. They must start with letters/underscores
-        # and may contain numbers afterward.
-        inner_varname = Word(alphas + "_", alphanums + "_")
-        varname = Group(inner_varname)("variable")
-        varname.setParseAction(self.variable_parse_action)
-
-        # Same thing for functions.
-        function = Group(inner_varname + Suppress("(") + expr + Suppress(")"))("function")
-        function.setParseAction(self.function_parse_action)
-
-        atom = number | function | varname | "(" + expr + ")"
-        atom = Group(atom)("atom")
-
-        # Do the following in the correct order to preserve order of operation.
-        pow_term = atom + ZeroOrMore("^" + atom)
-        pow_term = Group(pow_term)("power")
-
-        par_term = pow_term + ZeroOrMore('||' + pow_term)  # 5k || 4k
-        par_term = Group(par_term)("parallel")
-
-        prod_term = par_term + ZeroOrMore((Literal('*') | Literal('/')) + par_term)  # 7 * 5 / 4
-        prod_term = Group(prod_term)("product")
-
-        sum_term = Optional(plus_minus) + prod_term + ZeroOrMore(plus_minus + prod_term)  # -5 + 4 - 3
-        sum_term = Group(sum_term)("sum")
-
-        # Finish the recursion.
-        expr << sum_term  # pylint: disable=W0104
-        self.tree = (expr + stringEnd).parseString(self.math_expr)[0]
+        parsed_expr = parse_expression(self.math_expr)
+        self.tree = parsed_expr.tree
+        self.variables_used = set(parsed_expr.variables_used)
+        self.functions_used = set(parsed_expr.functions_used)
 
     def reduce_tree(self, handle_actions, terminal_converter=None):
         """
@@ -403,16 +681,6 @@ class ParseAugmenter(object):
 
         Otherwise, raise an UndefinedVariable containing all bad variables.
         """
-        if self.case_sensitive:
-            casify = lambda x: x
-        else:
-            casify = lambda x: x.lower()  # Lowercase for case insens.
-
-        # Test if casify(X) is valid, but return the actual bad input (i.e. X)
-        bad_vars = set(var for var in self.variables_used
-                       if casify(var) not in valid_variables)
-        bad_vars.update(func for func in self.functions_used
-                        if casify(func) not in valid_functions)
-
-        if bad_vars:
-            raise UndefinedVariable(' '.join(sorted(bad_vars)))
+        check_names(
+            self.variables_used, self.functions_used, valid_variables, valid_functions, self.case_sensitive
+        )
@@ -2,9 +2,12 @@
 Unit tests for calc.py
 """
 
+import random
 import unittest
+
 import numpy
 import calc
+from mock import patch
 from pyparsing import ParseException
 
 # numpy's default behavior when it evaluates a function outside its domain
@@ -558,3 +561,96 @@ class EvaluatorTest(unittest.TestCase):
             calc.evaluator({'r1': 5}, {}, "r1+r2")
         with self.assertRaisesRegexp(calc.UndefinedVariable, 'r1 r3'):
             calc.evaluator(variables, {}, "r1*r3", case_sensitive=True)
+
+
+class EvaluateSamplesTest(unittest.TestCase):
+    """
+    Check that calc.evaluate_samples agrees with calling calc.evaluator for
+    each sample, whether or not it can evaluate them all at once.
+    """
+    def setUp(self):
+        calc.calc._PARSE_CACHE.clear()  # pylint: disable=protected-access
+        random.seed(0)
+        self.samples = [
+            {'x': random.uniform(1, 10), 'y': random.uniform(1, 10)}
+            for _ in xrange(50)
+        ]
+
+    def assert_same_results(self, samples, math_expr, functions=None, case_sensitive=False):
+        """
+        Assert that evaluate_samples gives the results of evaluator
+        """
+        functions = functions or {}
+        results = calc.evaluate_samples(samples, functions, math_expr, case_sensitive)
+        self.assertEqual(len(results), len(samples))
+        for sample, result in zip(samples, results):
+            expected = calc.evaluator(sample, functions, math_expr, case_sensitive)
+            if numpy.isnan(expected):
+                self.assertTrue(numpy.isnan(result))
+            else:
+                self.assertAlmostEqual(result, expected, delta=1e-9 * max(1, abs(expected)))
+
+    def test_vectorized_expressions(self):
+        for math_expr in ['x', '-x+y', 'x*y/2 - 3', 'x^y^0.5', 'x||y', '2*sin(x)+cos(y)^2',
+                          'sqrt(x^2+y^2)', 'sec(x)*coth(y)', 'j*x + e^(j*y)', '5k*x + 10%',
+                          'X*Y', '1+2']:
+            self.assert_same_results(self.samples, math_expr)
+
+    def test_case_sensitive(self):
+        samples = [{'x': value, 'X': 2 * value} for value in (1.0, 2.0, 3.0)]
+        self.assert_same_results(samples, 'x+X', case_sensitive=True)
+        with self.assertRaisesRegexp(calc.UndefinedVariable, 'Y'):
+            calc.evaluate_samples(self.samples, {}, 'x+Y', case_sensitive=True)
+
+    def test_fallback_to_each_sample(self):
+        # a function which doesn't take arrays
+        self.assert_same_results(self.samples, 'f(x)*y', functions={'f': lambda x: max(x, 5)})
+        # integer variables
+        self.assert_same_results([{'x': 3}, {'x': 4}], 'fact(x)')
+        # different variables in each sample
+        self.assert_same_results([{'x': 1.0}, {'x': 2.0, 'y': 3.0}], '2*x')
+        # a zero in one of the samples
+        self.assert_same_results([{'x': 1.0}, {'x': 0.0}], 'x||2')
+
+    def test_errors_are_raised_like_evaluator(self):
+        with self.assertRaises(ZeroDivisionError):
+            calc.evaluate_samples([{'x': 1.0}, {'x': 0.0}], {}, '1/x')
+        with self.assertRaises(ValueError):
+            calc.evaluate_samples([{'x': 2.0}, {'x': -2.0}], {}, 'x^0.5')
+        with self.assertRaises(ParseException):
+            calc.evaluate_samples(self.samples, {}, 'x+')
+        with self.assertRaisesRegexp(calc.UndefinedVariable, 'z'):
+            calc.evaluate_samples(self.samples, {}, 'x*z')
+
+    def test_empty_expression(self):
+        results = calc.evaluate_samples(self.samples[:2], {}, ' ')
+        self.assertTrue(all(numpy.isnan(result) for result in results))
+
+    def test_parses_once(self):
+        with patch('calc.calc.ParsedExpression', wraps=calc.ParsedExpression) as mock_parse:
+            calc.evaluate_samples(self.samples, {}, 'x*sin(y)')
+            calc.evaluate_samples(self.samples, {}, 'x*sin(y)')
+            calc.evaluator({'x': 1.0, 'y': 2.0}, {}, 'x*sin(y)', case_sensitive=True)
+        self.assertEqual(mock_parse.call_count, 1)
+
+    def test_parse_cache_is_bounded(self):
+        cache = calc.calc._ParseCache(2)  # pylint: disable=protected-access
+        parsed = [cache.get(math_expr) for math_expr in ('1', '2', '3')]
+        self.assertIs(cache.get('3'), parsed[2])
+        self.assertIsNot(cache.get('1'), parsed[0])
+
+    def test_samples_parsed_once(self):
+        """
+        Checking a formula over `samples="x,y@1,1:10,10#50"` used to parse the
+        student and instructor expressions for every sample.
+        """
+        expressions = ['x^2*sin(y)/(1+x*y)', 'x*x*sin(y)/(x*y+1)', 'f(x)*y']
+        functions = {'f': lambda x: max(x, 5)}
+        grammar = calc.calc.ALGEBRA_GRAMMAR
+        with patch.object(grammar, 'parseString', wraps=grammar.parseString) as mock_parse:
+            for math_expr in expressions:
+                # whether all the samples are evaluated at once, or (for 'f') one by one
+                calc.evaluate_samples(self.samples, functions, math_expr)
+                for sample in self.samples:
+                    calc.evaluator(sample, functions, math_expr)
+        self.assertEqual(mock_parse.call_count, len(expressions))
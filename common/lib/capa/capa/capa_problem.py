@@ -13,10 +13,13 @@ Main module which shows problems (of "capa" type).
 This is used by capa_module.
 """
 
+from collections import OrderedDict
 from datetime import datetime
+import hashlib
 import logging
 import os.path
 import re
+import threading
 
 from lxml import etree
 from xml.sax.saxutils import unescape
@@ -29,7 +32,7 @@ import capa.responsetypes as responsetypes
 from capa.util import contextualize_text, convert_files_to_filenames
 import capa.xqueue_interface as xqueue_interface
 
-from capa.safe_exec import safe_exec
+from capa.safe_exec import safe_exec, code_hash_for
 
 from pytz import UTC
 
@@ -107,6 +110,52 @@ class LoncapaSystem(object):
         self.xqueue = xqueue
 
 
+class ProblemSkeletonCache(object):
+    """
+    A bounded, thread-safe LRU of problem skeletons: the XML trees of problems,
+    parsed and with IDs assigned, before anything which depends on the seed
+    (running the scripts, creating the responders) has happened.
+
+    Callers get their own copy of the tree, which is much cheaper than parsing
+    the problem and assigning the IDs again.
+    """
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Return a copy of the skeleton cached for `key`, or None
+        """
+        with self._lock:
+            tree = self._entries.pop(key, None)
+            if tree is None:
+                return None
+            self._entries[key] = tree
+        return deepcopy(tree)
+
+    def set(self, key, tree):
+        """
+        Cache a copy of `tree` as the skeleton for `key`
+        """
+        tree = deepcopy(tree)
+        with self._lock:
+            self._entries[key] = tree
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """
+        Drop all of the skeletons
+        """
+        with self._lock:
+            self._entries.clear()
+
+
+PROBLEM_SKELETON_CACHE = ProblemSkeletonCache(1000)
+
+
 class LoncapaProblem(object):
     """
     Main class for capa Problems.
@@ -156,18 +205,15 @@ class LoncapaProblem(object):
         problem_text = re.sub(r"endouttext\s*/", "/text", problem_text)
         self.problem_text = problem_text
 
-        # parse problem XML file into an element tree
-        self.tree = etree.XML(problem_text)
-
-        # handle any <include file="foo"> tags
-        self._process_includes()
+        # parse problem XML file into an element tree, with IDs assigned
+        self.tree = self._get_problem_skeleton(problem_text)
 
         # construct script processor context (eg for customresponse problems)
         self.context = self._extract_context(self.tree)
 
-        # Pre-parse the XML tree: modifies it to add ID's and perform some in-place
-        # transformations.  This also creates the dict (self.responders) of Response
-        # instances for each question in the problem. The dict has keys = xml subtree of
+        # Pre-parse the XML tree: perform some in-place transformations.  This
+        # creates the dict (self.responders) of Response instances for each
+        # question in the problem. The dict has keys = xml subtree of
         # Response, values = Response instance
         self._preprocess_problem(self.tree)
 
@@ -176,9 +222,28 @@ class LoncapaProblem(object):
 
         # dictionary of InputType objects associated with this problem
         #   input_id string -> InputType object
-        self.inputs = {}
+        # Created when first needed, see the `inputs` property: grading doesn't need them.
+        self._inputs = None
+        self._extracted_tree = None
 
-        self.extracted_tree = self._extract_html(self.tree)
+    @property
+    def inputs(self):
+        """
+        The dict of InputType objects associated with this problem, by input id.
+        """
+        if self._inputs is None:
+            self._inputs = {}
+            self._create_inputs(self.tree)
+        return self._inputs
+
+    @property
+    def extracted_tree(self):
+        """
+        The XHTML tree of the problem, only rendered if it's asked for.
+        """
+        if self._extracted_tree is None:
+            self._extracted_tree = self._extract_html(self.tree)
+        return self._extracted_tree
 
     def do_reset(self):
         """
@@ -209,6 +274,9 @@ class LoncapaProblem(object):
             2) Populate any student answers.
         """
 
+        # Creating the inputs gives each of them its (possibly empty) input state.
+        self.inputs  # pylint: disable=pointless-statement
+
         return {'seed': self.seed,
                 'student_answers': self.student_answers,
                 'correct_map': self.correct_map.get_dict(),
@@ -444,6 +512,34 @@ class LoncapaProblem(object):
 
     # ======= Private Methods Below ========
 
+    def _get_problem_skeleton(self, problem_text):
+        """
+        Return the XML tree of `problem_text`, with includes processed and IDs
+        assigned, from the cache of problem skeletons if possible.
+
+        Problems with <include>s aren't cached, since the included files may change.
+        """
+        if isinstance(problem_text, unicode):
+            key_text = problem_text.encode('utf-8')
+        else:
+            key_text = problem_text
+        key = "{0}:{1}".format(self.problem_id, hashlib.sha1(key_text).hexdigest())
+
+        tree = PROBLEM_SKELETON_CACHE.get(key)
+        if tree is not None:
+            return tree
+
+        self.tree = etree.XML(problem_text)
+        has_includes = bool(self.tree.findall('.//include'))
+
+        # handle any <include file="foo"> tags
+        self._process_includes()
+        self._assign_ids(self.tree)
+
+        if not has_includes:
+            PROBLEM_SKELETON_CACHE.set(key, self.tree)
+        return self.tree
+
     def _process_includes(self):
         """
         Handle any <include file="foo"> tags by reading in the specified file and inserting it
@@ -560,6 +656,9 @@ class LoncapaProblem(object):
             code = unescape(script.text, XMLESC)
             all_code += code
 
+        # Hashed once per problem, for the keys of the cached results of running it.
+        self.script_code_hash = code_hash_for(all_code)
+
         if all_code:
             try:
                 safe_exec(
@@ -570,6 +669,7 @@ class LoncapaProblem(object):
                     cache=self.capa_system.cache,
                     slug=self.problem_id,
                     unsafely=self.capa_system.can_execute_unsafe_code(),
+                    code_hash=self.script_code_hash,
                 )
             except Exception as err:
                 log.exception("Error while execing script code: " + all_code)
@@ -606,46 +706,9 @@ class LoncapaProblem(object):
         if problemtree.tag in html_problem_semantics:
             return
 
-        problemid = problemtree.get('id')    # my ID
-
         if problemtree.tag in inputtypes.registry.registered_tags():
             # If this is an inputtype subtree, let it render itself.
-            status = "unsubmitted"
-            msg = ''
-            hint = ''
-            hintmode = None
-            input_id = problemtree.get('id')
-            if problemid in self.correct_map:
-                pid = input_id
-                status = self.correct_map.get_correctness(pid)
-                msg = self.correct_map.get_msg(pid)
-                hint = self.correct_map.get_hint(pid)
-                hintmode = self.correct_map.get_hintmode(pid)
-
-            value = ""
-            if self.student_answers and problemid in self.student_answers:
-                value = self.student_answers[problemid]
-
-            if input_id not in self.input_state:
-                self.input_state[input_id] = {}
-
-            # do the rendering
-            state = {
-                'value': value,
-                'status': status,
-                'id': input_id,
-                'input_state': self.input_state[input_id],
-                'feedback': {
-                    'message': msg,
-                    'hint': hint,
-                    'hintmode': hintmode,
-                }
-            }
-
-            input_type_cls = inputtypes.registry.get_class_for_tag(problemtree.tag)
-            # save the input type so that we can make ajax calls on it if we need to
-            self.inputs[input_id] = input_type_cls(self.capa_system, problemtree, state)
-            return self.inputs[input_id].get_html()
+            return self._create_input(problemtree).get_html()
 
         # let each Response render itself
         if problemtree in self.responders:
@@ -679,19 +742,86 @@ class LoncapaProblem(object):
 
         return tree
 
-    def _preprocess_problem(self, tree):  # private
+    def _create_inputs(self, problemtree):
+        """
+        Create the InputType objects for all the inputs which `_extract_html`
+        would render, without rendering anything.
+        """
+        if not isinstance(problemtree.tag, basestring):
+            return
+
+        if (problemtree.tag == 'script' and problemtree.get('type')
+            and 'javascript' in problemtree.get('type')):
+            return
+
+        if problemtree.tag in html_problem_semantics:
+            return
+
+        if problemtree.tag in inputtypes.registry.registered_tags():
+            self._create_input(problemtree)
+            return
+
+        if problemtree.tag in customrender.registry.registered_tags():
+            return
+
+        for item in problemtree:
+            self._create_inputs(item)
+
+    def _create_input(self, problemtree):
+        """
+        Create and return the InputType object for the input `problemtree`,
+        with its current state, and save it in `self.inputs`.
+        """
+        problemid = problemtree.get('id')    # my ID
+        status = "unsubmitted"
+        msg = ''
+        hint = ''
+        hintmode = None
+        input_id = problemtree.get('id')
+        if problemid in self.correct_map:
+            pid = input_id
+            status = self.correct_map.get_correctness(pid)
+            msg = self.correct_map.get_msg(pid)
+            hint = self.correct_map.get_hint(pid)
+            hintmode = self.correct_map.get_hintmode(pid)
+
+        value = ""
+        if self.student_answers and problemid in self.student_answers:
+            value = self.student_answers[problemid]
+
+        if input_id not in self.input_state:
+            self.input_state[input_id] = {}
+
+        # do the rendering
+        state = {
+            'value': value,
+            'status': status,
+            'id': input_id,
+            'input_state': self.input_state[input_id],
+            'feedback': {
+                'message': msg,
+                'hint': hint,
+                'hintmode': hintmode,
+            }
+        }
+
+        input_type_cls = inputtypes.registry.get_class_for_tag(problemtree.tag)
+        # save the input type so that we can make ajax calls on it if we need to
+        if self._inputs is None:
+            self._inputs = {}
+        self._inputs[input_id] = input_type_cls(self.capa_system, problemtree, state)
+        return self._inputs[input_id]
+
+    def _assign_ids(self, tree):  # private
         """
         Assign IDs to all the responses
         Assign sub-IDs to all entries (textline, schematic, etc.)
-        Annoted correctness and value
         In-place transformation
 
-        Also create capa Response instances for each responsetype and save as self.responders
-
-        Obtain all responder answers and save as self.responder_answers dict (key = response)
+        Only depends on the problem XML, so the result can be cached (see _get_problem_skeleton).
         """
         response_id = 1
-        self.responders = {}
+        input_tags = inputtypes.registry.registered_tags()
         for response in tree.xpath('//' + "|//".join(responsetypes.registry.registered_tags())):
             response_id_str = self.problem_id + "_" + str(response_id)
             # create and save ID for this response
@@ -699,7 +829,6 @@ class LoncapaProblem(object):
             response_id += 1
 
             answer_id = 1
-            input_tags = inputtypes.registry.registered_tags()
             inputfields = tree.xpath(
                 "|".join(['//' + response.tag + '[@id=$id]//' + x for x in (input_tags + solution_tags)]),
                 id=response_id_str
@@ -712,6 +841,33 @@ class LoncapaProblem(object):
                 entry.attrib['id'] = "%s_%i_%i" % (self.problem_id, response_id, answer_id)
                 answer_id = answer_id + 1
 
+        # <solution>...</solution> may not be associated with any specific response; give
+        # IDs for those separately
+        # TODO: We should make the namespaces consistent and unique (e.g. %s_problem_%i).
+        solution_id = 1
+        for solution in tree.findall('.//solution'):
+            solution.attrib['id'] = "%s_solution_%i" % (self.problem_id, solution_id)
+            solution_id += 1
+
+    def _preprocess_problem(self, tree):  # private
+        """
+        Annoted correctness and value
+        In-place transformation
+
+        Create capa Response instances for each responsetype and save as self.responders
+
+        Obtain all responder answers and save as self.responder_answers dict (key = response)
+
+        The IDs must already have been assigned by _assign_ids.
+        """
+        self.responders = {}
+        input_tags = inputtypes.registry.registered_tags()
+        for response in tree.xpath('//' + "|//".join(responsetypes.registry.registered_tags())):
+            inputfields = tree.xpath(
+                "|".join(['//' + response.tag + '[@id=$id]//' + x for x in (input_tags + solution_tags)]),
+                id=response.get('id')
+            )
+
             # instantiate capa Response
             responsetype_cls = responsetypes.registry.get_class_for_tag(response.tag)
             responder = responsetype_cls(response, inputfields, self.context, self.capa_system)
@@ -728,11 +884,3 @@ class LoncapaProblem(object):
                 log.debug('responder %s failed to properly return get_answers()',
                           self.responders[response])  # FIXME
                 raise
-
-        # <solution>...</solution> may not be associated with any specific response; give
-        # IDs for those separately
-        # TODO: We should make the namespaces consistent and unique (e.g. %s_problem_%i).
-        solution_id = 1
-        for solution in tree.findall('.//solution'):
-            solution.attrib['id'] = "%s_solution_%i" % (self.problem_id, solution_id)
-            solution_id += 1
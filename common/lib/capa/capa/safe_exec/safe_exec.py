@@ -4,9 +4,13 @@ from codejail.safe_exec import safe_exec as codejail_safe_exec
 from codejail.safe_exec import not_safe_exec as codejail_not_safe_exec
 from codejail.safe_exec import json_safe, SafeExecException
 from . import lazymod
+from . import worker_pool
 from dogapi import dog_stats_api
 
 import hashlib
+import json
+import threading
+from collections import OrderedDict
 
 # Establish the Python environment for Capa.
 # Capa assumes float-friendly division always.
@@ -70,8 +74,132 @@ def update_hash(hasher, obj):
         hasher.update(repr(obj))
 
 
+def code_hash_for(code):
+    """
+    Return the hash of `code` used in the cache keys of its executions.
+
+    Callers which run the same code many times can compute it once, and pass
+    it to `safe_exec` as `code_hash`.
+    """
+    return hashlib.md5(repr(code)).hexdigest()
+
+
+def cache_key_for(code_hash, globals_dict, random_seed):
+    """
+    Return the cache key for running the code with hash `code_hash` on
+    `globals_dict` with `random_seed`.
+
+    The globals are hashed as canonical JSON, which is much quicker than
+    `update_hash` for big dicts.
+    """
+    md5er = hashlib.md5(code_hash)
+    md5er.update(json.dumps(json_safe(globals_dict), sort_keys=True))
+    return "safe_exec.%r.%s" % (random_seed, md5er.hexdigest())
+
+
+class LocalResultCache(object):
+    """
+    An in-process LRU cache in front of a shared cache (e.g. memcache).
+
+    Pages with many problems, and the same problems being rendered over and
+    over, run the same code with the same seeds. Keeping the most recent
+    results in the process saves a round trip to the shared cache for each
+    of them. Execution results never change for a given key, so there is
+    nothing to invalidate.
+
+    Values are kept as JSON, so each `get` returns a fresh copy which the
+    caller can modify, and so the memory they use is known. At most
+    `max_bytes` of JSON is kept.
+    """
+    def __init__(self, shared_cache, max_bytes=10 * 1024 * 1024):
+        self.shared_cache = shared_cache
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._hits = 0
+        self._shared_hits = 0
+        self._misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Return the value for `key` from this process, or else from the shared cache
+        """
+        with self._lock:
+            value_json = self._entries.pop(key, None)
+            if value_json is not None:
+                self._entries[key] = value_json
+                self._hits += 1
+        if value_json is not None:
+            dog_stats_api.increment('capa.safe_exec.cache', tags=['result:local_hit'])
+            return tuple(json.loads(value_json))
+
+        value = self.shared_cache.get(key)
+        if value is None:
+            with self._lock:
+                self._misses += 1
+            dog_stats_api.increment('capa.safe_exec.cache', tags=['result:miss'])
+            return None
+
+        with self._lock:
+            self._shared_hits += 1
+        dog_stats_api.increment('capa.safe_exec.cache', tags=['result:shared_hit'])
+        self._set_local(key, value)
+        return value
+
+    def set(self, key, value):
+        """
+        Store `value` for `key` in this process and in the shared cache
+        """
+        self._set_local(key, value)
+        self.shared_cache.set(key, value)
+
+    def _set_local(self, key, value):
+        """
+        Store `value` for `key` in this process, evicting the least recently used values to make room
+        """
+        value_json = json.dumps(value)
+        if len(value_json) > self.max_bytes:
+            return
+        with self._lock:
+            old_json = self._entries.pop(key, None)
+            if old_json is not None:
+                self._bytes -= len(old_json)
+            self._entries[key] = value_json
+            self._bytes += len(value_json)
+            while self._bytes > self.max_bytes:
+                __, evicted_json = self._entries.popitem(last=False)
+                self._bytes -= len(evicted_json)
+            num_bytes = self._bytes
+        dog_stats_api.gauge('capa.safe_exec.cache.local_bytes', num_bytes)
+
+    def stats(self):
+        """
+        Return a dict of the hit/miss counts and the size of the local cache
+        """
+        with self._lock:
+            return {
+                'hits': self._hits,
+                'shared_hits': self._shared_hits,
+                'misses': self._misses,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+            }
+
+    def clear(self):
+        """
+        Drop the values kept in this process
+        """
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+
 @dog_stats_api.timed('capa.safe_exec.time')
-def safe_exec(code, globals_dict, random_seed=None, python_path=None, cache=None, slug=None, unsafely=False):
+def safe_exec(
+        code, globals_dict, random_seed=None, python_path=None, cache=None, slug=None, unsafely=False,
+        code_hash=None,
+):
     """
     Execute python code safely.
 
@@ -85,7 +213,11 @@ def safe_exec(code, globals_dict, random_seed=None, python_path=None, cache=None
 
     `cache` is an object with .get(key) and .set(key, value) methods.  It will be used
     to cache the execution, taking into account the code, the values of the globals,
-    and the random seed.
+    and the random seed.  Wrap shared caches in a `LocalResultCache` to also keep
+    recent results in this process.
+
+    `code_hash` is the result of `code_hash_for(code)`, for callers which have it
+    already, so that the code doesn't have to be hashed again.
 
     `slug` is an arbitrary string, a description that's meaningful to the
     caller, that will be used in log messages.
@@ -95,11 +227,9 @@ def safe_exec(code, globals_dict, random_seed=None, python_path=None, cache=None
     """
     # Check the cache for a previous result.
     if cache:
-        safe_globals = json_safe(globals_dict)
-        md5er = hashlib.md5()
-        md5er.update(repr(code))
-        update_hash(md5er, safe_globals)
-        key = "safe_exec.%r.%s" % (random_seed, md5er.hexdigest())
+        if code_hash is None:
+            code_hash = code_hash_for(code)
+        key = cache_key_for(code_hash, globals_dict, random_seed)
         cached = cache.get(key)
         if cached is not None:
             # We have a cached result.  The result is a pair: the exception
@@ -113,18 +243,30 @@ def safe_exec(code, globals_dict, random_seed=None, python_path=None, cache=None
     # Create the complete code we'll run.
     code_prolog = CODE_PROLOG % random_seed
 
-    # Decide which code executor to use.
+    # Decide which code executor to use: prefer the warm workers of the pool, if there is one.
+    pool = None
     if unsafely:
         exec_fn = codejail_not_safe_exec
     else:
         exec_fn = codejail_safe_exec
+        pool = worker_pool.get_pool()
 
     # Run the code!  Results are side effects in globals_dict.
     try:
-        exec_fn(
-            code_prolog + LAZY_IMPORTS + code, globals_dict,
-            python_path=python_path, slug=slug,
-        )
+        if pool is not None:
+            try:
+                pool.execute(
+                    code_prolog + LAZY_IMPORTS + code, globals_dict,
+                    python_path=python_path, slug=slug,
+                )
+            except worker_pool.WorkerError:
+                # The code never reached a worker, so run it the usual way.
+                pool = None
+        if pool is None:
+            exec_fn(
+                code_prolog + LAZY_IMPORTS + code, globals_dict,
+                python_path=python_path, slug=slug,
+            )
     except SafeExecException as e:
         emsg = e.message
     else:
@@ -0,0 +1,203 @@
+"""
+A long-lived worker process for running sandboxed Python code.
+
+worker_pool.py reads this file and runs it with the sandboxed Python
+executable (as `python -c`), so it mustn't import anything from edx-platform.
+
+The worker imports the modules that problems commonly use once, when it
+starts. Then, for each job it reads from stdin, it forks a child which
+applies the CodeJail resource limits, runs the code in a new temporary
+directory, and sends back the resulting globals. Each job starts from the
+same warm state: nothing the code does survives its child process.
+
+The protocol is one JSON value per line. The only command line argument is a
+JSON dict of the configuration: {"limits": {...}, "preload": [module, ...]}.
+The worker writes "ready" once it has imported the modules. Each job is a
+list [code, globals_dict, python_path], and each reply is a dict with either
+the resulting "globals", or an "error" message.
+"""
+import json
+import os
+import resource
+import select
+import shutil
+import signal
+import sys
+import tempfile
+import time
+import traceback
+
+# Types of globals which can be sent back, as in codejail.safe_exec
+OK_TYPES = (type(None), int, long, float, str, unicode, list, tuple, dict)
+BAD_KEYS = ("__builtins__",)
+
+
+class DevNull(object):
+    """
+    Swallow anything printed by the sandboxed code
+    """
+    def write(self, *args, **kwargs):
+        pass
+
+
+def jsonable(value):
+    """
+    Return whether `value` can be sent back as JSON
+    """
+    if not isinstance(value, OK_TYPES):
+        return False
+    try:
+        json.dumps(value)
+    except Exception:  # pylint: disable=broad-except
+        return False
+    return True
+
+
+def vm_size():
+    """
+    Return the size of this process's address space, or 0 if it's unknown
+    """
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[0]) * resource.getpagesize()
+    except (IOError, OSError, ValueError, IndexError):
+        return 0
+
+
+def set_process_limits(limits):
+    """
+    Apply the CodeJail resource limits to this (child) process.
+
+    The VMEM limit is on top of the memory already used by the preloaded
+    modules, which a freshly started sandbox would have to import itself.
+    """
+    cpu = limits.get("CPU")
+    if cpu:
+        resource.setrlimit(resource.RLIMIT_CPU, (cpu, cpu))
+    vmem = limits.get("VMEM")
+    if vmem:
+        vmem += vm_size()
+        resource.setrlimit(resource.RLIMIT_AS, (vmem, vmem))
+    # No forking, and no writing files.
+    resource.setrlimit(resource.RLIMIT_NPROC, (0, 0))
+    resource.setrlimit(resource.RLIMIT_FSIZE, (0, 0))
+
+
+def run_child(job, limits, result_fd, tmpdir):
+    """
+    Run a job in the forked child, in the directory `tmpdir`, and write its result to `result_fd`
+    """
+    code, globals_dict, python_path = job
+    child_pid = os.getpid()
+    # Like codejail, run the code in its own directory rather than the worker's.
+    os.chdir(tmpdir)
+
+    # Don't let the code read the next jobs, or write replies of its own.
+    os.close(0)
+    os.close(1)
+    sys.stdout = DevNull()
+
+    # Don't share random state with the other children of this worker.
+    import random
+    random.seed()
+    if "numpy.random" in sys.modules:
+        sys.modules["numpy.random"].seed()
+
+    set_process_limits(limits)
+    for pydir in python_path:
+        sys.path.append(pydir)
+
+    try:
+        exec code in globals_dict  # pylint: disable=exec-used
+        result = {
+            "globals": dict(
+                (key, value) for key, value in globals_dict.iteritems()
+                if jsonable(value) and key not in BAD_KEYS
+            )
+        }
+    except BaseException:  # pylint: disable=broad-except
+        result = {"error": traceback.format_exc()}
+
+    if os.getpid() != child_pid:
+        # The code forked (which RLIMIT_NPROC prevents, except for root).
+        return
+    with os.fdopen(result_fd, "w") as result_file:
+        result_file.write(json.dumps(result))
+
+
+def run_job(job, limits):
+    """
+    Run a job in a child process, and return the JSON text of its result
+    """
+    tmpdir = tempfile.mkdtemp(prefix="codejail-")
+    try:
+        return wait_for_child(job, limits, tmpdir)
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+
+def wait_for_child(job, limits, tmpdir):
+    """
+    Fork a child to run a job in `tmpdir`, and return the JSON text of its result
+    """
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        try:
+            os.close(read_fd)
+            run_child(job, limits, write_fd, tmpdir)
+        finally:
+            os._exit(0)  # pylint: disable=protected-access
+
+    os.close(write_fd)
+    realtime = limits.get("REALTIME")
+    deadline = time.time() + realtime if realtime else None
+    timed_out = False
+    chunks = []
+    while True:
+        timeout = None if deadline is None else max(deadline - time.time(), 0)
+        readable, __, __ = select.select([read_fd], [], [], timeout)
+        if not readable:
+            timed_out = True
+            os.kill(pid, signal.SIGKILL)
+            break
+        chunk = os.read(read_fd, 65536)
+        if not chunk:
+            break
+        chunks.append(chunk)
+    os.close(read_fd)
+    __, status = os.waitpid(pid, 0)
+
+    if timed_out:
+        return json.dumps({"error": "Killed after %s seconds of real time" % realtime})
+    if os.WIFSIGNALED(status):
+        return json.dumps({"error": "Killed by signal %d" % os.WTERMSIG(status)})
+    if not chunks:
+        return json.dumps({"error": "Exited without a result, status %d" % os.WEXITSTATUS(status)})
+    return "".join(chunks)
+
+
+def main():
+    """
+    Preload the modules, then run jobs until stdin is closed
+    """
+    config = json.loads(sys.argv[1])
+    for module_name in config.get("preload", ()):
+        try:
+            __import__(module_name)
+        except Exception:  # pylint: disable=broad-except
+            pass
+
+    replies = sys.stdout
+    replies.write("ready\n")
+    replies.flush()
+    while True:
+        line = sys.stdin.readline()
+        if not line:
+            break
+        replies.write(run_job(json.loads(line), config.get("limits", {})) + "\n")
+        replies.flush()
+
+
+if __name__ == "__main__":
+    main()
@@ -9,7 +9,7 @@ import unittest
 
 from nose.plugins.skip import SkipTest
 
-from capa.safe_exec import safe_exec, update_hash
+from capa.safe_exec import safe_exec, update_hash, code_hash_for, LocalResultCache
 from codejail.safe_exec import SafeExecException
 from codejail.jail_code import is_configured
 
@@ -177,6 +177,83 @@ class TestSafeExecCaching(unittest.TestCase):
                 self.fail("Tried executing code with non-ASCII unicode: {0}".format(code))
 
 
+class CountingDictCache(DictCache):
+    """A DictCache which counts the calls to it."""
+
+    def __init__(self, d):
+        super(CountingDictCache, self).__init__(d)
+        self.gets = 0
+        self.sets = 0
+
+    def get(self, key):
+        self.gets += 1
+        return super(CountingDictCache, self).get(key)
+
+    def set(self, key, value):
+        self.sets += 1
+        super(CountingDictCache, self).set(key, value)
+
+
+class TestLocalResultCache(unittest.TestCase):
+    """Test the in-process cache in front of the shared cache."""
+
+    def test_repeated_problems_stay_local(self):
+        # Render 20 randomized problems, twice.
+        shared_cache = CountingDictCache({})
+        cache = LocalResultCache(shared_cache)
+        code = "a = random.randint(0, 999)"
+        code_hash = code_hash_for(code)
+        results = []
+        for _ in xrange(2):
+            for seed in xrange(20):
+                g = {}
+                safe_exec(code, g, random_seed=seed, cache=cache, code_hash=code_hash)
+                results.append(g['a'])
+
+        self.assertEqual(results[:20], results[20:])
+        # Only the first rendering of each problem went to the shared cache.
+        self.assertEqual(shared_cache.gets, 20)
+        self.assertEqual(shared_cache.sets, 20)
+        stats = cache.stats()
+        self.assertEqual(stats['hits'], 20)
+        self.assertEqual(stats['misses'], 20)
+        self.assertEqual(stats['entries'], 20)
+
+    def test_shared_hits_are_kept_locally(self):
+        shared_cache = CountingDictCache({'key': (None, {'a': 17})})
+        cache = LocalResultCache(shared_cache)
+        self.assertEqual(cache.get('key'), (None, {'a': 17}))
+        self.assertEqual(cache.get('key'), (None, {'a': 17}))
+        self.assertEqual(shared_cache.gets, 1)
+        self.assertEqual(cache.stats()['shared_hits'], 1)
+
+    def test_get_returns_copies(self):
+        cache = LocalResultCache(DictCache({}))
+        cache.set('key', (None, {'a': [1, 2]}))
+        cache.get('key')[1]['a'].append(3)
+        self.assertEqual(cache.get('key'), (None, {'a': [1, 2]}))
+
+    def test_bounded_by_bytes(self):
+        cache = LocalResultCache(DictCache({}), max_bytes=100)
+        for index in xrange(5):
+            cache.set('key%d' % index, (None, {'a': 'x' * 20}))
+        stats = cache.stats()
+        self.assertLessEqual(stats['bytes'], 100)
+        self.assertLess(stats['entries'], 5)
+        # The least recently used were evicted, but are still in the shared cache.
+        self.assertEqual(cache.get('key0'), (None, {'a': 'x' * 20}))
+        self.assertEqual(cache.stats()['shared_hits'], 1)
+
+    def test_code_hash_matches(self):
+        # Passing the hash of the code finds the results cached without it.
+        cache = {}
+        g = {}
+        safe_exec("a = 17", g, cache=DictCache(cache))
+        cache[cache.keys()[0]] = (None, {'a': 42})
+        safe_exec("a = 17", g, cache=DictCache(cache), code_hash=code_hash_for("a = 17"))
+        self.assertEqual(g['a'], 42)
+
+
 class TestUpdateHash(unittest.TestCase):
     """Test the safe_exec.update_hash function to be sure it canonicalizes properly."""
 
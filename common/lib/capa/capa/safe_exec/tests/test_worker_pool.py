@@ -0,0 +1,170 @@
+"""Test worker_pool.py"""
+
+import os.path
+import sys
+import unittest
+
+from mock import patch
+
+from capa.safe_exec import safe_exec
+from capa.safe_exec import worker_pool
+from capa.safe_exec.worker_pool import SandboxWorkerPool, WorkerError
+from codejail.safe_exec import SafeExecException
+
+
+def make_pool(size=1, max_executions=100, limits=None):
+    """
+    Make a pool of unsandboxed workers, which run the Python running the tests.
+    """
+    pool = SandboxWorkerPool(
+        size, max_executions=max_executions, command=[sys.executable],
+        limits=limits if limits is not None else {'CPU': 1, 'REALTIME': 3},
+        preload=['math', 'numpy'],
+    )
+    return pool
+
+
+class TestSandboxWorkerPool(unittest.TestCase):
+    def setUp(self):
+        self.pool = make_pool()
+        self.addCleanup(self.pool.close)
+
+    def test_set_values(self):
+        g = {'b': 5}
+        self.pool.execute("a = b + 12", g)
+        self.assertEqual(g, {'a': 17, 'b': 5})
+
+    def test_raising_exceptions(self):
+        with self.assertRaises(SafeExecException) as cm:
+            self.pool.execute("1/0", {})
+        self.assertIn("ZeroDivisionError", cm.exception.message)
+        # the worker is still usable
+        g = {}
+        self.pool.execute("a = 1", g)
+        self.assertEqual(g['a'], 1)
+
+    def test_executions_are_isolated(self):
+        g = {}
+        self.pool.execute("import math; math.leaked = True", g)
+        self.pool.execute("import math; leaked = hasattr(math, 'leaked')", g)
+        self.assertFalse(g['leaked'])
+        self.assertEqual(self.pool.stats()['workers'], 1)
+
+    def test_cpu_limit(self):
+        with self.assertRaises(SafeExecException) as cm:
+            self.pool.execute("while True: pass", {})
+        self.assertIn("Killed", cm.exception.message)
+
+    def test_realtime_limit(self):
+        g = {}
+        self.pool.execute("import os; pid = os.getppid()", g)
+        first_pid = g['pid']
+        with self.assertRaises(SafeExecException) as cm:
+            self.pool.execute("import time; time.sleep(10)", {})
+        self.assertIn("real time", cm.exception.message)
+        # only the child running the code was killed, not the worker
+        self.pool.execute("import os; pid = os.getppid()", g)
+        self.assertEqual(g['pid'], first_pid)
+        self.assertEqual(self.pool.stats()['recycled'], 0)
+
+    def test_reuses_warm_worker(self):
+        pids = set()
+        for _ in xrange(10):
+            g = {}
+            self.pool.execute("import os, sys; pid = os.getppid(); warm = 'numpy' in sys.modules", g)
+            pids.add(g['pid'])
+            self.assertTrue(g['warm'])
+        self.assertEqual(len(pids), 1)
+        stats = self.pool.stats()
+        self.assertEqual(stats['executions'], 10)
+        self.assertEqual(stats['workers'], 1)
+        self.assertEqual(stats['recycled'], 0)
+
+    def test_runs_in_own_directory(self):
+        dirs = []
+        for _ in xrange(2):
+            g = {}
+            self.pool.execute("import os; cwd = os.getcwd(); files = os.listdir(cwd)", g)
+            self.assertEqual(g['files'], [])
+            dirs.append(g['cwd'])
+        self.assertNotEqual(dirs[0], dirs[1])
+        self.assertNotIn(os.getcwd(), dirs)
+        # and the directories are removed afterwards
+        self.assertFalse(any(os.path.exists(cwd) for cwd in dirs))
+
+    def test_python_path(self):
+        pylib = os.path.dirname(__file__) + "/test_files/pylib"
+        g = {}
+        self.pool.execute("import constant; a = constant.THE_CONST", g, python_path=[pylib])
+        self.assertEqual(g['a'], 23)
+
+    def test_recycled_after_max_executions(self):
+        pool = make_pool(max_executions=2)
+        self.addCleanup(pool.close)
+        pids = []
+        for _ in xrange(3):
+            g = {}
+            pool.execute("import os; pid = os.getppid()", g)
+            pids.append(g['pid'])
+        self.assertEqual(pids[0], pids[1])
+        self.assertNotEqual(pids[1], pids[2])
+        stats = pool.stats()
+        self.assertEqual(stats['recycled'], 1)
+        self.assertEqual(stats['executions'], 3)
+
+    def test_recycled_on_error(self):
+        g = {}
+        self.pool.execute("import os; pid = os.getppid()", g)
+        first_pid = g['pid']
+        with patch('capa.safe_exec.worker_pool.SandboxWorker._read_line', side_effect=WorkerError):
+            # the worker failed after it was sent the code, which may have run
+            with self.assertRaises(SafeExecException):
+                self.pool.execute("a = 1", g)
+        self.pool.execute("import os; pid = os.getppid()", g)
+        self.assertNotEqual(g['pid'], first_pid)
+        self.assertEqual(self.pool.stats()['recycled'], 1)
+
+    def test_bad_command(self):
+        pool = SandboxWorkerPool(1, command=['/nonexistent/python'], limits={})
+        with self.assertRaises(WorkerError):
+            pool.execute("a = 1", {})
+        self.assertEqual(pool.stats()['workers'], 0)
+
+
+class TestSafeExecWithPool(unittest.TestCase):
+    def setUp(self):
+        worker_pool.configure(1, command=[sys.executable], limits={'CPU': 1, 'REALTIME': 3}, preload=['math'])
+        self.addCleanup(worker_pool.configure, 0)
+
+    def test_uses_pool(self):
+        g = {}
+        safe_exec("a = int(math.pi) + 1/2", g, random_seed=17)
+        self.assertEqual(g['a'], 3.5)
+        self.assertEqual(worker_pool.get_pool().stats()['executions'], 1)
+
+    def test_random_seeding(self):
+        g = {}
+        safe_exec("rnums = [random.randint(0, 999) for _ in xrange(10)]", g, random_seed=17)
+        first = g['rnums']
+        safe_exec("rnums = [random.randint(0, 999) for _ in xrange(10)]", g, random_seed=17)
+        self.assertEqual(g['rnums'], first)
+
+    def test_falls_back_without_pool(self):
+        with patch.object(SandboxWorkerPool, 'execute', side_effect=WorkerError):
+            g = {}
+            safe_exec("a = 17", g)
+        self.assertEqual(g['a'], 17)
+
+    def test_no_fallback_after_delivery(self):
+        safe_exec("a = 1", {})
+        with patch('capa.safe_exec.worker_pool.SandboxWorker._read_line', side_effect=WorkerError("Timed out")):
+            with patch('capa.safe_exec.safe_exec.codejail_safe_exec') as mock_codejail:
+                with self.assertRaises(SafeExecException):
+                    safe_exec("a = 17", {})
+        self.assertFalse(mock_codejail.called)
+
+    def test_not_used_unsafely(self):
+        g = {}
+        safe_exec("a = 17", g, unsafely=True)
+        self.assertEqual(g['a'], 17)
+        self.assertEqual(worker_pool.get_pool().stats()['executions'], 0)
@@ -0,0 +1,342 @@
+"""
+A pool of pre-forked, warm sandbox workers for running Capa's Python code.
+
+Running code through codejail starts a new sandboxed Python process for
+every execution, which then has to import numpy, scipy and friends again.
+The workers in this pool are sandboxed Python processes started the same
+way, which import those modules once and then fork a child (under the same
+CodeJail resource limits) for each execution. See sandbox_worker.py.
+
+The pool is optional. It's configured once per process with `configure()`,
+and `get_pool()` returns None if it isn't.
+"""
+import json
+import logging
+import os
+import select
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+
+from codejail import jail_code
+from codejail.safe_exec import json_safe, SafeExecException
+from dogapi import dog_stats_api
+
+log = logging.getLogger(__name__)
+
+# The source of the worker, to run with `python -c`.
+sandbox_worker_py_file = os.path.join(os.path.dirname(__file__), "sandbox_worker.py")
+with open(sandbox_worker_py_file) as sandbox_worker_file:
+    SANDBOX_WORKER_PY = sandbox_worker_file.read()
+
+# Modules to import in the workers before running any code.
+DEFAULT_PRELOAD = [
+    "numpy", "math", "scipy", "calc", "eia",
+    "chem.chemcalc", "chem.chemtools", "chem.miller", "verifiers.draganddrop",
+]
+
+# How long a worker may take to start, and how long to wait for a result
+# beyond the REALTIME limit, before giving up on the worker.
+STARTUP_TIMEOUT = 30
+RESULT_GRACE_TIME = 5
+# How long to wait for a result if there is no REALTIME limit.
+DEFAULT_RESULT_TIMEOUT = 60
+
+
+class WorkerError(Exception):
+    """
+    A sandbox worker failed, or stopped responding (as opposed to the code it ran failing).
+
+    `delivered` is whether the worker had been sent the code, in which case it may have run.
+    """
+    def __init__(self, message="", delivered=False):
+        super(WorkerError, self).__init__(message)
+        self.delivered = delivered
+
+
+class SandboxWorker(object):
+    """
+    A single sandbox worker process.
+    """
+    def __init__(self, command, limits, preload):
+        self.limits = limits
+        self.executions = 0
+        self._buffer = ""
+        config = json.dumps({"limits": limits, "preload": preload})
+        with open(os.devnull, "w") as devnull:
+            try:
+                self.process = subprocess.Popen(
+                    command + ["-c", SANDBOX_WORKER_PY, config],
+                    stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=devnull,
+                    close_fds=True,
+                )
+            except OSError as err:
+                raise WorkerError("Couldn't start a worker: {}".format(err))
+        try:
+            ready = self._read_line(STARTUP_TIMEOUT)
+        except WorkerError:
+            self.close()
+            raise
+        if ready != "ready":
+            self.close()
+            raise WorkerError("Unexpected output from a starting worker: {!r}".format(ready))
+
+    @property
+    def pid(self):
+        """
+        The process id of the worker
+        """
+        return self.process.pid
+
+    def _read_line(self, timeout):
+        """
+        Read a line of output from the worker, waiting at most `timeout` seconds
+        """
+        deadline = time.time() + timeout
+        fd = self.process.stdout.fileno()
+        while "\n" not in self._buffer:
+            remaining = deadline - time.time()
+            readable, __, __ = select.select([fd], [], [], max(remaining, 0))
+            if not readable:
+                raise WorkerError("Timed out waiting for a worker after {} seconds".format(timeout))
+            chunk = os.read(fd, 65536)
+            if not chunk:
+                raise WorkerError("Worker exited with status {}".format(self.process.poll()))
+            self._buffer += chunk
+        line, self._buffer = self._buffer.split("\n", 1)
+        return line
+
+    def execute(self, code, globals_dict, python_path=()):
+        """
+        Run `code` with `globals_dict` in a child of the worker.
+
+        Return the result dict, with either the "globals" or an "error".
+        """
+        self.executions += 1
+        job = json.dumps([code, json_safe(globals_dict), list(python_path)])
+        try:
+            self.process.stdin.write(job + "\n")
+            self.process.stdin.flush()
+        except (IOError, OSError) as err:
+            raise WorkerError("Couldn't send code to a worker: {}".format(err))
+
+        realtime = self.limits.get("REALTIME")
+        timeout = realtime + RESULT_GRACE_TIME if realtime else DEFAULT_RESULT_TIMEOUT
+        try:
+            line = self._read_line(timeout)
+        except WorkerError as err:
+            err.delivered = True
+            raise
+        try:
+            return json.loads(line)
+        except ValueError:
+            raise WorkerError("Unexpected output from a worker: {!r}".format(line[:100]), delivered=True)
+
+    def close(self):
+        """
+        Stop the worker
+        """
+        try:
+            self.process.stdin.close()
+        except (IOError, OSError):
+            pass
+        if self.process.poll() is None:
+            try:
+                self.process.terminate()
+            except OSError:
+                pass
+        self.process.wait()
+
+
+class SandboxWorkerPool(object):
+    """
+    Up to `size` sandbox workers, each of which is replaced after it has run
+    `max_executions` pieces of code, or if it fails.
+
+    `command` is the command line to start the sandboxed Python, and `limits`
+    the CodeJail resource limits to apply to each execution. They default to
+    the configuration of codejail itself.
+    """
+    def __init__(self, size, max_executions=100, command=None, limits=None, preload=None):
+        self.size = size
+        self.max_executions = max_executions
+        self.command = list(command or jail_code.COMMANDS["python"])
+        self.limits = dict(limits if limits is not None else getattr(jail_code, "LIMITS", {}))
+        self.preload = DEFAULT_PRELOAD if preload is None else preload
+
+        self._idle = []
+        self._num_workers = 0
+        self._num_waiting = 0
+        self._num_executions = 0
+        self._num_recycled = 0
+        self._condition = threading.Condition()
+
+    def stats(self):
+        """
+        Return a dict of counts describing the state of the pool
+        """
+        with self._condition:
+            return {
+                "size": self.size,
+                "workers": self._num_workers,
+                "idle": len(self._idle),
+                "waiting": self._num_waiting,
+                "executions": self._num_executions,
+                "recycled": self._num_recycled,
+            }
+
+    def _acquire(self):
+        """
+        Return an idle worker, starting one if the pool isn't full, or
+        waiting for one otherwise
+        """
+        with self._condition:
+            self._num_waiting += 1
+            dog_stats_api.histogram("capa.safe_exec.pool.queue_depth", self._num_waiting)
+            try:
+                while not self._idle and self._num_workers >= self.size:
+                    self._condition.wait()
+                if self._idle:
+                    return self._idle.pop()
+                # Reserve the slot, and start the worker outside of the lock.
+                self._num_workers += 1
+            finally:
+                self._num_waiting -= 1
+
+        try:
+            return SandboxWorker(self.command, self.limits, self.preload)
+        except WorkerError:
+            with self._condition:
+                self._num_workers -= 1
+                self._condition.notify()
+            raise
+
+    def _release(self, worker, failed=False):
+        """
+        Put a worker back in the pool, or stop it if it's done
+        """
+        recycle = failed or worker.executions >= self.max_executions
+        if recycle:
+            dog_stats_api.increment(
+                "capa.safe_exec.pool.recycled",
+                tags=["reason:{}".format("error" if failed else "max_executions")]
+            )
+            worker.close()
+
+        with self._condition:
+            if recycle:
+                self._num_workers -= 1
+                self._num_recycled += 1
+            else:
+                self._idle.append(worker)
+            self._condition.notify()
+            dog_stats_api.gauge("capa.safe_exec.pool.workers", self._num_workers)
+            dog_stats_api.gauge("capa.safe_exec.pool.idle", len(self._idle))
+
+    def execute(self, code, globals_dict, python_path=None, slug=None):
+        """
+        Execute code like codejail's safe_exec does, using a worker of the pool.
+
+        Changes to the globals are visible in `globals_dict` when this returns.
+        Raise SafeExecException if the code fails, or if its worker failed after
+        being sent the code, which may have run.  Raise WorkerError if the code
+        never reached a worker, so it can safely be run some other way.
+        """
+        python_path = python_path or ()
+        tmpdir = None
+        if python_path:
+            # Copy the directories somewhere the sandbox can read them, as codejail does.
+            tmpdir = tempfile.mkdtemp(prefix="codejail-")
+            os.chmod(tmpdir, 0755)
+        try:
+            sandbox_path = []
+            for pydir in python_path:
+                dest = os.path.join(tmpdir, os.path.basename(pydir))
+                if os.path.isdir(pydir):
+                    shutil.copytree(pydir, dest)
+                else:
+                    shutil.copy(pydir, dest)
+                sandbox_path.append(dest)
+
+            worker = self._acquire()
+            try:
+                result = worker.execute(code, globals_dict, sandbox_path)
+            except WorkerError as err:
+                log.warning("Sandbox worker %s failed running %s", worker.pid, slug, exc_info=True)
+                self._release(worker, failed=True)
+                if err.delivered:
+                    raise SafeExecException("Couldn't execute jailed code: {}".format(err))
+                raise
+            self._release(worker)
+        finally:
+            if tmpdir is not None:
+                shutil.rmtree(tmpdir, ignore_errors=True)
+
+        with self._condition:
+            self._num_executions += 1
+        if "error" in result:
+            raise SafeExecException("Couldn't execute jailed code: {}".format(result["error"]))
+        globals_dict.update(result["globals"])
+
+    def close(self):
+        """
+        Stop all of the idle workers
+        """
+        with self._condition:
+            idle, self._idle = self._idle, []
+            self._num_workers -= len(idle)
+        for worker in idle:
+            worker.close()
+
+
+_POOL_OPTIONS = None
+_POOL = None
+_POOL_PID = None
+_POOL_LOCK = threading.Lock()
+
+
+def configure(size, max_executions=100, command=None, limits=None, preload=None):
+    """
+    Make safe_exec run code through a pool of `size` workers (or not, if `size` is 0).
+
+    The workers are only started when code is first run, so that processes
+    forked after configuring the pool (e.g. by gunicorn) each get their own.
+    """
+    global _POOL_OPTIONS, _POOL  # pylint: disable=global-statement
+    with _POOL_LOCK:
+        if _POOL is not None:
+            _POOL.close()
+            _POOL = None
+        if size:
+            _POOL_OPTIONS = {
+                "size": size,
+                "max_executions": max_executions,
+                "command": command,
+                "limits": limits,
+                "preload": preload,
+            }
+        else:
+            _POOL_OPTIONS = None
+
+
+def get_pool():
+    """
+    Return this process's SandboxWorkerPool, or None if there is no pool to use.
+
+    Unless it was configured with a `command`, there is only a pool if codejail
+    is configured to sandbox Python.
+    """
+    global _POOL, _POOL_PID  # pylint: disable=global-statement
+    if _POOL_OPTIONS is None:
+        return None
+    if _POOL_OPTIONS["command"] is None and not jail_code.is_configured("python"):
+        return None
+
+    with _POOL_LOCK:
+        if _POOL is None or _POOL_PID != os.getpid():
+            # The pipes of a pool inherited through a fork belong to the parent.
+            _POOL = SandboxWorkerPool(**_POOL_OPTIONS)
+            _POOL_PID = os.getpid()
+        return _POOL
@@ -0,0 +1,87 @@
+"""
+Tests of the construction of LoncapaProblems, and the cache of problem skeletons.
+"""
+import textwrap
+import unittest
+
+from lxml import etree
+from mock import patch
+
+from capa.capa_problem import LoncapaProblem, PROBLEM_SKELETON_CACHE, ProblemSkeletonCache
+from .response_xml_factory import StringResponseXMLFactory
+from . import new_loncapa_problem
+
+
+class ProblemSkeletonTest(unittest.TestCase):
+
+    def setUp(self):
+        super(ProblemSkeletonTest, self).setUp()
+        PROBLEM_SKELETON_CACHE.clear()
+        self.addCleanup(PROBLEM_SKELETON_CACHE.clear)
+        self.xml = StringResponseXMLFactory().build_xml(answer="Michigan", num_responses=2)
+
+    def test_parsed_once(self):
+        with patch('capa.capa_problem.etree.XML', wraps=etree.XML) as xml:
+            first = new_loncapa_problem(self.xml)
+            second = new_loncapa_problem(self.xml)
+        self.assertEqual(xml.call_count, 1)
+
+        # The problems have the same IDs, but trees of their own
+        self.assertEqual(sorted(first.inputs.keys()), sorted(second.inputs.keys()))
+        self.assertEqual(sorted(first.inputs.keys()), ['1_2_1', '1_3_1'])
+        self.assertIsNot(first.tree, second.tree)
+        first.tree.set('changed', 'yes')
+        self.assertIsNone(second.tree.get('changed'))
+        self.assertIsNone(new_loncapa_problem(self.xml).tree.get('changed'))
+
+    def test_same_results(self):
+        first = new_loncapa_problem(self.xml)
+        second = new_loncapa_problem(self.xml)
+        self.assertEqual(first.get_html(), second.get_html())
+        answers = {'1_2_1': 'Michigan', '1_3_1': 'Ohio'}
+        self.assertEqual(first.grade_answers(answers).get_dict(), second.grade_answers(answers).get_dict())
+
+    def test_grading_without_rendering(self):
+        with patch.object(LoncapaProblem, '_extract_html') as extract_html:
+            problem = new_loncapa_problem(self.xml)
+            self.assertEqual(problem.get_max_score(), 2)
+            problem.grade_answers({'1_2_1': 'Michigan', '1_3_1': 'Michigan'})
+            self.assertEqual(problem.get_score()['score'], 2)
+            state = problem.get_state()
+        self.assertFalse(extract_html.called)
+        self.assertEqual(sorted(state['input_state'].keys()), ['1_2_1', '1_3_1'])
+
+    def test_includes_not_cached(self):
+        xml = textwrap.dedent("""
+            <problem>
+                <include file="test_include.xml"/>
+            </problem>
+        """)
+        with patch.object(LoncapaProblem, '_process_includes') as process_includes:
+            new_loncapa_problem(xml)
+            new_loncapa_problem(xml)
+        self.assertEqual(process_includes.call_count, 2)
+
+    def test_bounded(self):
+        cache = ProblemSkeletonCache(2)
+        for key in ('a', 'b', 'c'):
+            cache.set(key, new_loncapa_problem(self.xml).tree)
+        self.assertIsNone(cache.get('a'))
+        self.assertIsNotNone(cache.get('c'))
+
+    def test_skeleton_reused(self):
+        xml = StringResponseXMLFactory().build_xml(answer="Michigan", num_responses=20)
+        num_problems = 10
+        with patch.object(PROBLEM_SKELETON_CACHE, 'get', wraps=PROBLEM_SKELETON_CACHE.get) as cache_get:
+            with patch('capa.capa_problem.etree.XML', wraps=etree.XML) as xml_parse:
+                for _ in xrange(num_problems):
+                    self.assertEqual(new_loncapa_problem(xml).get_max_score(), 20)
+        # every problem looked its skeleton up, and only the first had to parse it
+        self.assertEqual(cache_get.call_count, num_problems)
+        self.assertEqual(xml_parse.call_count, 1)
+
+        with patch.object(ProblemSkeletonCache, 'get', return_value=None):
+            with patch('capa.capa_problem.etree.XML', wraps=etree.XML) as xml_parse:
+                for _ in xrange(num_problems):
+                    new_loncapa_problem(xml)
+        self.assertEqual(xml_parse.call_count, num_problems)
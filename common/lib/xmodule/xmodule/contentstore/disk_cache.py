@@ -0,0 +1,253 @@
+"""
+A size bounded cache of asset data on the local disk.
+
+Serving a large asset out of GridFS reads every chunk of it from Mongo. The
+DiskAssetCache keeps copies of the data of such assets on the local disk of
+each node, so that hot assets (lecture PDFs, images, ...) are read from there.
+
+Entries are stored as <root>/<hash of the content id>/<md5 of the data>, so a
+changed asset never matches an old entry, and all the entries for an asset can
+be dropped by removing its directory. Files are written to a temporary name
+and then renamed into place, so concurrent workers never see partial entries.
+
+Each process keeps a running total of the size of the cache, and only rescans
+the cache directory once that goes over the cache's size. Then the least
+recently used entries are evicted, until the cache is well under its size.
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+
+class DiskAssetCache(object):
+    """
+    Caches asset data in files under `root`, using at most about `max_bytes` of disk
+    """
+    # the fraction of max_bytes which eviction brings the cache down to, so that
+    # it's a while before the cache has to be rescanned again
+    EVICT_TO_FRACTION = 0.9
+    # temporary files older than this were left behind by a crashed worker
+    STALE_TEMP_SECONDS = 60 * 60
+
+    def __init__(self, root, max_bytes):
+        self.root = root
+        self.max_bytes = max_bytes
+        # bytes in the cache, as of the last scan plus what this process has added since
+        self._total_bytes = None
+        self._lock = threading.Lock()
+        if not os.path.isdir(root):
+            try:
+                os.makedirs(root)
+            except OSError:
+                # another worker created it first
+                if not os.path.isdir(root):
+                    raise
+
+    def _content_dir(self, content_id):
+        """
+        Return the directory holding the entries for the asset with id `content_id`
+        """
+        key = hashlib.sha1(json.dumps(content_id, sort_keys=True)).hexdigest()
+        return os.path.join(self.root, key)
+
+    def open(self, content_id, content_digest):
+        """
+        Return an open file with the cached data of the asset version with md5
+        `content_digest`, or None if it isn't cached
+        """
+        path = os.path.join(self._content_dir(content_id), content_digest)
+        try:
+            cached_file = open(path, 'rb')
+        except IOError:
+            return None
+        try:
+            # record the use, for LRU eviction
+            os.utime(path, None)
+        except OSError:
+            pass
+        return cached_file
+
+    def add(self, content_id, content_digest, stream):
+        """
+        Return a file-like object which reads the asset data from `stream`, and
+        adds it to the cache once it has been read through to the end. (Or
+        `stream` itself, if the data can't be cached.)
+
+        The data is cached while it's being served, so a miss costs no more than
+        serving the asset from `stream`. Seeking the returned object elsewhere
+        than where it's at, as serving a range request does, stops the caching.
+        """
+        content_dir = self._content_dir(content_id)
+        try:
+            if not os.path.isdir(content_dir):
+                os.makedirs(content_dir)
+            temp_fd, temp_path = tempfile.mkstemp(dir=content_dir, prefix='.tmp')
+        except OSError:
+            # e.g. the asset was invalidated by another worker at the same time
+            log.warning("Unable to add asset %s to the disk cache", content_id, exc_info=True)
+            return stream
+        return _CachingStream(self, content_id, os.path.join(content_dir, content_digest), stream, temp_fd, temp_path)
+
+    def delete(self, content_id):
+        """
+        Drop all the cached data of the asset with id `content_id`
+        """
+        content_dir = self._content_dir(content_id)
+        num_bytes = 0
+        try:
+            for filename in os.listdir(content_dir):
+                num_bytes += os.path.getsize(os.path.join(content_dir, filename))
+        except OSError:
+            pass
+        shutil.rmtree(content_dir, ignore_errors=True)
+        self._record_size_change(-num_bytes)
+
+    def _record_size_change(self, num_bytes):
+        """
+        Update the running total of the size of the cache, and evict entries if it's too big
+        """
+        with self._lock:
+            if self._total_bytes is not None:
+                self._total_bytes += num_bytes
+                if self._total_bytes <= self.max_bytes:
+                    return
+            # The first time, or once the cache seems too big, see what's really in it,
+            # as the other workers sharing the cache add and evict entries too.
+            self._evict()
+
+    def _entries(self):
+        """
+        Return a list of (last use, size, path) for all the cache entries, removing any stale temporary files
+        """
+        entries = []
+        stale_time = time.time() - self.STALE_TEMP_SECONDS
+        for dirpath, __, filenames in os.walk(self.root):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                try:
+                    stat = os.stat(path)
+                    if filename.startswith('.tmp'):
+                        if stat.st_mtime < stale_time:
+                            os.remove(path)
+                        continue
+                except OSError:
+                    # evicted by another worker
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def _evict(self):
+        """
+        Scan the cache, and if it's over max_bytes, remove the least recently used
+        entries until it's down to EVICT_TO_FRACTION of that
+        """
+        entries = self._entries()
+        total_bytes = sum(size for __, size, __ in entries)
+        if total_bytes > self.max_bytes:
+            for __, size, path in sorted(entries):
+                if total_bytes <= self.max_bytes * self.EVICT_TO_FRACTION:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                total_bytes -= size
+        self._total_bytes = total_bytes
+
+
+class _CachingStream(object):
+    """
+    Reads asset data from a stream, writing it to a temporary file as it goes,
+    which is moved into the cache at `path` once the end of the data is reached.
+    """
+    def __init__(self, cache, content_id, path, stream, temp_fd, temp_path):
+        self._cache = cache
+        self._content_id = content_id
+        self._path = path
+        self._stream = stream
+        self._temp_file = os.fdopen(temp_fd, 'wb')
+        self._temp_path = temp_path
+        self._position = 0
+
+    def read(self, size=-1):
+        """
+        Read up to `size` bytes (or all the rest, if it's negative) from the stream
+        """
+        data = self._stream.read(size)
+        self._position += len(data)
+        if self._temp_file is not None:
+            if data:
+                try:
+                    self._temp_file.write(data)
+                except (IOError, OSError):
+                    log.warning("Unable to add asset %s to the disk cache", self._content_id, exc_info=True)
+                    self._stop_caching()
+            if self._temp_file is not None and ((not data and size != 0) or size < 0):
+                self._finish_caching()
+        return data
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        """
+        Seek the stream, which stops the caching unless it stays where it is
+        """
+        self._stream.seek(offset, whence)
+        position = self._stream.tell()
+        if position != self._position:
+            self._stop_caching()
+        self._position = position
+
+    def tell(self):
+        """
+        Return the position in the stream
+        """
+        return self._position
+
+    def close(self):
+        """
+        Close the stream, dropping the data cached so far unless all of it was read
+        """
+        self._stop_caching()
+        self._stream.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _finish_caching(self):
+        """
+        Move the complete data into the cache
+        """
+        try:
+            self._temp_file.close()
+            self._temp_file = None
+            os.rename(self._temp_path, self._path)
+        except (IOError, OSError):
+            log.warning("Unable to add asset %s to the disk cache", self._content_id, exc_info=True)
+            self._stop_caching()
+            return
+        self._cache._record_size_change(self._position)  # pylint: disable=protected-access
+
+    def _stop_caching(self):
+        """
+        Drop the data copied so far, if it hasn't been moved into the cache
+        """
+        if self._temp_file is not None:
+            temp_file, self._temp_file = self._temp_file, None
+            try:
+                temp_file.close()
+            except (IOError, OSError):
+                pass
+        try:
+            os.remove(self._temp_path)
+        except OSError:
+            # already moved into the cache, or removed
+            pass
@@ -22,6 +22,7 @@ def contentstore(name='default'):
         class_ = load_function(settings.CONTENTSTORE['ENGINE'])
         options = {}
         options.update(settings.CONTENTSTORE['DOC_STORE_CONFIG'])
+        options.update(settings.CONTENTSTORE.get('OPTIONS', {}))
         if 'ADDITIONAL_OPTIONS' in settings.CONTENTSTORE:
             if name in settings.CONTENTSTORE['ADDITIONAL_OPTIONS']:
                 options.update(settings.CONTENTSTORE['ADDITIONAL_OPTIONS'][name])
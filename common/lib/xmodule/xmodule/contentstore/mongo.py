@@ -9,19 +9,29 @@ from xmodule.contentstore.content import XASSET_LOCATION_TAG
 import logging
 
 from .content import StaticContent, ContentStore, StaticContentStream
+from .disk_cache import DiskAssetCache
 from xmodule.exceptions import NotFoundError
 from fs.osfs import OSFS
 import os
 import json
 
 
+# assets smaller than this are cached in memcached by the content server rather than on disk
+DEFAULT_DISK_CACHE_MIN_BYTES = 1048576
+DEFAULT_DISK_CACHE_MAX_BYTES = 1024 * 1048576
+
+
 class MongoContentStore(ContentStore):
     # pylint: disable=W0613
-    def __init__(self, host, db, port=27017, user=None, password=None, bucket='fs', collection=None, **kwargs):
+    def __init__(self, host, db, port=27017, user=None, password=None, bucket='fs', collection=None,
+                 disk_cache_root=None, disk_cache_max_bytes=DEFAULT_DISK_CACHE_MAX_BYTES,
+                 disk_cache_min_bytes=DEFAULT_DISK_CACHE_MIN_BYTES, **kwargs):
         """
         Establish the connection with the mongo backend and connect to the collections
 
         :param collection: ignores but provided for consistency w/ other doc_store_config patterns
+        :param disk_cache_root: if set, the data of assets of at least disk_cache_min_bytes found as streams
+            is cached in a DiskAssetCache in this directory, using at most disk_cache_max_bytes
         """
         logging.debug('Using MongoDB for static content serving at host={0} db={1}'.format(host, db))
         _db = pymongo.database.Database(
@@ -40,6 +50,12 @@ class MongoContentStore(ContentStore):
 
         self.fs_files = _db[bucket + ".files"]  # the underlying collection GridFS uses
 
+        if disk_cache_root is not None:
+            self.disk_cache = DiskAssetCache(disk_cache_root, disk_cache_max_bytes)
+        else:
+            self.disk_cache = None
+        self.disk_cache_min_bytes = disk_cache_min_bytes
+
     def save(self, content):
         content_id = content.get_id()
 
@@ -51,7 +67,11 @@ class MongoContentStore(ContentStore):
                               import_path=content.import_path,
                               # getattr b/c caching may mean some pickled instances don't have attr
                               locked=getattr(content, 'locked', False)) as fp:
-            if hasattr(content.data, '__iter__'):
+            if isinstance(content, StaticContentStream):
+                # copy the stream (e.g. a file being imported) a chunk at a time rather than reading it all
+                for chunk in content.stream_data():
+                    fp.write(chunk)
+            elif hasattr(content.data, '__iter__'):
                 for chunk in content.data:
                     fp.write(chunk)
             else:
@@ -60,6 +80,8 @@ class MongoContentStore(ContentStore):
         return content
 
     def delete(self, content_id):
+        if self.disk_cache is not None:
+            self.disk_cache.delete(content_id)
         if self.fs.exists({"_id": content_id}):
             self.fs.delete(content_id)
 
@@ -69,10 +91,12 @@ class MongoContentStore(ContentStore):
             if as_stream:
                 fp = self.fs.get(content_id)
                 return StaticContentStream(
-                    location, fp.displayname, fp.content_type, fp, last_modified_at=fp.uploadDate,
+                    location, fp.displayname, fp.content_type, self._disk_cached_stream(content_id, fp),
+                    last_modified_at=fp.uploadDate,
                     thumbnail_location=getattr(fp, 'thumbnail_location', None),
                     import_path=getattr(fp, 'import_path', None),
-                    length=fp.length, locked=getattr(fp, 'locked', False)
+                    length=fp.length, locked=getattr(fp, 'locked', False),
+                    content_digest=getattr(fp, 'md5', None)
                 )
             else:
                 with self.fs.get(content_id) as fp:
@@ -80,7 +104,8 @@ class MongoContentStore(ContentStore):
                         location, fp.displayname, fp.content_type, fp.read(), last_modified_at=fp.uploadDate,
                         thumbnail_location=getattr(fp, 'thumbnail_location', None),
                         import_path=getattr(fp, 'import_path', None),
-                        length=fp.length, locked=getattr(fp, 'locked', False)
+                        length=fp.length, locked=getattr(fp, 'locked', False),
+                        content_digest=getattr(fp, 'md5', None)
                     )
         except NoFile:
             if throw_on_not_found:
@@ -88,6 +113,21 @@ class MongoContentStore(ContentStore):
             else:
                 return None
 
+    def _disk_cached_stream(self, content_id, fp):
+        """
+        Return a stream of the data of the GridFS file fp, read from the disk cache if
+        the asset is big enough to be cached there. Otherwise, fp is read directly,
+        and cached as it's read if it's big enough.
+        """
+        content_digest = getattr(fp, 'md5', None)
+        if self.disk_cache is None or content_digest is None or fp.length < self.disk_cache_min_bytes:
+            return fp
+
+        cached_file = self.disk_cache.open(content_id, content_digest)
+        if cached_file is None:
+            return self.disk_cache.add(content_id, content_digest, fp)
+        return cached_file
+
     def get_stream(self, location):
         content_id = StaticContent.get_id_from_location(location)
         try:
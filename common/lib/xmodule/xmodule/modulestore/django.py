@@ -8,6 +8,7 @@ from __future__ import absolute_import
 from importlib import import_module
 
 import re
+from uuid import uuid4
 
 from django.conf import settings
 from django.core.cache import get_cache, InvalidCacheBackendError
@@ -26,6 +27,11 @@ _MODULESTORES = {}
 
 FUNCTION_KEYS = ['render_template']
 
+# How long a course content version token lives in the cache. When it expires
+# a new token is generated, which only costs a recomputation of whatever was
+# keyed on the old one.
+COURSE_CONTENT_VERSION_TIMEOUT = 60 * 60 * 24 * 7
+
 
 def load_function(path):
     """
@@ -38,6 +44,11 @@ def load_function(path):
     return getattr(import_module(module_path), name)
 
 
+# Sent by the modulestores whenever an item is updated or deleted, so that
+# data derived from course content can be kept up to date
+modulestore_update_signal = Signal(providing_args=['modulestore', 'course_id', 'location'])
+
+
 def create_modulestore_instance(engine, doc_store_config, options):
     """
     This will return a new instance of a modulestore given an engine and options
@@ -56,15 +67,10 @@ def create_modulestore_instance(engine, doc_store_config, options):
     else:
         request_cache = None
 
-    try:
-        metadata_inheritance_cache = get_cache('mongo_metadata_inheritance')
-    except InvalidCacheBackendError:
-        metadata_inheritance_cache = get_cache('default')
-
     return class_(
-        metadata_inheritance_cache_subsystem=metadata_inheritance_cache,
+        metadata_inheritance_cache_subsystem=_metadata_inheritance_cache(),
         request_cache=request_cache,
-        modulestore_update_signal=Signal(providing_args=['modulestore', 'course_id', 'location']),
+        modulestore_update_signal=modulestore_update_signal,
         xblock_mixins=getattr(settings, 'XBLOCK_MIXINS', ()),
         xblock_select=getattr(settings, 'XBLOCK_SELECT_FUNCTION', None),
         doc_store_config=doc_store_config,
@@ -72,6 +78,65 @@ def create_modulestore_instance(engine, doc_store_config, options):
     )
 
 
+def _metadata_inheritance_cache():
+    """
+    Return the cache shared by the LMS and Studio for data derived from course content
+    """
+    try:
+        return get_cache('mongo_metadata_inheritance')
+    except InvalidCacheBackendError:
+        return get_cache('default')
+
+
+def _course_content_version_key(course_id):
+    """
+    Return the cache key of the content version token for the course `course_id`
+    """
+    return u'modulestore.course_content_version.{}'.format(course_id)
+
+
+def course_content_version(course_id):
+    """
+    Return an opaque token identifying the current version of the published
+    content of the course `course_id`. The token changes whenever a published
+    item in that course is updated or deleted through the Mongo modulestore,
+    so it can be used as part of the key for data computed from the content
+    students see (e.g. grades).
+
+    Only the Mongo modulestore reports its changes, so the token must not be
+    used for courses in any other store (see `get_modulestore_type`).
+    """
+    cache = _metadata_inheritance_cache()
+    key = _course_content_version_key(course_id)
+    version = cache.get(key)
+    if version is None:
+        # add() so that concurrent processes agree on a single token
+        cache.add(key, uuid4().hex, COURSE_CONTENT_VERSION_TIMEOUT)
+        version = cache.get(key)
+    return version
+
+
+def _bump_course_content_version(sender, modulestore=None, location=None, **kwargs):  # pylint: disable=W0613, W0621
+    """
+    Receiver for `modulestore_update_signal` that gives the updated course a new content version,
+    unless only a draft changed
+    """
+    if location is None or location.revision == 'draft':
+        return
+    if location.category == 'course':
+        course_ids = [location.course_id]
+    else:
+        # item locations don't include the run of their course
+        course_ids = modulestore.get_course_ids_for_item(location)
+    _metadata_inheritance_cache().set_many(
+        dict((_course_content_version_key(course_id), uuid4().hex) for course_id in course_ids),
+        COURSE_CONTENT_VERSION_TIMEOUT
+    )
+
+
+modulestore_update_signal.connect(_bump_course_content_version)
+
+
 def get_default_store_name_for_current_request():
     """
     This method will return the appropriate default store mapping for the current Django request,
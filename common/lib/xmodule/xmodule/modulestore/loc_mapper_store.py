@@ -1,8 +1,10 @@
 '''
 Method for converting among our differing Location/Locator whatever reprs
 '''
+from collections import OrderedDict
 from random import randint
 import re
+import threading
 import pymongo
 import bson.son
 
@@ -11,6 +13,59 @@ from xmodule.modulestore.locator import BlockUsageLocator, CourseLocator
 from xmodule.modulestore import Location
 import urllib
 
+# number of courses whose map entries each LocMapperStore keeps in memory
+MAP_ENTRY_CACHE_SIZE = 200
+
+
+class MapEntryCache(object):
+    """
+    A bounded, thread-safe LRU of the location map entries of courses, decoded for
+    lookups, so that translating the blocks of a course doesn't query the mapping
+    table for each block which isn't in the shared cache.
+
+    The entries may be out of date if another process changed them, so they're only
+    trusted to find translations which exist: callers reload them on a miss.
+    """
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Return the entry for key, or None
+        """
+        with self._lock:
+            value = self._entries.pop(key, None)
+            if value is not None:
+                self._entries[key] = value
+            return value
+
+    def set(self, key, value):
+        """
+        Store the entry for key, evicting the least recently used entries to make room
+        """
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = value
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, *keys):
+        """
+        Drop the entries for keys
+        """
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self):
+        """
+        Drop all of the entries
+        """
+        with self._lock:
+            self._entries.clear()
+
 
 class LocMapperStore(object):
     '''
@@ -49,6 +104,7 @@ class LocMapperStore(object):
         self.location_map = self.db[collection + '.location_map']
         self.location_map.write_concern = {'w': 1}
         self.cache = cache
+        self.map_entry_cache = MapEntryCache(MAP_ENTRY_CACHE_SIZE)
 
     # location_map functions
     def create_map_entry(self, course_location, package_id=None, draft_branch='draft', prod_branch='published',
@@ -104,6 +160,12 @@ class LocMapperStore(object):
             'prod_branch': prod_branch,
             'block_map': block_map or {},
         })
+        # the new entry may change which entry queries for the org/course and the package_id find
+        self.map_entry_cache.delete(
+            ('location', self._generate_location_course_id(location_id)),
+            ('location', u'{0.org}/{0.course}'.format(course_location)),
+            ('package', package_id),
+        )
         return package_id
 
     def translate_location(self, old_style_course_id, location, published=True, add_entry_if_missing=True):
@@ -136,26 +198,117 @@ class LocMapperStore(object):
         if cached_value:
             return cached_value
 
-        maps = self.location_map.find(location_id)
-        maps = list(maps)
-        if len(maps) == 0:
+        published_usage, draft_usage = self._translate_location_with_map(
+            location, location_id, add_entry_if_missing, {}
+        )
+        self._cache_location_map_entry(old_style_course_id, location, published_usage, draft_usage)
+        return published_usage if published else draft_usage
+
+    def translate_locations(self, old_style_course_id, locations, published=True, add_entry_if_missing=True):
+        """
+        Translate each of the given module locations to a Locator, as translate_location does, returning the
+        Locators in the same order. The cache is read with one get_many for all of the locations, and the
+        mapping table is queried at most once for each course of the ones which aren't cached.
+
+        Raises as translate_location does if any of the locations can't be translated.
+
+        :param old_style_course_id: the course_id of all of the locations (optional, will use each location)
+        :param locations: a list of Locations pointing to modules
+        """
+        if not locations:
+            return []
+
+        location_ids = []
+        course_ids = []
+        cache_keys = []
+        for location in locations:
+            location_id = self._interpret_location_course_id(old_style_course_id, location)
+            if old_style_course_id is None:
+                course_id = self._generate_location_course_id(location_id)
+            else:
+                course_id = old_style_course_id
+            location_ids.append(location_id)
+            course_ids.append(course_id)
+            cache_keys.append(self._locator_cache_key(course_id, location))
+        cached = self.cache.get_many(cache_keys)
+
+        # the map entries found for each course, so they're only looked up once
+        map_entries = {}
+        to_cache = {}
+        results = []
+        for location, location_id, course_id, cache_key in zip(locations, location_ids, course_ids, cache_keys):
+            usages = cached.get(cache_key)
+            if usages is None:
+                usages = self._translate_location_with_map(location, location_id, add_entry_if_missing, map_entries)
+                # so that repeats of the location don't translate it again
+                cached[cache_key] = usages
+                to_cache.update(self._location_map_cache_entries(course_id, location, *usages))
+            results.append(usages[0] if published else usages[1])
+        if to_cache:
+            self.cache.set_many(to_cache)
+        return results
+
+    def _translate_location_with_map(self, location, location_id, add_entry_if_missing, map_entries):
+        """
+        Translate location using the map entry found by location_id, returning the published and draft
+        BlockUsageLocators. Map entries are looked up in and added to map_entries, a dict of
+        (entry, from_memory) pairs keyed by the course id made from location_id.
+        """
+        entry_key = self._generate_location_course_id(location_id)
+        entry, from_memory = map_entries.get(entry_key, (None, False))
+        if entry is None:
+            entry, from_memory = self._get_map_entry(location_id)
+        if entry is None:
             if add_entry_if_missing:
                 # create a new map
                 course_location = location.replace(category='course', name=location_id['_id']['name'])
                 self.create_map_entry(course_location)
-                entry = self.location_map.find_one(location_id)
+                entry, from_memory = self._get_map_entry(location_id)
             else:
                 raise ItemNotFoundError()
-        elif len(maps) == 1:
-            entry = maps[0]
-        else:
-            # find entry w/o name, if any; otherwise, pick arbitrary
-            entry = maps[0]
-            for item in maps:
-                if 'name' not in item['_id']:
-                    entry = item
-                    break
 
+        try:
+            block_id = self._find_block_id(entry, location, location_id, add_entry_if_missing and not from_memory)
+        except ItemNotFoundError:
+            if not from_memory:
+                raise
+            # another process may have added the block; so, reload the entry before giving up
+            entry, from_memory = self._get_map_entry(location_id, reload_entry=True)
+            block_id = self._find_block_id(entry, location, location_id, add_entry_if_missing)
+        map_entries[entry_key] = (entry, from_memory)
+
+        published_usage = BlockUsageLocator(
+            package_id=entry['course_id'], branch=entry['prod_branch'], block_id=block_id)
+        draft_usage = BlockUsageLocator(
+            package_id=entry['course_id'], branch=entry['draft_branch'], block_id=block_id)
+        return published_usage, draft_usage
+
+    def _get_map_entry(self, location_id, reload_entry=False):
+        """
+        Return the map entry which location_id finds, or None if there isn't one, and whether it came
+        from the process's map entry cache rather than the mapping table. If several entries match,
+        it prefers the one w/o a name.
+        """
+        key = ('location', self._generate_location_course_id(location_id))
+        maps = None if reload_entry else self.map_entry_cache.get(key)
+        from_memory = maps is not None
+        if maps is None:
+            maps = list(self.location_map.find(location_id))
+            if maps:
+                self.map_entry_cache.set(key, maps)
+        if len(maps) == 0:
+            return None, from_memory
+        # find entry w/o name, if any; otherwise, pick arbitrary
+        for item in maps:
+            if 'name' not in item['_id']:
+                return item, from_memory
+        return maps[0], from_memory
+
+    def _find_block_id(self, entry, location, location_id, add_entry_if_missing):
+        """
+        Return the block_id which entry maps location to, adding one to the map if there isn't one
+        and add_entry_if_missing.
+        """
         block_id = entry['block_map'].get(self.encode_key_for_mongo(location.name))
         if block_id is None:
             if add_entry_if_missing:
@@ -178,18 +331,7 @@ class LocMapperStore(object):
                 raise ItemNotFoundError()
         else:
             raise InvalidLocationError()
-
-        published_usage = BlockUsageLocator(
-            package_id=entry['course_id'], branch=entry['prod_branch'], block_id=block_id)
-        draft_usage = BlockUsageLocator(
-            package_id=entry['course_id'], branch=entry['draft_branch'], block_id=block_id)
-        if published:
-            result = published_usage
-        else:
-            result = draft_usage
-
-        self._cache_location_map_entry(old_style_course_id, location, published_usage, draft_usage)
-        return result
+        return block_id
 
     def translate_locator_to_location(self, locator, get_course=False):
         """
@@ -216,20 +358,77 @@ class LocMapperStore(object):
         if cached_value:
             return cached_value
 
+        return self._translate_locator_with_map(locator, get_course, {})
+
+    def translate_locators_to_locations(self, locators, get_course=False):
+        """
+        Translate each of the given Locators to an old style Location, as translate_locator_to_location
+        does, returning the Locations (or None for those which have no mapping) in the same order. The
+        cache is read with one get_many for all of the locators, and the mapping table is queried at
+        most once for each package_id of the ones which aren't cached.
+
+        :param locators: a list of BlockUsageLocators
+        """
+        if not locators:
+            return []
+
+        if get_course:
+            cache_keys = [self._course_location_cache_key(locator.package_id) for locator in locators]
+        else:
+            cache_keys = [unicode(locator) for locator in locators]
+        cached = self.cache.get_many(cache_keys)
+
+        # the decoded map entries found for each package_id, so they're only looked up once
+        package_maps = {}
+        results = []
+        for locator, cache_key in zip(locators, cache_keys):
+            location = cached.get(cache_key)
+            if location is None:
+                location = self._translate_locator_with_map(locator, get_course, package_maps)
+            results.append(location)
+        return results
+
+    def _translate_locator_with_map(self, locator, get_course, package_maps):
+        """
+        Translate locator using the decoded map entries of its package_id, which are looked up in
+        and added to package_maps, a dict of (decoded entries, from_memory) pairs keyed by package_id.
+        Returns None if there's no mapping.
+        """
+        decoded, from_memory = package_maps.get(locator.package_id, (None, False))
+        if decoded is None:
+            decoded, from_memory = self._get_decoded_package_map(locator.package_id)
+        result = self._find_location(decoded, locator, get_course)
+        if result is None and from_memory:
+            # another process may have mapped the block; so, reload the entries before giving up
+            decoded, from_memory = self._get_decoded_package_map(locator.package_id, reload_entry=True)
+            result = self._find_location(decoded, locator, get_course)
+        package_maps[locator.package_id] = (decoded, from_memory)
+        return result
+
+    def _get_decoded_package_map(self, package_id, reload_entry=False):
+        """
+        Return the map entries which map to package_id decoded into a list of (course Location,
+        {block_id: Location}) pairs, one for each entry, and whether they came from the process's map
+        entry cache rather than the mapping table. Decoding the entries caches all of their translations.
+        """
+        key = ('package', package_id)
+        decoded = None if reload_entry else self.map_entry_cache.get(key)
+        if decoded is not None:
+            return decoded, True
+
         # This does not require that the course exist in any modulestore
         # only that it has a mapping entry.
-        maps = self.location_map.find({'course_id': locator.package_id})
-        # look for one which maps to this block block_id
-        if maps.count() == 0:
-            return None
-        result = None
-        for candidate in maps:
-            if get_course and 'name' in candidate['_id']:
-                candidate_id = candidate['_id']
-                return Location(
+        decoded = []
+        for candidate in self.location_map.find({'course_id': package_id}):
+            candidate_id = candidate['_id']
+            course_location = None
+            if 'name' in candidate_id:
+                course_location = Location(
                     'i4x', candidate_id['org'], candidate_id['course'], 'course', candidate_id['name']
                 )
-            old_course_id = self._generate_location_course_id(candidate['_id'])
+            old_course_id = self._generate_location_course_id(candidate_id)
+            locations = {}
+            to_cache = {}
             for old_name, cat_to_usage in candidate['block_map'].iteritems():
                 for category, block_id in cat_to_usage.iteritems():
                     # cache all entries and then figure out if we have the one we want
@@ -238,8 +437,8 @@ class LocMapperStore(object):
                     # trying to access things.
                     location = Location(
                         'i4x',
-                        candidate['_id']['org'],
-                        candidate['_id']['course'],
+                        candidate_id['org'],
+                        candidate_id['course'],
                         category,
                         self.decode_key_from_mongo(old_name),
                         None)
@@ -249,12 +448,31 @@ class LocMapperStore(object):
                     draft_locator = BlockUsageLocator(
                         candidate['course_id'], branch=candidate['draft_branch'], block_id=block_id
                     )
-                    self._cache_location_map_entry(old_course_id, location, published_locator, draft_locator)
+                    to_cache.update(
+                        self._location_map_cache_entries(old_course_id, location, published_locator, draft_locator)
+                    )
+                    locations[block_id] = location
+                    if category == 'course' and 'name' not in candidate_id:
+                        course_location = location
+            if to_cache:
+                self.cache.set_many(to_cache)
+            decoded.append((course_location, locations))
 
-                    if get_course and category == 'course':
-                        result = location
-                    elif not get_course and block_id == locator.block_id:
-                        result = location
+        if decoded:
+            self.map_entry_cache.set(key, decoded)
+        return decoded, False
+
+    @staticmethod
+    def _find_location(decoded, locator, get_course):
+        """
+        Find the Location of locator, or of its course if get_course, in the decoded map entries of its
+        package_id. Returns None if none of them map it.
+        """
+        for course_location, locations in decoded:
+            if get_course:
+                result = course_location
+            else:
+                result = locations.get(locator.block_id)
             if result is not None:
                 return result
         return None
@@ -397,7 +615,7 @@ class LocMapperStore(object):
         """
         See if the location x published pair is in the cache. If so, return the mapped locator.
         """
-        entry = self.cache.get(u'{}+{}'.format(old_course_id, location.url()))
+        entry = self.cache.get(self._locator_cache_key(old_course_id, location))
         if entry is not None:
             if published:
                 return entry[0]
@@ -429,7 +647,7 @@ class LocMapperStore(object):
         See if the package_id is in the cache. If so, return the mapped location to the
         course root.
         """
-        return self.cache.get(u'courseId+{}'.format(locator_package_id))
+        return self.cache.get(self._course_location_cache_key(locator_package_id))
 
     def _cache_course_locator(self, old_course_id, published_course_locator, draft_course_locator):
         """
@@ -445,11 +663,31 @@ class LocMapperStore(object):
         Also caches the inverse. If the location is category=='course', it caches it for
         the get_course query
         """
+        self.cache.set_many(self._location_map_cache_entries(old_course_id, location, published_usage, draft_usage))
+
+    def _location_map_cache_entries(self, old_course_id, location, published_usage, draft_usage):
+        """
+        Return the dict of cache entries which _cache_location_map_entry sets
+        """
         setmany = {}
         if location.category == 'course':
-            setmany[u'courseId+{}'.format(published_usage.package_id)] = location
+            setmany[self._course_location_cache_key(published_usage.package_id)] = location
         setmany[unicode(published_usage)] = location
         setmany[unicode(draft_usage)] = location
-        setmany[u'{}+{}'.format(old_course_id, location.url())] = (published_usage, draft_usage)
+        setmany[self._locator_cache_key(old_course_id, location)] = (published_usage, draft_usage)
         setmany[old_course_id] = (published_usage, draft_usage)
-        self.cache.set_many(setmany)
+        return setmany
+
+    @staticmethod
+    def _locator_cache_key(old_course_id, location):
+        """
+        The cache key of the Locators of location
+        """
+        return u'{}+{}'.format(old_course_id, location.url())
+
+    @staticmethod
+    def _course_location_cache_key(package_id):
+        """
+        The cache key of the course Location of package_id
+        """
+        return u'courseId+{}'.format(package_id)
@@ -79,6 +79,39 @@ class MixedModuleStore(ModuleStoreWriteBase):
         locator = loc_mapper().translate_location(course_id, reference, reference.revision == 'draft', True)
         return unicode(locator) if stringify else locator
 
+    def _locators_to_locations(self, references):
+        """
+        Convert the referenced locators to locations casting to and from strings as necessary,
+        translating them all at once
+        """
+        locators = [
+            BlockUsageLocator(url=reference) if isinstance(reference, basestring) else reference
+            for reference in references
+        ]
+        locations = loc_mapper().translate_locators_to_locations(locators)
+        return [
+            location.url() if isinstance(reference, basestring) else location
+            for reference, location in zip(references, locations)
+        ]
+
+    def _locations_to_locators(self, course_id, references):
+        """
+        Convert the referenced locations to locators casting to and from strings as necessary,
+        translating all of those of each revision at once
+        """
+        locations = [Location(reference) for reference in references]
+        locators = [None] * len(locations)
+        for published in (False, True):
+            indices = [
+                index for index, location in enumerate(locations) if (location.revision == 'draft') == published
+            ]
+            translated = loc_mapper().translate_locations(
+                course_id, [locations[index] for index in indices], published, True
+            )
+            for index, locator in zip(indices, translated):
+                locators[index] = unicode(locator) if isinstance(references[index], basestring) else locator
+        return locators
+
     def _incoming_reference_adaptor(self, store, course_id, reference):
         """
         Convert the reference to the type the persistence layer wants
@@ -89,34 +122,42 @@ class MixedModuleStore(ModuleStoreWriteBase):
             return self._locator_to_location(reference)
         return self._location_to_locator(course_id, reference)
 
-    def _outgoing_reference_adaptor(self, store, course_id, reference):
+    def _incoming_references_adaptor(self, store, course_id, references):
         """
-        Convert the reference to the type the application wants
+        Convert the list of references to the type the persistence layer wants
         """
         if issubclass(store.reference_type, Location if self.use_locations else Locator):
-            return reference
+            return references
+        if store.reference_type == Location:
+            return self._locators_to_locations(references)
+        return self._locations_to_locators(course_id, references)
+
+    def _outgoing_references_adaptor(self, store, course_id, references):
+        """
+        Convert the list of references to the type the application wants
+        """
+        if issubclass(store.reference_type, Location if self.use_locations else Locator):
+            return references
         if store.reference_type == Location:
-            return self._location_to_locator(course_id, reference)
-        return self._locator_to_location(reference)
+            return self._locations_to_locators(course_id, references)
+        return self._locators_to_locations(references)
 
     def _xblock_adaptor_iterator(self, adaptor, string_converter, store, course_id, xblock):
         """
-        Change all reference fields in this xblock to the type expected by the receiving layer
+        Change all reference fields in this xblock to the type expected by the receiving layer.
+        adaptor converts a list of references.
         """
         for field in xblock.fields.itervalues():
             if field.is_set_on(xblock):
                 if isinstance(field, Reference):
                     field.write_to(
                         xblock,
-                        adaptor(store, course_id, field.read_from(xblock))
+                        adaptor(store, course_id, [field.read_from(xblock)])[0]
                     )
                 elif isinstance(field, ReferenceList):
                     field.write_to(
                         xblock,
-                        [
-                            adaptor(store, course_id, ref)
-                            for ref in field.read_from(xblock)
-                        ]
+                        adaptor(store, course_id, field.read_from(xblock))
                     )
                 elif isinstance(field, String):
                     # replace links within the string
@@ -131,7 +172,7 @@ class MixedModuleStore(ModuleStoreWriteBase):
             course_id, store.reference_type, xblock.location
         )
         return self._xblock_adaptor_iterator(
-            self._incoming_reference_adaptor, string_converter, store, course_id, xblock
+            self._incoming_references_adaptor, string_converter, store, course_id, xblock
         )
 
     def _outgoing_xblock_adaptor(self, store, course_id, xblock):
@@ -142,7 +183,7 @@ class MixedModuleStore(ModuleStoreWriteBase):
             course_id, xblock.location.__class__, xblock.location
         )
         return self._xblock_adaptor_iterator(
-            self._outgoing_reference_adaptor, string_converter, store, course_id, xblock
+            self._outgoing_references_adaptor, string_converter, store, course_id, xblock
         )
 
     CONVERT_RE = re.compile(r"/jump_to_id/({}+)".format(ALLOWED_ID_CHARS))
@@ -325,8 +366,7 @@ class MixedModuleStore(ModuleStoreWriteBase):
         store = self._get_modulestore_for_courseid(course_id)
         decoded_ref = self._incoming_reference_adaptor(store, course_id, location)
         parents = store.get_parent_locations(decoded_ref, course_id)
-        return [self._outgoing_reference_adaptor(store, course_id, reference)
-                for reference in parents]
+        return self._outgoing_references_adaptor(store, course_id, parents)
 
     def get_modulestore_type(self, course_id):
         """
@@ -15,9 +15,12 @@ structure:
 import pymongo
 import sys
 import logging
-import copy
+import threading
+import time
 
 from bson.son import SON
+from collections import OrderedDict
+from contextlib import contextmanager
 from fs.osfs import OSFS
 from itertools import repeat
 from path import path
@@ -38,6 +41,16 @@ from xblock.core import XBlock
 
 log = logging.getLogger(__name__)
 
+# categories which can have children that inherit their metadata
+# note this is a bit ugly as when we add new categories of containers, we have to add it here
+INHERITANCE_CONTAINER_CATEGORIES = [
+    'course', 'chapter', 'sequential', 'vertical', 'videosequence',
+    'wrapper', 'problemset', 'conditional', 'randomize'
+]
+
+# number of item writes queued by `MongoModuleStore.batched_item_writes` before they're flushed
+ITEM_WRITE_BATCH_SIZE = 500
+
 
 def get_course_id_no_run(location):
     '''
@@ -202,6 +215,10 @@ class CachingDescriptorSystem(MakoDescriptorSystem):
                     # to python values
                     metadata_to_inherit = self.cached_metadata.get(non_draft_loc.url(), {})
                     inherit_metadata(module, metadata_to_inherit)
+                if json_data['location'].get('revision') != location.revision:
+                    # the draft store caches drafts under their published locations, so
+                    # mark them as drafts, as it does for the items it loads itself
+                    module.is_draft = True
                 # decache any computed pending field settings
                 module.save()
                 return module
@@ -251,6 +268,87 @@ def metadata_cache_key(location):
     return u"{0.org}/{0.course}".format(location)
 
 
+def inheritance_structure_cache_key(location):
+    """Return the cache key for the inheritance structure of the course of `location`."""
+    return u"{0.org}/{0.course}/structure".format(location)
+
+
+def inheritance_generation_cache_key(location):
+    """Return the cache key for the generation of the inheritance data cached for the course of `location`."""
+    return u"{0.org}/{0.course}/generation".format(location)
+
+
+def generation_cache_key(key, generation):
+    """Return the key which the data for `key` is cached under in the caching subsystem in `generation`."""
+    return u"{0}/{1}".format(key, generation)
+
+
+def _inheritance_record_filter():
+    """
+    Return the fields needed from a container's record to compute metadata inheritance
+    """
+    # we just want the Location, children, and inheritable metadata
+    record_filter = {'_id': 1, 'definition.children': 1}
+
+    # just get the inheritable metadata since that is all we need for the computation
+    # this minimizes both data pushed over the wire
+    for field_name in InheritanceMixin.fields:
+        record_filter['metadata.{0}'.format(field_name)] = 1
+    return record_filter
+
+
+def _compute_inherited_metadata(blocks, url, metadata, metadata_to_inherit):
+    """
+    Record in metadata_to_inherit what each descendant of the container at url
+    inherits, given that the container's own (inherited + set) metadata is `metadata`.
+
+    Children which are containers get a new dict layered over `metadata`. Leaves
+    share their parent's dict, and the values are shared rather than copied, so
+    none of the dicts may be modified once computed.
+    """
+    # go through all the children and recurse, but only if we have
+    # them in the structure. Remember it does not contain leaf nodes
+    for child in blocks[url]['children']:
+        if child in blocks:
+            child_metadata = dict(metadata)
+            child_metadata.update(blocks[child]['metadata'])
+            metadata_to_inherit[child] = child_metadata
+            _compute_inherited_metadata(blocks, child, child_metadata, metadata_to_inherit)
+        else:
+            # this is likely a leaf node, so let's record what metadata we need to inherit
+            metadata_to_inherit[child] = metadata
+
+
+def _compute_metadata_inheritance_tree(structure):
+    """
+    Return the map of url -> inherited metadata for the course inheritance structure
+    """
+    metadata_to_inherit = {}
+    root = structure['root']
+    if root is not None and root in structure['blocks']:
+        _compute_inherited_metadata(
+            structure['blocks'], root, structure['blocks'][root]['metadata'], metadata_to_inherit
+        )
+    return metadata_to_inherit
+
+
+def _inheritance_descendants(blocks, url):
+    """
+    Return the urls of everything below the container at url in the inheritance structure blocks
+    """
+    descendants = set()
+    to_process = [url]
+    while to_process:
+        block = blocks.get(to_process.pop())
+        if block is None:
+            continue
+        for child in block['children']:
+            if child not in descendants:
+                descendants.add(child)
+                to_process.append(child)
+    return descendants
+
+
 class MongoModuleStore(ModuleStoreWriteBase):
     """
     A Mongodb backed ModuleStore
@@ -313,75 +411,101 @@ class MongoModuleStore(ModuleStoreWriteBase):
         self.error_tracker = error_tracker
         self.render_template = render_template
         self.ignore_write_events_on_courses = []
+        # per thread, so that a batch only queues the writes of the thread which started it
+        self._item_write_state = threading.local()
 
-    def compute_metadata_inheritance_tree(self, location):
-        '''
-        TODO (cdodge) This method can be deleted when the 'split module store' work has been completed
-        '''
-
+    def _get_inheritance_structure(self, location):
+        """
+        Return the part of the course for location which determines metadata inheritance:
+        {'root': <course url>, 'blocks': {<container url>: {'children': [...], 'metadata': {...}}}}
+        where the metadata only contains inheritable fields.
+        """
         # get all collections in the course, this query should not return any leaf nodes
         # note this is a bit ugly as when we add new categories of containers, we have to add it here
         query = {'_id.org': location.org,
                  '_id.course': location.course,
-                 '_id.category': {'$in': ['course', 'chapter', 'sequential', 'vertical', 'videosequence',
-                                          'wrapper', 'problemset', 'conditional', 'randomize']}
+                 '_id.category': {'$in': INHERITANCE_CONTAINER_CATEGORIES}
                  }
-        # we just want the Location, children, and inheritable metadata
-        record_filter = {'_id': 1, 'definition.children': 1}
-
-        # just get the inheritable metadata since that is all we need for the computation
-        # this minimizes both data pushed over the wire
-        for field_name in InheritanceMixin.fields:
-            record_filter['metadata.{0}'.format(field_name)] = 1
-
-        # call out to the DB
-        resultset = self.collection.find(query, record_filter)
-
-        results_by_url = {}
+        blocks = {}
         root = None
-
-        # now go through the results and order them by the location url
+        for url, block in self._collate_inheritance_records(self.collection.find(query, _inheritance_record_filter())):
+            blocks[url] = block
+            if Location(url).category == 'course':
+                root = url
+        return {'root': root, 'blocks': blocks}
+
+    @staticmethod
+    def _collate_inheritance_records(resultset):
+        """
+        Turn inheritance query results into (url, {'children': ..., 'metadata': ...}) pairs
+        """
+        blocks = {}
         for result in resultset:
             location = Location(result['_id'])
             # We need to collate between draft and non-draft
             # i.e. draft verticals will have draft children but will have non-draft parents currently
-            location = location.replace(revision=None)
-            location_url = location.url()
-            if location_url in results_by_url:
-                existing_children = results_by_url[location_url].get('definition', {}).get('children', [])
-                additional_children = result.get('definition', {}).get('children', [])
-                total_children = existing_children + additional_children
-                results_by_url[location_url].setdefault('definition', {})['children'] = total_children
-            results_by_url[location.url()] = result
-            if location.category == 'course':
-                root = location.url()
-
-        # now traverse the tree and compute down the inherited metadata
-        metadata_to_inherit = {}
-
-        def _compute_inherited_metadata(url):
-            """
-            Helper method for computing inherited metadata for a specific location url
-            """
-            my_metadata = results_by_url[url].get('metadata', {})
-
-            # go through all the children and recurse, but only if we have
-            # in the result set. Remember results will not contain leaf nodes
-            for child in results_by_url[url].get('definition', {}).get('children', []):
-                if child in results_by_url:
-                    new_child_metadata = copy.deepcopy(my_metadata)
-                    new_child_metadata.update(results_by_url[child].get('metadata', {}))
-                    results_by_url[child]['metadata'] = new_child_metadata
-                    metadata_to_inherit[child] = new_child_metadata
-                    _compute_inherited_metadata(child)
-                else:
-                    # this is likely a leaf node, so let's record what metadata we need to inherit
-                    metadata_to_inherit[child] = my_metadata
+            location_url = location.replace(revision=None).url()
+            children = result.get('definition', {}).get('children', [])
+            if location_url in blocks:
+                existing_children = blocks[location_url]['children']
+                children = existing_children + [child for child in children if child not in existing_children]
+            blocks[location_url] = {'children': children, 'metadata': result.get('metadata', {})}
+        return blocks.iteritems()
 
-        if root is not None:
-            _compute_inherited_metadata(root)
+    def compute_metadata_inheritance_tree(self, location):
+        '''
+        TODO (cdodge) This method can be deleted when the 'split module store' work has been completed
+        '''
+        return _compute_metadata_inheritance_tree(self._get_inheritance_structure(location))
+
+    def _get_inheritance_generation(self, location):
+        """
+        Return the current generation of the inheritance data cached in the caching subsystem
+        for the course of location, or None if the caching subsystem doesn't keep it.
+
+        The tree and structure are cached under keys for their generation, and every write to
+        the course's containers moves it on to a new generation (see `_next_inheritance_generation`),
+        so processes never patch or read data cached before another process' write.
+        """
+        cache = self.metadata_inheritance_cache_subsystem
+        key = inheritance_generation_cache_key(location)
+        generation = cache.get(key)
+        if generation is None:
+            # start from the time rather than 0, so that if the generation was evicted,
+            # it doesn't go back to one whose data may still be cached
+            cache.add(key, int(time.time() * 1000))
+            generation = cache.get(key)
+        return generation
+
+    def _next_inheritance_generation(self, location):
+        """
+        Move the inheritance data cached for the course of location on to a new generation after
+        a write to the course, and return the new generation (or None, see `_get_inheritance_generation`).
+        """
+        if self._get_inheritance_generation(location) is None:
+            return None
+        try:
+            # incr is atomic, so each writer gets a generation of its own
+            return self.metadata_inheritance_cache_subsystem.incr(inheritance_generation_cache_key(location))
+        except ValueError:
+            # the generation was evicted in between
+            return None
+
+    def _cache_inheritance(self, location, tree, structure, generation):
+        """
+        Write the metadata inheritance tree and the structure it was computed from
+        to the caching subsystem (e.g. memcached) for generation, and the request cache, if available
+        """
+        key = metadata_cache_key(location)
+        structure_key = inheritance_structure_cache_key(location)
+        if self.metadata_inheritance_cache_subsystem is not None and generation is not None:
+            self.metadata_inheritance_cache_subsystem.set(generation_cache_key(key, generation), tree)
+            self.metadata_inheritance_cache_subsystem.set(generation_cache_key(structure_key, generation), structure)
 
-        return metadata_to_inherit
+        if self.request_cache is not None:
+            # we can't assume these parts of the request cache dict have been defined
+            self.request_cache.data.setdefault('metadata_inheritance', {})[key] = tree
+            self.request_cache.data.setdefault('metadata_inheritance_structure', {})[structure_key] = structure
 
     def get_cached_metadata_inheritance_tree(self, location, force_refresh=False):
         '''
@@ -389,35 +513,33 @@ class MongoModuleStore(ModuleStoreWriteBase):
         '''
         key = metadata_cache_key(location)
         tree = {}
+        generation = None
 
-        if not force_refresh:
+        if force_refresh:
+            # refreshes follow writes to the course, so they start a new generation
+            if self.metadata_inheritance_cache_subsystem is not None:
+                generation = self._next_inheritance_generation(location)
+        else:
             # see if we are first in the request cache (if present)
             if self.request_cache is not None and key in self.request_cache.data.get('metadata_inheritance', {}):
                 return self.request_cache.data['metadata_inheritance'][key]
 
             # then look in any caching subsystem (e.g. memcached)
             if self.metadata_inheritance_cache_subsystem is not None:
-                tree = self.metadata_inheritance_cache_subsystem.get(key, {})
+                generation = self._get_inheritance_generation(location)
+                if generation is not None:
+                    tree = self.metadata_inheritance_cache_subsystem.get(generation_cache_key(key, generation), {})
             else:
                 logging.warning('Running MongoModuleStore without a metadata_inheritance_cache_subsystem. This is OK in localdev and testing environment. Not OK in production.')
 
         if not tree:
             # if not in subsystem, or we are on force refresh, then we have to compute
-            tree = self.compute_metadata_inheritance_tree(location)
-
-            # now write out computed tree to caching subsystem (e.g. memcached), if available
-            if self.metadata_inheritance_cache_subsystem is not None:
-                self.metadata_inheritance_cache_subsystem.set(key, tree)
-
-        # now populate a request_cache, if available. NOTE, we are outside of the
-        # scope of the above if: statement so that after a memcache hit, it'll get
-        # put into the request_cache
-        if self.request_cache is not None:
-            # we can't assume the 'metadatat_inheritance' part of the request cache dict has been
-            # defined
-            if 'metadata_inheritance' not in self.request_cache.data:
-                self.request_cache.data['metadata_inheritance'] = {}
-            self.request_cache.data['metadata_inheritance'][key] = tree
+            structure = self._get_inheritance_structure(location)
+            tree = _compute_metadata_inheritance_tree(structure)
+            self._cache_inheritance(location, tree, structure, generation)
+        elif self.request_cache is not None:
+            # NOTE, after a memcache hit, it'll get put into the request_cache
+            self.request_cache.data.setdefault('metadata_inheritance', {})[key] = tree
 
         return tree
 
@@ -430,6 +552,218 @@ class MongoModuleStore(ModuleStoreWriteBase):
         if pseudo_course_id not in self.ignore_write_events_on_courses:
             self.get_cached_metadata_inheritance_tree(location, force_refresh=True)
 
+    def update_cached_metadata_inheritance_tree(self, location):
+        """
+        Bring the cached metadata inheritance tree up to date after a write to location.
+
+        Only the inheritable metadata and children of containers are in the tree, so
+        writes to leaves don't change it, and a write to a container only changes
+        the part of the tree below the container. Rather than recomputing the whole
+        course, this reloads just the container and recomputes its subtree from the
+        cached inheritance structure. Falls back to a full refresh if nothing is cached.
+
+        The cached tree is only patched if no other write to the course moved it on to a new
+        generation since the tree was read. Otherwise the other write's changes may be missing
+        from it, so the tree is recomputed.
+        """
+        location = Location(location).replace(revision=None)
+        if get_course_id_no_run(location) in self.ignore_write_events_on_courses:
+            return
+        if location.category not in INHERITANCE_CONTAINER_CATEGORIES:
+            return
+
+        key = metadata_cache_key(location)
+        structure_key = inheritance_structure_cache_key(location)
+        tree = structure = generation = None
+        if self.metadata_inheritance_cache_subsystem is not None:
+            generation = self._get_inheritance_generation(location)
+            if generation is not None:
+                tree = self.metadata_inheritance_cache_subsystem.get(generation_cache_key(key, generation))
+                structure = self.metadata_inheritance_cache_subsystem.get(
+                    generation_cache_key(structure_key, generation)
+                )
+            next_generation = self._next_inheritance_generation(location)
+            if next_generation is None or generation is None or next_generation != generation + 1:
+                # another write to the course came in between
+                tree = structure = None
+            generation = next_generation
+        elif self.request_cache is not None:
+            tree = self.request_cache.data.get('metadata_inheritance', {}).get(key)
+            structure = self.request_cache.data.get('metadata_inheritance_structure', {}).get(structure_key)
+
+        if not tree or not structure:
+            structure = self._get_inheritance_structure(location)
+            self._cache_inheritance(location, _compute_metadata_inheritance_tree(structure), structure, generation)
+            return
+
+        query = location_to_query(location)
+        # match both the draft and the published versions
+        del query['_id.revision']
+        url = location.url()
+        records = self.collection.find(query, _inheritance_record_filter())
+        block = dict(self._collate_inheritance_records(records)).get(url)
+
+        # Copy the top level dicts rather than modifying cached data in place, as they may also
+        # be held by runtimes in this request. Unchanged entries are shared.
+        old_blocks = structure['blocks']
+        blocks = dict(old_blocks)
+        if block is None:
+            blocks.pop(url, None)
+        else:
+            blocks[url] = block
+        structure = {'root': structure['root'], 'blocks': blocks}
+
+        if location.category == 'course':
+            structure['root'] = url if block is not None else None
+            tree = _compute_metadata_inheritance_tree(structure)
+        else:
+            tree = dict(tree)
+            # forget everything which used to be below the container, as it may have moved or gone
+            tree.pop(url, None)
+            for descendant in _inheritance_descendants(old_blocks, url):
+                tree.pop(descendant, None)
+
+            for parent_url, parent in blocks.iteritems():
+                if url not in parent['children']:
+                    continue
+                if parent_url == structure['root']:
+                    parent_metadata = parent['metadata']
+                elif parent_url in tree:
+                    parent_metadata = tree[parent_url]
+                else:
+                    # the parent isn't in the course tree, so neither is the container
+                    continue
+
+                if block is None:
+                    # still referenced by the parent, so treated like a leaf
+                    tree[url] = parent_metadata
+                else:
+                    metadata = dict(parent_metadata)
+                    metadata.update(block['metadata'])
+                    tree[url] = metadata
+                    _compute_inherited_metadata(blocks, url, metadata, tree)
+
+        self._cache_inheritance(location, tree, structure, generation)
+
+    def begin_bulk_write_operations(self, location):
+        """
+        Stop keeping the metadata inheritance tree for the course of location up to date on
+        every write, until `end_bulk_write_operations` is called. Returns False if writes to
+        the course were already being batched (in which case don't call `end_bulk_write_operations`).
+        """
+        pseudo_course_id = get_course_id_no_run(location)
+        if pseudo_course_id in self.ignore_write_events_on_courses:
+            return False
+        self.ignore_write_events_on_courses.append(pseudo_course_id)
+        return True
+
+    def end_bulk_write_operations(self, location):
+        """
+        Stop batching writes to the course of location and refresh its metadata inheritance tree
+        """
+        pseudo_course_id = get_course_id_no_run(location)
+        if pseudo_course_id in self.ignore_write_events_on_courses:
+            self.ignore_write_events_on_courses.remove(pseudo_course_id)
+        self.refresh_cached_metadata_inheritance_tree(location)
+
+    @contextmanager
+    def bulk_write_operations(self, location):
+        """
+        A context manager which defers recomputing the metadata inheritance tree for the course
+        of location to the end of a bulk operation (import, reorder, duplicate...) on the course.
+        """
+        started = self.begin_bulk_write_operations(location)
+        try:
+            yield
+        finally:
+            if started:
+                self.end_bulk_write_operations(location)
+
+    @property
+    def _item_write_batches(self):
+        """
+        This thread's queued item writes:
+        pseudo course id -> OrderedDict of location url -> (_id, $set update)
+        """
+        batches = getattr(self._item_write_state, 'batches', None)
+        if batches is None:
+            batches = self._item_write_state.batches = {}
+        return batches
+
+    @property
+    def _batched_update_signals(self):
+        """
+        The update signals this thread's item write batches will send once they're written:
+        pseudo course id -> location of an item written in the batch
+        """
+        signals = getattr(self._item_write_state, 'signals', None)
+        if signals is None:
+            signals = self._item_write_state.signals = {}
+        return signals
+
+    @contextmanager
+    def batched_item_writes(self, location):
+        """
+        A context manager which queues the writes of `update_item` to items in the course of
+        location, rather than making a round trip to mongo for each, and writes them in batches
+        of ITEM_WRITE_BATCH_SIZE: items which don't exist yet are inserted together, existing ones are
+        updated one by one. Meant for importing courses, where almost every item is new.
+
+        Queued writes aren't visible to reads until they're flushed, so don't read items written
+        in the batch (other than through `update_item`) until the context manager exits. Only
+        the writes of the thread which entered the context manager are queued.
+
+        The update signal isn't sent for each item written in the batch, as the item may not be
+        in mongo yet, but once for the course after the batch is written.
+        """
+        pseudo_course_id = get_course_id_no_run(location)
+        if pseudo_course_id in self._item_write_batches:
+            yield
+            return
+        self._item_write_batches[pseudo_course_id] = OrderedDict()
+        try:
+            yield
+            self._flush_item_writes(location)
+        finally:
+            del self._item_write_batches[pseudo_course_id]
+            # items may have been written before an error too, when the batch filled up
+            updated_location = self._batched_update_signals.pop(pseudo_course_id, None)
+            if updated_location is not None:
+                self.fire_updated_modulestore_signal(pseudo_course_id, updated_location)
+
+    def _flush_item_writes(self, location):
+        """
+        Write any item writes queued by `batched_item_writes` for the course of location
+        """
+        batch = self._item_write_batches.get(get_course_id_no_run(location))
+        if not batch:
+            return
+        writes = batch.values()
+        batch.clear()
+
+        existing = set(
+            Location(item['_id']).url()
+            for item in self.collection.find({'_id': {'$in': [item_id for item_id, _ in writes]}}, fields=['_id'])
+        )
+        new_items = []
+        for item_id, update in writes:
+            if Location(item_id).url() in existing:
+                self.collection.update(
+                    {'_id': item_id}, {'$set': update}, multi=False, upsert=True, safe=self.collection.safe
+                )
+            else:
+                # expand the $set's dotted keys into the document they would have upserted
+                item = {'_id': item_id}
+                for key, value in update.iteritems():
+                    parent = item
+                    path_elements = key.split('.')
+                    for path_element in path_elements[:-1]:
+                        parent = parent.setdefault(path_element, {})
+                    parent[path_elements[-1]] = value
+                new_items.append(item)
+        if new_items:
+            self.collection.insert(new_items, safe=self.collection.safe)
+
     def _clean_item_data(self, item):
         """
         Renames the '_id' field in item to 'location'
@@ -678,8 +1012,8 @@ class MongoModuleStore(ModuleStoreWriteBase):
                 'children': xmodule.children if xmodule.has_children else []
             }
         })
-        # recompute (and update) the metadata inheritance tree which is cached
-        self.refresh_cached_metadata_inheritance_tree(xmodule.location)
+        # update the metadata inheritance tree which is cached
+        self.update_cached_metadata_inheritance_tree(xmodule.location)
         self.fire_updated_modulestore_signal(get_course_id_no_run(xmodule.location), xmodule.location)
 
     def create_and_save_xmodule(self, location, definition_data=None, metadata=None, system=None):
@@ -725,6 +1059,17 @@ class MongoModuleStore(ModuleStoreWriteBase):
             self.modulestore_update_signal.send(self, modulestore=self, course_id=course_id,
                                                 location=location)
 
+    def get_course_ids_for_item(self, location):
+        """
+        Return the ids of the courses containing location: those with its org and course
+        number, as the locations of items other than courses don't include the run.
+        """
+        courses = self.collection.find(
+            {'_id.org': location.org, '_id.course': location.course, '_id.category': 'course'},
+            fields=['_id']
+        )
+        return [Location(course['_id']).course_id for course in courses]
+
     def _get_course_for_item(self, location, depth=0):
         '''
         VS[compat]
@@ -755,8 +1100,21 @@ class MongoModuleStore(ModuleStoreWriteBase):
     def _update_single_item(self, location, update):
         """
         Set update on the specified item, and raises ItemNotFoundError
-        if the location doesn't exist
+        if the location doesn't exist. Inside `batched_item_writes`, the update
+        is queued instead.
         """
+        location = Location(location)
+        batch = self._item_write_batches.get(get_course_id_no_run(location))
+        if batch is not None:
+            url = location.url()
+            if url in batch:
+                # later writes to an item override the fields set by earlier ones
+                batch[url][1].update(update)
+            else:
+                batch[url] = (namedtuple_to_son(location), dict(update))
+            if len(batch) >= ITEM_WRITE_BATCH_SIZE:
+                self._flush_item_writes(location)
+            return
 
         # See http://www.mongodb.org/display/DOCS/Updating for
         # atomic update syntax
@@ -795,6 +1153,8 @@ class MongoModuleStore(ModuleStoreWriteBase):
             self._update_single_item(xblock.location, payload)
             # for static tabs, their containing course also records their display name
             if xblock.category == 'static_tab':
+                # the course may have been written in a batch
+                self._flush_item_writes(xblock.location)
                 course = self._get_course_for_item(xblock.location)
                 # find the course's reference to this tab and update the name.
                 for tab in course.tabs:
@@ -805,11 +1165,17 @@ class MongoModuleStore(ModuleStoreWriteBase):
                             self.update_item(course, user)
                             break
 
-            # recompute (and update) the metadata inheritance tree which is cached
-            # was conditional on children or metadata having changed before dhm made one update to rule them all
-            self.refresh_cached_metadata_inheritance_tree(xblock.location)
-            # fire signal that we've written to DB
-            self.fire_updated_modulestore_signal(get_course_id_no_run(xblock.location), xblock.location)
+            # update the metadata inheritance tree which is cached
+            self.update_cached_metadata_inheritance_tree(xblock.location)
+            pseudo_course_id = get_course_id_no_run(xblock.location)
+            if pseudo_course_id in self._item_write_batches:
+                # the signal is sent once the batch is written, for a published item if there is one
+                signalled_location = self._batched_update_signals.get(pseudo_course_id)
+                if signalled_location is None or signalled_location.revision == 'draft':
+                    self._batched_update_signals[pseudo_course_id] = xblock.location
+            else:
+                # fire signal that we've written to DB
+                self.fire_updated_modulestore_signal(pseudo_course_id, xblock.location)
         except ItemNotFoundError:
             if not allow_not_found:
                 raise
@@ -835,8 +1201,8 @@ class MongoModuleStore(ModuleStoreWriteBase):
         # Must include this to avoid the django debug toolbar (which defines the deprecated "safe=False")
         # from overriding our default value set in the init method.
         self.collection.remove({'_id': Location(location).dict()}, safe=self.collection.safe)
-        # recompute (and update) the metadata inheritance tree which is cached
-        self.refresh_cached_metadata_inheritance_tree(Location(location))
+        # update the metadata inheritance tree which is cached
+        self.update_cached_metadata_inheritance_tree(Location(location))
         self.fire_updated_modulestore_signal(get_course_id_no_run(Location(location)), Location(location))
 
     def get_parent_locations(self, location, course_id):
@@ -45,6 +45,33 @@ def wrap_draft(item):
     return item
 
 
+def _prefer_drafts(items):
+    """
+    Returns the records in the query results `items`, which may include both the
+    draft and the published version of a location, with the published version dropped
+    wherever there is a draft. Drafts come first, and otherwise the order is kept.
+    """
+    drafts = []
+    published = []
+    for item in items:
+        if Location(item['_id']).revision == DRAFT:
+            drafts.append(item)
+        else:
+            published.append(item)
+
+    draft_locs_found = set(as_published(item['_id']) for item in drafts)
+    return drafts + [item for item in published if as_published(item['_id']) not in draft_locs_found]
+
+
+def _revisions_preferring_draft(location):
+    """
+    Returns the revisions to query for `location`: DRAFT, as well as the revision of `location`
+    """
+    if location.revision == DRAFT:
+        return [DRAFT]
+    return [DRAFT, location.revision]
+
+
 class DraftModuleStore(MongoModuleStore):
     """
     This mixin modifies a modulestore to give it draft semantics.
@@ -54,6 +81,8 @@ class DraftModuleStore(MongoModuleStore):
 
     This module also includes functionality to promote DRAFT modules (and optionally
     their children) to published modules.
+
+    Both revisions are fetched in the same query, and the draft picked out of the results.
     """
 
     def get_item(self, location, depth=0):
@@ -76,21 +105,13 @@ class DraftModuleStore(MongoModuleStore):
             get_children() to cache. None indicates to cache all descendents
         """
 
-        try:
-            return wrap_draft(super(DraftModuleStore, self).get_item(as_draft(location), depth=depth))
-        except ItemNotFoundError:
-            return wrap_draft(super(DraftModuleStore, self).get_item(location, depth=depth))
-
-    def get_instance(self, course_id, location, depth=0):
-        """
-        Get an instance of this location, with policy for course_id applied.
-        TODO (vshnayder): this may want to live outside the modulestore eventually
-        """
-
-        try:
-            return wrap_draft(super(DraftModuleStore, self).get_instance(course_id, as_draft(location), depth=depth))
-        except ItemNotFoundError:
-            return wrap_draft(super(DraftModuleStore, self).get_instance(course_id, location, depth=depth))
+        location = Location.ensure_fully_specified(location)
+        query = location_to_query(location, wildcard=False)
+        query['_id.revision'] = {'$in': _revisions_preferring_draft(location)}
+        items = _prefer_drafts(self.collection.find(query))
+        if not items:
+            raise ItemNotFoundError(location)
+        return wrap_draft(self._load_items(items[:1], depth)[0])
 
     def create_xmodule(self, location, definition_data=None, metadata=None, system=None):
         """
@@ -120,19 +141,11 @@ class DraftModuleStore(MongoModuleStore):
             in the request. The depth is counted in the number of calls to
             get_children() to cache. None indicates to cache all descendents
         """
-        draft_loc = as_draft(location)
-
-        draft_items = super(DraftModuleStore, self).get_items(draft_loc, course_id=course_id, depth=depth)
-        items = super(DraftModuleStore, self).get_items(location, course_id=course_id, depth=depth)
-
-        draft_locs_found = set(item.location.replace(revision=None) for item in draft_items)
-        non_draft_items = [
-            item
-            for item in items
-            if (item.location.revision != DRAFT
-                and item.location.replace(revision=None) not in draft_locs_found)
-        ]
-        return [wrap_draft(item) for item in draft_items + non_draft_items]
+        location = Location(location)
+        query = location_to_query(location)
+        query['_id.revision'] = {'$in': _revisions_preferring_draft(location)}
+        items = _prefer_drafts(self.collection.find(query, sort=[('revision', pymongo.ASCENDING)]))
+        return [wrap_draft(item) for item in self._load_items(items, depth)]
 
     def convert_to_draft(self, source_location):
         """
@@ -152,7 +165,7 @@ class DraftModuleStore(MongoModuleStore):
         except pymongo.errors.DuplicateKeyError:
             raise DuplicateItemError(original['_id'])
 
-        self.refresh_cached_metadata_inheritance_tree(draft_location)
+        self.update_cached_metadata_inheritance_tree(draft_location)
         self.fire_updated_modulestore_signal(get_course_id_no_run(draft_location), draft_location)
 
         return self._load_items([original])[0]
@@ -231,32 +244,25 @@ class DraftModuleStore(MongoModuleStore):
         super(DraftModuleStore, self).delete_item(location)
 
     def _query_children_for_cache_children(self, items):
-        # first get non-draft in a round-trip
-        to_process_non_drafts = super(DraftModuleStore, self)._query_children_for_cache_children(items)
-
-        to_process_dict = {}
-        for non_draft in to_process_non_drafts:
-            to_process_dict[Location(non_draft["_id"])] = non_draft
-
-        # now query all draft content in another round-trip
-        query = {
-            '_id': {'$in': [namedtuple_to_son(as_draft(Location(item))) for item in items]}
-        }
-        to_process_drafts = list(self.collection.find(query))
-
-        # now we have to go through all drafts and replace the non-draft
-        # with the draft. This is because the semantics of the DraftStore is to
-        # always return the draft - if available
-        for draft in to_process_drafts:
-            draft_loc = Location(draft["_id"])
-            draft_as_non_draft_loc = draft_loc.replace(revision=None)
-
-            # does non-draft exist in the collection
-            # if so, replace it
-            if draft_as_non_draft_loc in to_process_dict:
-                to_process_dict[draft_as_non_draft_loc] = draft
-
-        # convert the dict - which is used for look ups - back into a list
-        queried_children = to_process_dict.values()
-
-        return queried_children
+        """
+        Get the draft of each of the items, or else its published version, in a single round-trip
+        """
+        ids = []
+        for item in items:
+            location = Location(item)
+            ids.append(namedtuple_to_son(location))
+            if location.category not in DIRECT_ONLY_CATEGORIES:
+                ids.append(namedtuple_to_son(as_draft(location)))
+        return _prefer_drafts(self.collection.find({'_id': {'$in': ids}}))
+
+    def _cache_children(self, items, depth=0):
+        """
+        Cache drafts under their published locations as well, as that is how their parents
+        refer to them, so that loading children finds drafts in the cache instead of going
+        back to the database for each of them.
+        """
+        data = super(DraftModuleStore, self)._cache_children(items, depth)
+        for location, item in data.items():
+            if location.revision == DRAFT:
+                data[as_published(location)] = item
+        return data
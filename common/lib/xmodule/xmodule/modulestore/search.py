@@ -6,7 +6,7 @@ from .exceptions import (ItemNotFoundError, NoPathToItem)
 from . import Location
 
 
-def path_to_location(modulestore, course_id, location):
+def path_to_location(modulestore, course_id, location, outline=None):
     '''
     Try to find a course_id/chapter/section[/position] path to location in
     modulestore.  The courseware insists that the first level in the course is
@@ -29,7 +29,14 @@ def path_to_location(modulestore, course_id, location):
     If the section is a sequential or vertical, position will be the position
     of this location in that sequence.  Otherwise, position will
     be None. TODO (vshnayder): Not true yet.
+
+    outline: if given, the outline of the course computed by compute_course_outline.
+    Locations in it are looked up there, rather than searched for in modulestore.
     '''
+    if outline is not None:
+        path = outline['paths'].get(Location(location).url())
+        if path is not None:
+            return (course_id,) + tuple(path)
 
     def flatten(xs):
         '''Convert lisp-style (a, (b, (c, ()))) list into a python list.
@@ -88,8 +95,24 @@ def path_to_location(modulestore, course_id, location):
     if path is None:
         raise NoPathToItem(location)
 
-    n = len(path)
     course_id = CourseDescriptor.location_to_id(path[0])
+
+    def get_child_locations(location):
+        '''Return the locations of the children of the sequence at location.'''
+        section_desc = modulestore.get_instance(course_id, location)
+        return [c.location for c in section_desc.get_children()]
+
+    return (course_id,) + _chapter_section_position(path, get_child_locations)
+
+
+def _chapter_section_position(path, get_child_locations):
+    '''
+    Return the (chapter, section, position) for the list of locations path,
+    which leads down from a course to a location in it.  get_child_locations
+    is called with the location of each sequence in path for the locations
+    of its children.
+    '''
+    n = len(path)
     # pull out the location names
     chapter = path[1].name if n > 1 else None
     section = path[2].name if n > 2 else None
@@ -107,11 +130,66 @@ def path_to_location(modulestore, course_id, location):
         for path_index in range(2, n - 1):
             category = path[path_index].category
             if category == 'sequential' or category == 'videosequence':
-                section_desc = modulestore.get_instance(course_id, path[path_index])
-                child_locs = [c.location for c in section_desc.get_children()]
+                child_locs = get_child_locations(path[path_index])
                 # positions are 1-indexed, and should be strings to be consistent with
                 # url parsing.
                 position_list.append(str(child_locs.index(path[path_index + 1]) + 1))
         position = "_".join(position_list)
 
-    return (course_id, chapter, section, position)
+    return (chapter, section, position)
+
+
+def compute_course_outline(modulestore, course_id):
+    '''
+    Find the paths to all of the locations in the course course_id at once,
+    with a single query of modulestore, so that they can be looked up by
+    path_to_location without searching the modulestore for each one.
+
+    Return a dict with the keys
+
+        'paths': maps the url of each location in the course to the
+            (chapter, section, position) that path_to_location returns for it.
+        'url_names': maps the url_name of each location in the course to
+            its url.  If several locations share a url_name, it maps to the
+            first one found.
+
+    Only locations reachable from the course are included, as
+    path_to_location raises NoPathToItem for any others.
+    '''
+    course_location = CourseDescriptor.id_to_location(course_id)
+    items = modulestore.get_items(
+        Location('i4x', course_location.org, course_location.course, None, None),
+        course_id=course_id
+    )
+
+    # the children of each location which are in the course, as get_children only
+    # returns the children which can be loaded
+    children = {}
+    for item in items:
+        children[item.location.url()] = item.children if item.has_children else []
+    for url in children:
+        children[url] = [Location(child) for child in children[url] if Location(child).url() in children]
+
+    def get_child_locations(location):
+        '''Return the locations of the children of the sequence at location.'''
+        return children[location.url()]
+
+    paths = {}
+    url_names = {}
+    course_url = course_location.url()
+    if course_url in children:
+        # Standard DFS down from the course, keeping the first path found to each
+        # location.  The work queue has tuples (location, path-to-parent).
+        queue = [(course_location, [])]
+        while queue:
+            loc, path = queue.pop()
+            url = loc.url()
+            if url in paths:
+                continue
+            path = path + [loc]
+            paths[url] = _chapter_section_position(path, get_child_locations)
+            url_names.setdefault(loc.name, url)
+            # reversed, so that the children are taken off the queue in order
+            queue.extend((child, path) for child in reversed(children[url]))
+
+    return {'paths': paths, 'url_names': url_names}
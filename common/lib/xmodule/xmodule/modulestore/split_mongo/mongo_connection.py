@@ -1,18 +1,276 @@
 """
 Segregation of pymongo functions from the data modeling mechanisms for split modulestore.
 """
+import copy
+import logging
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from uuid import uuid4
+
 import pymongo
+from bson import BSON
+
+log = logging.getLogger(__name__)
+
+# memcached silently drops items bigger than this, so structures which are bigger
+# once compressed aren't written to the shared cache
+SHARED_CACHE_MAX_BYTES = 1024 * 1024
+
+
+class StructureVersions(object):
+    """
+    Tokens for the in-place rewrites of structures, kept in a cache shared by every process.
+
+    Structures are keyed by their _id (the course version guid). Most don't change once
+    written, but bulk operations rewrite a structure in place (see
+    `MongoConnection.update_structure`), which gives it a new token. Copies of a structure,
+    and data derived from one, are cached along with the token read before the structure
+    was, and are only used while the token is unchanged, so every process sees rewrites.
+    A token which is evicted from the shared cache is replaced by a new one, which only
+    costs rereading the structure.
+
+    Without a shared cache, the token never changes, so other processes' rewrites go unseen.
+    """
+    # how long tokens live in the shared cache
+    TIMEOUT = 60 * 60 * 24 * 7
+
+    def __init__(self, shared_cache=None):
+        """
+        :param shared_cache: a django-style cache shared by every process using the structures
+        """
+        self.shared_cache = shared_cache
+
+    @staticmethod
+    def _key(structure_id):
+        """
+        Return the key of the token of the structure with _id `structure_id` in the shared cache
+        """
+        return u'split_structure_version.{}'.format(structure_id)
+
+    def get(self, structure_id):
+        """
+        Return the current token of the structure with _id `structure_id`
+        """
+        if self.shared_cache is None:
+            return ''
+        key = self._key(structure_id)
+        version = self.shared_cache.get(key)
+        if version is None:
+            # add() so that concurrent processes agree on a single token
+            self.shared_cache.add(key, uuid4().hex, self.TIMEOUT)
+            version = self.shared_cache.get(key)
+        return version
+
+    def bump(self, structure_id):
+        """
+        Give the structure with _id `structure_id` a new token, because it was rewritten
+        """
+        if self.shared_cache is not None:
+            self.shared_cache.set(self._key(structure_id), uuid4().hex, self.TIMEOUT)
+
+
+class StructureCache(object):
+    """
+    A process-level LRU cache of structure documents, optionally backed by a
+    shared (e.g. memcache) cache.
+
+    Structures are keyed by their _id (the course version guid) and cached with their
+    token from `StructureVersions`, so copies of a structure which has since been rewritten
+    in place are never returned. Documents are kept as their BSON encoding, which bounds
+    the cache by bytes and means every hit decodes a fresh copy that callers are free to
+    modify. Structures too big for the shared cache (see SHARED_CACHE_MAX_BYTES) are only
+    cached locally, and counted in `stats`.
+    """
+    def __init__(self, max_bytes, tz_aware=True, shared_cache=None):
+        """
+        :param max_bytes: upper bound on the total size of the cached BSON
+        :param tz_aware: whether decoded datetimes should be timezone aware
+        :param shared_cache: an optional django-style cache used as a second tier
+        """
+        self.max_bytes = max_bytes
+        self.tz_aware = tz_aware
+        self.shared_cache = shared_cache
+        # _id -> (version, BSON)
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.shared_oversized = 0
+
+    @staticmethod
+    def _shared_key(key, version):
+        """
+        Return the key used for `version` of the structure with _id `key` in the shared cache
+        """
+        return u'split_structure.{}.{}'.format(key, version)
+
+    def get(self, key, version=''):
+        """
+        Return a copy of `version` of the structure with _id `key`, or None if it isn't cached
+        """
+        data = None
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                if entry[0] == version:
+                    # re-insert to mark as most recently used
+                    self._entries[key] = entry
+                    data = entry[1]
+                    self.hits += 1
+                else:
+                    # rewritten since it was cached
+                    self._size -= len(entry[1])
+
+        if data is None and self.shared_cache is not None:
+            compressed = self.shared_cache.get(self._shared_key(key, version))
+            if compressed is not None:
+                data = zlib.decompress(compressed)
+                self._store(key, version, data)
+                with self._lock:
+                    self.shared_hits += 1
+
+        if data is None:
+            with self._lock:
+                self.misses += 1
+            return None
+        return BSON(data).decode(tz_aware=self.tz_aware)
+
+    def set(self, key, structure, version=''):
+        """
+        Cache `structure` as `version` of the structure with _id `key`
+        """
+        data = BSON.encode(structure)
+        self._store(key, version, data)
+        if self.shared_cache is not None:
+            compressed = zlib.compress(data)
+            if len(compressed) > SHARED_CACHE_MAX_BYTES:
+                with self._lock:
+                    self.shared_oversized += 1
+                log.info(
+                    u'Structure %s is %d bytes compressed, too big for the shared cache', key, len(compressed)
+                )
+            else:
+                self.shared_cache.set(self._shared_key(key, version), compressed)
+
+    def delete(self, key):
+        """
+        Drop this process's copy of the structure with _id `key`. (Other versions of it in the
+        shared cache are never read once its token has changed.)
+        """
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._size -= len(entry[1])
+
+    def _store(self, key, version, data):
+        """
+        Put the BSON `data` into the local LRU, evicting the least recently used entries to make room
+        """
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            old_entry = self._entries.pop(key, None)
+            if old_entry is not None:
+                self._size -= len(old_entry[1])
+            self._entries[key] = (version, data)
+            self._size += len(data)
+            while self._size > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+    def stats(self):
+        """
+        Return a dict of the cache's hit/miss counters and size
+        """
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'shared_hits': self.shared_hits,
+                'misses': self.misses,
+                'shared_oversized': self.shared_oversized,
+                'entries': len(self._entries),
+                'bytes': self._size,
+            }
+
+
+class CourseIndexCache(object):
+    """
+    A short-lived, process-level cache of active_versions (course index) entries.
+
+    Index entries change whenever a course is edited, so entries expire after
+    `ttl` seconds, and are dropped immediately when this process writes the index.
+    """
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """
+        Return a copy of the index entry `key`, or None if it isn't cached or has expired
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] < time.time():
+                del self._entries[key]
+                entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return copy.deepcopy(entry[1])
+
+    def set(self, key, index):
+        """
+        Cache the index entry `index` under `key`
+        """
+        with self._lock:
+            self._entries[key] = (time.time() + self.ttl, copy.deepcopy(index))
+
+    def delete(self, key):
+        """
+        Drop the index entry `key` from the cache
+        """
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def stats(self):
+        """
+        Return a dict of the cache's hit/miss counters and size
+        """
+        return {'hits': self.hits, 'misses': self.misses, 'entries': len(self._entries)}
+
 
 class MongoConnection(object):
     """
     Segregation of pymongo functions from the data modeling mechanisms for split modulestore.
     """
     def __init__(
-        self, db, collection, host, port=27017, tz_aware=True, user=None, password=None, **kwargs
+        self, db, collection, host, port=27017, tz_aware=True, user=None, password=None,
+        structure_cache_bytes=0, index_cache_ttl=0, shared_cache=None, version_cache=None, **kwargs
     ):
         """
         Create & open the connection, authenticate, and provide pointers to the collections
+
+        :param structure_cache_bytes: size of the process-level structure cache; 0 disables it.
+            It's also disabled without a version_cache, as it couldn't see other processes' rewrites.
+        :param index_cache_ttl: seconds to cache course index entries for; 0 disables caching them
+        :param shared_cache: optional django-style cache to use as a second tier for structures
+        :param version_cache: django-style cache shared by every process, which holds the tokens
+            of the structures' in-place rewrites (see StructureVersions)
         """
+        self.structure_versions = StructureVersions(version_cache)
+        self.structure_cache = None
+        if structure_cache_bytes and version_cache is not None:
+            self.structure_cache = StructureCache(structure_cache_bytes, tz_aware, shared_cache)
+        self.index_cache = CourseIndexCache(index_cache_ttl) if index_cache_ttl else None
+
         self.database = pymongo.database.Database(
             pymongo.MongoClient(
                 host=host,
@@ -38,11 +296,32 @@ class MongoConnection(object):
         self.structures.write_concern = {'w': 1}
         self.definitions.write_concern = {'w': 1}
 
-    def get_structure(self, key):
+    def get_structure_version(self, key):
+        """
+        Get the token of the current version of the structure whose id is the given key,
+        which changes whenever the structure is rewritten in place (see StructureVersions)
+        """
+        return self.structure_versions.get(key)
+
+    def get_structure(self, key, version=None):
         """
         Get the structure from the persistence mechanism whose id is the given key
+
+        :param version: the structure's token from get_structure_version, if already read
         """
-        return self.structures.find_one({'_id': key})
+        if self.structure_cache is None:
+            return self.structures.find_one({'_id': key})
+
+        # read the token before the structure, so that a structure rewritten after it was
+        # read is never cached under the rewrite's token
+        if version is None:
+            version = self.structure_versions.get(key)
+        structure = self.structure_cache.get(key, version)
+        if structure is None:
+            structure = self.structures.find_one({'_id': key})
+            if structure is not None:
+                self.structure_cache.set(key, structure, version)
+        return structure
 
     def find_matching_structures(self, query):
         """
@@ -62,12 +341,25 @@ class MongoConnection(object):
         Update the db record for structure
         """
         self.structures.update({'_id': structure['_id']}, structure)
+        # Only bulk operations rewrite a structure in place. The new token stops every
+        # process using its cached copies of the old version.
+        self.structure_versions.bump(structure['_id'])
+        if self.structure_cache is not None:
+            self.structure_cache.delete(structure['_id'])
 
     def get_course_index(self, key):
         """
         Get the course_index from the persistence mechanism whose id is the given key
         """
-        return self.course_index.find_one({'_id': key})
+        if self.index_cache is None:
+            return self.course_index.find_one({'_id': key})
+
+        index = self.index_cache.get(key)
+        if index is None:
+            index = self.course_index.find_one({'_id': key})
+            if index is not None:
+                self.index_cache.set(key, index)
+        return index
 
     def find_matching_course_indexes(self, query):
         """
@@ -81,17 +373,23 @@ class MongoConnection(object):
         Create the course_index in the db
         """
         self.course_index.insert(course_index)
+        if self.index_cache is not None:
+            self.index_cache.delete(course_index['_id'])
 
     def update_course_index(self, course_index):
         """
         Update the db record for course_index
         """
         self.course_index.update({'_id': course_index['_id']}, course_index)
+        if self.index_cache is not None:
+            self.index_cache.delete(course_index['_id'])
 
     def delete_course_index(self, key):
         """
         Delete the course_index from the persistence mechanism whose id is the given key
         """
+        if self.index_cache is not None:
+            self.index_cache.delete(key)
         return self.course_index.remove({'_id': key})
 
     def get_definition(self, key):
@@ -107,10 +405,17 @@ class MongoConnection(object):
         """
         return self.definitions.find(query)
 
+    def cache_stats(self):
+        """
+        Return the hit/miss counters of the structure and course index caches
+        """
+        return {
+            'structures': self.structure_cache.stats() if self.structure_cache is not None else None,
+            'course_index': self.index_cache.stats() if self.index_cache is not None else None,
+        }
+
     def insert_definition(self, definition):
         """
         Create the definition in the db
         """
         self.definitions.insert(definition)
-
-
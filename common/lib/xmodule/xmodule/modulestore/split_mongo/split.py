@@ -66,6 +66,7 @@ from xmodule.modulestore import inheritance, ModuleStoreWriteBase, Location, SPL
 from ..exceptions import ItemNotFoundError
 from .definition_lazy_loader import DefinitionLazyLoader
 from .caching_descriptor_system import CachingDescriptorSystem
+from .structure_index import StructureIndexCache
 from xblock.fields import Scope
 from xblock.runtime import Mixologist
 from bson.objectid import ObjectId
@@ -74,6 +75,13 @@ from xblock.core import XBlock
 from xmodule.modulestore.loc_mapper_store import LocMapperStore
 
 log = logging.getLogger(__name__)
+
+# Default size of the process-level cache of structure documents
+DEFAULT_STRUCTURE_CACHE_BYTES = 32 * 1024 * 1024
+
+# Number of structure versions for which to keep block indexes
+STRUCTURE_INDEX_CACHE_SIZE = 50
+
 #==============================================================================
 # Documentation is at
 # https://edx-wiki.atlassian.net/wiki/display/ENG/Mongostore+Data+Structure
@@ -105,21 +113,42 @@ class SplitMongoModuleStore(ModuleStoreWriteBase):
                  default_class=None,
                  error_tracker=null_error_tracker,
                  loc_mapper=None,
+                 structure_cache_bytes=DEFAULT_STRUCTURE_CACHE_BYTES,
+                 index_cache_ttl=0,
+                 share_structure_cache=False,
                  **kwargs):
         """
         :param doc_store_config: must have a host, db, and collection entries. Other common entries: port, tz_aware.
+        :param structure_cache_bytes: size of the process-level cache of structures
+            (DEFAULT_STRUCTURE_CACHE_BYTES by default); 0 disables it. Structures which any
+            process rewrites in place (create_item with continue_version, internal_clean_children)
+            get a new token in the metadata_inheritance_cache_subsystem, which every process checks
+            its cached copies against, so the cache is only used when there is one.
+        :param index_cache_ttl: seconds for which to cache course index (active_versions) lookups.
+            Other processes' edits may go unseen for this long, so it defaults to 0 (disabled).
+        :param share_structure_cache: if True, also cache structures in the
+            metadata_inheritance_cache_subsystem so that they are shared between processes.
         """
 
         super(SplitMongoModuleStore, self).__init__(**kwargs)
         self.loc_mapper = loc_mapper
 
-        self.db_connection = MongoConnection(**doc_store_config)
+        self.db_connection = MongoConnection(
+            structure_cache_bytes=structure_cache_bytes,
+            index_cache_ttl=index_cache_ttl,
+            shared_cache=self.metadata_inheritance_cache_subsystem if share_structure_cache else None,
+            version_cache=self.metadata_inheritance_cache_subsystem,
+            **doc_store_config
+        )
         self.db = self.db_connection.database
 
         # Code review question: How should I expire entries?
         # _add_cache could use a lru mechanism to control the cache size?
         self.thread_cache = threading.local()
 
+        # parent, category and definition indexes of recently used structures
+        self.structure_indexes = StructureIndexCache(STRUCTURE_INDEX_CACHE_SIZE)
+
         if default_class is not None:
             module_path, _, class_name = default_class.rpartition('.')
             class_ = getattr(import_module(module_path), class_name)
@@ -224,8 +253,10 @@ class SplitMongoModuleStore(ModuleStoreWriteBase):
         """
         if course_version_guid:
             del self.thread_cache.course_cache[course_version_guid]
+            self.structure_indexes.delete(course_version_guid)
         else:
             self.thread_cache.course_cache = {}
+            self.structure_indexes.clear()
 
     def _lookup_course(self, course_locator):
         '''
@@ -240,8 +271,8 @@ class SplitMongoModuleStore(ModuleStoreWriteBase):
 
         :param course_locator: any subclass of CourseLocator
         '''
-        # NOTE: if and when this uses cache, the update if changed logic will break if the cache
-        # holds the same objects as the descriptors!
+        # NOTE: the structure cache in db_connection hands out a fresh copy of the structure on
+        # every hit, so the update if changed logic can't be broken by descriptors sharing objects.
         if not course_locator.is_fully_specified():
             raise InsufficientSpecificationError('Not fully specified: %s' % course_locator)
 
@@ -262,7 +293,10 @@ class SplitMongoModuleStore(ModuleStoreWriteBase):
 
         # cast string to ObjectId if necessary
         version_guid = course_locator.as_object_id(version_guid)
-        entry = self.db_connection.get_structure(version_guid)
+        # the token of the structure's in-place rewrites, read before the structure so that
+        # data derived from a structure which has since been rewritten isn't kept under the new token
+        structure_version = self.db_connection.get_structure_version(version_guid)
+        entry = self.db_connection.get_structure(version_guid, structure_version)
 
         # b/c more than one course can use same structure, the 'package_id' and 'branch' are not intrinsic to structure
         # and the one assoc'd w/ it by another fetch may not be the one relevant to this fetch; so,
@@ -271,9 +305,16 @@ class SplitMongoModuleStore(ModuleStoreWriteBase):
             'package_id': course_locator.package_id,
             'branch': course_locator.branch,
             'structure': entry,
+            'structure_version': structure_version,
         }
         return envelope
 
+    def _structure_index(self, course):
+        """
+        Return the StructureIndex of the structure in the envelope course (see _lookup_course)
+        """
+        return self.structure_indexes.get(course['structure'], course['structure_version'])
+
     def get_courses(self, branch='published', qualifiers=None):
         '''
         Returns a list of course descriptors matching any given qualifiers.
@@ -402,9 +443,14 @@ class SplitMongoModuleStore(ModuleStoreWriteBase):
         if qualifiers is None:
             qualifiers = {}
         course = self._lookup_course(locator)
+        blocks = course['structure']['blocks']
+        # use the structure's indexes to narrow down the blocks to check when possible
+        candidates = self._structure_index(course).candidates(qualifiers)
+        if candidates is None:
+            candidates = blocks.iterkeys()
         items = []
-        for block_id, value in course['structure']['blocks'].iteritems():
-            if self._block_matches(value, qualifiers):
+        for block_id in candidates:
+            if self._block_matches(blocks[block_id], qualifiers):
                 items.append(block_id)
 
         if len(items) > 0:
@@ -435,7 +481,7 @@ class SplitMongoModuleStore(ModuleStoreWriteBase):
         :param course_id: ignored. Only included for API compatibility. Specify the course_id within the locator.
         '''
         course = self._lookup_course(locator)
-        items = self._get_parents_from_structure(locator.block_id, course['structure'])
+        items = self._structure_index(course).get_parents(locator.block_id)
         return [BlockUsageLocator(
                     url=locator.as_course_locator(),
                     block_id=LocMapperStore.decode_key_from_mongo(parent_id),
@@ -450,12 +496,14 @@ class SplitMongoModuleStore(ModuleStoreWriteBase):
         """
         detached_categories = [name for name, __ in XBlock.load_tagged_classes("detached")]
         course = self._lookup_course(CourseLocator(package_id=package_id, branch=branch))
-        items = {LocMapperStore.decode_key_from_mongo(block_id) for block_id in course['structure']['blocks'].keys()}
-        items.remove(course['structure']['root'])
-        for block_id, block_data in course['structure']['blocks'].iteritems():
-            items.difference_update(block_data.get('fields', {}).get('children', []))
-            if block_data['category'] in detached_categories:
-                items.discard(LocMapperStore.decode_key_from_mongo(block_id))
+        structure_index = self._structure_index(course)
+        items = {
+            LocMapperStore.decode_key_from_mongo(block_id)
+            for block_id, block_data in course['structure']['blocks'].iteritems()
+            if block_data['category'] not in detached_categories
+        }
+        items.discard(course['structure']['root'])
+        items = {block_id for block_id in items if not structure_index.get_parents(block_id)}
         return [
             BlockUsageLocator(package_id=package_id, branch=branch, block_id=block_id)
             for block_id in items
@@ -805,7 +853,7 @@ class SplitMongoModuleStore(ModuleStoreWriteBase):
                 parent['edit_info']['update_version'] = new_id
         if continue_version:
             # db update
-            self.db_connection.update_structure(new_structure)
+            self._update_structure_in_place(new_structure)
             # clear cache so things get refetched and inheritance recomputed
             self._clear_cache(new_id)
         else:
@@ -1382,7 +1430,7 @@ class SplitMongoModuleStore(ModuleStoreWriteBase):
                     block_id for block_id in block['fields']["children"]
                     if LocMapperStore.encode_key_for_mongo(block_id) in original_structure['blocks']
                 ]
-        self.db_connection.update_structure(original_structure)
+        self._update_structure_in_place(original_structure)
         # clear cache again b/c inheritance may be wrong over orphans
         self._clear_cache(original_structure['_id'])
 
@@ -1452,6 +1500,15 @@ class SplitMongoModuleStore(ModuleStoreWriteBase):
                     index_entry['versions'][locator.branch]
                 )
 
+    def _update_structure_in_place(self, structure):
+        """
+        Rewrite structure's db record, keeping its version guid, which gives it a new token (so
+        other processes rebuild their indexes of it), and drop this process's indexes of it.
+        :param structure:
+        """
+        self.db_connection.update_structure(structure)
+        self.structure_indexes.delete(structure['_id'])
+
     def _version_structure(self, structure, user_id):
         """
         Copy the structure and update the history info (edited_by, edited_on, previous_version)
@@ -0,0 +1,109 @@
+"""
+In-memory indexes over the blocks of a split mongo structure.
+"""
+import threading
+from collections import defaultdict, OrderedDict
+
+from .definition_lazy_loader import DefinitionLazyLoader
+
+
+class StructureIndex(object):
+    """
+    Lookup tables derived from a structure's blocks, so that finding a block's
+    parents, or the blocks of a category or definition, doesn't require a scan
+    of every block in the course.
+
+    Block ids in the index values are in the encoded form used as keys of
+    structure['blocks']. Child ids (the keys of `parents`) are in the form
+    they have in the children lists.
+    """
+    def __init__(self, structure):
+        self.parents = defaultdict(list)
+        self.by_category = defaultdict(list)
+        self.by_definition = defaultdict(list)
+
+        for block_id, block in structure['blocks'].iteritems():
+            self.by_category[block['category']].append(block_id)
+            self.by_definition[self._definition_id(block['definition'])].append(block_id)
+            for child_id in block['fields'].get('children', []):
+                self.parents[child_id].append(block_id)
+
+    @staticmethod
+    def _definition_id(definition):
+        """
+        Return the id of a block's definition, which may already have been
+        replaced by a lazy loader when the block was loaded.
+        """
+        if isinstance(definition, DefinitionLazyLoader):
+            return definition.definition_locator.definition_id
+        return definition
+
+    def get_parents(self, block_id):
+        """
+        Return the encoded ids of the blocks which have `block_id` as a child
+        """
+        return self.parents.get(block_id, [])
+
+    def candidates(self, qualifiers):
+        """
+        Return the encoded ids of the only blocks which can match the get_items
+        `qualifiers`, or None if the qualifiers can't be answered from the
+        index and every block has to be checked.
+        """
+        category = qualifiers.get('category')
+        if isinstance(category, basestring):
+            return self.by_category.get(category, [])
+
+        definition = qualifiers.get('definition')
+        if definition is not None and not isinstance(definition, dict):
+            return self.by_definition.get(definition, [])
+
+        return None
+
+
+class StructureIndexCache(object):
+    """
+    A bounded, thread-safe LRU of StructureIndexes keyed by structure version guid.
+
+    Structures are immutable apart from the few operations which rewrite them in place, which
+    give the structure a new token (see `mongo_connection.StructureVersions`). Indexes are
+    cached with the token the structure was read with, and rebuilt when it has changed, so
+    rewrites by any process are seen. The rewriting process also `delete`s the index.
+    """
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        # version guid -> (token, StructureIndex)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, structure, version=''):
+        """
+        Return the StructureIndex for `structure`, read with the token `version`, building it if needed
+        """
+        key = structure['_id']
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None and entry[0] == version:
+                self._entries[key] = entry
+                return entry[1]
+
+        index = StructureIndex(structure)
+        with self._lock:
+            self._entries[key] = (version, index)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return index
+
+    def delete(self, structure_id):
+        """
+        Drop the index for the given version guid (e.g. because it was rewritten in place)
+        """
+        with self._lock:
+            self._entries.pop(structure_id, None)
+
+    def clear(self):
+        """
+        Drop all of the indexes
+        """
+        with self._lock:
+            self._entries.clear()
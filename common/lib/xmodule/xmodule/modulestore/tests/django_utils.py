@@ -226,6 +226,7 @@ class ModuleStoreTestCase(TestCase):
         location_mapper = loc_mapper()
         if location_mapper.db:
             location_mapper.location_map.drop()
+            location_mapper.map_entry_cache.clear()
 
     @classmethod
     def setUpClass(cls):
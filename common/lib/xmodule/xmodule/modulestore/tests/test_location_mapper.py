@@ -9,7 +9,7 @@ from xmodule.modulestore import Location
 from xmodule.modulestore.locator import BlockUsageLocator
 from xmodule.modulestore.exceptions import ItemNotFoundError, InvalidLocationError
 from xmodule.modulestore.loc_mapper_store import LocMapperStore
-from mock import Mock
+from mock import Mock, patch
 
 
 class TestLocationMapper(unittest.TestCase):
@@ -382,6 +382,92 @@ class TestLocationMapper(unittest.TestCase):
         with self.assertRaises(ItemNotFoundError):
             chapter_xlate = loc_mapper().translate_location(None, eponymous_block, add_entry_if_missing=False)
 
+    def test_translate_locations(self):
+        """
+        Test translating lists of locations and locators at once
+        """
+        org = 'foo_org'
+        course = 'bar_course'
+        old_style_course_id = '{}/{}/{}'.format(org, course, 'baz_run')
+        new_style_package_id = '{}.geek_dept.{}.baz_run'.format(org, course)
+        loc_mapper().create_map_entry(
+            Location('i4x', org, course, 'course', 'baz_run'),
+            new_style_package_id,
+            block_map={
+                'abc123': {'problem': 'problem2'},
+                'def456': {'problem': 'problem4'},
+            }
+        )
+        locations = [
+            Location('i4x', org, course, 'problem', 'abc123'),
+            Location('i4x', org, course, 'problem', 'def456'),
+            Location('i4x', org, course, 'chapter', 'intro'),
+        ]
+        find = loc_mapper().location_map.find
+        with patch.object(loc_mapper().location_map, 'find', wraps=find) as mock_find:
+            locators = loc_mapper().translate_locations(old_style_course_id, locations, False, True)
+        # one query for the course's map entry, to which the new chapter is added
+        self.assertEqual(mock_find.call_count, 1)
+        self.assertEqual([locator.block_id for locator in locators], ['problem2', 'problem4', 'intro'])
+        self.assertTrue(all(locator.branch == 'draft' for locator in locators))
+        self.assertEqual(
+            loc_mapper().translate_location(old_style_course_id, locations[2], False, False), locators[2]
+        )
+
+        # the map entry is kept in memory; so, uncached translations don't query the mapping table
+        self.instrumented_cache.cache.clear()
+        with patch.object(loc_mapper().location_map, 'find', wraps=find) as mock_find:
+            published = loc_mapper().translate_locations(old_style_course_id, locations, True, False)
+            self.assertFalse(mock_find.called)
+        self.assertEqual([locator.block_id for locator in published], ['problem2', 'problem4', 'intro'])
+
+        # the reverse translations
+        self.instrumented_cache.cache.clear()
+        unmapped = BlockUsageLocator(package_id=new_style_package_id, branch='draft', block_id='problem9')
+        with patch.object(loc_mapper().location_map, 'find', wraps=find) as mock_find:
+            reverted = loc_mapper().translate_locators_to_locations(locators + [unmapped])
+            self.assertEqual(mock_find.call_count, 1)
+        self.assertEqual(reverted, locations + [None])
+        with patch.object(loc_mapper().location_map, 'find', wraps=find) as mock_find:
+            self.assertEqual(
+                loc_mapper().translate_locators_to_locations(locators[:1], get_course=True),
+                [Location('i4x', org, course, 'course', 'baz_run')]
+            )
+            self.assertFalse(mock_find.called)
+
+    def test_translate_locations_reloads_map(self):
+        """
+        Test that blocks mapped by other processes are found although the course's map entry is in memory
+        """
+        org = 'foo_org'
+        course = 'bar_course'
+        old_style_course_id = '{}/{}/{}'.format(org, course, 'baz_run')
+        course_location = Location('i4x', org, course, 'course', 'baz_run')
+        package_id = loc_mapper().create_map_entry(course_location, block_map={'abc123': {'problem': 'problem2'}})
+        # load the course's map entry into memory both ways
+        loc_mapper().translate_locations(
+            old_style_course_id, [course_location.replace(category='problem', name='abc123')]
+        )
+        self.instrumented_cache.cache.clear()
+        loc_mapper().translate_locators_to_locations(
+            [BlockUsageLocator(package_id=package_id, branch='published', block_id='problem2')]
+        )
+
+        # map a block as another process would, w/o changing the entries in memory
+        loc_mapper().location_map.update(
+            {'course_id': package_id}, {'$set': {'block_map.def456': {'problem': 'problem4'}}}
+        )
+        new_location = course_location.replace(category='problem', name='def456')
+        locators = loc_mapper().translate_locations(old_style_course_id, [new_location], add_entry_if_missing=False)
+        self.assertEqual(locators[0].block_id, 'problem4')
+        self.instrumented_cache.cache.clear()
+        self.assertEqual(
+            loc_mapper().translate_locators_to_locations(
+                [BlockUsageLocator(package_id=package_id, branch='published', block_id='problem4')]
+            ),
+            [new_location]
+        )
+
 
 #==================================
 # functions to mock existing services
@@ -411,6 +497,12 @@ class TrivialCache(object):
         """
         return self.cache.get(key, default)
 
+    def get_many(self, keys):
+        """
+        Mock the .get_many
+        """
+        return {key: self.cache[key] for key in keys if key in self.cache}
+
     def set_many(self, entries):
         """
         mock set_many
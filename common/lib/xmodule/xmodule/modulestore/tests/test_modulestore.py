@@ -1,7 +1,7 @@
 from nose.tools import assert_equals, assert_raises  # pylint: disable=E0611
 
 from xmodule.modulestore.exceptions import ItemNotFoundError
-from xmodule.modulestore.search import path_to_location
+from xmodule.modulestore.search import path_to_location, compute_course_outline
 
 def check_path_to_location(modulestore):
     """
@@ -24,3 +24,16 @@ def check_path_to_location(modulestore):
     )
     for location in not_found:
         assert_raises(ItemNotFoundError, path_to_location, modulestore, course_id, location)
+
+    # the same paths are found with the course outline
+    outline = compute_course_outline(modulestore, course_id)
+    for location, expected in should_work:
+        assert_equals(path_to_location(modulestore, course_id, location, outline), expected)
+    for location in not_found:
+        assert_raises(ItemNotFoundError, path_to_location, modulestore, course_id, location, outline)
+    for location in outline['paths']:
+        assert_equals(
+            path_to_location(modulestore, course_id, location, outline),
+            path_to_location(modulestore, course_id, location)
+        )
+    assert_equals(outline['url_names']['Welcome'], "i4x://edX/toy/video/Welcome")
@@ -1,12 +1,14 @@
 from pprint import pprint
 # pylint: disable=E0611
-from nose.tools import assert_equals, assert_raises, \
+from nose.tools import assert_equals, assert_raises, assert_true, \
     assert_not_equals, assert_false
 from itertools import ifilter
 # pylint: enable=E0611
 import pymongo
 import logging
+import threading
 from uuid import uuid4
+from mock import Mock, patch
 
 from xblock.fields import Scope
 from xblock.runtime import KeyValueStore
@@ -15,6 +17,7 @@ from xblock.exceptions import InvalidScopeError
 from xmodule.tests import DATA_DIR
 from xmodule.modulestore import Location, MONGO_MODULESTORE_TYPE
 from xmodule.modulestore.mongo import MongoModuleStore, MongoKeyValueStore
+from xmodule.modulestore.mongo.base import namedtuple_to_son
 from xmodule.modulestore.draft import DraftModuleStore
 from xmodule.modulestore.xml_importer import import_from_xml, perform_xlint
 from xmodule.contentstore.mongo import MongoContentStore
@@ -22,7 +25,7 @@ from xmodule.contentstore.mongo import MongoContentStore
 from xmodule.modulestore.tests.test_modulestore import check_path_to_location
 from IPython.testing.nose_assert_methods import assert_in
 from xmodule.exceptions import NotFoundError
-from xmodule.modulestore.exceptions import InsufficientSpecificationError
+from xmodule.modulestore.exceptions import InsufficientSpecificationError, ItemNotFoundError
 
 log = logging.getLogger(__name__)
 
@@ -340,3 +343,355 @@ class TestMongoKeyValueStore(object):
         for scope in (Scope.preferences, Scope.user_info, Scope.user_state, Scope.parent):
             with assert_raises(InvalidScopeError):
                 self.kvs.delete(KeyValueStore.Key(scope, None, None, 'foo'))
+
+
+class DictCache(object):
+    """
+    Minimal stand-in for the metadata inheritance cache subsystem
+    """
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key, default=None):
+        return self.data.get(key, default)
+
+    def set(self, key, value):
+        self.data[key] = value
+
+    def add(self, key, value):
+        self.data.setdefault(key, value)
+
+    def incr(self, key):
+        if key not in self.data:
+            raise ValueError("Key '{}' not found".format(key))
+        self.data[key] += 1
+        return self.data[key]
+
+
+class TestMetadataInheritanceTree(object):
+    """
+    Tests that the incrementally maintained metadata inheritance tree matches
+    the tree computed from scratch.
+    """
+    def setUp(self):
+        self.db = 'test_mongo_inheritance_%s' % uuid4().hex[:5]
+        self.connection = pymongo.MongoClient(host=HOST, port=PORT, tz_aware=True)
+        self.cache = DictCache()
+        self.store = self.make_store()
+        self.course = Location('i4x', 'edX', 'inheritance', 'course', '2014')
+        self.chapter = self.course.replace(category='chapter', name='chapter')
+        self.sequentials = [self.course.replace(category='sequential', name='seq{}'.format(i)) for i in range(2)]
+        self.vertical = self.course.replace(category='vertical', name='vertical')
+        self.problem = self.course.replace(category='problem', name='problem')
+
+        self.save(self.course, [self.chapter], {'graceperiod': '1 day'})
+        self.save(self.chapter, self.sequentials)
+        self.save(self.sequentials[0], [self.vertical], {'showanswer': 'never'})
+        self.save(self.sequentials[1], [])
+        self.save(self.vertical, [self.problem])
+        self.save(self.problem, [], {'showanswer': 'always'})
+        self.store.refresh_cached_metadata_inheritance_tree(self.course)
+
+    def tearDown(self):
+        self.connection.drop_database(self.db)
+
+    def make_store(self):
+        """
+        Return a store sharing the metadata inheritance cache, like those of other processes
+        """
+        return MongoModuleStore(
+            {'host': HOST, 'db': self.db, 'collection': COLLECTION},
+            FS_ROOT, RENDER_TEMPLATE, default_class=DEFAULT_CLASS,
+            metadata_inheritance_cache_subsystem=self.cache,
+        )
+
+    def save(self, location, children, metadata=None):
+        """
+        Write an item directly to the collection
+        """
+        self.store.collection.save({
+            '_id': namedtuple_to_son(location),
+            'metadata': metadata or {},
+            'definition': {'data': {}, 'children': [child.url() for child in children]},
+        })
+
+    def cached_tree(self):
+        """
+        Return the tree in the metadata inheritance cache
+        """
+        generation = self.cache.get(u'edX/inheritance/generation')
+        return self.cache.get(u'edX/inheritance/{}'.format(generation))
+
+    def assert_tree_up_to_date(self):
+        """
+        Assert that the cached tree is the one computed from scratch
+        """
+        assert_equals(self.cached_tree(), self.store.compute_metadata_inheritance_tree(self.course))
+
+    def test_inheritance(self):
+        tree = self.cached_tree()
+        assert_equals(tree[self.problem.url()], {'graceperiod': '1 day', 'showanswer': 'never'})
+        assert_equals(tree[self.sequentials[1].url()], {'graceperiod': '1 day'})
+
+    def test_leaf_metadata_change(self):
+        self.save(self.problem, [], {'showanswer': 'attempted'})
+        with patch.object(self.store.collection, 'find') as mock_find:
+            self.store.update_cached_metadata_inheritance_tree(self.problem)
+            assert_false(mock_find.called)
+        self.assert_tree_up_to_date()
+
+    def test_container_metadata_change(self):
+        self.save(self.sequentials[0], [self.vertical], {'showanswer': 'attempted', 'due': '2014-01-01T00:00'})
+        self.store.update_cached_metadata_inheritance_tree(self.sequentials[0])
+        self.assert_tree_up_to_date()
+        assert_equals(self.cached_tree()[self.problem.url()]['showanswer'], 'attempted')
+
+    def test_course_metadata_change(self):
+        self.save(self.course, [self.chapter], {'graceperiod': '2 days'})
+        self.store.update_cached_metadata_inheritance_tree(self.course)
+        self.assert_tree_up_to_date()
+
+    def test_concurrent_container_changes(self):
+        other_store = self.make_store()
+        self.save(self.sequentials[0], [self.vertical], {'showanswer': 'attempted'})
+        self.save(self.sequentials[1], [], {'showanswer': 'always'})
+        next_generation = self.store._next_inheritance_generation  # pylint: disable=protected-access
+
+        def other_write_first(location):
+            """The other process updates the cached tree after this one read it"""
+            other_store.update_cached_metadata_inheritance_tree(self.sequentials[1])
+            return next_generation(location)
+
+        with patch.object(self.store, '_next_inheritance_generation', side_effect=other_write_first):
+            self.store.update_cached_metadata_inheritance_tree(self.sequentials[0])
+        self.assert_tree_up_to_date()
+        assert_equals(self.cached_tree()[self.sequentials[1].url()]['showanswer'], 'always')
+        assert_equals(self.cached_tree()[self.problem.url()]['showanswer'], 'attempted')
+
+    def test_move(self):
+        self.save(self.sequentials[0], [])
+        self.store.update_cached_metadata_inheritance_tree(self.sequentials[0])
+        self.assert_tree_up_to_date()
+        assert_false(self.vertical.url() in self.cached_tree())
+
+        self.save(self.sequentials[1], [self.vertical])
+        self.store.update_cached_metadata_inheritance_tree(self.sequentials[1])
+        self.assert_tree_up_to_date()
+        assert_equals(self.cached_tree()[self.problem.url()], {'graceperiod': '1 day'})
+
+    def test_delete_container(self):
+        self.store.collection.remove({'_id': namedtuple_to_son(self.vertical)})
+        self.store.update_cached_metadata_inheritance_tree(self.vertical)
+        self.assert_tree_up_to_date()
+
+        self.save(self.sequentials[0], [])
+        self.store.update_cached_metadata_inheritance_tree(self.sequentials[0])
+        self.assert_tree_up_to_date()
+
+    def test_draft_container(self):
+        draft_problem = self.course.replace(category='problem', name='draft_problem')
+        self.save(self.vertical.replace(revision='draft'), [self.problem, draft_problem], {'showanswer': 'always'})
+        self.store.update_cached_metadata_inheritance_tree(self.vertical.replace(revision='draft'))
+        self.assert_tree_up_to_date()
+        assert_in(draft_problem.url(), self.cached_tree())
+
+    def test_bulk_write_operations(self):
+        tree = self.cached_tree()
+        with self.store.bulk_write_operations(self.course):
+            with self.store.bulk_write_operations(self.course):
+                self.save(self.sequentials[0], [self.vertical], {'showanswer': 'attempted'})
+                self.store.update_cached_metadata_inheritance_tree(self.sequentials[0])
+            # the refresh is deferred to the end of the outermost bulk operation
+            assert_equals(self.cached_tree(), tree)
+            self.save(self.course, [self.chapter], {'graceperiod': '2 days'})
+            self.store.update_cached_metadata_inheritance_tree(self.course)
+            assert_equals(self.cached_tree(), tree)
+        self.assert_tree_up_to_date()
+        assert_equals(self.store.ignore_write_events_on_courses, [])
+
+
+class TestDraftModuleStoreQueries(object):
+    """
+    Tests that the draft store reads drafts and published items together, rather
+    than going back to the database for the published version of each item.
+    """
+    def setUp(self):
+        self.db = 'test_mongo_draft_queries_%s' % uuid4().hex[:5]
+        self.connection = pymongo.MongoClient(host=HOST, port=PORT, tz_aware=True)
+        self.store = DraftModuleStore(
+            {'host': HOST, 'db': self.db, 'collection': COLLECTION},
+            FS_ROOT, RENDER_TEMPLATE, default_class=DEFAULT_CLASS,
+            metadata_inheritance_cache_subsystem=DictCache(),
+        )
+        # a course which has a data directory, so that loading its items doesn't make one
+        self.course = Location('i4x', 'edX', 'toy', 'course', '2012_Fall')
+        self.chapter = self.course.replace(category='chapter', name='chapter')
+        self.sequential = self.course.replace(category='sequential', name='sequential')
+        # a published vertical with a draft, and a vertical which has only been drafted
+        self.verticals = [self.course.replace(category='vertical', name='vertical{}'.format(i)) for i in range(2)]
+        self.htmls = [self.course.replace(category='html', name='html{}'.format(i)) for i in range(3)]
+
+        self.save(self.course, [self.chapter])
+        self.save(self.chapter, [self.sequential])
+        self.save(self.sequential, self.verticals)
+        self.save(self.verticals[0], self.htmls[:1])
+        self.save(self.verticals[0].replace(revision='draft'), self.htmls[:2])
+        self.save(self.verticals[1].replace(revision='draft'), self.htmls[2:])
+        for html in self.htmls:
+            self.save(html, [])
+        self.store.refresh_cached_metadata_inheritance_tree(self.course)
+
+    def tearDown(self):
+        self.connection.drop_database(self.db)
+
+    def save(self, location, children):
+        """
+        Write an item directly to the collection
+        """
+        self.store.collection.save({
+            '_id': namedtuple_to_son(location),
+            'metadata': {},
+            'definition': {'data': {}, 'children': [child.url() for child in children]},
+        })
+
+    def count_queries(self, func, *args, **kwargs):
+        """
+        Return the result of calling func, and the number of queries of the collection it made
+        """
+        collection = self.store.collection
+        with patch.object(collection, 'find', wraps=collection.find) as mock_find:
+            with patch.object(collection, 'find_one', wraps=collection.find_one) as mock_find_one:
+                result = func(*args, **kwargs)
+        return result, mock_find.call_count + mock_find_one.call_count
+
+    def test_get_item(self):
+        vertical, num_queries = self.count_queries(self.store.get_item, self.verticals[0])
+        assert_equals(num_queries, 1)
+        assert_true(vertical.is_draft)
+        assert_equals(vertical.location, self.verticals[0])
+        assert_equals([Location(child) for child in vertical.children], self.htmls[:2])
+
+        sequential, num_queries = self.count_queries(self.store.get_item, self.sequential)
+        assert_equals(num_queries, 1)
+        assert_false(sequential.is_draft)
+
+        assert_raises(ItemNotFoundError, self.store.get_item, self.course.replace(category='html', name='nope'))
+
+    def test_get_items(self):
+        verticals, num_queries = self.count_queries(
+            self.store.get_items, self.course.replace(category='vertical', name=None)
+        )
+        assert_equals(num_queries, 1)
+        assert_equals(sorted(vertical.location for vertical in verticals), self.verticals)
+        assert_true(all(vertical.is_draft for vertical in verticals))
+
+    def test_load_course_outline(self):
+        def load_outline():
+            """Load the whole course, and walk it"""
+            course = self.store.get_item(self.course, depth=None)
+            sequential = course.get_children()[0].get_children()[0]
+            return sequential, [(vertical, vertical.get_children()) for vertical in sequential.get_children()]
+
+        (sequential, verticals), num_queries = self.count_queries(load_outline)
+        # One query for the course, and one for each level of its descendants which have children,
+        # whether or not any of them are drafts
+        assert_equals(num_queries, 5)
+        assert_false(getattr(sequential, 'is_draft', False))
+        assert_equals([vertical.location for vertical, _ in verticals], self.verticals)
+        assert_true(all(vertical.is_draft for vertical, _ in verticals))
+        assert_equals(
+            [[html.location for html in htmls] for _, htmls in verticals],
+            [self.htmls[:2], self.htmls[2:]]
+        )
+        assert_false(any(getattr(html, 'is_draft', False) for _, htmls in verticals for html in htmls))
+
+
+class TestBatchedItemWrites(object):
+    """
+    Tests that the item writes of an import are queued and written together
+    """
+    def setUp(self):
+        self.db = 'test_mongo_batched_writes_%s' % uuid4().hex[:5]
+        self.connection = pymongo.MongoClient(host=HOST, port=PORT, tz_aware=True)
+        self.store = MongoModuleStore(
+            {'host': HOST, 'db': self.db, 'collection': COLLECTION},
+            FS_ROOT, RENDER_TEMPLATE, default_class=DEFAULT_CLASS,
+        )
+        self.course = Location('i4x', 'edX', 'batched', 'course', 'run')
+
+    def tearDown(self):
+        self.connection.drop_database(self.db)
+
+    def test_batched_item_writes(self):
+        existing = self.store.create_xmodule(self.course.replace(category='html', name='existing'))
+        self.store.save_xmodule(existing)
+        existing.data = '<p>changed</p>'
+        htmls = [
+            self.store.create_xmodule(self.course.replace(category='html', name='new{}'.format(i)))
+            for i in range(3)
+        ]
+
+        collection = self.store.collection
+        with patch.object(collection, 'insert', wraps=collection.insert) as mock_insert:
+            with patch.object(collection, 'update', wraps=collection.update) as mock_update:
+                with self.store.batched_item_writes(self.course):
+                    self.store.update_item(existing, '**replace_user**')
+                    for html in htmls:
+                        html.data = '<p>{}</p>'.format(html.location.name)
+                        self.store.update_item(html, '**replace_user**')
+                    htmls[0].display_name = 'First'
+                    self.store.update_item(htmls[0], '**replace_user**')
+                    # nothing is written until the batch ends
+                    assert_false(mock_insert.called or mock_update.called)
+
+        # the new items are inserted together, and the existing one updated
+        assert_equals(mock_insert.call_count, 1)
+        assert_equals(mock_update.call_count, 1)
+        assert_equals(self.store.get_item(existing.location).data, '<p>changed</p>')
+        for html in htmls:
+            assert_equals(self.store.get_item(html.location).data, '<p>{}</p>'.format(html.location.name))
+        assert_equals(self.store.get_item(htmls[0].location).display_name, 'First')
+        assert_equals(self.store._item_write_batches, {})  # pylint: disable=protected-access
+
+    def test_update_signal_sent_after_batch(self):
+        htmls = [
+            self.store.create_xmodule(self.course.replace(category='html', name='html{}'.format(i)))
+            for i in range(3)
+        ]
+        self.store.modulestore_update_signal = Mock()
+        with patch('xmodule.modulestore.mongo.base.ITEM_WRITE_BATCH_SIZE', 2):
+            with self.store.batched_item_writes(self.course):
+                for html in htmls:
+                    self.store.update_item(html, '**replace_user**')
+                # not even for the items already flushed
+                assert_false(self.store.modulestore_update_signal.send.called)
+        # once for the course, when all of its items are in mongo
+        self.store.modulestore_update_signal.send.assert_called_once_with(
+            self.store, modulestore=self.store, course_id='edX/batched', location=htmls[0].location
+        )
+
+    def test_other_threads_not_batched(self):
+        batched = self.store.create_xmodule(self.course.replace(category='html', name='batched'))
+        unbatched = self.store.create_xmodule(self.course.replace(category='html', name='unbatched'))
+        with self.store.batched_item_writes(self.course):
+            self.store.update_item(batched, '**replace_user**')
+            # a write from another thread, e.g. a request, while the course is importing
+            writer = threading.Thread(target=self.store.update_item, args=(unbatched, '**replace_user**'))
+            writer.start()
+            writer.join()
+            # is written right away, rather than being queued in this thread's batch
+            self.store.get_item(unbatched.location)
+            assert_raises(ItemNotFoundError, self.store.get_item, batched.location)
+        self.store.get_item(batched.location)
+
+    def test_batch_flushed_when_full(self):
+        htmls = [
+            self.store.create_xmodule(self.course.replace(category='html', name='html{}'.format(i)))
+            for i in range(3)
+        ]
+        with patch('xmodule.modulestore.mongo.base.ITEM_WRITE_BATCH_SIZE', 2):
+            with self.store.batched_item_writes(self.course):
+                for html in htmls:
+                    self.store.update_item(html, '**replace_user**')
+                assert_equals(len(self.store.get_items(self.course.replace(category='html', name=None))), 2)
+        assert_equals(len(self.store.get_items(self.course.replace(category='html', name=None))), 3)
@@ -664,12 +664,17 @@ class TestItemCrud(SplitModuleTest):
             package_id=new_course_locator.package_id, branch=new_course_locator.branch
         )
 
+        # index the structure, which the continued version then rewrites in place
+        self.assertEqual(modulestore().get_items(new_course_locator, qualifiers={'category': 'chapter'}), [])
+
         # positive simple case: no force, add chapter
         new_ele = modulestore().create_item(
             new_course.location, 'chapter', user,
             fields={'display_name': 'chapter 1'},
             continue_version=True
         )
+        chapters = modulestore().get_items(new_course_locator, qualifiers={'category': 'chapter'})
+        self.assertEqual([chapter.location.block_id for chapter in chapters], [new_ele.location.block_id])
         # version info shouldn't change
         self.assertEqual(new_ele.update_version, course_block_update_version)
         self.assertEqual(new_ele.update_version, new_ele.location.version_guid)
@@ -0,0 +1,173 @@
+"""
+Tests for the structure and course index caches used by the split mongo connection.
+"""
+import datetime
+import unittest
+
+from bson import BSON
+from bson.objectid import ObjectId
+from mock import patch
+from pytz import UTC
+
+from xmodule.modulestore.split_mongo.mongo_connection import StructureCache, StructureVersions, CourseIndexCache
+
+
+class DictCache(object):
+    """
+    Minimal stand-in for a django cache
+    """
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, timeout=None):
+        self.data[key] = value
+
+    def add(self, key, value, timeout=None):
+        self.data.setdefault(key, value)
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+
+def make_structure(num_blocks=1):
+    """
+    Return a structure-like document with `num_blocks` blocks
+    """
+    return {
+        '_id': ObjectId(),
+        'root': 'course',
+        'edited_on': datetime.datetime(2013, 10, 1, tzinfo=UTC),
+        'blocks': {
+            'block{}'.format(index): {'category': 'html', 'fields': {'children': []}}
+            for index in xrange(num_blocks)
+        },
+    }
+
+
+class TestStructureCache(unittest.TestCase):
+    """
+    Tests for StructureCache
+    """
+    def test_get_returns_copies(self):
+        cache = StructureCache(1024 * 1024)
+        structure = make_structure()
+        cache.set(structure['_id'], structure)
+
+        cached = cache.get(structure['_id'])
+        self.assertEqual(cached, structure)
+        cached['blocks']['block0']['fields']['children'].append('other')
+        self.assertEqual(cache.get(structure['_id']), structure)
+        self.assertEqual(cache.stats()['hits'], 2)
+
+    def test_miss(self):
+        cache = StructureCache(1024 * 1024)
+        self.assertIsNone(cache.get(ObjectId()))
+        self.assertEqual(cache.stats()['misses'], 1)
+
+    def test_bounded_by_bytes(self):
+        structures = [make_structure(10) for _ in xrange(3)]
+        size = len(BSON.encode(structures[0]))
+        cache = StructureCache(size * 2)
+        for structure in structures:
+            cache.set(structure['_id'], structure)
+
+        # the least recently used structure was evicted
+        self.assertIsNone(cache.get(structures[0]['_id']))
+        self.assertIsNotNone(cache.get(structures[1]['_id']))
+        self.assertIsNotNone(cache.get(structures[2]['_id']))
+        self.assertLessEqual(cache.stats()['bytes'], size * 2)
+
+    def test_oversized_structure_not_cached(self):
+        structure = make_structure(10)
+        cache = StructureCache(10)
+        cache.set(structure['_id'], structure)
+        self.assertIsNone(cache.get(structure['_id']))
+
+    def test_shared_cache(self):
+        shared_cache = DictCache()
+        structure = make_structure()
+        StructureCache(1024 * 1024, shared_cache=shared_cache).set(structure['_id'], structure)
+
+        # another process's cache finds it in the shared tier
+        other_cache = StructureCache(1024 * 1024, shared_cache=shared_cache)
+        self.assertEqual(other_cache.get(structure['_id']), structure)
+        self.assertEqual(other_cache.stats()['shared_hits'], 1)
+
+    def test_oversized_structure_not_shared(self):
+        shared_cache = DictCache()
+        cache = StructureCache(1024 * 1024, shared_cache=shared_cache)
+        structure = make_structure()
+        with patch('xmodule.modulestore.split_mongo.mongo_connection.SHARED_CACHE_MAX_BYTES', 10):
+            cache.set(structure['_id'], structure)
+
+        # it's still cached locally, and counted
+        self.assertEqual(shared_cache.data, {})
+        self.assertEqual(cache.get(structure['_id']), structure)
+        self.assertEqual(cache.stats()['shared_oversized'], 1)
+
+    def test_delete(self):
+        cache = StructureCache(1024 * 1024)
+        structure = make_structure()
+        cache.set(structure['_id'], structure)
+        cache.delete(structure['_id'])
+        self.assertIsNone(cache.get(structure['_id']))
+        self.assertEqual(cache.stats()['bytes'], 0)
+
+    def test_rewritten_structure_not_returned(self):
+        versions = StructureVersions(DictCache())
+        shared_cache = DictCache()
+        structure = make_structure()
+        old_version = versions.get(structure['_id'])
+        self.assertEqual(versions.get(structure['_id']), old_version)
+
+        # a process caches the structure, then another rewrites it in place
+        cache = StructureCache(1024 * 1024, shared_cache=shared_cache)
+        cache.set(structure['_id'], structure, old_version)
+        versions.bump(structure['_id'])
+        new_version = versions.get(structure['_id'])
+        self.assertNotEqual(new_version, old_version)
+
+        # neither the process's copy nor the shared one is used for the new version
+        self.assertIsNone(cache.get(structure['_id'], new_version))
+        self.assertIsNone(StructureCache(1024 * 1024, shared_cache=shared_cache).get(structure['_id'], new_version))
+        self.assertEqual(cache.stats()['bytes'], 0)
+
+    def test_evicted_version_replaced(self):
+        version_cache = DictCache()
+        versions = StructureVersions(version_cache)
+        structure = make_structure()
+        cache = StructureCache(1024 * 1024)
+        cache.set(structure['_id'], structure, versions.get(structure['_id']))
+        version_cache.data.clear()
+        self.assertIsNone(cache.get(structure['_id'], versions.get(structure['_id'])))
+
+
+class TestCourseIndexCache(unittest.TestCase):
+    """
+    Tests for CourseIndexCache
+    """
+    def setUp(self):
+        self.index = {'_id': 'org.course.run', 'versions': {'draft': ObjectId()}}
+
+    def test_get_returns_copies(self):
+        cache = CourseIndexCache(60)
+        cache.set(self.index['_id'], self.index)
+        cached = cache.get(self.index['_id'])
+        cached['versions']['draft'] = ObjectId()
+        self.assertEqual(cache.get(self.index['_id']), self.index)
+
+    def test_expiry(self):
+        cache = CourseIndexCache(60)
+        with patch('xmodule.modulestore.split_mongo.mongo_connection.time.time', return_value=1000):
+            cache.set(self.index['_id'], self.index)
+        with patch('xmodule.modulestore.split_mongo.mongo_connection.time.time', return_value=1061):
+            self.assertIsNone(cache.get(self.index['_id']))
+
+    def test_delete(self):
+        cache = CourseIndexCache(60)
+        cache.set(self.index['_id'], self.index)
+        cache.delete(self.index['_id'])
+        self.assertIsNone(cache.get(self.index['_id']))
@@ -0,0 +1,146 @@
+"""
+Tests for the block indexes of split mongo structures.
+"""
+import random
+import unittest
+
+from bson.objectid import ObjectId
+from mock import patch
+
+from xmodule.modulestore.split_mongo.structure_index import StructureIndex, StructureIndexCache
+
+
+def make_course_structure(num_chapters, sequentials_per_chapter, verticals_per_sequential, problems_per_vertical):
+    """
+    Return a synthetic structure with the given course shape
+    """
+    blocks = {}
+
+    def add_block(block_id, category, children=()):
+        blocks[block_id] = {
+            'category': category,
+            'definition': ObjectId(),
+            'fields': {'children': list(children)},
+            'edit_info': {},
+        }
+
+    chapters = []
+    for chapter_num in xrange(num_chapters):
+        sequentials = []
+        for sequential_num in xrange(sequentials_per_chapter):
+            verticals = []
+            for vertical_num in xrange(verticals_per_sequential):
+                prefix = 'c{}s{}v{}'.format(chapter_num, sequential_num, vertical_num)
+                problems = ['{}p{}'.format(prefix, problem_num) for problem_num in xrange(problems_per_vertical)]
+                for problem in problems:
+                    add_block(problem, 'problem')
+                add_block(prefix, 'vertical', problems)
+                verticals.append(prefix)
+            sequential = 'c{}s{}'.format(chapter_num, sequential_num)
+            add_block(sequential, 'sequential', verticals)
+            sequentials.append(sequential)
+        chapter = 'c{}'.format(chapter_num)
+        add_block(chapter, 'chapter', sequentials)
+        chapters.append(chapter)
+    add_block('course', 'course', chapters)
+    return {'_id': ObjectId(), 'root': 'course', 'blocks': blocks}
+
+
+def scan_parents(structure, block_id):
+    """
+    Find the parents of block_id the way split did before it had indexes
+    """
+    return [
+        parent_id for parent_id, block in structure['blocks'].iteritems()
+        if block_id in block['fields'].get('children', [])
+    ]
+
+
+def scan_category(structure, category):
+    """
+    Find the blocks of a category the way split did before it had indexes
+    """
+    return [block_id for block_id, block in structure['blocks'].iteritems() if block['category'] == category]
+
+
+class TestStructureIndex(unittest.TestCase):
+    """
+    Check that the indexes agree with scanning the blocks of a ~20k block course.
+    """
+    @classmethod
+    def setUpClass(cls):
+        # 1 course + 20 chapters + 200 sequentials + 2000 verticals + 18000 problems
+        cls.structure = make_course_structure(20, 10, 10, 9)
+        cls.index = StructureIndex(cls.structure)
+
+    def test_size(self):
+        self.assertGreater(len(self.structure['blocks']), 20000)
+
+    def test_parents(self):
+        for block_id in random.sample(self.structure['blocks'].keys(), 100):
+            self.assertEqual(sorted(self.index.get_parents(block_id)), sorted(scan_parents(self.structure, block_id)))
+        self.assertEqual(self.index.get_parents('course'), [])
+
+    def test_categories(self):
+        for category in ('course', 'chapter', 'sequential', 'vertical', 'problem', 'html'):
+            self.assertEqual(
+                sorted(self.index.candidates({'category': category})),
+                sorted(scan_category(self.structure, category))
+            )
+
+    def test_definitions(self):
+        block_id, block = random.choice(self.structure['blocks'].items())
+        self.assertEqual(self.index.candidates({'definition': block['definition']}), [block_id])
+
+    def test_unindexed_qualifiers(self):
+        self.assertIsNone(self.index.candidates({}))
+        self.assertIsNone(self.index.candidates({'category': {'$regex': 'prob'}}))
+        self.assertIsNone(self.index.candidates({'display_name': 'foo'}))
+
+
+class TestStructureIndexCache(unittest.TestCase):
+    """
+    Tests for StructureIndexCache
+    """
+    def test_reuses_index(self):
+        cache = StructureIndexCache(2)
+        structure = make_course_structure(1, 1, 1, 1)
+        self.assertIs(cache.get(structure), cache.get(structure))
+
+    def test_builds_index_once(self):
+        cache = StructureIndexCache(2)
+        structure = make_course_structure(2, 2, 2, 2)
+        with patch(
+            'xmodule.modulestore.split_mongo.structure_index.StructureIndex', wraps=StructureIndex
+        ) as mock_index:
+            for block_id in structure['blocks']:
+                cache.get(structure).get_parents(block_id)
+            cache.get(structure).candidates({'category': 'problem'})
+        self.assertEqual(mock_index.call_count, 1)
+
+    def test_rebuilds_deleted_structure(self):
+        cache = StructureIndexCache(2)
+        structure = make_course_structure(1, 1, 1, 1)
+        index = cache.get(structure)
+        structure['blocks']['course']['fields']['children'].append('new')
+        structure['blocks']['new'] = {'category': 'chapter', 'definition': ObjectId(), 'fields': {}}
+        cache.delete(structure['_id'])
+        self.assertIsNot(cache.get(structure), index)
+        self.assertEqual(cache.get(structure).get_parents('new'), ['course'])
+
+    def test_rebuilds_rewritten_structure(self):
+        cache = StructureIndexCache(2)
+        structure = make_course_structure(1, 1, 1, 1)
+        index = cache.get(structure, 'old')
+        # another process rewrote the structure, giving it a new token
+        structure['blocks']['course']['fields']['children'].append('new')
+        structure['blocks']['new'] = {'category': 'chapter', 'definition': ObjectId(), 'fields': {}}
+        self.assertIsNot(cache.get(structure, 'new'), index)
+        self.assertEqual(cache.get(structure, 'new').get_parents('new'), ['course'])
+
+    def test_bounded(self):
+        cache = StructureIndexCache(2)
+        structures = [make_course_structure(1, 1, 1, 1) for _ in xrange(3)]
+        indexes = [cache.get(structure) for structure in structures]
+        self.assertIsNot(cache.get(structures[0]), indexes[0])
+        self.assertIs(cache.get(structures[2]), indexes[2])
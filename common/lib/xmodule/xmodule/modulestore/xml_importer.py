@@ -1,12 +1,16 @@
+import hashlib
 import logging
 import os
 import mimetypes
+import time
+from contextlib import contextmanager
+from multiprocessing.pool import ThreadPool
 from path import path
 import json
 
 from .xml import XMLModuleStore, ImportSystem, ParentTracker
 from xmodule.modulestore import Location
-from xmodule.contentstore.content import StaticContent
+from xmodule.contentstore.content import StaticContent, StaticContentStream
 from .inheritance import own_metadata
 from xmodule.errortracker import make_error_tracker
 from .store_utilities import rewrite_nonportable_content_links
@@ -14,10 +18,25 @@ import xblock
 
 log = logging.getLogger(__name__)
 
+# number of threads which import the static assets of a course
+ASSET_IMPORT_THREADS = 4
+# bytes read at a time when computing the md5 of an asset file
+MD5_BLOCK_SIZE = 1024 * 1024
+
 
 def import_static_content(
         modules, course_loc, course_data_path, static_content_store,
-        target_location_namespace, subpath='static', verbose=False):
+        target_location_namespace, subpath='static', verbose=False,
+        num_threads=ASSET_IMPORT_THREADS):
+    """
+    Import the files under subpath of course_data_path into static_content_store
+    as assets of the course target_location_namespace. Returns a dict of the paths
+    of the files (relative to subpath) to the names of their assets.
+
+    The files are streamed from disk by a pool of num_threads threads. Files whose
+    contents (by md5) and attributes are the same as those of the asset already in
+    the store aren't written again.
+    """
 
     remap_dict = {}
 
@@ -34,6 +53,12 @@ def import_static_content(
     verbose = True
     mimetypes_list = mimetypes.types_map.values()
 
+    existing_assets = dict(
+        (asset['_id']['name'], asset)
+        for asset in static_content_store.get_all_content_for_course(target_location_namespace)[0]
+    )
+
+    content_paths = []
     for dirname, _, filenames in os.walk(static_dir):
         for filename in filenames:
 
@@ -44,20 +69,28 @@ def import_static_content(
                     log.debug('skipping static content %s...', content_path)
                 continue
 
-            if verbose:
-                log.debug('importing static content %s...', content_path)
+            content_paths.append(content_path)
 
-            try:
-                with open(content_path, 'rb') as f:
-                    data = f.read()
-            except IOError:
-                if filename.startswith('._'):
-                    # OS X "companion files". See
-                    # http://www.diigo.com/annotated/0c936fda5da4aa1159c189cea227e174
-                    continue
-                # Not a 'hidden file', then re-raise exception
-                raise
+    def import_file(content_path):
+        """
+        Import the file at content_path, and return its path relative to subpath and
+        the name of its asset. Returns None if the file is skipped.
+        """
+        filename = os.path.basename(content_path)
+        if verbose:
+            log.debug('importing static content %s...', content_path)
 
+        try:
+            asset_file = open(content_path, 'rb')
+        except IOError:
+            if filename.startswith('._'):
+                # OS X "companion files". See
+                # http://www.diigo.com/annotated/0c936fda5da4aa1159c189cea227e174
+                return None
+            # Not a 'hidden file', then re-raise exception
+            raise
+
+        with asset_file:
             # strip away leading path from the name
             fullname_with_subpath = content_path.replace(static_dir, '')
             if fullname_with_subpath.startswith('/'):
@@ -75,13 +108,31 @@ def import_static_content(
             # Check extracted contentType in list of all valid mimetypes
             if not mime_type or mime_type not in mimetypes_list:
                 mime_type = mimetypes.guess_type(filename)[0]   # Assign guessed mimetype
-            content = StaticContent(
-                content_loc, displayname, mime_type, data,
-                import_path=fullname_with_subpath, locked=locked
+
+            existing_asset = existing_assets.get(content_loc.name)
+            if (
+                existing_asset is not None and
+                existing_asset.get('displayname') == displayname and
+                existing_asset.get('contentType') == mime_type and
+                existing_asset.get('import_path') == fullname_with_subpath and
+                existing_asset.get('locked', False) == locked and
+                existing_asset.get('md5') == _file_md5(asset_file)
+            ):
+                if verbose:
+                    log.debug('static content %s is unchanged', content_path)
+                return fullname_with_subpath, content_loc.name
+            asset_file.seek(0)
+
+            content = StaticContentStream(
+                content_loc, displayname, mime_type, asset_file,
+                import_path=fullname_with_subpath, locked=locked,
+                length=os.fstat(asset_file.fileno()).st_size
             )
 
             # first let's save a thumbnail so we can get back a thumbnail location
-            thumbnail_content, thumbnail_location = static_content_store.generate_thumbnail(content)
+            thumbnail_content, thumbnail_location = static_content_store.generate_thumbnail(
+                content, tempfile_path=content_path
+            )
 
             if thumbnail_content is not None:
                 content.thumbnail_location = thumbnail_location
@@ -94,19 +145,76 @@ def import_static_content(
                     fullname_with_subpath, err
                 ))
 
-            # store the remapping information which will be needed
-            # to subsitute in the module data
-            remap_dict[fullname_with_subpath] = content_loc.name
+        return fullname_with_subpath, content_loc.name
+
+    pool = ThreadPool(num_threads)
+    try:
+        for imported in pool.imap_unordered(import_file, content_paths):
+            if imported is not None:
+                fullname_with_subpath, name = imported
+                # store the remapping information which will be needed
+                # to subsitute in the module data
+                remap_dict[fullname_with_subpath] = name
+    finally:
+        pool.terminate()
+        pool.join()
 
     return remap_dict
 
 
+def _file_md5(asset_file):
+    """
+    Return the md5 hex digest of the contents of asset_file, reading it a block at a time
+    """
+    md5 = hashlib.md5()
+    for block in iter(lambda: asset_file.read(MD5_BLOCK_SIZE), ''):
+        md5.update(block)
+    return md5.hexdigest()
+
+
+class _PhaseTimer(object):
+    """
+    Times the phases of an import, each of which runs from the end of the previous one
+    """
+    def __init__(self):
+        self.timings = []
+        self.phase_start = time.time()
+
+    def end_phase(self, phase):
+        """
+        Record the time taken by phase, which has just ended
+        """
+        now = time.time()
+        self.timings.append((phase, now - self.phase_start))
+        self.phase_start = now
+
+    def log(self, description):
+        """
+        Log how long each of the phases took
+        """
+        log.info('%s took %s', description, ', '.join(
+            '{0}: {1:.2f}s'.format(phase, seconds) for phase, seconds in self.timings
+        ))
+
+
+@contextmanager
+def _batched_item_writes(store, location):
+    """
+    Batch the writes of items to the course of location in store, if the store supports it
+    """
+    if hasattr(store, 'batched_item_writes'):
+        with store.batched_item_writes(location):
+            yield
+    else:
+        yield
+
+
 def import_from_xml(
         store, data_dir, course_dirs=None,
         default_class='xmodule.raw_module.RawDescriptor',
         load_error_modules=True, static_content_store=None,
         target_location_namespace=None, verbose=False, draft_store=None,
-        do_import_static=True):
+        do_import_static=True, module_imported=None):
     """
     Import the specified xml data_dir into the "store" modulestore,
     using org and course as the location org and course.
@@ -129,8 +237,16 @@ def import_from_xml(
         time the course is loaded. Static content for some courses may also be
         served directly by nginx, instead of going through django.
 
+    :param module_imported:
+        if given, a function which is called with each module once it has
+        been imported, e.g. to report the progress of the import.
+
+    The writes of the modules of each course are batched on stores which
+    support it (see `MongoModuleStore.batched_item_writes`), and the time
+    taken by each phase of the import is logged.
     """
 
+    timer = _PhaseTimer()
     xml_module_store = XMLModuleStore(
         data_dir,
         default_class=default_class,
@@ -139,6 +255,8 @@ def import_from_xml(
         xblock_mixins=store.xblock_mixins,
         xblock_select=store.xblock_select,
     )
+    timer.end_phase('xml')
+    timer.log('Loading {0}'.format(data_dir))
 
     # NOTE: the XmlModuleStore does not implement get_items()
     # which would be a preferable means to enumerate the entire collection
@@ -148,21 +266,22 @@ def import_from_xml(
     for course_id in xml_module_store.modules.keys():
 
         if target_location_namespace is not None:
-            pseudo_course_id = '/'.join(
-                [target_location_namespace.org, target_location_namespace.course]
+            bulk_write_location = Location(
+                'i4x', target_location_namespace.org, target_location_namespace.course, 'course', None
             )
         else:
             course_id_components = course_id.split('/')
-            pseudo_course_id = '/'.join(
-                [course_id_components[0], course_id_components[1]]
-            )
-
+            bulk_write_location = Location('i4x', course_id_components[0], course_id_components[1], 'course', None)
+
+        # turn off all write signalling while importing as this
+        # is a high volume operation on stores that need it
+        bulk_write_stores = [
+            bulk_write_store for bulk_write_store in (store, draft_store)
+            if hasattr(bulk_write_store, 'begin_bulk_write_operations') and
+            bulk_write_store.begin_bulk_write_operations(bulk_write_location)
+        ]
+        timer = _PhaseTimer()
         try:
-            # turn off all write signalling while importing as this
-            # is a high volume operation on stores that need it
-            if (hasattr(store, 'ignore_write_events_on_courses') and
-                    pseudo_course_id not in store.ignore_write_events_on_courses):
-                store.ignore_write_events_on_courses.append(pseudo_course_id)
 
             course_data_path = None
             course_location = None
@@ -217,8 +336,11 @@ def import_from_xml(
                         target_location_namespace or course_location,
                         do_import_static=do_import_static
                     )
+                    if module_imported is not None:
+                        module_imported(module)
 
                     course_items.append(module)
+            timer.end_phase('course')
 
             # then import all the static content
             if static_content_store is not None and do_import_static:
@@ -233,6 +355,7 @@ def import_from_xml(
                     course_data_path, static_content_store,
                     _namespace_rename, subpath='static', verbose=verbose
                 )
+                timer.end_phase('static')
 
             elif verbose and not do_import_static:
                 log.debug(
@@ -262,29 +385,34 @@ def import_from_xml(
                     course_data_path, static_content_store,
                     _namespace_rename, subpath=simport, verbose=verbose
                 )
+                timer.end_phase(simport)
+
+            # finally loop through all the modules, batching their writes
+            with _batched_item_writes(store, bulk_write_location):
+                for module in xml_module_store.modules[course_id].itervalues():
+                    if module.scope_ids.block_type == 'course':
+                        # we've already saved the course module up at the top
+                        # of the loop so just skip over it in the inner loop
+                        continue
+
+                    # remap module to the new namespace
+                    if target_location_namespace is not None:
+                        module = remap_namespace(module, target_location_namespace)
+
+                    if verbose:
+                        log.debug('importing module location {loc}'.format(
+                            loc=module.location
+                        ))
 
-            # finally loop through all the modules
-            for module in xml_module_store.modules[course_id].itervalues():
-                if module.scope_ids.block_type == 'course':
-                    # we've already saved the course module up at the top
-                    # of the loop so just skip over it in the inner loop
-                    continue
-
-                # remap module to the new namespace
-                if target_location_namespace is not None:
-                    module = remap_namespace(module, target_location_namespace)
-
-                if verbose:
-                    log.debug('importing module location {loc}'.format(
-                        loc=module.location
-                    ))
-
-                import_module(
-                    module, store, course_data_path, static_content_store,
-                    course_location,
-                    target_location_namespace if target_location_namespace else course_location,
-                    do_import_static=do_import_static
-                )
+                    import_module(
+                        module, store, course_data_path, static_content_store,
+                        course_location,
+                        target_location_namespace if target_location_namespace else course_location,
+                        do_import_static=do_import_static
+                    )
+                    if module_imported is not None:
+                        module_imported(module)
+            timer.end_phase('modules')
 
             # now import any 'draft' items
             if draft_store is not None:
@@ -297,15 +425,13 @@ def import_from_xml(
                     course_location,
                     target_location_namespace if target_location_namespace else course_location
                 )
+                timer.end_phase('drafts')
 
+            timer.log('Importing {0}'.format(course_id))
         finally:
             # turn back on all write signalling on stores that need it
-            if (hasattr(store, 'ignore_write_events_on_courses') and
-                    pseudo_course_id in store.ignore_write_events_on_courses):
-                store.ignore_write_events_on_courses.remove(pseudo_course_id)
-                store.refresh_cached_metadata_inheritance_tree(
-                    target_location_namespace if target_location_namespace is not None else course_location
-                )
+            for bulk_write_store in bulk_write_stores:
+                bulk_write_store.end_bulk_write_operations(bulk_write_location)
 
     return xml_module_store, course_items
 
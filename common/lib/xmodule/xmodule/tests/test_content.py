@@ -1,5 +1,6 @@
 import unittest
-from xmodule.contentstore.content import StaticContent
+from StringIO import StringIO
+from xmodule.contentstore.content import StaticContent, StaticContentStream
 from xmodule.contentstore.content import ContentStore
 from xmodule.modulestore import Location
 
@@ -36,3 +37,12 @@ class ContentTest(unittest.TestCase):
         # still happen.
         asset_location = StaticContent.compute_location('mitX', '400', 'subs__1eo_jXvZnE .srt.sjson')
         self.assertEqual(Location(u'c4x', u'mitX', u'400', u'asset', u'subs__1eo_jXvZnE_.srt.sjson', None), asset_location)
+
+    def test_stream_data_in_range(self):
+        data = ''.join(chr(ord('a') + index % 26) for index in xrange(5000))
+        content = StaticContentStream('loc', 'name', 'content_type', StringIO(data), length=len(data))
+        self.assertEqual(''.join(content.stream_data_in_range(1000, 3499)), data[1000:3500])
+        self.assertEqual(''.join(content.stream_data_in_range(4990, 4999)), data[4990:])
+
+        content = StaticContent('loc', 'name', 'content_type', data, length=len(data))
+        self.assertEqual(''.join(content.stream_data_in_range(10, 19)), data[10:20])
@@ -0,0 +1,113 @@
+"""
+Tests for the disk cache of asset data.
+"""
+import os
+import shutil
+import tempfile
+import unittest
+from StringIO import StringIO
+
+from mock import patch
+
+from xmodule.contentstore.disk_cache import DiskAssetCache
+
+
+def content_id(name):
+    """
+    Return a content id like those of the mongo contentstore
+    """
+    return {'tag': 'c4x', 'org': 'edX', 'course': 'toy', 'category': 'asset', 'name': name, 'revision': None}
+
+
+class DiskAssetCacheTest(unittest.TestCase):
+    """
+    Tests for DiskAssetCache
+    """
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.cache = DiskAssetCache(self.root, 1350)
+
+    def add(self, name, digest, data):
+        """
+        Serve data through the cache, which adds it to the cache
+        """
+        with self.cache.add(content_id(name), digest, StringIO(data)) as stream:
+            self.assertEqual(''.join(iter(lambda: stream.read(100), '')), data)
+
+    def temp_files(self):
+        """
+        Return the temporary files in the cache
+        """
+        return [
+            filename for __, __, filenames in os.walk(self.root) for filename in filenames
+            if filename.startswith('.tmp')
+        ]
+
+    def test_add_and_open(self):
+        self.assertIsNone(self.cache.open(content_id('a.pdf'), 'md5a'))
+        self.add('a.pdf', 'md5a', 'a' * 300)
+        with self.cache.open(content_id('a.pdf'), 'md5a') as cached_file:
+            self.assertEqual(cached_file.read(), 'a' * 300)
+        self.assertEqual(self.temp_files(), [])
+
+    def test_added_once_read(self):
+        stream = self.cache.add(content_id('a.pdf'), 'md5a', StringIO('a' * 300))
+        self.assertEqual(stream.read(200), 'a' * 200)
+        # not cached until the end is reached
+        self.assertIsNone(self.cache.open(content_id('a.pdf'), 'md5a'))
+        self.assertEqual(stream.read(), 'a' * 100)
+        self.assertIsNotNone(self.cache.open(content_id('a.pdf'), 'md5a'))
+        stream.close()
+
+    def test_partial_read_not_added(self):
+        stream = self.cache.add(content_id('a.pdf'), 'md5a', StringIO('a' * 300))
+        stream.read(100)
+        stream.close()
+        self.assertIsNone(self.cache.open(content_id('a.pdf'), 'md5a'))
+        self.assertEqual(self.temp_files(), [])
+
+    def test_range_read_not_added(self):
+        stream = self.cache.add(content_id('a.pdf'), 'md5a', StringIO('abcdef' * 50))
+        stream.seek(0)
+        stream.seek(200)
+        self.assertEqual(stream.read(), ('abcdef' * 50)[200:])
+        stream.close()
+        self.assertIsNone(self.cache.open(content_id('a.pdf'), 'md5a'))
+        self.assertEqual(self.temp_files(), [])
+
+    def test_keyed_by_digest(self):
+        self.add('a.pdf', 'md5a', 'a' * 300)
+        self.assertIsNone(self.cache.open(content_id('a.pdf'), 'md5b'))
+        self.assertIsNone(self.cache.open(content_id('b.pdf'), 'md5a'))
+
+    def test_delete(self):
+        self.add('a.pdf', 'md5a', 'a' * 300)
+        self.cache.delete(content_id('a.pdf'))
+        self.assertIsNone(self.cache.open(content_id('a.pdf'), 'md5a'))
+
+    def test_evicts_least_recently_used(self):
+        for index, name in enumerate(['a.pdf', 'b.pdf', 'c.pdf']):
+            self.add(name, 'md5', 'x' * 400)
+            # make the order of use unambiguous, whatever the resolution of the file system's times
+            path = os.path.join(self.cache._content_dir(content_id(name)), 'md5')  # pylint: disable=W0212
+            os.utime(path, (index, index))
+        self.cache.open(content_id('a.pdf'), 'md5').close()
+        self.add('d.pdf', 'md5', 'x' * 400)
+
+        self.assertIsNotNone(self.cache.open(content_id('a.pdf'), 'md5'))
+        self.assertIsNone(self.cache.open(content_id('b.pdf'), 'md5'))
+        self.assertIsNotNone(self.cache.open(content_id('c.pdf'), 'md5'))
+        self.assertIsNotNone(self.cache.open(content_id('d.pdf'), 'md5'))
+
+    def test_tracks_size_without_rescanning(self):
+        with patch.object(self.cache, '_entries', wraps=self.cache._entries) as mock_entries:  # pylint: disable=W0212
+            for name in ['a.pdf', 'b.pdf', 'c.pdf']:
+                self.add(name, 'md5', 'x' * 400)
+            self.cache.delete(content_id('a.pdf'))
+            self.add('d.pdf', 'md5', 'x' * 400)
+            # only scanned for the size of the cache when the first entry was added
+            self.assertEqual(mock_entries.call_count, 1)
+            self.add('e.pdf', 'md5', 'x' * 400)
+            # which is over its size now
+            self.assertEqual(mock_entries.call_count, 2)
@@ -1,6 +1,7 @@
 """
 Tests that check that we ignore the appropriate files when importing courses.
 """
+import hashlib
 import unittest
 from mock import Mock
 from xmodule.modulestore import Location
@@ -10,14 +11,37 @@ from xmodule.tests import DATA_DIR
 
 class IgnoredFilesTestCase(unittest.TestCase):
     "Tests for ignored files"
+    def setUp(self):
+        self.course_dir = DATA_DIR / "tilde"
+        self.loc = Location("edX", "tilde", "Fall_2012")
+        self.content_store = Mock()
+        self.content_store.generate_thumbnail.return_value = ("content", "location")
+        self.content_store.get_all_content_for_course.return_value = ([], 0)
+        # the content is streamed from the file, so read it while it's being saved
+        self.saved_data = {}
+        self.content_store.save.side_effect = lambda content: self.saved_data.update(
+            {content.name: ''.join(content.stream_data())}
+        )
+
     def test_ignore_tilde_static_files(self):
-        course_dir = DATA_DIR / "tilde"
-        loc = Location("edX", "tilde", "Fall_2012")
-        content_store = Mock()
-        content_store.generate_thumbnail.return_value = ("content", "location")
-        import_static_content(Mock(), Mock(), course_dir, content_store, loc)
-        saved_static_content = [call[0][0] for call in content_store.save.call_args_list]
-        name_val = {sc.name: sc.data for sc in saved_static_content}
-        self.assertIn("example.txt", name_val)
-        self.assertNotIn("example.txt~", name_val)
-        self.assertIn("GREEN", name_val["example.txt"])
+        import_static_content(Mock(), Mock(), self.course_dir, self.content_store, self.loc)
+        self.assertIn("example.txt", self.saved_data)
+        self.assertNotIn("example.txt~", self.saved_data)
+        self.assertIn("GREEN", self.saved_data["example.txt"])
+
+    def test_skip_unchanged_static_files(self):
+        with open(self.course_dir / "static" / "example.txt", 'rb') as asset_file:
+            md5 = hashlib.md5(asset_file.read()).hexdigest()
+        existing_asset = {
+            '_id': {'name': 'example.txt'}, 'displayname': 'example.txt', 'contentType': 'text/plain',
+            'import_path': 'example.txt', 'md5': md5,
+        }
+        self.content_store.get_all_content_for_course.return_value = ([existing_asset], 1)
+        remap_dict = import_static_content(Mock(), Mock(), self.course_dir, self.content_store, self.loc)
+        self.assertFalse(self.content_store.save.called)
+        self.assertEqual(remap_dict, {'example.txt': 'example.txt'})
+
+        # a changed file is imported again
+        existing_asset['md5'] = hashlib.md5('changed').hexdigest()
+        import_static_content(Mock(), Mock(), self.course_dir, self.content_store, self.loc)
+        self.assertIn("GREEN", self.saved_data["example.txt"])
@@ -12,6 +12,8 @@ file and check it in at the same time as your model changes. To do that,
 
 """
 import logging
+from string import Formatter
+
 from django.db import models, transaction
 from django.contrib.auth.models import User
 from html_to_text import html_to_text
@@ -213,6 +215,90 @@ class CourseEmailTemplate(models.Model):
         """
         return CourseEmailTemplate._render(self.html_template, htmltext, context)
 
+    def compile_plaintext(self, plaintext, context):
+        """
+        Create a CompiledEmailTemplate of the plain text message.
+
+        `context` holds the values which are the same for every recipient,
+        which are substituted into the stored plain template once.
+        """
+        return CompiledEmailTemplate(self.plain_template, plaintext, context)
+
+    def compile_htmltext(self, htmltext, context):
+        """
+        Create a CompiledEmailTemplate of the HTML text message.
+
+        `context` holds the values which are the same for every recipient,
+        which are substituted into the stored HTML template once.
+        """
+        return CompiledEmailTemplate(self.html_template, htmltext, context)
+
+
+class CompiledEmailTemplate(object):
+    """
+    A course email template, with a message body and the values which are the
+    same for every recipient already substituted into it.
+
+    The fields named in `RECIPIENT_FIELDS` are left in place, so rendering the
+    message for each recipient of a bulk email only has to join the compiled
+    pieces with that recipient's values, instead of reformatting the whole
+    template.  The result is the same as that of CourseEmailTemplate._render().
+    """
+    RECIPIENT_FIELDS = ('name', 'email')
+
+    def __init__(self, format_string, message_body, context):
+        formatter = Formatter()
+        # Alternating literal text and (field_name, conversion, format_spec) tuples of recipient fields.
+        self.pieces = []
+        literal_text = []
+        for text, field_name, format_spec, conversion in formatter.parse(format_string):
+            literal_text.append(text)
+            if field_name is None:
+                continue
+            if self._base_name(field_name) in self.RECIPIENT_FIELDS:
+                self.pieces.append(u''.join(literal_text))
+                self.pieces.append((field_name, conversion, format_spec))
+                literal_text = []
+            else:
+                literal_text.append(self._format_field(formatter, field_name, conversion, format_spec, context))
+        self.pieces.append(u''.join(literal_text))
+
+        # Insert the message body in place of the (formatted) body tag,
+        # as CourseEmailTemplate._render() does.
+        message_body_tag = COURSE_EMAIL_MESSAGE_BODY_TAG.format()
+        for index in range(0, len(self.pieces), 2):
+            if message_body_tag in self.pieces[index]:
+                self.pieces[index] = self.pieces[index].replace(message_body_tag, message_body, 1)
+                break
+
+    @staticmethod
+    def _base_name(field_name):
+        """Returns the name of the context value used by a field, e.g. 'a' for 'a.b[0]'."""
+        return field_name.split('.', 1)[0].split('[', 1)[0]
+
+    @staticmethod
+    def _format_field(formatter, field_name, conversion, format_spec, context):
+        """Formats one field of the template, as str.format() would."""
+        value, _ = formatter.get_field(field_name, (), context)
+        value = formatter.convert_field(value, conversion)
+        format_spec = formatter.vformat(format_spec, (), context)
+        return formatter.format_field(value, format_spec)
+
+    def render(self, context):
+        """
+        Render the message for one recipient, whose values for the
+        `RECIPIENT_FIELDS` are provided in the `context` dict.
+        """
+        formatter = Formatter()
+        result = []
+        for index, piece in enumerate(self.pieces):
+            if index % 2:
+                field_name, conversion, format_spec = piece
+                result.append(self._format_field(formatter, field_name, conversion, format_spec, context))
+            else:
+                result.append(piece)
+        return u''.join(result)
+
 
 class CourseAuthorization(models.Model):
     """
@@ -0,0 +1,72 @@
+"""
+Limits the rate at which bulk email is sent by all of the workers sending it.
+"""
+from time import time, sleep
+
+from django.core.cache import cache
+
+# Cache key of the rate currently allowed, in emails per second
+SEND_RATE_KEY = 'bulk_email.send_rate'
+# Cache key of the number of emails sent in a one-second window
+SENDS_KEY = 'bulk_email.sends.{window}'
+# Seconds after which a reduced rate is forgotten, if it isn't changed again
+SEND_RATE_TIMEOUT = 10 * 60
+
+
+class SendRateLimiter(object):
+    """
+    A rate limiter for sending bulk email, shared by all of the workers through
+    the django cache.
+
+    Sends are counted in one-second windows with atomic cache increments, so that
+    the workers between them send no more than the allowed rate.  The allowed
+    rate starts at `max_rate`, and adapts to what the email backend will accept:
+    it is halved (down to `min_rate`) whenever the backend says that email is
+    being sent too quickly, and grows back by one for each batch of emails sent
+    without complaint.  Updates of the rate by different workers may overwrite each
+    other, which only makes the adaptation a little slower.
+
+    A `max_rate` of None doesn't limit sends at all.
+    """
+    def __init__(self, max_rate, min_rate=1):
+        self.max_rate = max_rate
+        self.min_rate = min_rate
+
+    def get_rate(self):
+        """Returns the number of emails per second currently allowed."""
+        rate = cache.get(SEND_RATE_KEY)
+        return rate if rate is not None else self.max_rate
+
+    def acquire(self):
+        """
+        Waits until another email may be sent.
+        """
+        if self.max_rate is None:
+            return
+
+        while True:
+            now = time()
+            window = int(now)
+            key = SENDS_KEY.format(window=window)
+            cache.add(key, 0, timeout=10)
+            try:
+                num_sent = cache.incr(key)
+            except ValueError:
+                # the count expired between add() and incr()
+                cache.set(key, 1, timeout=10)
+                num_sent = 1
+            if num_sent <= self.get_rate():
+                return
+            sleep(window + 1 - now)
+
+    def slow_down(self):
+        """Halves the allowed rate, as the email backend says email is being sent too quickly."""
+        if self.max_rate is not None:
+            cache.set(SEND_RATE_KEY, max(self.min_rate, self.get_rate() / 2.0), timeout=SEND_RATE_TIMEOUT)
+
+    def speed_up(self):
+        """Increases the allowed rate by one email per second, up to `max_rate`."""
+        if self.max_rate is not None:
+            rate = self.get_rate()
+            if rate < self.max_rate:
+                cache.set(SEND_RATE_KEY, min(self.max_rate, rate + 1), timeout=SEND_RATE_TIMEOUT)
@@ -5,7 +5,7 @@ to a course.
 import re
 import random
 import json
-from time import sleep
+from time import time, sleep
 
 from dogapi import dog_stats_api
 from smtplib import SMTPServerDisconnected, SMTPDataError, SMTPConnectError, SMTPException
@@ -36,6 +36,7 @@ from bulk_email.models import (
     CourseEmail, Optout, CourseEmailTemplate,
     SEND_TO_MYSELF, SEND_TO_ALL, TO_OPTIONS,
 )
+from bulk_email.rate_limit import SendRateLimiter
 from courseware.courses import get_course, course_image_url
 from student.roles import CourseStaffRole, CourseInstructorRole
 from instructor_task.models import InstructorTask
@@ -89,6 +90,10 @@ BULK_EMAIL_FAILURE_ERRORS = (
     SMTPException,
 )
 
+# The connection to the email backend kept open by this worker process
+# between tasks, and when it was last used.
+_KEPT_CONNECTION = {'connection': None, 'last_used': 0}
+
 
 def _get_recipient_queryset(user_id, to_option, course_id, course_location):
     """
@@ -97,7 +102,8 @@ def _get_recipient_queryset(user_id, to_option, course_id, course_location):
     `to_option` is either SEND_TO_MYSELF, SEND_TO_STAFF, or SEND_TO_ALL.
 
     Recipients who are in more than one category (e.g. enrolled in the course and are staff or self)
-    will be properly deduped.
+    will be properly deduped.  Recipients who have opted out of email from the course are
+    excluded by the query itself, rather than being filtered out of each subtask's list.
     """
     if to_option not in TO_OPTIONS:
         log.error("Unexpected bulk email TO_OPTION found: %s", to_option)
@@ -120,6 +126,7 @@ def _get_recipient_queryset(user_id, to_option, course_id, course_location):
             recipient_qset = recipient_qset | enrollment_qset
         recipient_qset = recipient_qset.distinct()
 
+    recipient_qset = recipient_qset.exclude(optout__course_id=course_id)
     recipient_qset = recipient_qset.order_by('pk')
     return recipient_qset
 
@@ -219,7 +226,7 @@ def perform_delegate_email_batches(entry_id, course_id, task_input, action_name)
         return new_subtask
 
     recipient_qset = _get_recipient_queryset(user_id, to_option, course_id, course.location)
-    recipient_fields = ['profile__name', 'email']
+    recipient_fields = ['email', 'profile__name']
 
     log.info(u"Task %s: Preparing to queue subtasks for sending emails for course %s, email %s, to_option %s",
              task_id, course_id, email_id, to_option)
@@ -250,10 +257,8 @@ def send_course_email(entry_id, email_id, to_list, global_email_context, subtask
     Inputs are:
       * `entry_id`: id of the InstructorTask object to which progress should be recorded.
       * `email_id`: id of the CourseEmail model that is to be emailed.
-      * `to_list`: list of recipients.  Each is represented as a dict with the following keys:
-        - 'profile__name': full name of User.
-        - 'email': email address of User.
-        - 'pk': primary key of User model.
+      * `to_list`: list of recipients.  Each is represented as a (pk, email, profile__name) tuple
+        (a list, once serialized) with the primary key, email address and full name of the User.
       * `global_email_context`: dict containing values that are unique for this email but the same
         for all recipients of this email.  This dict is to be used to fill in slots in email
         template.  It does not include 'name' and 'email', which will be provided by the to_list.
@@ -273,9 +278,10 @@ def send_course_email(entry_id, email_id, to_list, global_email_context, subtask
         Most values will be zero on initial call, but may be different when the task is
         invoked as part of a retry.
 
-    Sends to all addresses contained in to_list that are not also in the Optout table.
-    Emails are sent multi-part, in both plain text and html.  Updates InstructorTask object
-    with status information (sends, failures, skips) and updates number of subtasks completed.
+    Sends to all addresses contained in to_list, from which users in the Optout table have
+    already been excluded.  Emails are sent multi-part, in both plain text and html.  Updates
+    InstructorTask object with status information (sends, failures, skips) and updates number
+    of subtasks completed.
     """
     subtask_status = SubtaskStatus.from_dict(subtask_status_dict)
     current_task_id = subtask_status.task_id
@@ -337,24 +343,25 @@ def send_course_email(entry_id, email_id, to_list, global_email_context, subtask
     return new_subtask_status.to_dict()
 
 
-def _filter_optouts_from_recipients(to_list, course_id):
+def _convert_legacy_recipients(to_list, course_id, filter_optouts):
     """
-    Filters a recipient list based on student opt-outs for a given course.
+    Converts a recipient list queued before recipients were (pk, email, profile__name) tuples,
+    when each was a dict with 'pk', 'email' and 'profile__name' keys, and users who opted out
+    of email from the course were not yet excluded from it.
 
-    Returns the filtered recipient list, as well as the number of optouts
-    removed from the list.
+    Returns the list of recipient tuples, without the users who opted out if `filter_optouts`
+    is True, and the number of users who opted out.
     """
-    optouts = Optout.objects.filter(
-        course_id=course_id,
-        user__in=[i['pk'] for i in to_list]
-    ).values_list('user__email', flat=True)
-    optouts = set(optouts)
-    # Only count the num_optout for the first time the optouts are calculated.
-    # We assume that the number will not change on retries, and so we don't need
-    # to calculate it each time.
-    num_optout = len(optouts)
-    to_list = [recipient for recipient in to_list if recipient['email'] not in optouts]
-    return to_list, num_optout
+    num_optout = 0
+    if filter_optouts:
+        optouts = Optout.objects.filter(
+            course_id=course_id,
+            user__in=[recipient['pk'] for recipient in to_list]
+        ).values_list('user__email', flat=True)
+        optouts = set(optouts)
+        num_optout = len(optouts)
+        to_list = [recipient for recipient in to_list if recipient['email'] not in optouts]
+    return [(recipient['pk'], recipient['email'], recipient['profile__name']) for recipient in to_list], num_optout
 
 
 def _get_source_address(course_id, course_title):
@@ -389,17 +396,15 @@ def _send_course_email(entry_id, email_id, to_list, global_email_context, subtas
     Inputs are:
       * `entry_id`: id of the InstructorTask object to which progress should be recorded.
       * `email_id`: id of the CourseEmail model that is to be emailed.
-      * `to_list`: list of recipients.  Each is represented as a dict with the following keys:
-        - 'profile__name': full name of User.
-        - 'email': email address of User.
-        - 'pk': primary key of User model.
+      * `to_list`: list of recipients.  Each is represented as a (pk, email, profile__name) tuple
+        (a list, once serialized) with the primary key, email address and full name of the User.
       * `global_email_context`: dict containing values that are unique for this email but the same
         for all recipients of this email.  This dict is to be used to fill in slots in email
         template.  It does not include 'name' and 'email', which will be provided by the to_list.
       * `subtask_status` : object of class SubtaskStatus representing current status.
 
-    Sends to all addresses contained in to_list that are not also in the Optout table.
-    Emails are sent multi-part, in both plain text and html.
+    Sends to all addresses contained in to_list, from which users in the Optout table have
+    already been excluded.  Emails are sent multi-part, in both plain text and html.
 
     Returns a tuple of two values:
       * First value is a SubtaskStatus object which represents current progress at the end of this call.
@@ -417,14 +422,12 @@ def _send_course_email(entry_id, email_id, to_list, global_email_context, subtas
         log.exception("Task %s: could not find email id:%s to send.", task_id, email_id)
         raise
 
-    # Exclude optouts (if not a retry):
-    # Note that we don't have to do the optout logic at all if this is a retry,
-    # because we have presumably already performed the optout logic on the first
-    # attempt.  Anyone on the to_list on a retry has already passed the filter
-    # that existed at that time, and we don't need to keep checking for changes
-    # in the Optout list.
-    if subtask_status.get_retry_count() == 0:
-        to_list, num_optout = _filter_optouts_from_recipients(to_list, course_email.course_id)
+    # Subtasks queued by an older version may still have recipient dicts, which would otherwise
+    # unpack into their keys.  As that version did, filter out optouts only on the first attempt.
+    if to_list and isinstance(to_list[0], dict):
+        to_list, num_optout = _convert_legacy_recipients(
+            to_list, course_email.course_id, subtask_status.get_retry_count() == 0
+        )
         subtask_status.increment(skipped=num_optout)
 
     course_title = global_email_context['course_title']
@@ -432,28 +435,38 @@ def _send_course_email(entry_id, email_id, to_list, global_email_context, subtas
     from_addr = _get_source_address(course_email.course_id, course_title)
 
     course_email_template = CourseEmailTemplate.get_template()
+    rate_limiter = SendRateLimiter(settings.BULK_EMAIL_MAX_SEND_RATE)
+    num_sent_since_speed_up = 0
+    connection = None
     try:
-        connection = get_connection()
-        connection.open()
+        connection = _get_open_connection()
 
-        # Define context values to use in all course emails:
+        # Define context values to use in all course emails, and substitute
+        # them into the templates once, leaving only the user-specific values:
         email_context = {'name': '', 'email': ''}
         email_context.update(global_email_context)
+        plaintext_template = course_email_template.compile_plaintext(course_email.text_message, email_context)
+        html_template = course_email_template.compile_htmltext(course_email.html_message, email_context)
 
         while to_list:
+            # Wait until the rate limiter, shared by all workers, lets us send another email.
+            # Without a rate limit, just slow down if this task was retried because of throttling.
+            rate_limiter.acquire()
+            if settings.BULK_EMAIL_MAX_SEND_RATE is None and subtask_status.retried_nomax > 0:
+                sleep(settings.BULK_EMAIL_RETRY_DELAY_BETWEEN_SENDS)
+
             # Update context with user-specific values from the user at the end of the list.
             # At the end of processing this user, they will be popped off of the to_list.
             # That way, the to_list will always contain the recipients remaining to be emailed.
             # This is convenient for retries, which will need to send to those who haven't
             # yet been emailed, but not send to those who have already been sent to.
-            current_recipient = to_list[-1]
-            email = current_recipient['email']
+            _user_id, email, name = to_list[-1]
             email_context['email'] = email
-            email_context['name'] = current_recipient['profile__name']
+            email_context['name'] = name
 
             # Construct message content using templates and context:
-            plaintext_msg = course_email_template.render_plaintext(course_email.text_message, email_context)
-            html_msg = course_email_template.render_htmltext(course_email.html_message, email_context)
+            plaintext_msg = plaintext_template.render(email_context)
+            html_msg = html_template.render(email_context)
 
             # Create email:
             email_msg = EmailMultiAlternatives(
@@ -465,17 +478,8 @@ def _send_course_email(entry_id, email_id, to_list, global_email_context, subtas
             )
             email_msg.attach_alternative(html_msg, 'text/html')
 
-            # Throttle if we have gotten the rate limiter.  This is not very high-tech,
-            # but if a task has been retried for rate-limiting reasons, then we sleep
-            # for a period of time between all emails within this task.  Choice of
-            # the value depends on the number of workers that might be sending email in
-            # parallel, and what the SES throttle rate is.
-            if subtask_status.retried_nomax > 0:
-                sleep(settings.BULK_EMAIL_RETRY_DELAY_BETWEEN_SENDS)
-
             try:
                 log.debug('Email with id %s to be sent to %s', email_id, email)
-
                 with dog_stats_api.timer('course_email.single_send.time.overall', tags=[_statsd_tag(course_title)]):
                     connection.send_messages([email_msg])
 
@@ -509,8 +513,16 @@ def _send_course_email(entry_id, email_id, to_list, global_email_context, subtas
             # needed to be retried, the user is still on the list.)
             to_list.pop()
 
+            num_sent_since_speed_up += 1
+            if num_sent_since_speed_up == settings.BULK_EMAIL_SEND_BATCH_SIZE:
+                # A batch was sent without being told to slow down.
+                rate_limiter.speed_up()
+                num_sent_since_speed_up = 0
+
     except INFINITE_RETRY_ERRORS as exc:
         dog_stats_api.increment('course_email.infinite_retry', tags=[_statsd_tag(course_title)])
+        # Email is being sent too quickly, so have all workers send it more slowly.
+        rate_limiter.slow_down()
         # Increment the "retried_nomax" counter, update other counters with progress to date,
         # and set the state to RETRY:
         subtask_status.increment(retried_nomax=1, state=RETRY)
@@ -562,7 +574,40 @@ def _send_course_email(entry_id, email_id, to_list, global_email_context, subtas
         # Successful completion is marked by an exception value of None.
         return subtask_status, None
     finally:
-        # Clean up at the end.
+        # Clean up at the end, keeping the connection open for the next task if it still works.
+        if connection is not None:
+            _release_connection(connection, reusable=subtask_status.state == SUCCESS)
+
+
+def _get_open_connection():
+    """
+    Returns an open connection to the email backend.
+
+    The connection kept open by the last task run by this worker process is reused,
+    if it was last used within settings.BULK_EMAIL_CONNECTION_IDLE_TIMEOUT seconds,
+    to save opening (and authenticating) a new connection for every task.
+    """
+    connection = _KEPT_CONNECTION['connection']
+    _KEPT_CONNECTION['connection'] = None
+    if connection is not None:
+        if time() - _KEPT_CONNECTION['last_used'] < settings.BULK_EMAIL_CONNECTION_IDLE_TIMEOUT:
+            return connection
+        connection.close()
+
+    connection = get_connection()
+    connection.open()
+    return connection
+
+
+def _release_connection(connection, reusable):
+    """
+    Keeps `connection` open for the next task run by this worker process, if it
+    is `reusable` and connections are to be kept open at all, or else closes it.
+    """
+    if reusable and settings.BULK_EMAIL_CONNECTION_IDLE_TIMEOUT > 0:
+        _KEPT_CONNECTION['connection'] = connection
+        _KEPT_CONNECTION['last_used'] = time()
+    else:
         connection.close()
 
 
@@ -669,7 +714,7 @@ def _submit_for_retry(entry_id, email_id, to_list, global_email_context, current
         # and update status as if it were any other failure.  That means that
         # the recipients still in the to_list are counted as failures.
         log.exception('Task %s: email with id %d caused send_course_email task to fail to retry. To list: %s',
-                      task_id, email_id, [i['email'] for i in to_list])
+                      task_id, email_id, [email for _user_id, email, _name in to_list])
         num_failed = len(to_list)
         subtask_status.increment(subtask_status, failed=num_failed, state=FAILURE)
         return subtask_status, retry_exc
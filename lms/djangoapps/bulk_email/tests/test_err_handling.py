@@ -77,6 +77,26 @@ class TestEmailErrors(ModuleStoreTestCase):
         exc = kwargs['exc']
         self.assertIsInstance(exc, SMTPDataError)
 
+    @patch('bulk_email.tasks.get_connection', autospec=True)
+    @patch('bulk_email.tasks.send_course_email.retry')
+    @patch('bulk_email.tasks.SendRateLimiter')
+    def test_data_err_slows_sending(self, mock_limiter_class, retry, get_conn):
+        """
+        Test that all workers are made to send more slowly on being told sending is too fast.
+        """
+        get_conn.return_value.send_messages.side_effect = SMTPDataError(455, "Throttling: Sending rate exceeded")
+        test_email = {
+            'action': 'Send email',
+            'to_option': 'myself',
+            'subject': 'test subject for myself',
+            'message': 'test message for myself'
+        }
+        self.client.post(self.url, test_email)
+
+        self.assertTrue(retry.called)
+        self.assertTrue(mock_limiter_class.return_value.slow_down.called)
+        self.assertFalse(mock_limiter_class.return_value.speed_up.called)
+
     @patch('bulk_email.tasks.get_connection', autospec=True)
     @patch('bulk_email.tasks.update_subtask_status')
     @patch('bulk_email.tasks.send_course_email.retry')
@@ -288,7 +308,7 @@ class TestEmailErrors(ModuleStoreTestCase):
         with self.assertRaisesRegexp(DuplicateTaskException, 'already retried'):
             send_course_email(entry_id, bogus_email_id, to_list, global_email_context, new_subtask_status.to_dict())
 
-    def test_send_email_with_locked_instructor_task(self):
+    def test_send_email_with_failed_subtask_update(self):
         # test at a lower level, to ensure that the course gets checked down below too.
         entry = InstructorTask.create(self.course.id, "task_type", "task_key", "task_input", self.instructor)
         entry_id = entry.id  # pylint: disable=E1101
@@ -298,11 +318,11 @@ class TestEmailErrors(ModuleStoreTestCase):
         bogus_email_id = 1001
         to_list = ['test@test.com']
         global_email_context = {'course_title': 'dummy course'}
-        with patch('instructor_task.subtasks.InstructorTask.save') as mock_task_save:
-            mock_task_save.side_effect = DatabaseError
+        with patch('instructor_task.subtasks._save_subtask_status') as mock_save_status:
+            mock_save_status.side_effect = DatabaseError
             with self.assertRaises(DatabaseError):
                 send_course_email(entry_id, bogus_email_id, to_list, global_email_context, subtask_status.to_dict())
-            self.assertEquals(mock_task_save.call_count, MAX_DATABASE_LOCK_RETRIES)
+            self.assertEquals(mock_save_status.call_count, MAX_DATABASE_LOCK_RETRIES)
 
     def test_send_email_undefined_email(self):
         # test at a lower level, to ensure that the course gets checked down below too.
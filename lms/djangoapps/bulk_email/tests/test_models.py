@@ -103,6 +103,29 @@ class CourseEmailTemplateTest(TestCase):
         context = self._get_sample_plain_context()
         template.render_plaintext("My new plain text.", context)
 
+    def test_compiled_templates_render_the_same(self):
+        template = CourseEmailTemplate.get_template()
+        context = self._get_sample_html_context()
+        global_context = dict(context)
+        global_context.pop('name', None)
+        global_context.pop('email', None)
+        compiled_html = template.compile_htmltext("My new html text.", global_context)
+        compiled_plain = template.compile_plaintext("My new plain text.", global_context)
+        for name, email in [('Fred', 'fred@test.com'), (u'Z\xfc {name}', 'z@test.com')]:
+            context.update(name=name, email=email)
+            self.assertEquals(compiled_html.render(context), template.render_htmltext("My new html text.", context))
+            self.assertEquals(compiled_plain.render(context), template.render_plaintext("My new plain text.", context))
+
+    def test_compiled_template_without_context(self):
+        template = CourseEmailTemplate.get_template()
+        context = self._get_sample_plain_context()
+        del context['course_title']
+        with self.assertRaises(KeyError):
+            template.compile_plaintext("My new plain text.", context)
+        compiled = template.compile_plaintext("My new plain text.", self._get_sample_plain_context())
+        with self.assertRaises(KeyError):
+            compiled.render({'name': 'Fred'})
+
 
 class CourseAuthorizationTest(TestCase):
     """Test the CourseAuthorization model."""
@@ -0,0 +1,80 @@
+"""
+Unit tests for the rate limiter of bulk email sends.
+"""
+from django.core.cache import cache
+from django.test import TestCase
+from mock import patch
+
+from bulk_email.rate_limit import SendRateLimiter
+
+
+class SendRateLimiterTest(TestCase):
+    """Test the SendRateLimiter shared by workers through the cache."""
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def test_unlimited(self):
+        limiter = SendRateLimiter(None)
+        with patch('bulk_email.rate_limit.sleep') as mock_sleep:
+            for _ in range(100):
+                limiter.acquire()
+        self.assertFalse(mock_sleep.called)
+        limiter.slow_down()
+        self.assertIsNone(limiter.get_rate())
+
+    @patch('bulk_email.rate_limit.time')
+    @patch('bulk_email.rate_limit.sleep')
+    def test_waits_for_next_window(self, mock_sleep, mock_time):
+        limiter = SendRateLimiter(14)
+        mock_time.return_value = 1000.25
+        for _ in range(14):
+            limiter.acquire()
+        self.assertFalse(mock_sleep.called)
+
+        # the fifteenth email has to wait for the next second
+        def next_second(_seconds):
+            """Moves time on to the next window"""
+            mock_time.return_value = 1001.0
+        mock_sleep.side_effect = next_second
+        limiter.acquire()
+        mock_sleep.assert_called_once_with(0.75)
+
+    @patch('bulk_email.rate_limit.time')
+    @patch('bulk_email.rate_limit.sleep')
+    def test_slow_rate(self, mock_sleep, mock_time):
+        limiter = SendRateLimiter(14)
+        for _ in range(3):
+            limiter.slow_down()
+        # the rate is now 1.75, so only one email is sent per second
+        mock_time.return_value = 1000.5
+        limiter.acquire()
+        self.assertFalse(mock_sleep.called)
+
+        def next_second(_seconds):
+            """Moves time on to the next window"""
+            mock_time.return_value += 1
+        mock_sleep.side_effect = next_second
+        limiter.acquire()
+        self.assertEquals(mock_sleep.call_count, 1)
+        limiter.acquire()
+        self.assertEquals(mock_sleep.call_count, 2)
+
+    def test_slow_down_and_speed_up(self):
+        limiter = SendRateLimiter(14, min_rate=2)
+        limiter.slow_down()
+        self.assertEquals(limiter.get_rate(), 7)
+        limiter.slow_down()
+        limiter.slow_down()
+        limiter.slow_down()
+        self.assertEquals(limiter.get_rate(), 2)
+        limiter.speed_up()
+        self.assertEquals(limiter.get_rate(), 3)
+        for _ in range(20):
+            limiter.speed_up()
+        self.assertEquals(limiter.get_rate(), 14)
+
+    def test_rate_shared_between_limiters(self):
+        SendRateLimiter(14).slow_down()
+        self.assertEquals(SendRateLimiter(14).get_rate(), 7)
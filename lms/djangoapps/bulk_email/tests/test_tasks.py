@@ -27,12 +27,15 @@ from celery.states import SUCCESS, FAILURE
 
 from django.conf import settings
 from django.core.management import call_command
+from django.db import connection
+from django.test.utils import override_settings
 
 from bulk_email.models import CourseEmail, Optout, SEND_TO_ALL
 
+from bulk_email.tasks import _KEPT_CONNECTION, _get_course_email_context, send_course_email
 from instructor_task.tasks import send_bulk_course_email
-from instructor_task.subtasks import update_subtask_status, SubtaskStatus
-from instructor_task.models import InstructorTask
+from instructor_task.subtasks import initialize_subtask_info, update_subtask_status, SubtaskStatus
+from instructor_task.models import InstructorTask, InstructorSubtask
 from instructor_task.tests.test_base import InstructorTaskCourseTestCase
 from instructor_task.tests.factories import InstructorTaskFactory
 
@@ -60,10 +63,8 @@ def my_update_subtask_status(entry_id, current_task_id, new_subtask_status):
     This should not be an issue in production, where status is updated before
     a task is retried, and is then updated afterwards if the retry fails.
     """
-    entry = InstructorTask.objects.get(pk=entry_id)
-    subtask_dict = json.loads(entry.subtasks)
-    subtask_status_info = subtask_dict['status']
-    current_subtask_status = SubtaskStatus.from_dict(subtask_status_info[current_task_id])
+    subtask = InstructorSubtask.objects.get(instructor_task=entry_id, task_id=current_task_id)
+    current_subtask_status = SubtaskStatus.from_dict(json.loads(subtask.status))
     current_retry_count = current_subtask_status.get_retry_count()
     new_retry_count = new_subtask_status.get_retry_count()
     if current_retry_count <= new_retry_count:
@@ -194,6 +195,34 @@ class TestBulkEmailInstructorTask(InstructorTaskCourseTestCase):
             get_conn.return_value.send_messages.side_effect = cycle([None])
             self._test_run_with_task(send_bulk_course_email, 'emailed', num_emails, num_emails)
 
+    @override_settings(BULK_EMAIL_CONNECTION_IDLE_TIMEOUT=10)
+    def test_connection_kept_open_between_tasks(self):
+        self.addCleanup(_KEPT_CONNECTION.update, {'connection': None, 'last_used': 0})
+        num_emails = settings.BULK_EMAIL_EMAILS_PER_TASK
+        self._create_students(num_emails - 1)
+        with patch('bulk_email.tasks.get_connection', autospec=True) as get_conn:
+            get_conn.return_value.send_messages.side_effect = cycle([None])
+            self._test_run_with_task(send_bulk_course_email, 'emailed', num_emails, num_emails)
+            self._test_run_with_task(send_bulk_course_email, 'emailed', num_emails, num_emails)
+        # the second task used the connection the first one left open:
+        self.assertEquals(get_conn.call_count, 1)
+        self.assertEquals(get_conn.return_value.open.call_count, 1)
+        self.assertFalse(get_conn.return_value.close.called)
+        self.assertIs(_KEPT_CONNECTION['connection'], get_conn.return_value)
+
+    @override_settings(BULK_EMAIL_SEND_BATCH_SIZE=30)
+    def test_sends_rate_limited_per_email(self):
+        num_emails = settings.BULK_EMAIL_EMAILS_PER_TASK
+        self._create_students(num_emails - 1)
+        with patch('bulk_email.tasks.SendRateLimiter') as mock_limiter_class:
+            with patch('bulk_email.tasks.get_connection', autospec=True) as get_conn:
+                get_conn.return_value.send_messages.side_effect = cycle([None])
+                self._test_run_with_task(send_bulk_course_email, 'emailed', num_emails, num_emails)
+        mock_limiter = mock_limiter_class.return_value
+        self.assertEquals(mock_limiter.acquire.call_count, num_emails)
+        self.assertEquals(mock_limiter.speed_up.call_count, num_emails // 30)
+        self.assertFalse(mock_limiter.slow_down.called)
+
     def test_successful_twice(self):
         # Select number of emails to fit into a single subtask.
         num_emails = settings.BULK_EMAIL_EMAILS_PER_TASK
@@ -224,20 +253,75 @@ class TestBulkEmailInstructorTask(InstructorTaskCourseTestCase):
             get_conn.return_value.send_messages.side_effect = cycle([None])
             self._test_run_with_task(send_bulk_course_email, 'emailed', num_emails - 1, num_emails - 1)
 
-    def test_skipped(self):
+    def test_optouts_not_queued(self):
         # Select number of emails to fit into a single subtask.
         num_emails = settings.BULK_EMAIL_EMAILS_PER_TASK
         # We also send email to the instructor:
         students = self._create_students(num_emails - 1)
         # have every fourth student optout:
-        expected_skipped = int((num_emails + 3) / 4.0)
-        expected_succeeds = num_emails - expected_skipped
+        num_optouts = int((num_emails + 3) / 4.0)
+        expected_succeeds = num_emails - num_optouts
         for index in range(0, num_emails, 4):
             Optout.objects.create(user=students[index], course_id=self.course.id)
-        # mark some students as opting out
+        # students who opted out are left out of the recipients altogether, rather than skipped:
         with patch('bulk_email.tasks.get_connection', autospec=True) as get_conn:
             get_conn.return_value.send_messages.side_effect = cycle([None])
-            self._test_run_with_task(send_bulk_course_email, 'emailed', num_emails, expected_succeeds, skipped=expected_skipped)
+            self._test_run_with_task(send_bulk_course_email, 'emailed', expected_succeeds, expected_succeeds)
+        sent_to = set(call_args[0][0][0].to[0] for call_args in get_conn.return_value.send_messages.call_args_list)
+        self.assertFalse(sent_to & set(students[index].email for index in range(0, num_emails, 4)))
+
+    def test_recipients_queued_as_dicts(self):
+        # Subtasks queued before recipients were tuples have lists of dicts, which
+        # haven't had the users who opted out taken out yet.
+        students = self._create_students(3)
+        Optout.objects.create(user=students[0], course_id=self.course.id)
+        task_entry = self._create_input_entry()
+        subtask_id = str(uuid4())
+        initialize_subtask_info(task_entry, 'emailed', len(students), [subtask_id])
+        email_id = json.loads(task_entry.task_input)['email_id']
+        to_list = [
+            {'pk': student.pk, 'email': student.email, 'profile__name': student.profile.name}
+            for student in students
+        ]
+        with patch('bulk_email.tasks.get_connection', autospec=True) as get_conn:
+            get_conn.return_value.send_messages.side_effect = cycle([None])
+            status = send_course_email(
+                task_entry.id, email_id, to_list, _get_course_email_context(self.course),
+                SubtaskStatus.create(subtask_id).to_dict()
+            )
+        sent_to = [call_args[0][0][0].to[0] for call_args in get_conn.return_value.send_messages.call_args_list]
+        self.assertEquals(sorted(sent_to), sorted(student.email for student in students[1:]))
+        self.assertEquals(status['succeeded'], 2)
+        self.assertEquals(status['skipped'], 1)
+
+    def _count_queries_to_send(self, num_emails_per_task):
+        """Runs a bulk email task in two subtasks of `num_emails_per_task` emails, and counts its queries."""
+        task_entry = self._create_input_entry()
+        connection.use_debug_cursor = True
+        num_queries_before = len(connection.queries)
+        try:
+            with override_settings(BULK_EMAIL_EMAILS_PER_TASK=num_emails_per_task, BULK_EMAIL_EMAILS_PER_QUERY=1000):
+                with patch('bulk_email.tasks.get_connection', autospec=True) as get_conn:
+                    get_conn.return_value.send_messages.side_effect = cycle([None])
+                    parent_status = self._run_task_with_mock_celery(send_bulk_course_email, task_entry.id, task_entry.task_id)
+        finally:
+            connection.use_debug_cursor = None
+        self.assertEquals(parent_status.get('total'), 2 * num_emails_per_task)
+        entry = InstructorTask.objects.get(id=task_entry.id)
+        self.assertEquals(json.loads(entry.task_output).get('succeeded'), 2 * num_emails_per_task)
+        self.assertEquals(InstructorSubtask.objects.filter(instructor_task=entry).count(), 2)
+        return len(connection.queries) - num_queries_before
+
+    def test_queries_do_not_grow_with_recipients(self):
+        # Two subtasks of two emails each (one to the instructor):
+        students = self._create_students(3)
+        num_queries_few = self._count_queries_to_send(2)
+        # ... and two subtasks of fifty emails each, with a student who has opted out:
+        students.extend(self.create_student('robot_more%d' % i) for i in xrange(97))
+        Optout.objects.create(user=students[0], course_id=self.course.id)
+        num_queries_many = self._count_queries_to_send(50)
+        # Recipients are fetched in one query, and each subtask makes a fixed number of queries:
+        self.assertEquals(num_queries_many, num_queries_few)
 
     def _test_email_address_failures(self, exception):
         """Test that celery handles bad address errors by failing and not retrying."""
@@ -372,6 +456,20 @@ class TestBulkEmailInstructorTask(InstructorTaskCourseTestCase):
     def test_retry_after_ses_throttling_error(self):
         self._test_retry_after_unlimited_retry_error(SESMaxSendingRateExceededError(455, "Throttling: Sending rate exceeded"))
 
+    @override_settings(BULK_EMAIL_RETRY_DELAY_BETWEEN_SENDS=0.5)
+    def test_delay_between_sends_after_throttling(self):
+        num_emails = 4
+        self._create_students(num_emails - 1)
+        with patch('bulk_email.tasks.sleep') as mock_sleep:
+            with patch('bulk_email.tasks.get_connection', autospec=True) as get_conn:
+                # Throttle the first send only; the retry sends every email.
+                get_conn.return_value.send_messages.side_effect = chain(
+                    [SMTPDataError(455, "Throttling: Sending rate exceeded")], repeat(None)
+                )
+                self._test_run_with_task(send_bulk_course_email, 'emailed', num_emails, num_emails, retried_nomax=1)
+        self.assertEquals(mock_sleep.call_count, num_emails)
+        mock_sleep.assert_called_with(0.5)
+
     def _test_immediate_failure(self, exception):
         """Test that celery can hit a maximum number of retries."""
         # Doesn't really matter how many recipients, since we expect
@@ -0,0 +1,102 @@
+"""
+Cache of course outlines.
+
+Finding the chapter, section and position of a location with
+`xmodule.modulestore.search.path_to_location` searches up the course from the
+location, which takes several modulestore queries each time a link is followed
+with jump_to. The outline of a course (see
+`xmodule.modulestore.search.compute_course_outline`) holds those paths for all
+of the locations in the course, so it is computed once for each version of the
+course content (see `xmodule.modulestore.django.course_content_version`) and
+kept in the django cache, keyed by that version. Only courses in the Mongo
+modulestore have content versions, so only their outlines are cached.
+
+The outline of a large course can be bigger than memcached's 1MB item limit,
+above which memcached silently drops writes, so outlines are compressed and
+stored in chunks of at most COURSE_OUTLINE_CHUNK_SIZE bytes.
+"""
+import cPickle as pickle
+import zlib
+from uuid import uuid4
+
+from django.core.cache import cache
+
+from xmodule.modulestore import MONGO_MODULESTORE_TYPE
+from xmodule.modulestore.django import course_content_version
+from xmodule.modulestore.search import compute_course_outline
+
+# How long outlines stay in the cache. Outlines of old versions of a course are
+# never read again, so they only need to last while the course is unchanged.
+COURSE_OUTLINE_TIMEOUT = 60 * 60 * 24
+
+# The largest chunk of a compressed outline stored in one cache item, well under
+# memcached's default 1MB item limit to leave room for the key and pickling.
+COURSE_OUTLINE_CHUNK_SIZE = 900 * 1024
+
+
+def _cache_key(course_id, version):
+    """
+    Return the django cache key for the outline of a version of a course
+    """
+    return u'courseware.course_outline.{}.{}'.format(course_id, version)
+
+
+def _chunk_keys(key, token, num_chunks):
+    """
+    Return the django cache keys of the chunks of the outline stored under key
+    """
+    return [u'{}.{}.{}'.format(key, token, index) for index in range(num_chunks)]
+
+
+def _get_cached_outline(key):
+    """
+    Return the outline stored under key, or None if it, or any of its chunks,
+    isn't in the cache.
+    """
+    header = cache.get(key)
+    if header is None:
+        return None
+    token, num_chunks = header
+    chunk_keys = _chunk_keys(key, token, num_chunks)
+    chunks = cache.get_many(chunk_keys)
+    if len(chunks) != num_chunks:
+        return None
+    return pickle.loads(zlib.decompress(''.join(chunks[chunk_key] for chunk_key in chunk_keys)))
+
+
+def _set_cached_outline(key, outline):
+    """
+    Store outline under key, split into chunks
+    """
+    data = zlib.compress(pickle.dumps(outline, pickle.HIGHEST_PROTOCOL))
+    chunks = [
+        data[start:start + COURSE_OUTLINE_CHUNK_SIZE] for start in range(0, len(data), COURSE_OUTLINE_CHUNK_SIZE)
+    ]
+    # The chunk keys are unique to this write, so that an outline computed by another
+    # process at the same time can't be read back with chunks from this one.
+    token = uuid4().hex
+    cache.set_many(dict(zip(_chunk_keys(key, token, len(chunks)), chunks)), COURSE_OUTLINE_TIMEOUT)
+    # the header is written last, so that it's only found once its chunks are
+    cache.set(key, (token, len(chunks)), COURSE_OUTLINE_TIMEOUT)
+
+
+def get_course_outline(store, course_id):
+    """
+    Return the outline of the course `course_id` in `store` for the current
+    version of the course content, computing it if it isn't cached.
+
+    Returns None for courses outside the Mongo modulestore, as only it reports
+    changes to course content, so other courses' content has no version.
+    """
+    if store.get_modulestore_type(course_id) != MONGO_MODULESTORE_TYPE:
+        return None
+
+    # Get the version before computing the outline, so that an outline computed
+    # while the course is being changed is filed under the version it replaces.
+    version = course_content_version(course_id)
+    key = _cache_key(course_id, version)
+    outline = _get_cached_outline(key)
+    if outline is None:
+        outline = compute_course_outline(store, course_id)
+        _set_cached_outline(key, outline)
+    return outline
@@ -0,0 +1,238 @@
+"""
+Cache of computed grades.
+
+Computing a student's grade or progress summary walks the whole course, so
+the results are kept in the django cache, and in the CachedGrade table behind
+it. Entries are keyed by user and course, and record the version of the grade
+inputs (see `grade_version`) they were computed against, so that they stop
+being used as soon as the published course content, the student's scores or
+the set of sections which have started change.
+
+Computing grades is a read, so entries are only written to the django cache
+inline; the CachedGrade rows are written by a celery task.
+
+`invalidate_grades` must be called whenever one of a student's scores changes.
+"""
+import bisect
+import json
+from datetime import datetime, timedelta
+from uuid import uuid4
+
+import dateutil.parser
+from django.conf import settings
+from django.core.cache import cache
+from pytz import UTC
+
+from xmodule.graders import Score
+from xmodule.modulestore import MONGO_MODULESTORE_TYPE
+from xmodule.modulestore.django import course_content_version, modulestore
+
+from .models import CachedGrade
+from .tasks import persist_cached_grade
+
+COURSE_GRADE = 'course_grade'
+PROGRESS_SUMMARY = 'progress_summary'
+GRADE_TYPES = (COURSE_GRADE, PROGRESS_SUMMARY)
+
+# How long entries stay in the django cache tier
+GRADE_CACHE_TIMEOUT = 60 * 60
+
+# How long the versions of a student's scores and of a course's dates live in
+# the django cache. When one expires a new one is made, which only costs a
+# recomputation of the grades keyed on the old one.
+VERSION_TIMEOUT = 60 * 60 * 24 * 7
+
+
+def grade_cache_enabled():
+    """
+    Return True if computed grades should be read from and written to the cache
+    """
+    return settings.FEATURES.get('ENABLE_GRADE_CACHE', False)
+
+
+def _cache_key(grade_type, user_id, course_id):
+    """
+    Return the django cache key for a grade entry
+    """
+    return u'courseware.grade_cache.{}.{}.{}'.format(grade_type, user_id, course_id)
+
+
+def _score_version_key(user_id, course_id):
+    """
+    Return the django cache key for the version of a user's scores in a course
+    """
+    return u'courseware.grade_cache.scores.{}.{}'.format(user_id, course_id)
+
+
+def _course_dates_key(course_id, content_version):
+    """
+    Return the django cache key for the dates of a version of a course's content
+    """
+    return u'courseware.grade_cache.dates.{}.{}'.format(course_id, content_version)
+
+
+def _score_version(user_id, course_id):
+    """
+    Return a token for the current version of a user's scores in a course,
+    which `invalidate_grades` replaces
+    """
+    key = _score_version_key(user_id, course_id)
+    version = cache.get(key)
+    if version is None:
+        # add() so that concurrent processes agree on a single token
+        cache.add(key, uuid4().hex, VERSION_TIMEOUT)
+        version = cache.get(key)
+    return version
+
+
+def _course_dates(course, content_version):
+    """
+    Return (always_recalculate, start_dates) for the content of course, where
+    always_recalculate is True if any of it has scores which change outside of
+    the LMS (see `XModuleDescriptor.always_recalculate_grades`), and start_dates
+    is the sorted list of the dates at which any of it starts, for beta testers
+    or for everyone.
+    """
+    key = _course_dates_key(course.id, content_version)
+    dates = cache.get(key)
+    if dates is not None:
+        return dates
+
+    always_recalculate = False
+    start_dates = set()
+    to_process = [course]
+    while to_process:
+        descriptor = to_process.pop()
+        always_recalculate = always_recalculate or descriptor.always_recalculate_grades
+        if descriptor.start is not None:
+            start_dates.add(descriptor.start)
+            if descriptor.days_early_for_beta is not None:
+                start_dates.add(descriptor.start - timedelta(descriptor.days_early_for_beta))
+        to_process.extend(descriptor.get_children())
+
+    dates = (always_recalculate, sorted(start_dates))
+    cache.set(key, dates, VERSION_TIMEOUT)
+    return dates
+
+
+def grade_version(user, course):
+    """
+    Return a token for the version of everything the grade data of user in course
+    is computed from, or None if the grade data can't be cached.
+
+    The token changes when the published course content or the user's scores change,
+    and when content starts, as that changes what the user has access to. Grades for
+    courses with content which is always regraded (e.g. foldit) aren't cached, nor are
+    grades for courses outside the Mongo modulestore, as only it reports content changes.
+    """
+    if modulestore().get_modulestore_type(course.id) != MONGO_MODULESTORE_TYPE:
+        return None
+
+    content_version = course_content_version(course.id)
+    always_recalculate, start_dates = _course_dates(course, content_version)
+    if always_recalculate:
+        return None
+
+    # the number of start dates which have passed
+    dates_version = bisect.bisect_right(start_dates, datetime.now(UTC))
+    return u'{}.{}.{}'.format(content_version, dates_version, _score_version(user.id, course.id))
+
+
+def _to_json_safe(value):
+    """
+    Convert grade data into something that survives a round trip through
+    JSON. Scores and datetimes are tagged so that `_from_json` can restore them.
+    """
+    if isinstance(value, Score):
+        return {'__score__': list(value)}
+    elif isinstance(value, datetime):
+        return {'__datetime__': value.isoformat()}
+    elif isinstance(value, dict):
+        return dict((key, _to_json_safe(item)) for key, item in value.iteritems())
+    elif isinstance(value, (list, tuple)):
+        return [_to_json_safe(item) for item in value]
+    return value
+
+
+def _from_json(obj):
+    """
+    json object_hook that restores the values tagged by `_to_json_safe`
+    """
+    if '__score__' in obj:
+        return Score(*obj['__score__'])
+    elif '__datetime__' in obj:
+        return dateutil.parser.parse(obj['__datetime__'])
+    return obj
+
+
+def dumps(value):
+    """
+    Serialize a gradeset or progress summary to JSON
+    """
+    return json.dumps(_to_json_safe(value))
+
+
+def loads(value):
+    """
+    Deserialize a gradeset or progress summary serialized with `dumps`
+    """
+    return json.loads(value, object_hook=_from_json)
+
+
+def get_cached_grade(grade_type, user, course, version):
+    """
+    Return the cached `grade_type` data for `user` in `course`, or None if
+    there is no entry for `version` of the grade inputs (see `grade_version`).
+    """
+    key = _cache_key(grade_type, user.id, course.id)
+
+    cached = cache.get(key)
+    if cached is not None:
+        cached_version, value = cached
+        if cached_version == version:
+            return loads(value)
+
+    try:
+        cached_grade = CachedGrade.objects.get(user=user, course_id=course.id, grade_type=grade_type)
+    except CachedGrade.DoesNotExist:
+        return None
+
+    if cached_grade.course_version != version:
+        return None
+
+    cache.set(key, (version, cached_grade.value), GRADE_CACHE_TIMEOUT)
+    return loads(cached_grade.value)
+
+
+def set_cached_grade(grade_type, user, course, version, grade_data):
+    """
+    Store `grade_data`, computed for `user` against `version` of the grade
+    inputs, as the cached `grade_type` data. The CachedGrade row is written in
+    celery, so that requests which compute grades don't write to the database.
+    """
+    value = dumps(grade_data)
+    cache.set(_cache_key(grade_type, user.id, course.id), (version, value), GRADE_CACHE_TIMEOUT)
+    persist_cached_grade.delay(user.id, course.id, grade_type, version, value)
+
+
+def invalidate_grades(user_id, course_id):
+    """
+    Stop using the cached grade data for a user in a course. Call this whenever
+    one of the user's scores in the course changes.
+
+    This only replaces the version of the user's scores, so entries computed from
+    the old scores are never used again, even if they are written afterwards.
+    """
+    if grade_cache_enabled():
+        cache.set(_score_version_key(user_id, course_id), uuid4().hex, VERSION_TIMEOUT)
+
+
+def invalidate_grades_for_users(user_ids, course_id):
+    """
+    Stop using the cached grade data in a course for every user in `user_ids`
+    """
+    if grade_cache_enabled():
+        cache.set_many(
+            dict((_score_version_key(user_id, course_id), uuid4().hex) for user_id in user_ids),
+            VERSION_TIMEOUT
+        )
@@ -1,6 +1,7 @@
 # Compute grades using real division, with no integer truncation
 from __future__ import division
 from collections import defaultdict
+from itertools import islice
 import json
 import random
 import logging
@@ -12,7 +13,7 @@ from django.test.client import RequestFactory
 
 from dogapi import dog_stats_api
 
-from courseware import courses
+from courseware import courses, grade_cache
 from courseware.model_data import FieldDataCache
 from xmodule import graders
 from xmodule.graders import Score
@@ -145,16 +146,33 @@ def answer_distributions(course_id):
     return answer_counts
 
 @transaction.commit_manually
-def grade(student, request, course, keep_raw_scores=False):
+def grade(student, request, course, keep_raw_scores=False, student_scores=None):
     """
     Wraps "_grade" with the manual_transaction context manager just in case
     there are unanticipated errors.
+
+    If the grade cache is enabled, a gradeset cached for the current version
+    of the grade inputs is returned without regrading (raw scores are never cached).
     """
     with manual_transaction():
-        return _grade(student, request, course, keep_raw_scores)
+        version = None
+        if grade_cache.grade_cache_enabled() and not keep_raw_scores:
+            version = grade_cache.grade_version(student, course)
+        if version is not None:
+            gradeset = grade_cache.get_cached_grade(grade_cache.COURSE_GRADE, student, course, version)
+            if gradeset is not None:
+                return gradeset
+
+        gradeset = _grade(student, request, course, keep_raw_scores, student_scores)
+
+        # student_scores may come from a read replica, so don't let possibly
+        # stale scores into the cache.
+        if version is not None and student_scores is None:
+            grade_cache.set_cached_grade(grade_cache.COURSE_GRADE, student, course, version, gradeset)
+        return gradeset
 
 
-def _grade(student, request, course, keep_raw_scores):
+def _grade(student, request, course, keep_raw_scores, student_scores=None):
     """
     Unwrapped version of "grade"
 
@@ -173,11 +191,20 @@ def _grade(student, request, course, keep_raw_scores):
     - keep_raw_scores : if True, then value for key 'raw_scores' contains scores
       for every graded module
 
+    student_scores, if given, is a dict mapping module_state_key ->
+    (grade, max_grade) for every StudentModule the student has in this course
+    (see `get_score`). If it isn't given, it is loaded with a single query, so
+    the number of queries doesn't grow with the size of the course.
+
     More information on the format is in the docstring for CourseGrader.
     """
     grading_context = course.grading_context
     raw_scores = []
 
+    if student_scores is None:
+        with manual_transaction():
+            student_scores = get_student_scores(student, course.id)
+
     totaled_scores = {}
     # This next complicated loop is just to collect the totaled_scores, which is
     # passed to the grader
@@ -196,28 +223,37 @@ def _grade(student, request, course, keep_raw_scores):
 
             # If we haven't seen a single problem in the section, we don't have to grade it at all! We can assume 0%
             if not should_grade_section:
-                with manual_transaction():
-                    should_grade_section = StudentModule.objects.filter(
-                        student=student,
-                        module_state_key__in=[
-                            descriptor.location for descriptor in section['xmoduledescriptors']
-                        ]
-                    ).exists()
+                should_grade_section = any(
+                    descriptor.location.url() in student_scores
+                    for descriptor in section['xmoduledescriptors']
+                )
 
             if should_grade_section:
                 scores = []
+                # Filled in the first time a module in this section has to be created
+                section_field_data_cache = []
 
                 def create_module(descriptor):
                     '''creates an XModule instance given a descriptor'''
+                    # Modules only get created for dynamic containers and for problems
+                    # without a stored score, so the state for the whole section is
+                    # loaded at most once, rather than once per module.
+                    if not section_field_data_cache:
+                        with manual_transaction():
+                            section_field_data_cache.append(FieldDataCache.cache_for_descriptor_descendents(
+                                course.id, student, section_descriptor, depth=None
+                            ))
                     # TODO: We need the request to pass into here. If we could forego that, our arguments
                     # would be simpler
-                    with manual_transaction():
-                        field_data_cache = FieldDataCache([descriptor], course.id, student)
-                    return get_module_for_descriptor(student, request, descriptor, field_data_cache, course.id)
+                    return get_module_for_descriptor(
+                        student, request, descriptor, section_field_data_cache[0], course.id
+                    )
 
                 for module_descriptor in yield_dynamic_descriptor_descendents(section_descriptor, create_module):
 
-                    (correct, total) = get_score(course.id, student, module_descriptor, create_module)
+                    (correct, total) = get_score(
+                        course.id, student, module_descriptor, create_module, student_scores
+                    )
                     if correct is None and total is None:
                         continue
 
@@ -264,6 +300,27 @@ def _grade(student, request, course, keep_raw_scores):
     return grade_summary
 
 
+def section_breakdown_labels(course):
+    """
+    Return the labels of the entries of the `section_breakdown` of grades in
+    `course`, in order. The course grader labels sections by their position in
+    each format, so the labels are the same for every student, and can be had
+    without grading anyone by grading a blank sheet.
+    """
+    totaled_scores = {
+        section_format: [
+            Score(0.0, 1.0, True, section['section_descriptor'].display_name_with_default)
+            for section in sections
+        ]
+        for section_format, sections in course.grading_context['graded_sections'].iteritems()
+    }
+    return [
+        section['label']
+        for section in course.grader.grade(totaled_scores)['section_breakdown']
+        if 'label' in section
+    ]
+
+
 def grade_for_percentage(grade_cutoffs, percentage):
     """
     Returns a letter grade as defined in grading_policy (e.g. 'A' 'B' 'C' for 6.002x) or None.
@@ -291,9 +348,24 @@ def progress_summary(student, request, course):
     """
     Wraps "_progress_summary" with the manual_transaction context manager just
     in case there are unanticipated errors.
+
+    If the grade cache is enabled, a summary cached for the current version of
+    the grade inputs is returned without walking the course.
     """
     with manual_transaction():
-        return _progress_summary(student, request, course)
+        version = None
+        if grade_cache.grade_cache_enabled():
+            version = grade_cache.grade_version(student, course)
+        if version is not None:
+            summary = grade_cache.get_cached_grade(grade_cache.PROGRESS_SUMMARY, student, course, version)
+            if summary is not None:
+                return summary
+
+        summary = _progress_summary(student, request, course)
+
+        if version is not None and summary is not None:
+            grade_cache.set_cached_grade(grade_cache.PROGRESS_SUMMARY, student, course, version, summary)
+        return summary
 
 
 # TODO: This method is not very good. It was written in the old course style and
@@ -331,6 +403,10 @@ def _progress_summary(student, request, course):
             # This student must not have access to the course.
             return None
 
+    # The cache already holds the StudentModule of every module in the
+    # course, so there's no need to query for the scores again.
+    student_scores = get_student_scores_from_field_data_cache(field_data_cache)
+
     chapters = []
     # Don't include chapters that aren't displayable (e.g. due to error)
     for chapter_module in course_module.get_display_items():
@@ -353,7 +429,9 @@ def _progress_summary(student, request, course):
 
                 for module_descriptor in yield_dynamic_descriptor_descendents(section_module, module_creator):
                     course_id = course.id
-                    (correct, total) = get_score(course_id, student, module_descriptor, module_creator)
+                    (correct, total) = get_score(
+                        course_id, student, module_descriptor, module_creator, student_scores
+                    )
                     if correct is None and total is None:
                         continue
 
@@ -383,7 +461,37 @@ def _progress_summary(student, request, course):
 
     return chapters
 
-def get_score(course_id, user, problem_descriptor, module_creator):
+
+def get_student_scores(student, course_id):
+    """
+    Return a dict mapping module_state_key -> (grade, max_grade) for every
+    StudentModule that `student` has in the course, suitable for passing as
+    `student_scores` to `get_score`.
+    """
+    if not student.is_authenticated():
+        return {}
+
+    rows = StudentModule.objects.filter(
+        student=student,
+        course_id=course_id
+    ).values_list('module_state_key', 'grade', 'max_grade')
+    return dict((module_state_key, (module_grade, module_max_grade))
+                for module_state_key, module_grade, module_max_grade in rows)
+
+
+def get_student_scores_from_field_data_cache(field_data_cache):
+    """
+    Return a dict mapping module_state_key -> (grade, max_grade) for every
+    StudentModule held by `field_data_cache`, suitable for passing as
+    `student_scores` to `get_score` for any module the cache was built for.
+    """
+    return dict(
+        (student_module.module_state_key, (student_module.grade, student_module.max_grade))
+        for student_module in field_data_cache.student_modules()
+    )
+
+
+def get_score(course_id, user, problem_descriptor, module_creator, student_scores=None):
     """
     Return the score for a user on a problem, as a tuple (correct, total).
     e.g. (5,7) if you got 5 out of 7 points.
@@ -395,7 +503,8 @@ def get_score(course_id, user, problem_descriptor, module_creator):
     problem_descriptor: an XModuleDescriptor
     module_creator: a function that takes a descriptor, and returns the corresponding XModule for this user.
            Can return None if user doesn't have access, or if something else went wrong.
-    cache: A FieldDataCache
+    student_scores: An optional dict mapping module_state_key -> (grade, max_grade)
+           for this user. If given, it is used instead of querying StudentModule.
     """
     if not user.is_authenticated():
         return (None, None)
@@ -416,18 +525,22 @@ def get_score(course_id, user, problem_descriptor, module_creator):
         # These are not problems, and do not have a score
         return (None, None)
 
-    try:
-        student_module = StudentModule.objects.get(
-            student=user,
-            course_id=course_id,
-            module_state_key=problem_descriptor.location
-        )
-    except StudentModule.DoesNotExist:
-        student_module = None
+    if student_scores is not None:
+        module_grade, module_max_grade = student_scores.get(problem_descriptor.location.url(), (None, None))
+    else:
+        try:
+            student_module = StudentModule.objects.get(
+                student=user,
+                course_id=course_id,
+                module_state_key=problem_descriptor.location
+            )
+            module_grade, module_max_grade = student_module.grade, student_module.max_grade
+        except StudentModule.DoesNotExist:
+            module_grade, module_max_grade = None, None
 
-    if student_module is not None and student_module.max_grade is not None:
-        correct = student_module.grade if student_module.grade is not None else 0
-        total = student_module.max_grade
+    if module_max_grade is not None:
+        correct = module_grade if module_grade is not None else 0
+        total = module_max_grade
     else:
         # If the problem was not in the cache, or hasn't been graded yet,
         # we need to instantiate the problem.
@@ -448,7 +561,7 @@ def get_score(course_id, user, problem_descriptor, module_creator):
     weight = problem_descriptor.weight
     if weight is not None:
         if total == 0:
-            log.exception("Cannot reweight a problem with zero total points. Problem: " + str(student_module))
+            log.exception("Cannot reweight a problem with zero total points. Problem: " + str(problem_descriptor.location))
             return (correct, total)
         correct = correct * weight / total
         total = weight
@@ -469,7 +582,37 @@ def manual_transaction():
         transaction.commit()
 
 
-def iterate_grades_for(course_id, students):
+def _iterate_students_with_scores(course_id, students, students_per_query):
+    """
+    Yield (student, student_scores) for each student in `students`.
+
+    If `students_per_query` is falsy, student_scores is always None and scores
+    will be looked up problem by problem while grading. Otherwise the students
+    are read in chunks of `students_per_query`, and the StudentModule scores
+    for each chunk are fetched with a single query, so student_scores is a dict
+    of module_state_key -> (grade, max_grade) suitable for passing to `grade`.
+    """
+    if not students_per_query:
+        for student in students:
+            yield student, None
+        return
+
+    students = iter(students)
+    while True:
+        chunk = list(islice(students, students_per_query))
+        if not chunk:
+            return
+
+        scores_by_student = defaultdict(dict)
+        rows = StudentModule.scores_for_students_read_only(course_id, [student.id for student in chunk])
+        for student_id, module_state_key, module_grade, module_max_grade in rows:
+            scores_by_student[student_id][module_state_key] = (module_grade, module_max_grade)
+
+        for student in chunk:
+            yield student, scores_by_student[student.id]
+
+
+def iterate_grades_for(course_id, students, students_per_query=None):
     """Given a course_id and an iterable of students (User), yield a tuple of:
 
     (student, gradeset, err_msg) for every student enrolled in the course.
@@ -486,6 +629,12 @@ def iterate_grades_for(course_id, students):
     - grade_breakdown : A breakdown of the major components that
         make up the final grade. (For display)
     - raw_scores: contains scores for every graded module
+
+    If `students_per_query` is given, grading runs in batch mode: the
+    StudentModule scores for that many students at a time are loaded in one
+    query (from the read replica, if there is one) and the gradesets are
+    computed from them in memory. XModules are only instantiated for problems
+    that have no stored max_grade or that always recalculate their grades.
     """
     course = courses.get_course_by_id(course_id)
 
@@ -494,7 +643,7 @@ def iterate_grades_for(course_id, students):
     # grading that student.
     request = RequestFactory().get('/')
 
-    for student in students:
+    for student, student_scores in _iterate_students_with_scores(course_id, students, students_per_query):
         with dog_stats_api.timer('lms.grades.iterate_grades_for', tags=['action:{}'.format(course_id)]):
             try:
                 request.user = student
@@ -503,7 +652,10 @@ def iterate_grades_for(course_id, students):
                 # It's not pretty, but untangling that is currently beyond the
                 # scope of this feature.
                 request.session = {}
-                gradeset = grade(student, request, course)
+                if student_scores is None:
+                    gradeset = grade(student, request, course)
+                else:
+                    gradeset = grade(student, request, course, student_scores=student_scores)
                 yield student, gradeset, ""
             except Exception as exc:  # pylint: disable=broad-except
                 # Keep marching on even if this student couldn't be graded for
@@ -43,7 +43,7 @@ class FieldDataCache(object):
     A cache of django model objects needed to supply the data
     for a module and its decendants
     """
-    def __init__(self, descriptors, course_id, user, select_for_update=False):
+    def __init__(self, descriptors, course_id, user, select_for_update=False, student_modules=None):
         '''
         Find any courseware.models objects that are needed by any descriptor
         in descriptors. Attempts to minimize the number of queries to the database.
@@ -55,12 +55,15 @@ class FieldDataCache(object):
         course_id: The id of the current course
         user: The user for which to cache data
         select_for_update: True if rows should be locked until end of transaction
+        student_modules: StudentModules of `user` which have already been read,
+            and so needn't be queried for again
         '''
         self.cache = {}
         self.descriptors = descriptors
         self.select_for_update = select_for_update
         self.course_id = course_id
         self.user = user
+        self.prefetched_student_modules = student_modules or []
 
         if user.is_authenticated():
             for scope, fields in self._fields_to_cache().items():
@@ -70,7 +73,7 @@ class FieldDataCache(object):
     @classmethod
     def cache_for_descriptor_descendents(cls, course_id, user, descriptor, depth=None,
                                          descriptor_filter=lambda descriptor: True,
-                                         select_for_update=False):
+                                         select_for_update=False, student_modules=None):
         """
         course_id: the course in the context of which we want StudentModules.
         user: the django user for whom to load modules.
@@ -80,6 +83,7 @@ class FieldDataCache(object):
         descriptor_filter is a function that accepts a descriptor and return wether the StudentModule
             should be cached
         select_for_update: Flag indicating whether the rows should be locked until end of transaction
+        student_modules: StudentModules of `user` which have already been read
         """
 
         def get_child_descriptors(descriptor, depth, descriptor_filter):
@@ -107,7 +111,7 @@ class FieldDataCache(object):
 
         descriptors = get_child_descriptors(descriptor, depth, descriptor_filter)
 
-        return FieldDataCache(descriptors, course_id, user, select_for_update)
+        return FieldDataCache(descriptors, course_id, user, select_for_update, student_modules)
 
     def _query(self, model_class, **kwargs):
         """
@@ -139,13 +143,21 @@ class FieldDataCache(object):
         Queries the database for all of the fields in the specified scope
         """
         if scope == Scope.user_state:
-            return self._chunked_query(
+            prefetched = [
+                student_module for student_module in self.prefetched_student_modules
+                if student_module.course_id == self.course_id and student_module.student_id == self.user.pk
+            ]
+            prefetched_keys = set(student_module.module_state_key for student_module in prefetched)
+            return chain(prefetched, self._chunked_query(
                 StudentModule,
                 'module_state_key__in',
-                (str(descriptor.scope_ids.usage_id) for descriptor in self.descriptors),
+                (
+                    str(descriptor.scope_ids.usage_id) for descriptor in self.descriptors
+                    if str(descriptor.scope_ids.usage_id) not in prefetched_keys
+                ),
                 course_id=self.course_id,
                 student=self.user.pk,
-            )
+            ))
         elif scope == Scope.user_state_summary:
             return self._chunked_query(
                 XModuleUserStateSummaryField,
@@ -207,6 +219,15 @@ class FieldDataCache(object):
         elif scope == Scope.user_info:
             return (scope, field_object.field_name)
 
+    def student_modules(self):
+        """
+        Return all of the StudentModules held by this cache
+        """
+        return [
+            field_object for cache_key, field_object in self.cache.iteritems()
+            if cache_key[0] == Scope.user_state
+        ]
+
     def find(self, key):
         '''
         Look for a model data object using an DjangoKeyValueStore.Key object
@@ -75,6 +75,24 @@ class StudentModule(models.Model):
         else:
             return queryset
 
+    @classmethod
+    def scores_for_students_read_only(cls, course_id, student_ids):
+        """
+        Return (student_id, module_state_key, grade, max_grade) tuples for
+        every StudentModule that the given students have in a course. This
+        lets callers grade a whole group of students with one query instead of
+        one query per problem per student. Use a read replica if one exists
+        for this environment.
+        """
+        queryset = cls.objects.filter(
+            course_id=course_id,
+            student_id__in=student_ids
+        ).values_list('student_id', 'module_state_key', 'grade', 'max_grade')
+        if "read_replica" in settings.DATABASES:
+            return queryset.using("read_replica")
+        else:
+            return queryset
+
     def __repr__(self):
         return 'StudentModule<%r>' % ({
             'course_id': self.course_id,
@@ -233,6 +251,36 @@ class OfflineComputedGrade(models.Model):
         return "[OfflineComputedGrade] %s: %s (%s) = %s" % (self.user, self.course_id, self.created, self.gradeset)
 
 
+class CachedGrade(models.Model):
+    """
+    Grade data (course grade or progress summary) computed for a user in a
+    course, stored so that it only has to be recomputed when the user's scores,
+    the course content or the started content change. See courseware.grade_cache.
+    """
+    GRADE_TYPES = (('course_grade', 'course grade'),
+                   ('progress_summary', 'progress summary'),
+                   )
+
+    class Meta:
+        unique_together = (('user', 'course_id', 'grade_type'),)
+
+    user = models.ForeignKey(User, db_index=True)
+    course_id = models.CharField(max_length=255, db_index=True)
+    grade_type = models.CharField(max_length=32, choices=GRADE_TYPES)
+
+    # The version of the grade inputs the grade was computed against (see
+    # courseware.grade_cache.grade_version)
+    course_version = models.CharField(max_length=255)
+
+    # grade data, stored as JSON
+    value = models.TextField()
+
+    modified = models.DateTimeField(auto_now=True, db_index=True)
+
+    def __unicode__(self):
+        return u"[CachedGrade] %s: %s %s (%s)" % (self.user, self.course_id, self.grade_type, self.course_version)
+
+
 class OfflineComputedGradeLog(models.Model):
     """
     Log of when offline grades are computed.
@@ -0,0 +1,33 @@
+"""
+Celery tasks for courseware.
+"""
+from celery import task
+from celery.utils.log import get_task_logger
+from django.db import IntegrityError
+
+from courseware.models import CachedGrade
+
+log = get_task_logger(__name__)
+
+
+@task  # pylint: disable=E1102
+def persist_cached_grade(user_id, course_id, grade_type, version, value):
+    """
+    Write grade data cached in the django cache (see courseware.grade_cache)
+    to its CachedGrade row.
+
+    The row records the version of the grade inputs the data was computed
+    against, so a row written after the student's scores changed is never used.
+    """
+    updated = CachedGrade.objects.filter(
+        user_id=user_id, course_id=course_id, grade_type=grade_type
+    ).update(course_version=version, value=value)
+    if not updated:
+        try:
+            CachedGrade.objects.create(
+                user_id=user_id, course_id=course_id, grade_type=grade_type, course_version=version, value=value
+            )
+        except IntegrityError:
+            # Another process cached a grade for this user at the same time;
+            # theirs is just as good as ours.
+            log.info("Grade for user %s in course %s was cached concurrently", user_id, course_id)
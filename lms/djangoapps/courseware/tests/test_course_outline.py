@@ -0,0 +1,107 @@
+"""
+Tests for the cache of course outlines.
+"""
+from django.core.cache import cache
+from django.core.urlresolvers import reverse
+from django.test.utils import override_settings
+from mock import Mock, patch
+
+from courseware.course_outline import get_course_outline
+from courseware.tests.modulestore_config import TEST_DATA_MIXED_MODULESTORE
+from xmodule.modulestore import SPLIT_MONGO_MODULESTORE_TYPE
+from xmodule.modulestore.django import modulestore
+from xmodule.modulestore.search import compute_course_outline
+from xmodule.modulestore.tests.factories import CourseFactory, ItemFactory
+from xmodule.modulestore.tests.django_utils import ModuleStoreTestCase
+
+
+@override_settings(MODULESTORE=TEST_DATA_MIXED_MODULESTORE)
+class TestCourseOutline(ModuleStoreTestCase):
+    """
+    Test that course outlines are cached, and recomputed when the course changes.
+    """
+    def setUp(self):
+        self.course = CourseFactory.create()
+        self.chapter = ItemFactory.create(parent_location=self.course.location, category='chapter')
+        self.section = ItemFactory.create(parent_location=self.chapter.location, category='sequential')
+        self.verticals = [
+            ItemFactory.create(parent_location=self.section.location, category='vertical')
+            for _ in range(2)
+        ]
+        self.problem = ItemFactory.create(parent_location=self.verticals[1].location, category='problem')
+
+    def test_outline_paths(self):
+        outline = get_course_outline(modulestore(), self.course.id)
+        self.assertEqual(
+            outline['paths'][self.problem.location.url()],
+            (self.chapter.location.name, self.section.location.name, '2')
+        )
+        self.assertEqual(outline['paths'][self.chapter.location.url()], (self.chapter.location.name, None, None))
+        self.assertEqual(outline['url_names'][self.problem.location.name], self.problem.location.url())
+
+    def test_outline_is_cached(self):
+        get_course_outline(modulestore(), self.course.id)
+        with patch('courseware.course_outline.compute_course_outline') as mock_compute:
+            get_course_outline(modulestore(), self.course.id)
+            self.assertFalse(mock_compute.called)
+
+    def test_outline_recomputed_after_change(self):
+        get_course_outline(modulestore(), self.course.id)
+        new_problem = ItemFactory.create(parent_location=self.verticals[0].location, category='problem')
+        with patch('courseware.course_outline.compute_course_outline', wraps=compute_course_outline) as mock_compute:
+            outline = get_course_outline(modulestore(), self.course.id)
+            self.assertTrue(mock_compute.called)
+        self.assertEqual(
+            outline['paths'][new_problem.location.url()],
+            (self.chapter.location.name, self.section.location.name, '1')
+        )
+
+    def test_large_outline_stored_in_chunks(self):
+        for _ in range(40):
+            ItemFactory.create(parent_location=self.verticals[0].location, category='html')
+        # make the cache chunks small enough that this course's outline needs several
+        with patch('courseware.course_outline.COURSE_OUTLINE_CHUNK_SIZE', 128):
+            with patch.object(cache, 'set_many', wraps=cache.set_many) as mock_set_many:
+                outline = get_course_outline(modulestore(), self.course.id)
+            chunks = mock_set_many.call_args[0][0]
+            self.assertGreater(len(chunks), 1)
+            self.assertTrue(all(len(chunk) <= 128 for chunk in chunks.values()))
+            self.assertEqual(len(outline['paths']), 46)
+
+            with patch('courseware.course_outline.compute_course_outline') as mock_compute:
+                self.assertEqual(get_course_outline(modulestore(), self.course.id), outline)
+                self.assertFalse(mock_compute.called)
+
+            # chunks can be evicted separately, and the outline is recomputed if any is missing
+            cache.delete(sorted(chunks)[-1])
+            compute_patch = patch('courseware.course_outline.compute_course_outline', wraps=compute_course_outline)
+            with compute_patch as mock_compute:
+                self.assertEqual(get_course_outline(modulestore(), self.course.id), outline)
+                self.assertTrue(mock_compute.called)
+
+    def test_xml_course_has_no_outline(self):
+        self.assertIsNone(get_course_outline(modulestore(), 'edX/toy/2012_Fall'))
+
+    def test_split_course_has_no_outline(self):
+        store = Mock(get_modulestore_type=Mock(return_value=SPLIT_MONGO_MODULESTORE_TYPE))
+        self.assertIsNone(get_course_outline(store, self.course.id))
+        self.assertFalse(store.get_items.called)
+
+    def test_jump_to_uses_outline(self):
+        expected = reverse('courseware_position', kwargs={
+            'course_id': self.course.id,
+            'chapter': self.chapter.location.name,
+            'section': self.section.location.name,
+            'position': '2',
+        })
+        jump_to_url = reverse('jump_to', kwargs={'course_id': self.course.id, 'location': self.problem.location.url()})
+        jump_to_id_url = reverse('jump_to_id', kwargs={'course_id': self.course.id, 'module_id': self.problem.location.name})
+        self.assertRedirects(self.client.get(jump_to_url), expected, target_status_code=302)
+
+        # now that the outline is cached, the modulestore isn't searched for the path
+        with patch('xmodule.modulestore.mongo.base.MongoModuleStore.get_parent_locations') as mock_get_parents:
+            with patch('xmodule.modulestore.mongo.base.MongoModuleStore.get_items') as mock_get_items:
+                self.assertRedirects(self.client.get(jump_to_url), expected, target_status_code=302)
+                self.assertRedirects(self.client.get(jump_to_id_url), expected, target_status_code=302)
+        self.assertFalse(mock_get_parents.called)
+        self.assertFalse(mock_get_items.called)
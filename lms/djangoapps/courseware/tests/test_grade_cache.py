@@ -0,0 +1,135 @@
+"""
+Tests for the persistent grade cache.
+"""
+from datetime import datetime, timedelta
+
+from django.test.client import RequestFactory
+from django.test.utils import override_settings
+from mock import patch
+from pytz import UTC
+
+from courseware import grade_cache, grades
+from courseware.models import CachedGrade
+from courseware.tests.modulestore_config import TEST_DATA_MIXED_MODULESTORE
+from student.tests.factories import UserFactory
+from xmodule.graders import Score
+from xmodule.modulestore.django import _bump_course_content_version, modulestore
+from xmodule.modulestore.tests.factories import CourseFactory, ItemFactory
+from xmodule.modulestore.tests.django_utils import ModuleStoreTestCase
+
+
+@override_settings(MODULESTORE=TEST_DATA_MIXED_MODULESTORE)
+@patch.dict('django.conf.settings.FEATURES', {'ENABLE_GRADE_CACHE': True})
+class TestGradeCache(ModuleStoreTestCase):
+    """
+    Test that grades are cached, and that the cache is invalidated.
+    """
+    def setUp(self):
+        self.course = CourseFactory.create()
+        self.student = UserFactory.create()
+        self.request = RequestFactory().get('/')
+        self.request.user = self.student
+        self.request.session = {}
+
+    def test_serialization_round_trip(self):
+        summary = [{
+            'scores': [Score(1.0, 2.0, True, u'Problem')],
+            'section_total': Score(1.0, 2.0, True, u'Section'),
+            'due': datetime(2013, 10, 1, tzinfo=UTC),
+        }]
+        self.assertEqual(grade_cache.loads(grade_cache.dumps(summary)), summary)
+        self.assertIsInstance(grade_cache.loads(grade_cache.dumps(summary))[0]['section_total'], Score)
+
+    def test_grade_is_cached(self):
+        gradeset = grades.grade(self.student, self.request, self.course)
+        self.assertEqual(CachedGrade.objects.filter(user=self.student).count(), 1)
+
+        with patch('courseware.grades._grade') as mock_grade:
+            self.assertEqual(grades.grade(self.student, self.request, self.course), gradeset)
+            self.assertFalse(mock_grade.called)
+
+    def test_raw_scores_are_not_cached(self):
+        grades.grade(self.student, self.request, self.course, keep_raw_scores=True)
+        self.assertFalse(CachedGrade.objects.filter(user=self.student).exists())
+
+    def test_progress_summary_is_cached(self):
+        summary = grades.progress_summary(self.student, self.request, self.course)
+        with patch('courseware.grades._progress_summary') as mock_progress_summary:
+            self.assertEqual(grades.progress_summary(self.student, self.request, self.course), summary)
+            self.assertFalse(mock_progress_summary.called)
+
+    def cached_grade(self):
+        """
+        Return the course grade cached for the current version of the grade inputs
+        """
+        version = grade_cache.grade_version(self.student, self.course)
+        return grade_cache.get_cached_grade(grade_cache.COURSE_GRADE, self.student, self.course, version)
+
+    def test_invalidate_grades(self):
+        grades.grade(self.student, self.request, self.course)
+        grade_cache.invalidate_grades(self.student.id, self.course.id)
+        self.assertIsNone(self.cached_grade())
+
+    def test_stale_grade_is_not_used(self):
+        # a grade computed from the old scores, which is cached after they changed
+        version = grade_cache.grade_version(self.student, self.course)
+        grade_cache.invalidate_grades(self.student.id, self.course.id)
+        grade_cache.set_cached_grade(grade_cache.COURSE_GRADE, self.student, self.course, version, {'percent': 1.0})
+        self.assertIsNone(self.cached_grade())
+
+    def test_course_change_invalidates_grades(self):
+        grades.grade(self.student, self.request, self.course)
+        _bump_course_content_version(None, modulestore=modulestore(), location=self.course.location)
+        self.assertIsNone(self.cached_grade())
+
+    def test_item_change_invalidates_grades(self):
+        chapter = ItemFactory.create(parent_location=self.course.location, category='chapter')
+        self.course = modulestore().get_course(self.course.id)
+        grades.grade(self.student, self.request, self.course)
+        chapter.display_name = u'Changed'
+        modulestore().update_item(chapter, '**replace_user**')
+        self.assertIsNone(self.cached_grade())
+
+    def test_other_run_change_keeps_grades(self):
+        grades.grade(self.student, self.request, self.course)
+        other_run = self.course.location.replace(name='other_run')
+        _bump_course_content_version(None, modulestore=modulestore(), location=other_run)
+        self.assertIsNotNone(self.cached_grade())
+
+    def test_draft_change_keeps_grades(self):
+        grades.grade(self.student, self.request, self.course)
+        draft = self.course.location.replace(revision='draft')
+        _bump_course_content_version(None, modulestore=modulestore(), location=draft)
+        self.assertIsNotNone(self.cached_grade())
+
+    def test_xml_course_grades_are_not_cached(self):
+        xml_course = modulestore().get_course('edX/toy/2012_Fall')
+        self.assertIsNone(grade_cache.grade_version(self.student, xml_course))
+
+    def test_start_date_invalidates_grades(self):
+        start = datetime.now(UTC) + timedelta(days=1)
+        chapter = ItemFactory.create(parent_location=self.course.location, category='chapter')
+        ItemFactory.create(parent_location=chapter.location, category='sequential', start=start)
+        self.course = modulestore().get_course(self.course.id)
+        grades.grade(self.student, self.request, self.course)
+        self.assertIsNotNone(self.cached_grade())
+
+        with patch('courseware.grade_cache.datetime') as mock_datetime:
+            mock_datetime.now.return_value = start + timedelta(seconds=1)
+            self.assertIsNone(self.cached_grade())
+
+    def test_always_recalculated_grades_are_not_cached(self):
+        with patch.object(self.course.__class__, 'always_recalculate_grades', True):
+            self.assertIsNone(grade_cache.grade_version(self.student, self.course))
+            grades.grade(self.student, self.request, self.course)
+        self.assertFalse(CachedGrade.objects.filter(user=self.student).exists())
+
+    @patch.dict('django.conf.settings.FEATURES', {'ENABLE_GRADE_CACHE': False})
+    def test_disabled(self):
+        grades.grade(self.student, self.request, self.course)
+        self.assertFalse(CachedGrade.objects.filter(user=self.student).exists())
+
+        with patch('courseware.grade_cache.cache') as mock_cache:
+            grade_cache.invalidate_grades(self.student.id, self.course.id)
+            grade_cache.invalidate_grades_for_users([self.student.id], self.course.id)
+        self.assertFalse(mock_cache.method_calls)
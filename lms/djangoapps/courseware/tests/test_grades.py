@@ -1,16 +1,23 @@
 """
 Test grade calculation.
 """
+from django.db import connection
 from django.http import Http404
+from django.test.client import RequestFactory
 from django.test.utils import override_settings
 from mock import patch
 
+from capa.tests.response_xml_factory import OptionResponseXMLFactory
+from courseware.tests.factories import StudentModuleFactory
 from courseware.tests.modulestore_config import TEST_DATA_MIXED_MODULESTORE
 from student.tests.factories import UserFactory
-from xmodule.modulestore.tests.factories import CourseFactory
+from xmodule.modulestore.django import modulestore
+from xmodule.modulestore.tests.factories import CourseFactory, ItemFactory
 from xmodule.modulestore.tests.django_utils import ModuleStoreTestCase
 
-from courseware.grades import grade, iterate_grades_for
+from courseware.grades import (
+    grade, iterate_grades_for, progress_summary, section_breakdown_labels, _iterate_students_with_scores
+)
 
 
 def _grade_with_errors(student, request, course, keep_raw_scores=False):
@@ -105,8 +112,27 @@ class TestGradeIteration(ModuleStoreTestCase):
         self.assertTrue(all_gradesets[student2])
         self.assertTrue(all_gradesets[student5])
 
+    def test_batch_grading_matches_individual_grading(self):
+        """Grading students in chunks should give the same gradesets as
+        grading them one at a time."""
+        individual_gradesets, _ = self._gradesets_and_errors_for(self.course.id, self.students)
+        batch_gradesets, batch_errors = self._gradesets_and_errors_for(
+            self.course.id, self.students, students_per_query=2
+        )
+        self.assertEqual(len(batch_errors), 0)
+        self.assertEqual(individual_gradesets, batch_gradesets)
+
+    def test_batch_score_queries(self):
+        """In batch mode, StudentModule scores are fetched with one query per
+        chunk of students."""
+        with self.assertNumQueries(3):
+            students_with_scores = list(_iterate_students_with_scores(self.course.id, self.students, 2))
+        self.assertEqual([student for student, _ in students_with_scores], self.students)
+        for _, student_scores in students_with_scores:
+            self.assertEqual(student_scores, {})
+
     ################################# Helpers #################################
-    def _gradesets_and_errors_for(self, course_id, students):
+    def _gradesets_and_errors_for(self, course_id, students, students_per_query=None):
         """Simple helper method to iterate through student grades and give us
         two dictionaries -- one that has all students and their respective
         gradesets, and one that has only students that could not be graded and
@@ -114,9 +140,109 @@ class TestGradeIteration(ModuleStoreTestCase):
         students_to_gradesets = {}
         students_to_errors = {}
 
-        for student, gradeset, err_msg in iterate_grades_for(course_id, students):
+        for student, gradeset, err_msg in iterate_grades_for(course_id, students, students_per_query):
             students_to_gradesets[student] = gradeset
             if err_msg:
                 students_to_errors[student] = err_msg
 
         return students_to_gradesets, students_to_errors
+
+
+@override_settings(MODULESTORE=TEST_DATA_MIXED_MODULESTORE)
+class TestGradeQueryCount(ModuleStoreTestCase):
+    """
+    Test that the number of SQL queries made while grading a student doesn't
+    depend on the size of the course.
+    """
+    def setUp(self):
+        self.student = UserFactory.create()
+        self.request = RequestFactory().get('/')
+        self.request.user = self.student
+        self.request.session = {}
+
+    def _create_course(self, num_sections, problems_per_section):
+        """
+        Create a course with graded sections full of problems that the student
+        has already answered.
+        """
+        course = CourseFactory.create()
+        chapter = ItemFactory.create(parent_location=course.location, category='chapter')
+        problem_xml = OptionResponseXMLFactory().build_xml(
+            question_text='The correct answer is Correct',
+            options=['Correct', 'Incorrect'],
+            correct_option='Correct'
+        )
+        for _ in xrange(num_sections):
+            section = ItemFactory.create(
+                parent_location=chapter.location,
+                category='sequential',
+                metadata={'graded': True, 'format': 'Homework'}
+            )
+            for _ in xrange(problems_per_section):
+                problem = ItemFactory.create(parent_location=section.location, category='problem', data=problem_xml)
+                StudentModuleFactory.create(
+                    student=self.student,
+                    course_id=course.id,
+                    module_state_key=problem.location.url(),
+                    grade=1,
+                    max_grade=1,
+                )
+        return modulestore().get_instance(course.id, course.location)
+
+    def _num_queries(self, func, *args):
+        """
+        Return the number of SQL queries made by calling func(*args)
+        """
+        connection.use_debug_cursor = True
+        try:
+            num_queries_before = len(connection.queries)
+            func(*args)
+            return len(connection.queries) - num_queries_before
+        finally:
+            connection.use_debug_cursor = None
+
+    def test_grade_query_count(self):
+        small_course = self._create_course(1, 1)
+        large_course = self._create_course(5, 10)
+        self.assertEqual(
+            self._num_queries(grade, self.student, self.request, small_course),
+            self._num_queries(grade, self.student, self.request, large_course),
+        )
+        homework_scores = grade(self.student, self.request, large_course)['totaled_scores']['Homework']
+        self.assertEqual([(score.earned, score.possible) for score in homework_scores], [(10, 10)] * 5)
+
+    def test_progress_summary_query_count(self):
+        small_course = self._create_course(1, 1)
+        large_course = self._create_course(5, 10)
+        self.assertEqual(
+            self._num_queries(progress_summary, self.student, self.request, small_course),
+            self._num_queries(progress_summary, self.student, self.request, large_course),
+        )
+
+
+@override_settings(MODULESTORE=TEST_DATA_MIXED_MODULESTORE)
+class TestSectionBreakdownLabels(ModuleStoreTestCase):
+    """
+    Test that the section breakdown labels can be had without grading a student.
+    """
+    def test_labels_match_gradeset(self):
+        course = CourseFactory.create()
+        chapter = ItemFactory.create(parent_location=course.location, category='chapter')
+        # more homeworks than the default grading policy expects
+        for _ in xrange(13):
+            ItemFactory.create(
+                parent_location=chapter.location,
+                category='sequential',
+                metadata={'graded': True, 'format': 'Homework'}
+            )
+        course = modulestore().get_instance(course.id, course.location)
+
+        student = UserFactory.create()
+        request = RequestFactory().get('/')
+        request.user = student
+        request.session = {}
+        gradeset = grade(student, request, course)
+
+        labels = section_breakdown_labels(course)
+        self.assertEqual(labels, [section['label'] for section in gradeset['section_breakdown']])
+        self.assertIn('HW 13', labels)
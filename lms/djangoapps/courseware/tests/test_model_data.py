@@ -153,6 +153,38 @@ class TestStudentModuleStorage(TestCase):
         self.assertEquals(len(exception_context.exception.saved_field_names), 0)
 
 
+class TestPrefetchedStudentModule(TestCase):
+
+    def setUp(self):
+        self.student_module = StudentModuleFactory(state=json.dumps({'a_field': 'a_value'}))
+        self.user = self.student_module.student
+        self.assertEqual(self.user.id, 1)   # check our assumption hard-coded in the key functions above.
+
+    def test_prefetched_module_not_queried(self):
+        "Test that a StudentModule which has already been read is used without querying for it"
+        descriptor = mock_descriptor([mock_field(Scope.user_state, 'a_field')])
+        with self.assertNumQueries(0):
+            field_data_cache = FieldDataCache([descriptor], course_id, self.user, student_modules=[self.student_module])
+            kvs = DjangoKeyValueStore(field_data_cache)
+            self.assertEquals('a_value', kvs.get(user_state_key('a_field')))
+        self.assertIs(field_data_cache.student_modules()[0], self.student_module)
+
+    def test_other_modules_queried(self):
+        "Test that StudentModules of the descriptors which weren't read are still queried for"
+        other_module = StudentModuleFactory(module_state_key=location('other_id').url(), student=self.user)
+        descriptor = mock_descriptor([mock_field(Scope.user_state, 'a_field')])
+        other_descriptor = mock_descriptor([mock_field(Scope.user_state, 'a_field')])
+        other_descriptor.scope_ids = ScopeIds('user1', 'mock_problem', location('def_id'), location('other_id'))
+        with self.assertNumQueries(1):
+            field_data_cache = FieldDataCache(
+                [descriptor, other_descriptor], course_id, self.user, student_modules=[self.student_module]
+            )
+        self.assertEquals(
+            sorted(module.id for module in field_data_cache.student_modules()),
+            sorted([self.student_module.id, other_module.id])
+        )
+
+
 class TestMissingStudentModule(TestCase):
     def setUp(self):
         self.user = UserFactory.create(username='user')
@@ -20,6 +20,7 @@ from markupsafe import escape
 from courseware import grades
 from courseware.access import has_access
 from courseware.courses import get_courses, get_course_with_access, sort_by_announcement
+from courseware.course_outline import get_course_outline
 import courseware.tabs as tabs
 from courseware.masquerade import setup_masquerade
 from courseware.model_data import FieldDataCache
@@ -388,6 +389,11 @@ def jump_to_id(request, course_id, module_id):
     passed in. This assumes that id is unique within the course_id namespace
     """
 
+    # Look the id up in the course outline, if the course has one, before querying the modulestore
+    outline = get_course_outline(modulestore(), course_id)
+    if outline is not None and module_id in outline['url_names']:
+        return jump_to(request, course_id, outline['url_names'][module_id])
+
     course_location = CourseDescriptor.id_to_location(course_id)
 
     items = modulestore().get_items(
@@ -423,7 +429,8 @@ def jump_to(request, course_id, location):
 
     # Complain if there's not data for this location
     try:
-        (course_id, chapter, section, position) = path_to_location(modulestore(), course_id, location)
+        outline = get_course_outline(modulestore(), course_id)
+        (course_id, chapter, section, position) = path_to_location(modulestore(), course_id, location, outline)
     except ItemNotFoundError:
         raise Http404(u"No data at this location: {0}".format(location))
     except NoPathToItem:
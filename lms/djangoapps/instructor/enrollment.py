@@ -11,6 +11,7 @@ from django.core.urlresolvers import reverse
 from django.core.mail import send_mail
 
 from student.models import CourseEnrollment, CourseEnrollmentAllowed
+from courseware.grade_cache import invalidate_grades
 from courseware.models import StudentModule
 from edxmako.shortcuts import render_to_string
 
@@ -159,6 +160,7 @@ def reset_student_attempts(course_id, student, module_state_key, delete_module=F
 
     if delete_module:
         module_to_reset.delete()
+        invalidate_grades(student.id, course_id)
     else:
         _reset_module_attempts(module_to_reset)
 
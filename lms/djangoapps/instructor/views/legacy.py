@@ -30,7 +30,7 @@ from xmodule.modulestore.exceptions import ItemNotFoundError
 from xmodule.html_module import HtmlDescriptor
 
 from bulk_email.models import CourseEmail, CourseAuthorization
-from courseware import grades
+from courseware import grade_cache, grades
 from courseware.access import has_access
 from courseware.courses import get_course_with_access, get_cms_course_link
 from student.roles import (
@@ -357,6 +357,7 @@ def instructor_dashboard(request, course_id):
                 # delete the state
                 try:
                     student_module.delete()
+                    grade_cache.invalidate_grades(student.id, course_id)
                     msg += "<font color='red'>{text}</font>".format(
                         text=_u("Deleted student module state for {state}!").format(state=module_state_key)
                     )
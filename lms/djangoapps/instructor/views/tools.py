@@ -9,6 +9,7 @@ from django.http import HttpResponseBadRequest
 from django.utils.timezone import utc
 from django.utils.translation import ugettext as _
 
+from courseware.grade_cache import invalidate_grades
 from courseware.models import StudentModule
 from xmodule.fields import Date
 
@@ -162,6 +163,8 @@ def set_due_date_extension(course, unit, student, due_date):
             set_due_date(child)
 
     set_due_date(unit)
+    # The progress summary shows the extended due dates
+    invalidate_grades(student.id, course.id)
 
 
 def dump_module_extensions(course, unit):
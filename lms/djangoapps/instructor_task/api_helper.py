@@ -9,6 +9,7 @@ from courseware.module_render import get_xqueue_callback_url_prefix
 
 from xmodule.modulestore.django import modulestore
 from instructor_task.models import InstructorTask, PROGRESS
+from instructor_task.subtasks import rollup_subtask_status
 
 
 log = logging.getLogger(__name__)
@@ -108,10 +109,10 @@ def _update_instructor_task(instructor_task, task_result):
     opportunity to update the InstructorTask entry.
 
     Tasks that are in progress and have subtasks doing the processing do not look
-    to the task's AsyncResult object.  When subtasks are running, the
-    InstructorTask object itself is updated with the subtasks' progress,
-    not any AsyncResult object.  In this case, the InstructorTask is
-    not updated at all.
+    to the task's AsyncResult object.  When subtasks are running, their
+    progress is recorded in InstructorSubtask objects, not any AsyncResult
+    object.  In this case, the InstructorTask is updated with the progress
+    rolled up from its subtasks instead.
 
     Calculates json to store in "task_output" field of the `instructor_task`,
     as well as updating the task_state.
@@ -141,7 +142,8 @@ def _update_instructor_task(instructor_task, task_result):
         # meaning that the subtasks have successfully been defined.  However, the InstructorTask
         # will be marked as in PROGRESS, until the last subtask completes and marks it as SUCCESS.
         # We want to ignore the parent SUCCESS if subtasks are still running, and just trust the
-        # contents of the InstructorTask.
+        # contents of the InstructorTask, once it is up to date with its subtasks.
+        rollup_subtask_status(instructor_task)
         entry_needs_updating = False
     elif result_state in [PROGRESS, SUCCESS]:
         # construct a status message directly from the task result's result:
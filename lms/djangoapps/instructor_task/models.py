@@ -12,8 +12,8 @@ file and check it in at the same time as your model changes. To do that,
 ASSUMPTIONS: modules have unique IDs, even across different module_types
 
 """
-from cStringIO import StringIO
 from gzip import GzipFile
+from tempfile import NamedTemporaryFile, SpooledTemporaryFile
 from uuid import uuid4
 import csv
 import json
@@ -189,12 +189,44 @@ class InstructorTask(models.Model):
         return json.dumps({'message': 'Task revoked before running'})
 
 
+class InstructorSubtask(models.Model):
+    """
+    Stores the status of one subtask of an InstructorTask.
+
+    Each subtask writes only its own row, so that subtasks finishing at the same
+    time don't have to wait on a lock on their parent InstructorTask.  The parent's
+    `subtasks` and `task_output` are rolled up from these rows.
+
+    `instructor_task` is the parent InstructorTask.
+    `task_id` stores the id used by celery for the subtask.
+    `task_state` stores the last known state of the subtask.
+    `status` stores the subtask's SubtaskStatus, as a JSON-serialized dict.
+    `updated` stores date that entry was last modified
+    """
+    instructor_task = models.ForeignKey(InstructorTask, db_index=True)
+    task_id = models.CharField(max_length=255, unique=True)  # max_length from celery_taskmeta
+    task_state = models.CharField(max_length=50, null=True, db_index=True)  # max_length from celery_taskmeta
+    status = models.TextField()  # JSON dictionary
+    updated = models.DateTimeField(auto_now=True)
+
+    def __repr__(self):
+        return 'InstructorSubtask<%r>' % ({
+            'instructor_task_id': self.instructor_task_id,
+            'task_id': self.task_id,
+            'task_state': self.task_state,
+            'status': self.status,
+        },)
+
+    def __unicode__(self):
+        return unicode(repr(self))
+
+
 class GradesStore(object):
     """
     Simple abstraction layer that can fetch and store CSV files for grades
-    download. Should probably refactor later to create a GradesFile object that
-    can simply be appended to for the sake of memory efficiency, rather than
-    passing in the whole dataset. Doing that for now just because it's simpler.
+    download. `store_rows` accepts any iterable of rows, including generators,
+    and writes rows out as they are produced, so the whole dataset never has
+    to be held in memory.
     """
     @classmethod
     def from_config(cls):
@@ -221,6 +253,11 @@ class S3GradesStore(GradesStore):
     conventions on where files are stored to know what to display. Clients using
     this class can name the final file whatever they want.
     """
+    # S3 requires every part of a multipart upload but the last to be at least 5MB
+    MULTIPART_UPLOAD_PART_SIZE = 5 * 1024 * 1024
+    # how much of a gzipped CSV file is kept in memory before spooling it to disk
+    SPOOL_MAX_SIZE = 5 * 1024 * 1024
+
     def __init__(self, bucket_name, root_path):
         self.root_path = root_path
 
@@ -294,21 +331,56 @@ class S3GradesStore(GradesStore):
             }
         )
 
+    def store_file(self, course_id, filename, gzipped_file):
+        """
+        Store the gzip-encoded contents of the file object `gzipped_file` like
+        `store()` does. Large files are sent with a multipart upload, a part at
+        a time, so they are never read into memory as a whole.
+        """
+        key = self.key_for(course_id, filename)
+        headers = {
+            "Content-Encoding": "gzip",
+            "Content-Type": "text/csv",
+        }
+
+        gzipped_file.seek(0, os.SEEK_END)
+        size = gzipped_file.tell()
+        gzipped_file.seek(0)
+
+        if size <= self.MULTIPART_UPLOAD_PART_SIZE:
+            key.set_contents_from_file(gzipped_file, headers=headers)
+            return
+
+        multipart_upload = self.bucket.initiate_multipart_upload(key.key, headers=headers)
+        try:
+            for part_num, offset in enumerate(xrange(0, size, self.MULTIPART_UPLOAD_PART_SIZE), start=1):
+                gzipped_file.seek(offset)
+                multipart_upload.upload_part_from_file(
+                    gzipped_file, part_num, size=min(self.MULTIPART_UPLOAD_PART_SIZE, size - offset)
+                )
+            multipart_upload.complete_upload()
+        except:
+            # don't leave the parts uploaded so far lying around (and billed for)
+            multipart_upload.cancel_upload()
+            raise
+
     def store_rows(self, course_id, filename, rows):
         """
         Given a `course_id`, `filename`, and `rows` (each row is an iterable of
-        strings), create a buffer that is a gzip'd csv file, and then `store()`
-        that buffer.
+        strings), write a gzip'd csv file of the rows to a temporary file, and
+        then `store_file()` it. The temporary file only spills to disk once it
+        gets large, and rows are written as they are produced, so this takes
+        constant memory however many rows there are.
 
         Even though we store it in gzip format, browsers will transparently
         download and decompress it. Filenames should end in `.csv`, not `.gz`.
         """
-        output_buffer = StringIO()
-        gzip_file = GzipFile(fileobj=output_buffer, mode="wb")
-        csv.writer(gzip_file).writerows(rows)
-        gzip_file.close()
+        with SpooledTemporaryFile(max_size=self.SPOOL_MAX_SIZE) as spool:
+            gzip_file = GzipFile(fileobj=spool, mode="wb")
+            csv.writer(gzip_file).writerows(rows)
+            gzip_file.close()
 
-        self.store(course_id, filename, output_buffer)
+            self.store_file(course_id, filename, spool)
 
     def links_for(self, course_id):
         """
@@ -380,11 +452,23 @@ class LocalFSGradesStore(GradesStore):
     def store_rows(self, course_id, filename, rows):
         """
         Given a course_id, filename, and rows (each row is an iterable of strings),
-        write this data out.
+        write this data out. Rows are written as they are produced, to a temporary
+        file which is moved into place once complete, so readers never see part of
+        a file.
         """
-        output_buffer = StringIO()
-        csv.writer(output_buffer).writerows(rows)
-        self.store(course_id, filename, output_buffer)
+        full_path = self.path_to(course_id, filename)
+        directory = os.path.dirname(full_path)
+        if not os.path.exists(directory):
+            os.mkdir(directory)
+
+        # The temporary file is kept out of the course directory, so links_for won't list it
+        with NamedTemporaryFile(dir=self.root_path, prefix='.', delete=False) as temp_file:
+            try:
+                csv.writer(temp_file).writerows(rows)
+            except:
+                os.remove(temp_file.name)
+                raise
+        os.rename(temp_file.name, full_path)
 
     def links_for(self, course_id):
         """
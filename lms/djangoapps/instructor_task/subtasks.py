@@ -12,14 +12,15 @@ from dogapi import dog_stats_api
 
 from django.db import transaction, DatabaseError
 from django.core.cache import cache
+from django.utils import timezone
 
-from instructor_task.models import InstructorTask, PROGRESS, QUEUING
+from instructor_task.models import InstructorTask, InstructorSubtask, PROGRESS, QUEUING
 
 TASK_LOG = get_task_logger(__name__)
 
 # Lock expiration should be long enough to allow a subtask to complete.
 SUBTASK_LOCK_EXPIRE = 60 * 10  # Lock expires in 10 minutes
-# Number of times to retry if a subtask update encounters a lock on the InstructorTask.
+# Number of times to retry if a subtask update fails with a database error.
 # (These are recursive retries, so don't make this number too large.)
 MAX_DATABASE_LOCK_RETRIES = 5
 
@@ -57,33 +58,40 @@ def _generate_items_for_subtask(item_queryset, item_fields, total_num_items, tot
 
     Arguments:
         `item_queryset` : a query set that defines the "items" that should be passed to subtasks.
-        `item_fields` : the fields that should be included in the dict that is returned.
-            These are in addition to the 'pk' field.
+        `item_fields` : the fields that should be included in the tuple that is returned.
+            These follow the 'pk' field, which comes first.
         `total_num_items` : the result of item_queryset.count().
         `items_per_query` : size of chunks to break the query operation into.
         `items_per_task` : maximum size of chunks to break each query chunk into for use by a subtask.
 
-    Returns:  yields a list of dicts, where each dict contains the fields in `item_fields`, plus the 'pk' field.
+    Returns:  yields a list of tuples, where each tuple contains the 'pk' field followed by the fields in `item_fields`.
+
+    The items are paged through in order of 'pk', each query starting after the last 'pk' of the one
+    before, so that every query is as cheap as the first however far into the items it starts.
 
     Warning:  if the algorithm here changes, the _get_number_of_subtasks() method should similarly be changed.
     """
     num_queries = int(math.ceil(float(total_num_items) / float(items_per_query)))
-    last_pk = item_queryset.order_by('pk')[0].pk - 1
+    last_pk = None
     num_items_queued = 0
     available_num_subtasks = total_num_subtasks
-    all_item_fields = list(item_fields)
-    all_item_fields.append('pk')
+    item_queryset = item_queryset.order_by('pk').values_list('pk', *item_fields)
 
     for query_number in range(num_queries):
+        item_sublist = item_queryset
+        if last_pk is not None:
+            item_sublist = item_sublist.filter(pk__gt=last_pk)
         # In case total_num_items has increased since it was initially calculated
         # include all remaining items in last query.
-        item_sublist = item_queryset.order_by('pk').filter(pk__gt=last_pk).values(*all_item_fields)
         if query_number < num_queries - 1:
             item_sublist = list(item_sublist[:items_per_query])
         else:
             item_sublist = list(item_sublist)
 
-        last_pk = item_sublist[-1]['pk']
+        if not item_sublist:
+            # Items have been removed since total_num_items was calculated.
+            break
+        last_pk = item_sublist[-1][0]
         num_items_this_query = len(item_sublist)
 
         # In case total_num_items has increased since it was initially calculated just distribute the extra
@@ -216,6 +224,10 @@ def initialize_subtask_info(entry, action_name, total_num, subtask_id_list):
     information for each subtask.  The value for each subtask (keyed by its task_id)
     is its subtask status, as defined by SubtaskStatus.to_dict().
 
+    An InstructorSubtask is also created for each subtask, which the subtask updates with its
+    status as it runs.  The InstructorTask's "task_output" and "subtasks" are rolled up from
+    these by rollup_subtask_status().
+
     This information needs to be set up in the InstructorTask before any of the subtasks start
     running.  If not, there is a chance that the subtasks could complete before the parent task
     is done creating subtasks.  Doing so also simplifies the save() here, as it avoids the need
@@ -253,9 +265,27 @@ def initialize_subtask_info(entry, action_name, total_num, subtask_id_list):
 
     # and save the entry immediately, before any subtasks actually start work:
     entry.save_now()
+    _create_subtasks(entry, subtask_status)
     return task_progress
 
 
+@transaction.autocommit
+def _create_subtasks(entry, subtask_status):
+    """
+    Creates an InstructorSubtask of `entry` for each of the initial statuses in `subtask_status`,
+    ensuring they are committed before any subtasks start work.
+    """
+    InstructorSubtask.objects.bulk_create([
+        InstructorSubtask(
+            instructor_task=entry,
+            task_id=subtask_id,
+            task_state=status['state'],
+            status=json.dumps(status),
+        )
+        for subtask_id, status in subtask_status.iteritems()
+    ])
+
+
 def queue_subtasks_for_query(entry, action_name, create_subtask_fcn, item_queryset, item_fields, items_per_query, items_per_task):
     """
     Generates and queues subtasks to each execute a chunk of "items" generated by a queryset.
@@ -267,8 +297,8 @@ def queue_subtasks_for_query(entry, action_name, create_subtask_fcn, item_querys
             Arguments are the list of items to be processed by this subtask, and a SubtaskStatus
             object reflecting initial status (and containing the subtask's id).
         `item_queryset` : a query set that defines the "items" that should be passed to subtasks.
-        `item_fields` : the fields that should be included in the dict that is returned.
-            These are in addition to the 'pk' field.
+        `item_fields` : the fields that should be included in the tuple that is returned.
+            These follow the 'pk' field, which comes first.
         `items_per_query` : size of chunks to break the query operation into.
         `items_per_task` : maximum size of chunks to break each query chunk into for use by a subtask.
 
@@ -379,9 +409,8 @@ def check_subtask_is_valid(entry_id, current_task_id, new_subtask_status):
         raise DuplicateTaskException(msg)
 
     # Confirm that the InstructorTask knows about this particular subtask.
-    subtask_dict = json.loads(entry.subtasks)
-    subtask_status_info = subtask_dict['status']
-    if current_task_id not in subtask_status_info:
+    subtask = _get_subtask(entry, current_task_id)
+    if subtask is None:
         format_str = "Unexpected task_id '{}': unable to find status for subtask of instructor task '{}': rejecting task {}"
         msg = format_str.format(current_task_id, entry, new_subtask_status)
         TASK_LOG.warning(msg)
@@ -390,7 +419,7 @@ def check_subtask_is_valid(entry_id, current_task_id, new_subtask_status):
 
     # Confirm that the InstructorTask doesn't think that this subtask has already been
     # performed successfully.
-    subtask_status = SubtaskStatus.from_dict(subtask_status_info[current_task_id])
+    subtask_status = SubtaskStatus.from_dict(json.loads(subtask.status))
     subtask_state = subtask_status.state
     if subtask_state in READY_STATES:
         format_str = "Unexpected task_id '{}': already completed - status {} for subtask of instructor task '{}': rejecting task {}"
@@ -424,14 +453,32 @@ def check_subtask_is_valid(entry_id, current_task_id, new_subtask_status):
         raise DuplicateTaskException(msg)
 
 
+def _get_subtask(entry, current_task_id):
+    """
+    Returns the InstructorSubtask of `entry` with `current_task_id`, or None if it isn't one of
+    the subtasks listed in the InstructorTask's "subtasks" field (e.g. if the parent task has been
+    requeued, and has defined other subtasks).
+
+    Subtasks which were queued before InstructorSubtasks were introduced only have their status
+    in the InstructorTask's "subtasks" field, so their InstructorSubtask is created from it here.
+    """
+    subtask_status_info = json.loads(entry.subtasks)['status']
+    if current_task_id not in subtask_status_info:
+        return None
+
+    try:
+        return InstructorSubtask.objects.get(instructor_task=entry, task_id=current_task_id)
+    except InstructorSubtask.DoesNotExist:
+        _create_subtasks(entry, {current_task_id: subtask_status_info[current_task_id]})
+        return InstructorSubtask.objects.get(instructor_task=entry, task_id=current_task_id)
+
+
 def update_subtask_status(entry_id, current_task_id, new_subtask_status, retry_count=0):
     """
-    Update the status of the subtask in the parent InstructorTask object tracking its progress.
+    Update the status of the subtask, and the progress of the parent InstructorTask if it is done.
 
-    Because select_for_update is used to lock the InstructorTask object while it is being updated,
-    multiple subtasks updating at the same time may time out while waiting for the lock.
     The actual update operation is surrounded by a try/except/else that permits the update to be
-    retried if the transaction times out.
+    retried if it fails with a database error.
 
     The subtask lock acquired in the call to check_subtask_is_valid() is released here, only when
     the attempting of retries has concluded.
@@ -458,97 +505,113 @@ def update_subtask_status(entry_id, current_task_id, new_subtask_status, retry_c
         _release_subtask_lock(current_task_id)
 
 
-@transaction.commit_manually
 def _update_subtask_status(entry_id, current_task_id, new_subtask_status):
     """
-    Update the status of the subtask in the parent InstructorTask object tracking its progress.
+    Update the status of the subtask in its InstructorSubtask.
+
+    Only the subtask's own row is written, so subtasks of the same InstructorTask don't
+    contend with each other.  Once the subtask is done, the progress of all of the subtasks
+    is rolled up into the parent InstructorTask by rollup_subtask_status().
+    """
+    TASK_LOG.info("Preparing to update status for subtask %s for instructor task %d with status %s",
+                  current_task_id, entry_id, new_subtask_status)
 
-    Uses select_for_update to lock the InstructorTask object while it is being updated.
-    The operation is surrounded by a try/except/else that permit the manual transaction to be
-    committed on completion, or rolled back on error.
+    num_updated = _save_subtask_status(entry_id, current_task_id, new_subtask_status)
+    if num_updated == 0:
+        # unexpected error -- raise an exception
+        format_str = "Unexpected task_id '{}': unable to update status for subtask of instructor task '{}'"
+        msg = format_str.format(current_task_id, entry_id)
+        TASK_LOG.warning(msg)
+        dog_stats_api.increment('instructor_task.subtask.update_exception')
+        raise ValueError(msg)
 
-    The InstructorTask's "task_output" field is updated.  This is a JSON-serialized dict.
-    Accumulates values for 'attempted', 'succeeded', 'failed', 'skipped' from `new_subtask_status`
-    into the corresponding values in the InstructorTask's task_output.  Also updates the 'duration_ms'
-    value with the current interval since the original InstructorTask started.  Note that this
-    value is only approximate, since the subtask may be running on a different server than the
-    original task, so is subject to clock skew.
+    if new_subtask_status.state in READY_STATES:
+        rollup_subtask_status(InstructorTask.objects.get(pk=entry_id))
 
-    The InstructorTask's "subtasks" field is also updated.  This is also a JSON-serialized dict.
-    Keys include 'total', 'succeeded', 'retried', 'failed', which are counters for the number of
-    subtasks.  'Total' is expected to have been set at the time the subtasks were created.
-    The other three counters are incremented depending on the value of `status`.  Once the counters
-    for 'succeeded' and 'failed' match the 'total', the subtasks are done and the InstructorTask's
-    "status" is changed to SUCCESS.
 
-    The "subtasks" field also contains a 'status' key, that contains a dict that stores status
-    information for each subtask.  At the moment, the value for each subtask (keyed by its task_id)
-    is the value of the SubtaskStatus.to_dict(), but could be expanded in future to store information
-    about failure messages, progress made, etc.
+@transaction.autocommit
+def _save_subtask_status(entry_id, current_task_id, new_subtask_status):
     """
-    TASK_LOG.info("Preparing to update status for subtask %s for instructor task %d with status %s",
-                  current_task_id, entry_id, new_subtask_status)
+    Writes `new_subtask_status` to the subtask's InstructorSubtask, committing it immediately.
 
-    try:
-        entry = InstructorTask.objects.select_for_update().get(pk=entry_id)
-        subtask_dict = json.loads(entry.subtasks)
-        subtask_status_info = subtask_dict['status']
-        if current_task_id not in subtask_status_info:
-            # unexpected error -- raise an exception
-            format_str = "Unexpected task_id '{}': unable to update status for subtask of instructor task '{}'"
-            msg = format_str.format(current_task_id, entry_id)
-            TASK_LOG.warning(msg)
-            raise ValueError(msg)
-
-        # Update status:
-        subtask_status_info[current_task_id] = new_subtask_status.to_dict()
-
-        # Update the parent task progress.
-        # Set the estimate of duration, but only if it
-        # increases.  Clock skew between time() returned by different machines
-        # may result in non-monotonic values for duration.
-        task_progress = json.loads(entry.task_output)
-        start_time = task_progress['start_time']
-        prev_duration = task_progress['duration_ms']
-        new_duration = int((time() - start_time) * 1000)
-        task_progress['duration_ms'] = max(prev_duration, new_duration)
-
-        # Update counts only when subtask is done.
-        # In future, we can make this more responsive by updating status
-        # between retries, by comparing counts that change from previous
-        # retry.
-        new_state = new_subtask_status.state
-        if new_subtask_status is not None and new_state in READY_STATES:
-            for statname in ['attempted', 'succeeded', 'failed', 'skipped']:
-                task_progress[statname] += getattr(new_subtask_status, statname)
+    Returns the number of InstructorSubtasks updated, which is 0 if the subtask is unknown.
+    """
+    return InstructorSubtask.objects.filter(instructor_task=entry_id, task_id=current_task_id).update(
+        task_state=new_subtask_status.state,
+        status=json.dumps(new_subtask_status.to_dict()),
+        updated=timezone.now(),
+    )
+
+
+@transaction.autocommit
+def rollup_subtask_status(entry):
+    """
+    Rolls the status of the InstructorSubtasks of `entry` up into its "task_output" and "subtasks".
+
+    The InstructorTask's "task_output" field is a JSON-serialized dict.  Its values for 'attempted',
+    'succeeded', 'failed', 'skipped' are the sums of those of the subtasks which are done.  Its
+    'duration_ms' value is also updated with the current interval since the original InstructorTask
+    started.  Note that this value is only approximate, since the subtask may be running on a
+    different server than the original task, so is subject to clock skew.
+
+    The InstructorTask's "subtasks" field is also a JSON-serialized dict.  Its 'succeeded' and
+    'failed' counters are the numbers of subtasks which are done, and its 'status' dict the status
+    of each subtask.  Once the counters for 'succeeded' and 'failed' match the 'total', the subtasks
+    are done and the InstructorTask's "status" is changed to SUCCESS.
 
-        # Figure out if we're actually done (i.e. this is the last task to complete).
-        # This is easier if we just maintain a counter, rather than scanning the
-        # entire new_subtask_status dict.
-        if new_state == SUCCESS:
+    This is called by each subtask as it finishes, and when the status of a running InstructorTask
+    is requested.  The entry is written with a single UPDATE rather than locked and saved, so
+    concurrent rollups may briefly write counts which are out of date, but the rollup by the last
+    subtask to finish sees all of them, and a finished InstructorTask is never written again.
+
+    `entry` is updated in place, and its task progress is returned.
+    """
+    subtask_dict = json.loads(entry.subtasks)
+    task_progress = json.loads(entry.task_output)
+    if 'start_time' not in task_progress:
+        # the task hasn't started its subtasks
+        return task_progress
+
+    subtask_status_info = subtask_dict['status']
+    for subtask in InstructorSubtask.objects.filter(instructor_task=entry):
+        # skip subtasks left over from an earlier queuing of the task
+        if subtask.task_id in subtask_status_info:
+            subtask_status_info[subtask.task_id] = json.loads(subtask.status)
+
+    # Count the subtasks which are done, and add up their results.
+    subtask_dict['succeeded'] = 0
+    subtask_dict['failed'] = 0
+    for statname in ['attempted', 'succeeded', 'failed', 'skipped']:
+        task_progress[statname] = 0
+    for status in subtask_status_info.itervalues():
+        if status['state'] == SUCCESS:
             subtask_dict['succeeded'] += 1
-        elif new_state in READY_STATES:
+        elif status['state'] in READY_STATES:
             subtask_dict['failed'] += 1
-        num_remaining = subtask_dict['total'] - subtask_dict['succeeded'] - subtask_dict['failed']
-
-        # If we're done with the last task, update the parent status to indicate that.
-        # At present, we mark the task as having succeeded.  In future, we should see
-        # if there was a catastrophic failure that occurred, and figure out how to
-        # report that here.
-        if num_remaining <= 0:
-            entry.task_state = SUCCESS
-        entry.subtasks = json.dumps(subtask_dict)
-        entry.task_output = InstructorTask.create_output_for_success(task_progress)
-
-        TASK_LOG.debug("about to save....")
-        entry.save()
-        TASK_LOG.info("Task output updated to %s for subtask %s of instructor task %d",
-                      entry.task_output, current_task_id, entry_id)
-    except Exception:
-        TASK_LOG.exception("Unexpected error while updating InstructorTask.")
-        transaction.rollback()
-        dog_stats_api.increment('instructor_task.subtask.update_exception')
-        raise
-    else:
-        TASK_LOG.debug("about to commit....")
-        transaction.commit()
+        if status['state'] in READY_STATES:
+            for statname in ['attempted', 'succeeded', 'failed', 'skipped']:
+                task_progress[statname] += status[statname]
+
+    # Set the estimate of duration, but only if it increases.  Clock skew between
+    # time() returned by different machines may result in non-monotonic values for duration.
+    new_duration = int((time() - task_progress['start_time']) * 1000)
+    task_progress['duration_ms'] = max(task_progress['duration_ms'], new_duration)
+
+    # If all of the subtasks are done, update the parent status to indicate that.
+    # At present, we mark the task as having succeeded.  In future, we should see
+    # if there was a catastrophic failure that occurred, and figure out how to
+    # report that here.
+    num_remaining = subtask_dict['total'] - subtask_dict['succeeded'] - subtask_dict['failed']
+    if num_remaining <= 0:
+        entry.task_state = SUCCESS
+    entry.subtasks = json.dumps(subtask_dict)
+    entry.task_output = InstructorTask.create_output_for_success(task_progress)
+
+    InstructorTask.objects.filter(pk=entry.id).exclude(task_state=SUCCESS).update(
+        task_state=entry.task_state,
+        subtasks=entry.subtasks,
+        task_output=entry.task_output,
+        updated=timezone.now(),
+    )
+    TASK_LOG.info("Task output updated to %s for instructor task %d", entry.task_output, entry.id)
+    return task_progress
@@ -27,9 +27,13 @@ from instructor_task.tasks_helper import (
     run_main_task,
     BaseInstructorTask,
     perform_module_state_update,
+    perform_module_state_update_subtask,
     rescore_problem_module_state,
+    rescore_problem_module_states,
     reset_attempts_module_state,
+    reset_attempts_module_states,
     delete_problem_module_state,
+    delete_problem_module_states,
     push_grades_to_s3,
 )
 from bulk_email.tasks import perform_delegate_email_batches
@@ -57,15 +61,42 @@ def rescore_problem(entry_id, xmodule_instance_args):
     # Translators: This is a past-tense verb that is inserted into task progress messages as {action}.
     action_name = ugettext_noop('rescored')
     update_fcn = partial(rescore_problem_module_state, xmodule_instance_args)
+    chunk_update_fcn = partial(rescore_problem_module_states, xmodule_instance_args)
 
     def filter_fcn(modules_to_update):
         """Filter that matches problems which are marked as being done"""
         return modules_to_update.filter(state__contains='"done": true')
 
-    visit_fcn = partial(perform_module_state_update, update_fcn, filter_fcn)
+    def create_subtask_fcn(item_list, initial_subtask_status):
+        """Creates a subtask to rescore a list of StudentModules."""
+        return rescore_problem_subtask.subtask(
+            (entry_id, xmodule_instance_args, item_list, initial_subtask_status.to_dict()),
+            task_id=initial_subtask_status.task_id,
+            routing_key=settings.PROBLEM_UPDATES_ROUTING_KEY,
+        )
+
+    visit_fcn = partial(
+        perform_module_state_update, update_fcn, filter_fcn,
+        chunk_update_fcn=chunk_update_fcn, create_subtask_fcn=create_subtask_fcn,
+    )
     return run_main_task(entry_id, visit_fcn, action_name)
 
 
+@task  # pylint: disable=E1102
+def rescore_problem_subtask(entry_id, xmodule_instance_args, item_list, subtask_status_dict):
+    """Rescores some of the StudentModules of a rescore_problem task which is spread over subtasks.
+
+    `entry_id` is the id value of the InstructorTask entry of the rescore_problem task.
+    `item_list` is the list of StudentModules to rescore, each a list starting with its 'pk'.
+    `subtask_status_dict` is the initial SubtaskStatus of this subtask, as a dict.
+
+    `xmodule_instance_args` provides information needed by _get_module_instance_for_task()
+    to instantiate an xmodule instance.
+    """
+    chunk_update_fcn = partial(rescore_problem_module_states, xmodule_instance_args)
+    return perform_module_state_update_subtask(chunk_update_fcn, entry_id, item_list, subtask_status_dict)
+
+
 @task(base=BaseInstructorTask)  # pylint: disable=E1102
 def reset_problem_attempts(entry_id, xmodule_instance_args):
     """Resets problem attempts to zero for a particular problem for all students in a course.
@@ -84,7 +115,8 @@ def reset_problem_attempts(entry_id, xmodule_instance_args):
     # Translators: This is a past-tense verb that is inserted into task progress messages as {action}.
     action_name = ugettext_noop('reset')
     update_fcn = partial(reset_attempts_module_state, xmodule_instance_args)
-    visit_fcn = partial(perform_module_state_update, update_fcn, None)
+    chunk_update_fcn = partial(reset_attempts_module_states, xmodule_instance_args)
+    visit_fcn = partial(perform_module_state_update, update_fcn, None, chunk_update_fcn=chunk_update_fcn)
     return run_main_task(entry_id, visit_fcn, action_name)
 
 
@@ -106,7 +138,8 @@ def delete_problem_state(entry_id, xmodule_instance_args):
     # Translators: This is a past-tense verb that is inserted into task progress messages as {action}.
     action_name = ugettext_noop('deleted')
     update_fcn = partial(delete_problem_module_state, xmodule_instance_args)
-    visit_fcn = partial(perform_module_state_update, update_fcn, None)
+    chunk_update_fcn = partial(delete_problem_module_states, xmodule_instance_args)
+    visit_fcn = partial(perform_module_state_update, update_fcn, None, chunk_update_fcn=chunk_update_fcn)
     return run_main_task(entry_id, visit_fcn, action_name)
 
 
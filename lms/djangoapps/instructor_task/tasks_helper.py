@@ -5,25 +5,35 @@ running state of a course.
 """
 import json
 import urllib
+from collections import defaultdict
 from datetime import datetime
 from time import time
 
 from celery import Task, current_task
 from celery.utils.log import get_task_logger
 from celery.states import SUCCESS, FAILURE
+from django.conf import settings
 from django.contrib.auth.models import User
-from django.db import transaction, reset_queries
+from django.db import connection, transaction, reset_queries
 from dogapi import dog_stats_api
 from pytz import UTC
 
 from xmodule.modulestore.django import modulestore
 from track.views import task_track
 
-from courseware.grades import iterate_grades_for
-from courseware.models import StudentModule
+from courseware.grade_cache import invalidate_grades, invalidate_grades_for_users
+from courseware.courses import get_course_by_id
+from courseware.grades import iterate_grades_for, section_breakdown_labels
+from courseware.models import StudentModule, StudentModuleHistory
 from courseware.model_data import FieldDataCache
 from courseware.module_render import get_module_for_descriptor_internal
 from instructor_task.models import GradesStore, InstructorTask, PROGRESS
+from instructor_task.subtasks import (
+    SubtaskStatus,
+    queue_subtasks_for_query,
+    check_subtask_is_valid,
+    update_subtask_status,
+)
 from student.models import CourseEnrollment
 
 # define different loggers for use within tasks and on client side
@@ -207,7 +217,65 @@ def run_main_task(entry_id, task_fcn, action_name):
     return task_progress
 
 
-def perform_module_state_update(update_fcn, filter_fcn, _entry_id, course_id, task_input, action_name):
+def _get_modules_to_update(course_id, task_input, filter_fcn):
+    """
+    Returns a query for the StudentModule instances to update, and the user whose
+    modules they are (or None if they belong to all students).
+
+    See `perform_module_state_update` for how `task_input` and `filter_fcn` are used.
+    """
+    module_state_key = task_input.get('problem_url')
+    student_identifier = task_input.get('student')
+
+    # find the module in question
+    modules_to_update = StudentModule.objects.filter(course_id=course_id,
+                                                     module_state_key=module_state_key)
+
+    # give the option of updating an individual student. If not specified,
+    # then updates all students who have responded to a problem so far
+    student = None
+    if student_identifier is not None:
+        # if an identifier is supplied, then look for the student,
+        # and let it throw an exception if none is found.
+        if "@" in student_identifier:
+            student = User.objects.get(email=student_identifier)
+        elif student_identifier is not None:
+            student = User.objects.get(username=student_identifier)
+
+    if student is not None:
+        modules_to_update = modules_to_update.filter(student_id=student.id)
+
+    if filter_fcn is not None:
+        modules_to_update = filter_fcn(modules_to_update)
+
+    return modules_to_update, student
+
+
+def _iterate_modules_in_chunks(modules_to_update, chunk_size):
+    """
+    Yields the StudentModules of the query `modules_to_update`, with their students,
+    in lists of at most `chunk_size`.
+
+    Each chunk is read with a query of its own, for the modules with ids after the last
+    one of the previous chunk, so that the whole result is never held in memory and the
+    queries don't slow down as they go (as OFFSET queries do).  This also copes with
+    modules being deleted as they are visited.
+    """
+    last_id = 0
+    while True:
+        chunk = list(
+            modules_to_update.filter(id__gt=last_id).order_by('id').select_related('student')[:chunk_size]
+        )
+        if not chunk:
+            return
+        yield chunk
+        if len(chunk) < chunk_size:
+            return
+        last_id = chunk[-1].id
+
+
+def perform_module_state_update(update_fcn, filter_fcn, entry_id, course_id, task_input, action_name,
+                                chunk_update_fcn=None, create_subtask_fcn=None):
     """
     Performs generic update by visiting StudentModule instances with the update_fcn provided.
 
@@ -225,6 +293,17 @@ def perform_module_state_update(update_fcn, filter_fcn, _entry_id, course_id, ta
     the update is successful; False indicates the update on the particular student module failed.
     A raised exception indicates a fatal condition -- that no other student modules should be considered.
 
+    StudentModules are read in chunks of settings.PROBLEM_UPDATES['MODULES_PER_QUERY'].  If a
+    `chunk_update_fcn` is not None, it is called instead of `update_fcn` with the module_descriptor and
+    each chunk of StudentModules, and returns the list of their update statuses.
+
+    If a `create_subtask_fcn` is not None, and there are more StudentModules to update than
+    settings.PROBLEM_UPDATES['SUBTASK_THRESHOLD'] (when that is not 0), the work is instead spread over
+    subtasks of settings.PROBLEM_UPDATES['MODULES_PER_TASK'] StudentModules each, as
+    `queue_subtasks_for_query` describes, which then record their own progress.
+
+    Progress is reported to Celery at most every settings.PROBLEM_UPDATES['PROGRESS_INTERVAL'] seconds.
+
     The return value is a dict containing the task's results, with the following keys:
 
           'attempted': number of attempts made
@@ -245,31 +324,11 @@ def perform_module_state_update(update_fcn, filter_fcn, _entry_id, course_id, ta
     start_time = time()
 
     module_state_key = task_input.get('problem_url')
-    student_identifier = task_input.get('student')
 
     # find the problem descriptor:
     module_descriptor = modulestore().get_instance(course_id, module_state_key)
 
-    # find the module in question
-    modules_to_update = StudentModule.objects.filter(course_id=course_id,
-                                                     module_state_key=module_state_key)
-
-    # give the option of updating an individual student. If not specified,
-    # then updates all students who have responded to a problem so far
-    student = None
-    if student_identifier is not None:
-        # if an identifier is supplied, then look for the student,
-        # and let it throw an exception if none is found.
-        if "@" in student_identifier:
-            student = User.objects.get(email=student_identifier)
-        elif student_identifier is not None:
-            student = User.objects.get(username=student_identifier)
-
-    if student is not None:
-        modules_to_update = modules_to_update.filter(student_id=student.id)
-
-    if filter_fcn is not None:
-        modules_to_update = filter_fcn(modules_to_update)
+    modules_to_update, student = _get_modules_to_update(course_id, task_input, filter_fcn)
 
     # perform the main loop
     num_attempted = 0
@@ -278,6 +337,21 @@ def perform_module_state_update(update_fcn, filter_fcn, _entry_id, course_id, ta
     num_failed = 0
     num_total = modules_to_update.count()
 
+    subtask_threshold = settings.PROBLEM_UPDATES.get('SUBTASK_THRESHOLD', 0)
+    if create_subtask_fcn is not None and student is None and subtask_threshold and num_total > subtask_threshold:
+        entry = InstructorTask.objects.get(pk=entry_id)
+        modules_per_task = settings.PROBLEM_UPDATES.get('MODULES_PER_TASK', 1000)
+        TASK_LOG.info(u"Task %s: spreading %s updates of %s over subtasks", entry.task_id, num_total, module_state_key)
+        return queue_subtasks_for_query(
+            entry,
+            action_name,
+            create_subtask_fcn,
+            modules_to_update,
+            [],
+            max(settings.PROBLEM_UPDATES.get('MODULES_PER_QUERY', 500), modules_per_task),
+            modules_per_task,
+        )
+
     def get_task_progress():
         """Return a dict containing info about current task"""
         current_time = time()
@@ -291,14 +365,30 @@ def perform_module_state_update(update_fcn, filter_fcn, _entry_id, course_id, ta
                     }
         return progress
 
+    def update_modules(student_modules):
+        """Return the update statuses of a chunk of StudentModules"""
+        tags = ['action:{name}'.format(name=action_name)]
+        if chunk_update_fcn is not None:
+            with dog_stats_api.timer('instructor_tasks.module.time.chunk', tags=tags):
+                return chunk_update_fcn(module_descriptor, student_modules)
+
+        update_statuses = []
+        for module_to_update in student_modules:
+            # There is no try here:  if there's an error, we let it throw, and the task will
+            # be marked as FAILED, with a stack trace.
+            with dog_stats_api.timer('instructor_tasks.module.time.step', tags=tags):
+                update_statuses.append(update_fcn(module_descriptor, module_to_update))
+        return update_statuses
+
+    progress_interval = settings.PROBLEM_UPDATES.get('PROGRESS_INTERVAL', 0)
+    modules_per_query = settings.PROBLEM_UPDATES.get('MODULES_PER_QUERY', 500)
+
     task_progress = get_task_progress()
     _get_current_task().update_state(state=PROGRESS, meta=task_progress)
-    for module_to_update in modules_to_update:
-        num_attempted += 1
-        # There is no try here:  if there's an error, we let it throw, and the task will
-        # be marked as FAILED, with a stack trace.
-        with dog_stats_api.timer('instructor_tasks.module.time.step', tags=['action:{name}'.format(name=action_name)]):
-            update_status = update_fcn(module_descriptor, module_to_update)
+    last_progress_time = time()
+    for student_modules in _iterate_modules_in_chunks(modules_to_update, modules_per_query):
+        for update_status in update_modules(student_modules):
+            num_attempted += 1
             if update_status == UPDATE_STATUS_SUCCEEDED:
                 # If the update_fcn returns true, then it performed some kind of work.
                 # Logging of failures is left to the update_fcn itself.
@@ -310,13 +400,67 @@ def perform_module_state_update(update_fcn, filter_fcn, _entry_id, course_id, ta
             else:
                 raise UpdateProblemModuleStateError("Unexpected update_status returned: {}".format(update_status))
 
-        # update task status:
-        task_progress = get_task_progress()
-        _get_current_task().update_state(state=PROGRESS, meta=task_progress)
+        # update task status, but not so often that it slows the task down:
+        if time() - last_progress_time >= progress_interval:
+            task_progress = get_task_progress()
+            _get_current_task().update_state(state=PROGRESS, meta=task_progress)
+            last_progress_time = time()
 
+    task_progress = get_task_progress()
+    _get_current_task().update_state(state=PROGRESS, meta=task_progress)
     return task_progress
 
 
+def perform_module_state_update_subtask(chunk_update_fcn, entry_id, item_list, subtask_status_dict):
+    """
+    Performs the updates of one subtask queued by `perform_module_state_update`.
+
+    `item_list` is the list of items, each starting with the 'pk' of a StudentModule to update, and
+    `subtask_status_dict` the initial SubtaskStatus of the subtask as a dict.  The StudentModules
+    are updated in chunks with `chunk_update_fcn`, as they are by `perform_module_state_update`,
+    and the subtask's progress is recorded in the InstructorTask `entry_id`.
+
+    Returns the final SubtaskStatus of the subtask as a dict.
+    """
+    subtask_status = SubtaskStatus.from_dict(subtask_status_dict)
+    current_task_id = subtask_status.task_id
+    num_to_update = len(item_list)
+    TASK_LOG.info("Preparing to update %d modules as subtask %s for instructor task %d: status=%s",
+                  num_to_update, current_task_id, entry_id, subtask_status)
+
+    # Check that the subtask is known to the InstructorTask entry and hasn't already been run.
+    check_subtask_is_valid(entry_id, current_task_id, subtask_status)
+
+    entry = InstructorTask.objects.get(pk=entry_id)
+    task_input = json.loads(entry.task_input)
+    num_updated = 0
+    try:
+        module_descriptor = modulestore().get_instance(entry.course_id, task_input.get('problem_url'))
+        modules_to_update = StudentModule.objects.filter(id__in=[item[0] for item in item_list])
+        modules_per_query = settings.PROBLEM_UPDATES.get('MODULES_PER_QUERY', 500)
+        for student_modules in _iterate_modules_in_chunks(modules_to_update, modules_per_query):
+            update_statuses = chunk_update_fcn(module_descriptor, student_modules)
+            num_updated += len(update_statuses)
+            subtask_status.increment(
+                succeeded=update_statuses.count(UPDATE_STATUS_SUCCEEDED),
+                failed=update_statuses.count(UPDATE_STATUS_FAILED),
+                skipped=update_statuses.count(UPDATE_STATUS_SKIPPED),
+            )
+    except Exception:
+        # Count everything which wasn't updated as having failed, to keep the counts consistent.
+        TASK_LOG.exception("Update subtask %s for instructor task %d: failed unexpectedly!", current_task_id, entry_id)
+        subtask_status.increment(failed=num_to_update - num_updated, state=FAILURE)
+        update_subtask_status(entry_id, current_task_id, subtask_status)
+        raise
+
+    # StudentModules deleted since the subtask was queued are counted as skipped.
+    subtask_status.increment(skipped=num_to_update - num_updated, state=SUCCESS)
+    update_subtask_status(entry_id, current_task_id, subtask_status)
+    TASK_LOG.info("Update subtask %s for instructor task %d: returning status %s",
+                  current_task_id, entry_id, subtask_status)
+    return subtask_status.to_dict()
+
+
 def _get_task_id_from_xmodule_args(xmodule_instance_args):
     """Gets task_id from `xmodule_instance_args` dict, or returns default value if missing."""
     return xmodule_instance_args.get('task_id', UNKNOWN_TASK_ID) if xmodule_instance_args is not None else UNKNOWN_TASK_ID
@@ -344,16 +488,21 @@ def _get_track_function_for_task(student, xmodule_instance_args=None, source_pag
 
 
 def _get_module_instance_for_task(course_id, student, module_descriptor, xmodule_instance_args=None,
-                                  grade_bucket_type=None):
+                                  grade_bucket_type=None, student_module=None):
     """
     Fetches a StudentModule instance for a given `course_id`, `student` object, and `module_descriptor`.
 
     `xmodule_instance_args` is used to provide information for creating a track function and an XQueue callback.
     These are passed, along with `grade_bucket_type`, to get_module_for_descriptor_internal, which sidesteps
     the need for a Request object when instantiating an xmodule instance.
+
+    `student_module` is the student's StudentModule for `module_descriptor`, if it has already been read.
     """
     # reconstitute the problem's corresponding XModule:
-    field_data_cache = FieldDataCache.cache_for_descriptor_descendents(course_id, student, module_descriptor)
+    field_data_cache = FieldDataCache.cache_for_descriptor_descendents(
+        course_id, student, module_descriptor,
+        student_modules=[student_module] if student_module is not None else None,
+    )
 
     # get request-related tracking information from args passthrough, and supplement with task-specific
     # information:
@@ -391,11 +540,57 @@ def rescore_problem_module_state(xmodule_instance_args, module_descriptor, stude
     Returns True if problem was successfully rescored for the given student, and False
     if problem encountered some kind of error in rescoring.
     '''
+    return _rescore_student_module(xmodule_instance_args, module_descriptor, student_module)
+
+
+def rescore_problem_module_states(xmodule_instance_args, module_descriptor, student_modules):
+    """
+    Rescores a chunk of StudentModules for the XModule descriptor, as
+    `rescore_problem_module_state` does for one, and returns their update statuses.
+
+    The descriptor is shared by all of them (as is the parsed problem, see
+    capa.capa_problem.PROBLEM_SKELETON_CACHE).  Each StudentModule is rescored in its own
+    transaction, so that students only wait for the rescoring of their own StudentModule,
+    and the student's cached grades are invalidated once it's committed.  StudentModules
+    deleted since the chunk was read are left out.
+    """
+    update_statuses = []
+    for student_module in student_modules:
+        update_status = _rescore_locked_student_module(xmodule_instance_args, module_descriptor, student_module)
+        if update_status is not None:
+            # Grades computed while the rescore was uncommitted were cached under the
+            # version set by its grade event, so they are invalidated again.
+            invalidate_grades(student_module.student_id, student_module.course_id)
+            update_statuses.append(update_status)
+    return update_statuses
+
+
+@transaction.commit_on_success
+def _rescore_locked_student_module(xmodule_instance_args, module_descriptor, student_module):
+    """
+    Rescores `student_module` as `rescore_problem_module_state` does, after re-reading and
+    locking it so that a submission made since it was first read isn't overwritten.
+
+    Returns None if the StudentModule has been deleted.
+    """
+    locked_modules = _lock_modules([student_module])
+    if not locked_modules:
+        return None
+    return _rescore_student_module(xmodule_instance_args, module_descriptor, locked_modules[0])
+
+
+def _rescore_student_module(xmodule_instance_args, module_descriptor, student_module):
+    """
+    Rescores a student's problem submission, without managing transactions.
+
+    See `rescore_problem_module_state`.
+    """
     # unpack the StudentModule:
     course_id = student_module.course_id
     student = student_module.student
     module_state_key = student_module.module_state_key
-    instance = _get_module_instance_for_task(course_id, student, module_descriptor, xmodule_instance_args, grade_bucket_type='rescore')
+    instance = _get_module_instance_for_task(course_id, student, module_descriptor, xmodule_instance_args,
+                                             grade_bucket_type='rescore', student_module=student_module)
 
     if instance is None:
         # Either permissions just changed, or someone is trying to be clever
@@ -445,6 +640,7 @@ def reset_attempts_module_state(xmodule_instance_args, _module_descriptor, stude
             # convert back to json and save
             student_module.state = json.dumps(problem_state)
             student_module.save()
+            invalidate_grades(student_module.student_id, student_module.course_id)
             # get request-related tracking information from args passthrough,
             # and supplement with task-specific information:
             track_function = _get_track_function_for_task(student_module.student, xmodule_instance_args)
@@ -463,6 +659,7 @@ def delete_problem_module_state(xmodule_instance_args, _module_descriptor, stude
     Always returns UPDATE_STATUS_SUCCEEDED, indicating success, if it doesn't raise an exception due to database error.
     """
     student_module.delete()
+    invalidate_grades(student_module.student_id, student_module.course_id)
     # get request-related tracking information from args passthrough,
     # and supplement with task-specific information:
     track_function = _get_track_function_for_task(student_module.student, xmodule_instance_args)
@@ -470,96 +667,255 @@ def delete_problem_module_state(xmodule_instance_args, _module_descriptor, stude
     return UPDATE_STATUS_SUCCEEDED
 
 
+def reset_attempts_module_states(xmodule_instance_args, _module_descriptor, student_modules):
+    """
+    Resets problem attempts to zero for a chunk of StudentModules, as
+    `reset_attempts_module_state` does for one, and returns their update statuses.
+
+    The tracking events are emitted once the changes are committed.
+    """
+    update_statuses, modules_to_reset, events = _reset_attempts(student_modules)
+    _invalidate_grades_for_modules(modules_to_reset)
+    _track_module_events(xmodule_instance_args, events)
+    return update_statuses
+
+
+@transaction.commit_on_success
+def _reset_attempts(student_modules):
+    """
+    Resets problem attempts to zero for a chunk of StudentModules, which are re-read and
+    locked so that submissions made since the chunk was first read aren't overwritten.
+    The new states are written with a single UPDATE.
+
+    Returns the update statuses of the StudentModules which still exist, the StudentModules
+    which were reset, and their tracking events as (student, event_type, event) tuples.
+    """
+    update_statuses = []
+    modules_to_reset = []
+    events = []
+    for student_module in _lock_modules(student_modules):
+        problem_state = json.loads(student_module.state) if student_module.state else {}
+        old_number_of_attempts = problem_state.get('attempts')
+        if old_number_of_attempts > 0:
+            problem_state["attempts"] = 0
+            student_module.state = json.dumps(problem_state)
+            modules_to_reset.append(student_module)
+            event_info = {"old_attempts": old_number_of_attempts, "new_attempts": 0}
+            events.append((student_module.student, 'problem_reset_attempts', event_info))
+            update_statuses.append(UPDATE_STATUS_SUCCEEDED)
+        else:
+            update_statuses.append(UPDATE_STATUS_SKIPPED)
+
+    _save_module_states(modules_to_reset)
+    return update_statuses, modules_to_reset, events
+
+
+def delete_problem_module_states(xmodule_instance_args, _module_descriptor, student_modules):
+    """
+    Deletes a chunk of StudentModules with a single query, as `delete_problem_module_state`
+    does for one, and returns their update statuses.
+    """
+    _delete_modules(student_modules)
+    _invalidate_grades_for_modules(student_modules)
+    _track_module_events(
+        xmodule_instance_args,
+        [(student_module.student, 'problem_delete_state', {}) for student_module in student_modules]
+    )
+    return [UPDATE_STATUS_SUCCEEDED] * len(student_modules)
+
+
+def _lock_modules(student_modules):
+    """
+    Re-reads `student_modules`, with their students, locking them until the end of the
+    transaction.  StudentModules deleted since they were read are left out.
+    """
+    return list(
+        StudentModule.objects.select_for_update().filter(
+            id__in=[student_module.id for student_module in student_modules]
+        ).order_by('id').select_related('student')
+    )
+
+
+def _save_module_states(student_modules):
+    """
+    Writes the changed `state` of each of `student_modules` with a single UPDATE,
+    which picks the new state of each StudentModule by its id with a CASE.
+    (The ORM can only set a field to the same value for every row it updates.)
+
+    Updates like this don't send post_save, so the StudentModuleHistory entries which it
+    would have created are created here, in bulk.
+    """
+    if not student_modules:
+        return
+
+    modified = datetime.now(UTC)
+    quote_name = connection.ops.quote_name
+    opts = StudentModule._meta  # pylint: disable=W0212
+    id_column = quote_name(opts.pk.column)
+    cases = []
+    params = []
+    for student_module in student_modules:
+        student_module.modified = modified
+        cases.append('WHEN %s THEN %s')
+        params.extend([student_module.id, student_module.state])
+    params.append(connection.ops.value_to_db_datetime(modified))
+    params.extend(student_module.id for student_module in student_modules)
+
+    sql = 'UPDATE {table} SET {state} = CASE {id} {cases} END, {modified} = %s WHERE {id} IN ({ids})'.format(
+        table=quote_name(opts.db_table),
+        state=quote_name(opts.get_field('state').column),
+        modified=quote_name(opts.get_field('modified').column),
+        id=id_column,
+        cases=' '.join(cases),
+        ids=', '.join(['%s'] * len(student_modules)),
+    )
+    connection.cursor().execute(sql, params)
+    # raw queries don't mark the transaction as having changes to commit
+    transaction.set_dirty()
+
+    StudentModuleHistory.objects.bulk_create([
+        StudentModuleHistory(
+            student_module=student_module,
+            version=None,
+            created=modified,
+            state=student_module.state,
+            grade=student_module.grade,
+            max_grade=student_module.max_grade,
+        )
+        for student_module in student_modules
+        if student_module.module_type in StudentModuleHistory.HISTORY_SAVING_TYPES
+    ])
+
+
+@transaction.commit_on_success
+def _delete_modules(student_modules):
+    """Deletes `student_modules`, and their history, in bulk rather than one by one."""
+    StudentModule.objects.filter(id__in=[student_module.id for student_module in student_modules]).delete()
+
+
+def _invalidate_grades_for_modules(student_modules):
+    """Drops the cached grades of the students of `student_modules`."""
+    user_ids_by_course = defaultdict(set)
+    for student_module in student_modules:
+        user_ids_by_course[student_module.course_id].add(student_module.student_id)
+    for course_id, user_ids in user_ids_by_course.iteritems():
+        invalidate_grades_for_users(user_ids, course_id)
+
+
+def _track_module_events(xmodule_instance_args, events):
+    """
+    Emits the tracking events of a chunk of StudentModules, given as a list of
+    (student, event_type, event) tuples.
+    """
+    for student, event_type, event in events:
+        track_function = _get_track_function_for_task(student, xmodule_instance_args)
+        track_function(event_type, event)
+
+
 def push_grades_to_s3(_xmodule_instance_args, _entry_id, course_id, _task_input, action_name):
     """
     For a given `course_id`, generate a grades CSV file for all students that
     are enrolled, and store using a `GradesStore`. Once created, the files can
     be accessed by instantiating another `GradesStore` (via
-    `GradesStore.from_config()`) and calling `link_for()` on it. Writes are
-    buffered, so we'll never write part of a CSV file to S3 -- i.e. any files
-    that are visible in GradesStore will be complete ones.
-
-    As we start to add more CSV downloads, it will probably be worthwhile to
-    make a more general CSVDoc class instead of building out the rows like we
-    do here.
+    `GradesStore.from_config()`) and calling `link_for()` on it. Rows are
+    streamed to the `GradesStore` as students are graded, which writes them to
+    a temporary file first, so we'll never write part of a CSV file to S3 --
+    i.e. any files that are visible in GradesStore will be complete ones.
     """
     start_time = datetime.now(UTC)
     status_interval = 100
 
-    enrolled_students = CourseEnrollment.users_enrolled_in(course_id)
-    num_total = enrolled_students.count()
-    num_attempted = 0
-    num_succeeded = 0
-    num_failed = 0
-    curr_step = "Calculating Grades"
+    enrolled_students = CourseEnrollment.users_enrolled_in(course_id).order_by('id')
+    counts = {
+        'attempted': 0,
+        'succeeded': 0,
+        'failed': 0,
+        'total': enrolled_students.count(),
+    }
+    # a list so that it can be changed from within grade_rows()
+    curr_step = ["Calculating Grades"]
 
     def update_task_progress():
         """Return a dict containing info about current task"""
         current_time = datetime.now(UTC)
+        duration_sec = (current_time - start_time).total_seconds()
         progress = {
             'action_name': action_name,
-            'attempted': num_attempted,
-            'succeeded': num_succeeded,
-            'failed': num_failed,
-            'total': num_total,
-            'duration_ms': int((current_time - start_time).total_seconds() * 1000),
-            'step': curr_step,
+            'attempted': counts['attempted'],
+            'succeeded': counts['succeeded'],
+            'failed': counts['failed'],
+            'total': counts['total'],
+            'duration_ms': int(duration_sec * 1000),
+            'rows_per_sec': round(counts['attempted'] / duration_sec, 1) if duration_sec > 0 else 0.0,
+            'step': curr_step[0],
         }
         _get_current_task().update_state(state=PROGRESS, meta=progress)
 
         return progress
 
-    # Loop over all our students and build our CSV lists in memory
-    header = None
-    rows = []
+    # The sections are the same for every student, so the header comes from the
+    # course grader rather than from whoever happens to be graded first.
+    course = get_course_by_id(course_id)
+    header = section_breakdown_labels(course)
     err_rows = [["id", "username", "error_msg"]]
-    for student, gradeset, err_msg in iterate_grades_for(course_id, enrolled_students):
-        # Periodically update task status (this is a cache write)
-        if num_attempted % status_interval == 0:
-            update_task_progress()
-        num_attempted += 1
-
-        if gradeset:
-            # We were able to successfully grade this student for this course.
-            num_succeeded += 1
-            if not header:
-                # Encode the header row in utf-8 encoding in case there are unicode characters
-                header = [section['label'].encode('utf-8') for section in gradeset[u'section_breakdown']]
-                rows.append(["id", "email", "username", "grade"] + header)
-
-            percents = {
-                section['label']: section.get('percent', 0.0)
-                for section in gradeset[u'section_breakdown']
-                if 'label' in section
-            }
-
-            # Not everybody has the same gradable items. If the item is not
-            # found in the user's gradeset, just assume it's a 0. The aggregated
-            # grades for their sections and overall course will be calculated
-            # without regard for the item they didn't have access to, so it's
-            # possible for a student to have a 0.0 show up in their row but
-            # still have 100% for the course.
-            row_percents = [percents.get(label, 0.0) for label in header]
-            rows.append([student.id, student.email, student.username, gradeset['percent']] + row_percents)
-        else:
-            # An empty gradeset means we failed to grade a student.
-            num_failed += 1
-            err_rows.append([student.id, student.username, err_msg])
 
-    # By this point, we've got the rows we're going to stuff into our CSV files.
-    curr_step = "Uploading CSVs"
-    update_task_progress()
+    def grade_rows():
+        """
+        Grade all our students, yielding the CSV rows as we go. Error rows
+        are collected in err_rows.
+        """
+        # Encode the header row in utf-8 encoding in case there are unicode characters
+        yield ["id", "email", "username", "grade"] + [label.encode('utf-8') for label in header]
+
+        # Grade in batch mode, so that StudentModule scores are read for a chunk of
+        # students at a time rather than one problem at a time.
+        students_per_query = settings.GRADES_DOWNLOAD.get('STUDENTS_PER_QUERY', 100)
+        for student, gradeset, err_msg in iterate_grades_for(course_id, enrolled_students, students_per_query):
+            # Periodically update task status (this is a cache write)
+            if counts['attempted'] % status_interval == 0:
+                update_task_progress()
+            counts['attempted'] += 1
+
+            if gradeset:
+                # We were able to successfully grade this student for this course.
+                counts['succeeded'] += 1
+                percents = {
+                    section['label']: section.get('percent', 0.0)
+                    for section in gradeset[u'section_breakdown']
+                    if 'label' in section
+                }
+
+                # Not everybody has the same gradable items. If the item is not
+                # found in the user's gradeset, just assume it's a 0. The aggregated
+                # grades for their sections and overall course will be calculated
+                # without regard for the item they didn't have access to, so it's
+                # possible for a student to have a 0.0 show up in their row but
+                # still have 100% for the course.
+                row_percents = [percents.get(label, 0.0) for label in header]
+                yield [student.id, student.email, student.username, gradeset['percent']] + row_percents
+            else:
+                # An empty gradeset means we failed to grade a student.
+                counts['failed'] += 1
+                err_rows.append([student.id, student.username, err_msg])
+
+        # The rows have all been written; what's left is getting the files into the store.
+        curr_step[0] = "Uploading CSVs"
+        progress = update_task_progress()
+        TASK_LOG.info(
+            u'Graded %s students in course %s in %s ms (%s rows/sec)',
+            counts['attempted'], course_id, progress['duration_ms'], progress['rows_per_sec']
+        )
 
     # Generate parts of the file name
     timestamp_str = start_time.strftime("%Y-%m-%d-%H%M")
     course_id_prefix = urllib.quote(course_id.replace("/", "_"))
 
-    # Perform the actual upload
+    # Perform the actual upload, grading students as the rows are written out
     grades_store = GradesStore.from_config()
     grades_store.store_rows(
         course_id,
         u"{}_grade_report_{}.csv".format(course_id_prefix, timestamp_str),
-        rows
+        grade_rows()
     )
 
     # If there are any error rows (don't count the header), write them out as well
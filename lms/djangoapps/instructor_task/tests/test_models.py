@@ -0,0 +1,127 @@
+"""
+Tests for the stores of grade report CSV files.
+"""
+import csv
+import os
+import shutil
+import tempfile
+from cStringIO import StringIO
+from gzip import GzipFile
+
+from django.test import TestCase
+from mock import patch, Mock
+
+from instructor_task.models import LocalFSGradesStore, S3GradesStore
+
+COURSE_ID = 'org/course/run'
+
+
+def generate_rows(num_rows):
+    """
+    Yield a header and `num_rows` rows, like push_grades_to_s3 does
+    """
+    yield ['id', 'email', 'username', 'grade']
+    for index in xrange(num_rows):
+        yield [index, 'student{}@example.com'.format(index), 'student{}'.format(index), 0.5]
+
+
+def csv_data(rows):
+    """
+    Return rows as they should be written to a CSV file
+    """
+    output = StringIO()
+    csv.writer(output).writerows(rows)
+    return output.getvalue()
+
+
+class TestLocalFSGradesStore(TestCase):
+    """
+    Tests for LocalFSGradesStore
+    """
+    def setUp(self):
+        self.root_path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root_path)
+        self.store = LocalFSGradesStore(self.root_path)
+
+    def test_store_rows_from_generator(self):
+        self.store.store_rows(COURSE_ID, 'grades.csv', generate_rows(1000))
+
+        with open(self.store.path_to(COURSE_ID, 'grades.csv')) as grades_file:
+            self.assertEqual(grades_file.read(), csv_data(generate_rows(1000)))
+        self.assertEqual([filename for filename, __ in self.store.links_for(COURSE_ID)], ['grades.csv'])
+        # no temporary files are left behind
+        self.assertEqual(len(os.listdir(self.root_path)), 1)
+
+    def test_failed_rows_leave_no_file(self):
+        def failing_rows():
+            """Yield a row, then fail like a grading error would"""
+            yield ['id']
+            raise ValueError()
+
+        with self.assertRaises(ValueError):
+            self.store.store_rows(COURSE_ID, 'grades.csv', failing_rows())
+        self.assertEqual(self.store.links_for(COURSE_ID), [])
+        # only the (empty) course directory is left
+        course_dir = os.path.dirname(self.store.path_to(COURSE_ID, ''))
+        self.assertEqual(os.listdir(self.root_path), [os.path.basename(course_dir)])
+
+
+@patch('instructor_task.models.S3Connection')
+class TestS3GradesStore(TestCase):
+    """
+    Tests for S3GradesStore
+    """
+    def setUp(self):
+        self.uploaded_parts = []
+
+    def uploaded_data(self):
+        """
+        Return the ungzipped data of the parts uploaded so far
+        """
+        return GzipFile(fileobj=StringIO(''.join(self.uploaded_parts)), mode='rb').read()
+
+    def record_part(self, fileobj, *args, **kwargs):
+        """
+        Read an uploaded part like boto would
+        """
+        size = kwargs.get('size')
+        self.uploaded_parts.append(fileobj.read(size) if size is not None else fileobj.read())
+
+    def test_small_file(self, mock_connection):
+        store = S3GradesStore('bucket', 'root')
+        with patch('instructor_task.models.Key') as mock_key:
+            mock_key.return_value.set_contents_from_file.side_effect = self.record_part
+            store.store_rows(COURSE_ID, 'grades.csv', generate_rows(10))
+
+        self.assertEqual(self.uploaded_data(), csv_data(generate_rows(10)))
+        self.assertFalse(mock_connection.return_value.get_bucket.return_value.initiate_multipart_upload.called)
+
+    def test_multipart_upload(self, mock_connection):
+        store = S3GradesStore('bucket', 'root')
+        multipart_upload = Mock()
+        multipart_upload.upload_part_from_file.side_effect = self.record_part
+        mock_connection.return_value.get_bucket.return_value.initiate_multipart_upload.return_value = multipart_upload
+
+        with patch.object(S3GradesStore, 'MULTIPART_UPLOAD_PART_SIZE', 1024):
+            with patch.object(S3GradesStore, 'SPOOL_MAX_SIZE', 2048):
+                store.store_rows(COURSE_ID, 'grades.csv', generate_rows(5000))
+
+        self.assertGreater(multipart_upload.upload_part_from_file.call_count, 1)
+        self.assertEqual(
+            [call[0][1] for call in multipart_upload.upload_part_from_file.call_args_list],
+            range(1, multipart_upload.upload_part_from_file.call_count + 1)
+        )
+        self.assertTrue(multipart_upload.complete_upload.called)
+        self.assertEqual(self.uploaded_data(), csv_data(generate_rows(5000)))
+
+    def test_failed_multipart_upload_is_cancelled(self, mock_connection):
+        store = S3GradesStore('bucket', 'root')
+        multipart_upload = Mock()
+        multipart_upload.upload_part_from_file.side_effect = IOError()
+        mock_connection.return_value.get_bucket.return_value.initiate_multipart_upload.return_value = multipart_upload
+
+        with patch.object(S3GradesStore, 'MULTIPART_UPLOAD_PART_SIZE', 1024):
+            with self.assertRaises(IOError):
+                store.store_rows(COURSE_ID, 'grades.csv', generate_rows(5000))
+        self.assertTrue(multipart_upload.cancel_upload.called)
+        self.assertFalse(multipart_upload.complete_upload.called)
@@ -1,13 +1,22 @@
 """
 Unit tests for instructor_task subtasks.
 """
+import json
 from uuid import uuid4
 
+from celery.states import SUCCESS, FAILURE
 from mock import Mock, patch
 
 from student.models import CourseEnrollment
 
-from instructor_task.subtasks import queue_subtasks_for_query
+from instructor_task.models import InstructorTask, InstructorSubtask, PROGRESS
+from instructor_task.subtasks import (
+    queue_subtasks_for_query,
+    initialize_subtask_info,
+    update_subtask_status,
+    rollup_subtask_status,
+    SubtaskStatus,
+)
 from instructor_task.tests.factories import InstructorTaskFactory
 from instructor_task.tests.test_base import InstructorTaskCourseTestCase
 
@@ -93,3 +102,71 @@ class TestSubtasks(InstructorTaskCourseTestCase):
         self.assertEqual(len(mock_create_subtask_fcn_args[1][0][0]), 3)
         self.assertEqual(len(mock_create_subtask_fcn_args[2][0][0]), 4)
         self.assertEqual(len(mock_create_subtask_fcn_args[3][0][0]), 4)
+
+
+class TestSubtaskStatusRollup(InstructorTaskCourseTestCase):
+    """Tests for recording the status of subtasks, and rolling it up into their InstructorTask."""
+
+    def setUp(self):
+        super(TestSubtaskStatusRollup, self).setUp()
+        self.initialize_course()
+        self.subtask_ids = [str(uuid4()) for _ in range(3)]
+        self.entry = InstructorTaskFactory.create(
+            course_id=self.course.id,
+            task_id=str(uuid4()),
+            task_key='dummy_task_key',
+            task_type='bulk_course_email',
+        )
+        initialize_subtask_info(self.entry, 'emailed', 30, self.subtask_ids)
+
+    def _get_entry(self):
+        """Reload the InstructorTask"""
+        return InstructorTask.objects.get(pk=self.entry.id)
+
+    def _update_subtask(self, index, state, **counts):
+        """Record the status of one of the subtasks"""
+        subtask_id = self.subtask_ids[index]
+        update_subtask_status(self.entry.id, subtask_id, SubtaskStatus.create(subtask_id, state=state, **counts))
+
+    def test_running_subtask_only_updates_itself(self):
+        task_output = self._get_entry().task_output
+        self._update_subtask(0, PROGRESS, succeeded=4)
+        subtask = InstructorSubtask.objects.get(task_id=self.subtask_ids[0])
+        self.assertEquals(subtask.task_state, PROGRESS)
+        self.assertEquals(json.loads(subtask.status)['succeeded'], 4)
+        self.assertEquals(self._get_entry().task_output, task_output)
+
+    def test_finished_subtasks_roll_up(self):
+        self._update_subtask(0, SUCCESS, succeeded=10)
+        self._update_subtask(1, FAILURE, succeeded=8, failed=2)
+        entry = self._get_entry()
+        self.assertEquals(entry.task_state, PROGRESS)
+        progress = json.loads(entry.task_output)
+        self.assertEquals(progress['attempted'], 20)
+        self.assertEquals(progress['succeeded'], 18)
+        self.assertEquals(progress['failed'], 2)
+        subtask_dict = json.loads(entry.subtasks)
+        self.assertEquals(subtask_dict['succeeded'], 1)
+        self.assertEquals(subtask_dict['failed'], 1)
+        self.assertEquals(subtask_dict['status'][self.subtask_ids[1]]['state'], FAILURE)
+
+        self._update_subtask(2, SUCCESS, skipped=10)
+        entry = self._get_entry()
+        self.assertEquals(entry.task_state, SUCCESS)
+        progress = json.loads(entry.task_output)
+        self.assertEquals(progress['skipped'], 10)
+        self.assertEquals(progress['total'], 30)
+
+    def test_stale_rollup_does_not_overwrite_finished_task(self):
+        stale_entry = self._get_entry()
+        for index in range(len(self.subtask_ids)):
+            self._update_subtask(index, SUCCESS, succeeded=10)
+        finished_entry = self._get_entry()
+        self.assertEquals(finished_entry.task_state, SUCCESS)
+        # a rollup which missed the last subtasks finishing mustn't undo that:
+        with patch('instructor_task.subtasks.InstructorSubtask.objects.filter') as mock_filter:
+            mock_filter.return_value = []
+            rollup_subtask_status(stale_entry)
+        entry = self._get_entry()
+        self.assertEquals(entry.task_state, SUCCESS)
+        self.assertEquals(entry.task_output, finished_entry.task_output)
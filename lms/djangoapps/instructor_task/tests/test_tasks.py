@@ -11,10 +11,12 @@ from uuid import uuid4
 from mock import Mock, MagicMock, patch
 
 from celery.states import SUCCESS, FAILURE
+from django.conf import settings
+from django.test.utils import override_settings
 
 from xmodule.modulestore.exceptions import ItemNotFoundError
 
-from courseware.models import StudentModule
+from courseware.models import StudentModule, StudentModuleHistory
 from courseware.tests.factories import StudentModuleFactory
 from student.tests.factories import UserFactory, CourseEnrollmentFactory
 
@@ -22,11 +24,15 @@ from instructor_task.models import InstructorTask
 from instructor_task.tests.test_base import InstructorTaskModuleTestCase
 from instructor_task.tests.factories import InstructorTaskFactory
 from instructor_task.tasks import rescore_problem, reset_problem_attempts, delete_problem_state
-from instructor_task.tasks_helper import UpdateProblemModuleStateError
+from instructor_task.tasks_helper import (
+    UPDATE_STATUS_SUCCEEDED,
+    UpdateProblemModuleStateError,
+    _lock_modules,
+    reset_attempts_module_states,
+)
 
 PROBLEM_URL_NAME = "test_urlname"
 
-
 class TestTaskFailure(Exception):
     pass
 
@@ -257,6 +263,75 @@ class TestRescoreInstructorTask(TestInstructorTasks):
         self.assertEquals(output.get('action_name'), 'rescored')
         self.assertGreater(output.get('duration_ms'), 0)
 
+    def test_rescoring_in_chunks(self):
+        input_state = json.dumps({'done': True})
+        num_students = 10
+        self._create_students_with_state(num_students, input_state)
+        task_entry = self._create_input_entry()
+        mock_instance = Mock()
+        mock_instance.rescore_problem = Mock(return_value={'success': 'correct'})
+        problem_updates = dict(settings.PROBLEM_UPDATES, MODULES_PER_QUERY=3, PROGRESS_INTERVAL=0)
+        with override_settings(PROBLEM_UPDATES=problem_updates):
+            with patch('instructor_task.tasks_helper.get_module_for_descriptor_internal') as mock_get_module:
+                mock_get_module.return_value = mock_instance
+                self._run_task_with_mock_celery(rescore_problem, task_entry.id, task_entry.task_id)
+        # every student's module was built from the StudentModule read with its chunk
+        rescored_ids = []
+        for call_args in mock_get_module.call_args_list:
+            student, field_data_cache = call_args[0][0], call_args[0][2]
+            student_module, = field_data_cache.student_modules()
+            self.assertEquals(student_module.student_id, student.id)
+            rescored_ids.append(student_module.id)
+        module_ids = StudentModule.objects.filter(module_state_key=self.problem_url).values_list('id', flat=True)
+        self.assertEquals(rescored_ids, sorted(module_ids))
+        # progress was reported at the start, after each of the 4 chunks, and at the end
+        self.assertEquals(self.current_task.update_state.call_count, 6)
+        entry = InstructorTask.objects.get(id=task_entry.id)
+        output = json.loads(entry.task_output)
+        self.assertEquals(output.get('attempted'), num_students)
+        self.assertEquals(output.get('succeeded'), num_students)
+
+    def test_rescoring_commits_each_module(self):
+        input_state = json.dumps({'done': True})
+        num_students = 5
+        self._create_students_with_state(num_students, input_state)
+        task_entry = self._create_input_entry()
+        mock_instance = Mock()
+        mock_instance.rescore_problem = Mock(return_value={'success': 'correct'})
+        with patch('instructor_task.tasks_helper.get_module_for_descriptor_internal') as mock_get_module:
+            mock_get_module.return_value = mock_instance
+            with patch('instructor_task.tasks_helper._lock_modules', wraps=_lock_modules) as mock_lock:
+                with patch('instructor_task.tasks_helper.invalidate_grades') as mock_invalidate:
+                    self._run_task_with_mock_celery(rescore_problem, task_entry.id, task_entry.task_id)
+        # each StudentModule was locked on its own, and its student's grades invalidated after it was committed
+        self.assertEquals(mock_lock.call_count, num_students)
+        self.assertTrue(all(len(call_args[0][0]) == 1 for call_args in mock_lock.call_args_list))
+        self.assertEquals(mock_invalidate.call_count, num_students)
+
+    def test_rescoring_with_subtasks(self):
+        input_state = json.dumps({'done': True})
+        num_students = 10
+        self._create_students_with_state(num_students, input_state)
+        task_entry = self._create_input_entry()
+        mock_instance = Mock()
+        mock_instance.rescore_problem = Mock(return_value={'success': 'correct'})
+        problem_updates = dict(settings.PROBLEM_UPDATES, SUBTASK_THRESHOLD=5, MODULES_PER_TASK=4)
+        with override_settings(PROBLEM_UPDATES=problem_updates):
+            with patch('instructor_task.tasks_helper.get_module_for_descriptor_internal') as mock_get_module:
+                mock_get_module.return_value = mock_instance
+                self._run_task_with_mock_celery(rescore_problem, task_entry.id, task_entry.task_id)
+        self.assertEquals(mock_instance.rescore_problem.call_count, num_students)
+        # the subtasks recorded their progress in the entry
+        entry = InstructorTask.objects.get(id=task_entry.id)
+        self.assertEquals(entry.task_state, SUCCESS)
+        subtasks = json.loads(entry.subtasks)
+        self.assertEquals(subtasks['total'], 3)
+        self.assertEquals(subtasks['succeeded'], 3)
+        output = json.loads(entry.task_output)
+        self.assertEquals(output.get('attempted'), num_students)
+        self.assertEquals(output.get('succeeded'), num_students)
+        self.assertEquals(output.get('total'), num_students)
+
     def test_rescoring_bad_result(self):
         # Confirm that rescoring does not succeed if "success" key is not an expected value.
         input_state = json.dumps({'done': True})
@@ -389,6 +464,80 @@ class TestResetAttemptsInstructorTask(TestInstructorTasks):
             else:
                 self.assertEquals(state['attempts'], initial_attempts)
 
+    def test_reset_in_chunks(self):
+        input_state = json.dumps({'attempts': 3, 'done': True})
+        num_students = 10
+        students = self._create_students_with_state(num_students, input_state)
+        task_entry = self._create_input_entry()
+        problem_updates = dict(settings.PROBLEM_UPDATES, MODULES_PER_QUERY=4)
+        with override_settings(PROBLEM_UPDATES=problem_updates):
+            with patch('instructor_task.tasks_helper.task_track') as mock_track:
+                self._run_task_with_mock_celery(reset_problem_attempts, task_entry.id, task_entry.task_id)
+        self._assert_num_attempts(students, 0)
+        # one event was emitted for each student
+        self.assertEquals(mock_track.call_count, num_students)
+        self.assertEquals(
+            sorted(call_args[0][1]['student'] for call_args in mock_track.call_args_list),
+            sorted(student.username for student in students)
+        )
+        # and the history of each module records the reset
+        for module in StudentModule.objects.filter(module_state_key=self.problem_url):
+            history = StudentModuleHistory.objects.filter(student_module=module).latest()
+            self.assertEquals(history.state, module.state)
+            self.assertEquals(history.created, module.modified)
+
+    def test_reset_chunk_queries(self):
+        """
+        Resetting the attempts of a chunk of StudentModules with different states should
+        lock them, write their states and create their history with a query each.
+        """
+        self.define_option_problem(PROBLEM_URL_NAME)
+        student = UserFactory.create(username='robot')
+        num_modules = 20
+        StudentModule.objects.bulk_create([
+            StudentModule(
+                course_id=self.course.id,
+                module_state_key='{}_{}'.format(self.problem_url, index),
+                module_type='problem',
+                student=student,
+                state=json.dumps({'attempts': index % 5 + 1, 'student_answers': {'answer': index}}),
+            )
+            for index in xrange(num_modules)
+        ])
+        modules = list(StudentModule.objects.filter(student=student).order_by('id'))
+
+        with patch('instructor_task.tasks_helper.task_track'):
+            with self.assertNumQueries(3):
+                update_statuses = reset_attempts_module_states(None, None, modules)
+        self.assertEquals(update_statuses, [UPDATE_STATUS_SUCCEEDED] * num_modules)
+
+        for module in StudentModule.objects.filter(student=student):
+            state = json.loads(module.state)
+            self.assertEquals(state['attempts'], 0)
+            # each module keeps its own answers
+            expected_key = '{}_{}'.format(self.problem_url, state['student_answers']['answer'])
+            self.assertEquals(module.module_state_key, expected_key)
+            self.assertEquals(StudentModuleHistory.objects.get(student_module=module).state, module.state)
+
+    def test_reset_keeps_concurrent_submission(self):
+        """
+        A submission made after a chunk was read, but before it was reset, isn't overwritten.
+        """
+        input_state = json.dumps({'attempts': 3, 'done': True})
+        students = self._create_students_with_state(2, input_state)
+        modules = list(StudentModule.objects.filter(module_state_key=self.problem_url).order_by('id'))
+        # the first student submits again after the chunk was read
+        StudentModule.objects.filter(id=modules[0].id).update(
+            state=json.dumps({'attempts': 4, 'done': True, 'student_answers': {'answer': 'new'}})
+        )
+
+        with patch('instructor_task.tasks_helper.task_track'):
+            reset_attempts_module_states(None, None, modules)
+        state = json.loads(StudentModule.objects.get(id=modules[0].id).state)
+        self.assertEquals(state['attempts'], 0)
+        self.assertEquals(state['student_answers'], {'answer': 'new'})
+        self._assert_num_attempts(students, 0)
+
     def test_reset_with_student_username(self):
         self._test_reset_with_student(False)
 
@@ -430,7 +579,9 @@ class TestDeleteStateInstructorTask(TestInstructorTasks):
             StudentModule.objects.get(course_id=self.course.id,
                                       student=student,
                                       module_state_key=self.problem_url)
-        self._test_run_with_task(delete_problem_state, 'deleted', num_students)
+        problem_updates = dict(settings.PROBLEM_UPDATES, MODULES_PER_QUERY=4)
+        with override_settings(PROBLEM_UPDATES=problem_updates):
+            self._test_run_with_task(delete_problem_state, 'deleted', num_students)
         # confirm that no state can be found anymore:
         for student in students:
             with self.assertRaises(StudentModule.DoesNotExist):
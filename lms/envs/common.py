@@ -204,6 +204,12 @@ FEATURES = {
     # grades CSV files to S3 and give links for downloads.
     'ENABLE_S3_GRADE_DOWNLOADS': False,
 
+    # Serve grades and progress summaries from a persistent cache
+    # (courseware.grade_cache) until the student's scores or the course change.
+    # Score changes aren't tracked while this is off, so clear the cache and the
+    # CachedGrade table when turning it back on.
+    'ENABLE_GRADE_CACHE': False,
+
     # whether to use password policy enforcement or not
     'ENFORCE_PASSWORD_POLICY': False,
 
@@ -436,6 +442,15 @@ CODE_JAIL = {
         # How many CPU seconds can jailed code use?
         'CPU': 1,
     },
+
+    # Pre-forked sandbox workers, to avoid starting a sandboxed Python for
+    # every execution. A size of 0 disables the pool.
+    'worker_pool': {
+        # How many workers each LMS process may run.
+        'size': 0,
+        # How many executions a worker runs before it is replaced.
+        'max_executions': 100,
+    },
 }
 
 # Some courses are allowed to run unsafe code. This is a list of regexes, one
@@ -1009,12 +1024,28 @@ BULK_EMAIL_ROUTING_KEY = HIGH_PRIORITY_QUEUE
 # a bulk email message.
 BULK_EMAIL_LOG_SENT_EMAILS = False
 
+# Maximum number of bulk emails sent per second, by all workers together.
+# When the email backend reports that email is being sent too quickly, the
+# rate is lowered, and then raised back gradually.  Set this depending on
+# what the SES sending rate is.  None does not limit the rate, and only
+# retries sends that the email backend throttles.
+BULK_EMAIL_MAX_SEND_RATE = None
+
 # Delay in seconds to sleep between individual mail messages being sent,
-# when a bulk email task is retried for rate-related reasons.  Choose this
-# value depending on the number of workers that might be sending email in
-# parallel, and what the SES rate is.
+# when a bulk email task is retried for rate-related reasons and
+# BULK_EMAIL_MAX_SEND_RATE is None.  Choose this value depending on the
+# number of workers that might be sending email in parallel, and what the
+# SES rate is.
 BULK_EMAIL_RETRY_DELAY_BETWEEN_SENDS = 0.02
 
+# Number of bulk emails sent without complaint from the email backend after
+# which the rate limiter raises the rate again.
+BULK_EMAIL_SEND_BATCH_SIZE = 10
+
+# Number of seconds for which a worker keeps its connection to the email
+# backend open after a task, for use by its next task.  0 closes it at once.
+BULK_EMAIL_CONNECTION_IDLE_TIMEOUT = 10
+
 
 ############################## Video ##########################################
 
@@ -1248,6 +1279,25 @@ GRADES_DOWNLOAD = {
     'STORAGE_TYPE': 'localfs',
     'BUCKET': 'edx-grades',
     'ROOT_PATH': '/tmp/edx-s3/grades',
+    # Number of students whose StudentModule scores are fetched per query
+    # when generating grade reports.
+    'STUDENTS_PER_QUERY': 100,
+}
+
+###################### Problem Updates ######################
+# Rescoring, resetting attempts and deleting the state of a problem for its students.
+PROBLEM_UPDATES_ROUTING_KEY = HIGH_MEM_QUEUE
+
+PROBLEM_UPDATES = {
+    # Number of StudentModules read per query, and rescored per transaction.
+    'MODULES_PER_QUERY': 500,
+    # Minimum number of seconds between updates of a task's progress.
+    'PROGRESS_INTERVAL': 2,
+    # Rescoring more StudentModules than this is spread over subtasks of
+    # MODULES_PER_TASK StudentModules each, which can run on several workers.
+    # 0 always rescores in a single task.
+    'SUBTASK_THRESHOLD': 0,
+    'MODULES_PER_TASK': 1000,
 }
 
 #### PASSWORD POLICY SETTINGS #####
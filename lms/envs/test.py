@@ -219,6 +219,11 @@ CELERY_ALWAYS_EAGER = True
 CELERY_RESULT_BACKEND = 'cache'
 BROKER_TRANSPORT = 'memory'
 
+################################ BULK EMAIL ###################################
+
+# Don't keep mocked connections between tests.
+BULK_EMAIL_CONNECTION_IDLE_TIMEOUT = 0
+
 ############################ STATIC FILES #############################
 DEFAULT_FILE_STORAGE = 'django.core.files.storage.FileSystemStorage'
 MEDIA_ROOT = TEST_ROOT / "uploads"
@@ -20,6 +20,21 @@ def run():
     if settings.FEATURES.get('USE_CUSTOM_THEME', False):
         enable_theme()
 
+    configure_sandbox_worker_pool()
+
+
+def configure_sandbox_worker_pool():
+    """
+    Let capa run sandboxed code in a pool of warm workers, if configured.
+    """
+    pool_settings = settings.CODE_JAIL.get('worker_pool', {})
+    if pool_settings.get('size'):
+        from capa.safe_exec import worker_pool
+        worker_pool.configure(
+            pool_settings['size'],
+            max_executions=pool_settings.get('max_executions', 100),
+        )
+
 
 def enable_theme():
     """